@@ -1,14 +1,15 @@
 import os
 import sys
 import json
-import base64
 import asyncio
 import traceback
 import uuid
 import secrets
-from typing import List, Optional, Dict
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect, Query
+import time
+from typing import Any, List, Optional, Dict, Set, Tuple
+from datetime import datetime, timedelta
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Query, Request
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
@@ -17,11 +18,77 @@ from pathlib import Path
 # 将项目根目录添加到路径
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 sys.path.insert(0, str(PROJECT_ROOT))
+BACKEND_DIR = Path(__file__).resolve().parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
 
+from echuu.live.cancel import CancelToken, Cancelled
 from echuu.live.engine import EchuuLiveEngine
+from echuu.live.llm_policy import parse_llm_policies
+from echuu.live.memory_sync import MemorySync
+from echuu.live.metrics import (
+    CONNECTIONS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    FANOUT_SECONDS,
+    QUEUE_DEPTH,
+    REGISTRY,
+    ROOMS,
+    STEP_FIRST_AUDIO_SECONDS,
+)
+from echuu.live.pacing import StepPacer
+from echuu.live.resources import (
+    default_scripts_dir,
+    get_shared_resources,
+    open_script_index,
+)
+from echuu.live.script_index import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ScriptIndex
+from audio_store import (
+    AUDIO_MIME,
+    CACHE_CONTROL,
+    AudioStore,
+    RangeNotSatisfiable,
+    etag_for,
+    etag_matches,
+    parse_range,
+)
+from danmaku_buffer import DanmakuRingBuffer
+from danmaku_ingest import DanmakuIngest
+from fanout import FanoutStats, ViewerConnection
+from room_bus import (
+    MESSAGE_DANMAKU,
+    MESSAGE_EVENT,
+    MESSAGE_STOP,
+    ROOM_RUN_LOCK_REFRESH,
+    WORKER_ID,
+    BusMessage,
+    check_owner_token,
+    create_room_backend,
+)
+from room_reaper import RoomReaper, current_rss_mb
+from ws_protocol import (
+    PROTOCOL_V1,
+    PROTOCOL_V2,
+    SUPPORTED_PROTOCOLS,
+    OutboundEvent,
+    parse_protocol,
+)
 
 app = FastAPI(title="ECHUU Agent Control Panel")
 
+# 记忆同步：每发送多少次增量附带一次完整快照
+MEMORY_SNAPSHOT_EVERY = int(os.getenv("MEMORY_SNAPSHOT_EVERY", "20"))
+MEMORY_DELTA_PROTOCOLS = [p for p in SUPPORTED_PROTOCOLS if p != PROTOCOL_V1]
+# 停播后等待引擎协作退出的时间（秒），超时则强制取消引擎任务
+ENGINE_STOP_GRACE = float(os.getenv("ENGINE_STOP_GRACE", "5"))
+# 按音频时长放行步骤（0 = 旧行为：生成即推送，每步间隔 0.1 秒）
+STEP_PACING = os.getenv("STEP_PACING", "1") != "0"
+# 提前多少秒把下一步推给客户端（下载 / 解码余量）
+STEP_PACING_CLIENT_LEAD = float(os.getenv("STEP_PACING_CLIENT_LEAD", "0.5"))
+# 边合成边向 v2 观众推送 PCM 分片（0 = 合成完成后整段发送）
+TTS_STREAMING = os.getenv("TTS_STREAMING", "1") != "0"
+# 流式推送时每个二进制帧至少攒多少字节（第一帧立即发送）；默认 200ms @ 24kHz 16-bit
+STREAM_FRAME_BYTES = int(os.getenv("WS_AUDIO_STREAM_BYTES", "9600"))
+
 # 允许跨域
 app.add_middleware(
     CORSMiddleware,
@@ -29,6 +96,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # 挂载静态文件目录
@@ -36,6 +104,54 @@ SCRIPTS_DIR = PROJECT_ROOT / "output" / "scripts"
 SCRIPTS_DIR.mkdir(parents=True, exist_ok=True)
 app.mount("/audio", StaticFiles(directory=str(SCRIPTS_DIR)), name="audio")
 
+# 单步音频的内容寻址存储（GET /api/audio/{key}）
+AUDIO_STORE_DIR = Path(os.getenv("AUDIO_STORE_DIR", str(PROJECT_ROOT / "output" / "audio")))
+audio_store = AudioStore(AUDIO_STORE_DIR)
+
+
+async def get_script_index() -> Optional[ScriptIndex]:
+    """
+    剧本历史索引：与引擎保存剧本时写入的是同一个实例（SharedResources.script_index）。
+
+    共享资源还建不起来（如缺少 API Key）时直接打开同一个索引，历史页照常可用。
+    """
+    try:
+        resources = await asyncio.to_thread(get_shared_resources)
+        return resources.script_index
+    except Exception:
+        return await asyncio.to_thread(open_script_index, default_scripts_dir())
+
+
+@app.on_event("startup")
+async def warm_shared_resources():
+    """预先构建进程级共享资源（语料、索引、SDK 客户端），首个房间开播时无需等待。"""
+    try:
+        await asyncio.to_thread(get_shared_resources)
+    except Exception as e:
+        # 缺少 API Key 等问题留到开播时再报错给房主
+        print(f"[startup] shared resources not ready: {e}")
+
+    try:
+        script_index = await get_script_index()
+        if script_index is not None:
+            stats = await asyncio.to_thread(script_index.reconcile)
+            print(f"[startup] script index reconciled: {stats}")
+    except Exception as e:
+        print(f"[startup] script index reconcile failed: {e}")
+
+    await event_bus.start(deliver_room_message)
+    room_reaper.start()
+
+
+@app.on_event("shutdown")
+async def stop_room_reaper():
+    for room in rooms.values():
+        room.request_stop("shutdown")
+    await room_reaper.stop()
+    await event_bus.close()
+    await room_store.close()
+
+
 # 数据模型
 class LiveRequest(BaseModel):
     character_name: str = "六螺"
@@ -45,6 +161,8 @@ class LiveRequest(BaseModel):
     danmaku: List[str] = ["主播快说！", "真的假的？", "这也太离谱了"]
     voice: str = "Cherry"  # TTS 音色，与前端侧栏「声音」一致
     language: str = ""  # 留空则从 topic/persona 检测；"en"/"zh"/"ja" 则强制该语言
+    # 本场覆盖的调用点 LLM 策略，如 {"danmaku_reply": {"thinking_level": "minimal", "max_tokens": 300}}
+    llm_policy: Dict[str, Dict[str, Any]] = {}
 
 class DanmakuRequest(BaseModel):
     text: str
@@ -52,10 +170,17 @@ class DanmakuRequest(BaseModel):
 
 
 class RoomState:
-    """单个直播间的状态，按 room_id 隔离。"""
-    def __init__(self, room_id: str, owner_token: str):
+    """
+    单个直播间在本 worker 上的状态，按 room_id 隔离。
+
+    is_origin 表示房间由本 worker 创建；多 worker 部署时，其他 worker 上有观众连入时会
+    建一个镜像 RoomState，只负责把总线上的事件扇出给本 worker 的观众。
+    """
+
+    def __init__(self, room_id: str, owner_token: str, is_origin: bool = True):
         self.room_id = room_id
         self.owner_token = owner_token
+        self.is_origin = is_origin
         self.is_running = False
         self.current_step = 0
         self.total_steps = 0
@@ -63,37 +188,281 @@ class RoomState:
         self.stream_state = "idle"
         self.info_message = ""
         self.error_message = ""
-        self.active_connections: List[WebSocket] = []
-        self.live_danmaku: List[dict] = []
+        self.active_connections: Set[ViewerConnection] = set()
+        self.live_danmaku = DanmakuRingBuffer()
+        self.audio_seq = 0
+        # 流式音频：引擎分配的 stream 编号 -> 本 worker 的 audio seq
+        self.stream_seqs: Dict[int, int] = {}
+        self.stream_id = 0
+        self.fanout_stats = FanoutStats()
+        self.danmaku_ingest = DanmakuIngest(publish=self.publish, sink=self._accept_live_danmaku)
+        self.created_at = time.monotonic()
+        self.last_activity = self.created_at
+        self.started_at: Optional[float] = None
+        self.memory_sync: Optional[MemorySync] = None
+        self.engine_task: Optional[asyncio.Task] = None
+        self.cancel_token: Optional[CancelToken] = None
+        # 共享存储里开播锁的令牌（本 worker 正在运行引擎时才有）
+        self.run_token: Optional[str] = None
 
-    async def broadcast(self, data: dict):
-        clean_data = json.loads(json.dumps(data, default=str))
-        dead = []
-        for connection in self.active_connections:
+    def touch(self):
+        """记录活动时间（回收器据此判断房间是否空闲）。"""
+        self.last_activity = time.monotonic()
+
+    async def aclose(self):
+        """房间被回收：停止引擎与弹幕入口，并关闭所有观众连接。"""
+        self.request_stop("room_closed")
+        if self.is_origin:
+            try:
+                await room_store.delete_room(self.room_id)
+            except Exception as e:
+                print(f"[room] delete room={self.room_id} from store failed: {e}")
+        self.danmaku_ingest.close()
+        self.live_danmaku.clear()
+        connections = list(self.active_connections)
+        self.active_connections.clear()
+        for connection in connections:
+            await connection.aclose()
             try:
-                await connection.send_json(clean_data)
+                await connection.websocket.close(code=1001)
             except Exception:
-                dead.append(connection)
-        for c in dead:
-            if c in self.active_connections:
-                self.active_connections.remove(c)
+                pass
+
+    def request_stop(self, reason: str = "stopped") -> bool:
+        """
+        停止本 worker 上运行的引擎。
+
+        取消标记立即生效（放弃进行中的 LLM 请求、关闭 realtime TTS 连接）；
+        超过 ENGINE_STOP_GRACE 秒引擎任务仍未退出时强制取消。
+
+        Returns:
+            引擎是否在本 worker 上运行。
+        """
+        if not self.is_running or self.cancel_token is None:
+            return False
+        if self.cancel_token.cancel(reason):
+            print(f"[stop] room={self.room_id} reason={reason}")
+            self.stream_state = "stopping"
+            if self.engine_task is not None:
+                asyncio.get_running_loop().call_later(
+                    ENGINE_STOP_GRACE, self._force_stop, self.engine_task
+                )
+        return True
+
+    def _force_stop(self, task: asyncio.Task):
+        if not task.done():
+            print(
+                f"[stop] room={self.room_id} engine did not exit in {ENGINE_STOP_GRACE}s, "
+                "cancelling task"
+            )
+            task.cancel()
+
+    def _accept_live_danmaku(self, item: dict):
+        """通过限流的观众弹幕经总线转给正在运行引擎的 worker。"""
+        event_bus.publish(self.room_id, BusMessage(MESSAGE_DANMAKU, item))
+
+    def next_audio_seq(self) -> int:
+        self.audio_seq += 1
+        return self.audio_seq
+
+    def next_stream_id(self) -> int:
+        self.stream_id += 1
+        return self.stream_id
+
+    def _audio_seq_for(self, message: BusMessage) -> int:
+        """
+        事件对应的 audio seq。
+
+        流式音频的 step_start / audio_chunk / step 共用一个 seq（在 step_start 时分配）；
+        每个 worker 按相同顺序收到消息，所以各 worker 分配的 seq 一致。
+        """
+        stream = message.data.get("stream")
+        if stream is None:
+            return self.next_audio_seq() if message.audio else 0
+        event_type = message.data.get("type")
+        if event_type == "step_start":
+            seq = self.stream_seqs[stream] = self.next_audio_seq()
+            return seq
+        if event_type == "step":
+            return self.stream_seqs.pop(stream, 0)
+        return self.stream_seqs.get(stream, 0)
+
+    def add_connection(self, websocket: WebSocket, protocol: int) -> ViewerConnection:
+        connection = ViewerConnection(
+            websocket,
+            protocol,
+            stats=self.fanout_stats,
+            on_evict=self._on_connection_evicted,
+        )
+        self.active_connections.add(connection)
+        connection.start()
+        self.touch()
+        return connection
+
+    async def remove_connection(self, connection: ViewerConnection):
+        self.active_connections.discard(connection)
+        await connection.aclose()
+        self.touch()
+
+    def _on_connection_evicted(self, connection: ViewerConnection, reason: str):
+        self.active_connections.discard(connection)
+        asyncio.create_task(self.viewer_left())
+
+    async def viewer_joined(self):
+        await room_store.add_viewers(self.room_id, 1)
+        await self.broadcast_user_count()
+
+    async def viewer_left(self):
+        await room_store.add_viewers(self.room_id, -1)
+        await self.broadcast_user_count()
+
+    def publish(
+        self,
+        data: dict,
+        audio: Optional[bytes] = None,
+        audio_url: Optional[str] = None,
+        protocols: Optional[List[int]] = None,
+    ):
+        """
+        经事件总线发布事件（不等待发送完成）；每个 worker 在 deliver 里扇出给自己的观众。
+
+        protocols 不为空时只发给这些协议版本的连接。
+        """
+        self.touch()
+        event_bus.publish(
+            self.room_id,
+            BusMessage(MESSAGE_EVENT, data, audio=audio, audio_url=audio_url, protocols=protocols),
+        )
+
+    def publish_memory(self, memory):
+        """
+        同步表演记忆：v1 每次收到完整快照，v2+ 收到增量并定期收到完整快照。
+        """
+        if self.memory_sync is None or self.memory_sync.memory is not memory:
+            self.memory_sync = MemorySync(memory, snapshot_every=MEMORY_SNAPSHOT_EVERY)
+        sync = self.memory_sync
+
+        if sync.snapshot_due():
+            self.publish({"type": "memory", **sync.snapshot()})
+            return
+        delta = sync.delta()
+        if delta is None:
+            return
+        self.publish({"type": "memory_delta", **delta}, protocols=MEMORY_DELTA_PROTOCOLS)
+        # 多 worker 时不知道其他 worker 上有没有 v1 观众，总是发送
+        if event_bus.distributed or any(c.protocol == PROTOCOL_V1 for c in self.active_connections):
+            self.publish(
+                {"type": "memory", "version": delta["version"], "memory": memory.to_dict()},
+                protocols=[PROTOCOL_V1],
+            )
+
+    def send_memory_baseline(self, connection: ViewerConnection):
+        """中途加入的 v2+ 观众先收到当前基线，之后的增量才能接上。"""
+        if self.memory_sync is None or connection.protocol == PROTOCOL_V1:
+            return
+        connection.enqueue(
+            OutboundEvent({"type": "memory", **self.memory_sync.baseline_snapshot()})
+        )
+
+    def deliver(self, message: BusMessage):
+        """
+        处理总线投递的消息。
+
+        事件按协议版本只编码一次；audio 按各连接的协议版本内联（v1）、以二进制帧发送（v2）
+        或只发送 audio_url（v3）。弹幕只由正在运行引擎的 worker 收下。
+        """
+        if message.kind == MESSAGE_DANMAKU:
+            if self.is_running:
+                self.live_danmaku.append(message.data)
+            return
+        if message.kind == MESSAGE_STOP:
+            self.request_stop(message.data.get("reason", "stopped"))
+            return
+
+        event = OutboundEvent(
+            message.data,
+            audio=message.audio,
+            audio_seq=self._audio_seq_for(message),
+            audio_url=message.audio_url,
+            protocols=message.protocols,
+        )
+        self.fanout_stats.published += 1
+        with FANOUT_SECONDS.time():
+            for connection in list(self.active_connections):
+                connection.enqueue(event)
+
+    async def broadcast(
+        self, data: dict, audio: Optional[bytes] = None, audio_url: Optional[str] = None
+    ):
+        self.publish(data, audio=audio, audio_url=audio_url)
+        if event_bus.distributed and self.is_running:
+            # 其他 worker 的 /api/status 读取这份快照
+            try:
+                await room_store.put_status(self.room_id, self.status_snapshot())
+            except Exception as e:
+                print(f"[room] put status failed: {e}")
 
     async def broadcast_user_count(self):
-        await self.broadcast({"type": "user_count", "count": len(self.active_connections)})
+        await self.broadcast({"type": "user_count", "count": await self.online_count()})
+
+    async def online_count(self) -> int:
+        if not event_bus.distributed:
+            return len(self.active_connections)
+        return await room_store.add_viewers(self.room_id, 0)
+
+    def status_snapshot(self) -> dict:
+        return {
+            "is_running": self.is_running,
+            "stream_state": self.stream_state,
+            "current_step": self.current_step,
+            "total_steps": self.total_steps,
+            "current_stage": self.current_stage,
+            "info_message": self.info_message,
+            "error_message": self.error_message,
+        }
+
+    def queue_depths(self) -> List[int]:
+        return [c.queue_depth for c in self.active_connections]
 
 
-# 所有直播间：room_id -> RoomState
+# 本 worker 上的直播间：room_id -> RoomState
 rooms: Dict[str, RoomState] = {}
 
+# 跨 worker 共享的房间元数据与事件总线（未设置 ROOM_BACKEND_URL 时为进程内实现）
+room_store, event_bus = create_room_backend()
+
+room_reaper = RoomReaper(rooms, close_room=lambda room: room.aclose())
+
+
+def deliver_room_message(room_id: str, message: BusMessage):
+    room = rooms.get(room_id)
+    if room is not None:
+        room.deliver(message)
+
+
+async def resolve_room(room_id: str) -> Optional[RoomState]:
+    """取本 worker 的房间；房间由其他 worker 创建时，按共享存储建一个镜像。"""
+    room = rooms.get(room_id)
+    if room is not None or not event_bus.distributed:
+        return room
+    owner_token = await room_store.get_owner_token(room_id)
+    if owner_token is None:
+        return None
+    room = rooms.get(room_id)
+    if room is None:
+        room = RoomState(room_id=room_id, owner_token=owner_token, is_origin=False)
+        rooms[room_id] = room
+    return room
 
-def get_room(room_id: str) -> Optional[RoomState]:
-    return rooms.get(room_id)
 
 @app.post("/api/room")
 async def create_room():
     """创建直播间，仅房主调用。返回 room_id 与 owner_token，房主需妥善保存 owner_token。"""
+    if not await room_reaper.admit():
+        raise HTTPException(status_code=503, detail="直播间数量已达上限，请稍后再试")
     room_id = str(uuid.uuid4())
     owner_token = secrets.token_urlsafe(16)
+    await room_store.create_room(room_id, owner_token)
     rooms[room_id] = RoomState(room_id=room_id, owner_token=owner_token)
     return {"room_id": room_id, "owner_token": owner_token}
 
@@ -102,108 +471,238 @@ async def create_room():
 async def websocket_endpoint(
     websocket: WebSocket,
     room_id: Optional[str] = Query(None),
+    protocol: Optional[int] = Query(None),
 ):
     if not room_id:
         await websocket.close(code=4000)
         return
-    room = get_room(room_id)
+    room = await resolve_room(room_id)
     if not room:
         await websocket.close(code=4004)
         return
     await websocket.accept()
-    room.active_connections.append(websocket)
-    await websocket.send_json({"type": "system", "message": "Connected", "room_id": room_id})
-    await room.broadcast_user_count()
+    protocol = parse_protocol(protocol)
+    await websocket.send_json(
+        {
+            "type": "system",
+            "message": "Connected",
+            "room_id": room_id,
+            "protocol": protocol,
+        }
+    )
+    connection = room.add_connection(websocket, protocol)
+    room.send_memory_baseline(connection)
+    await room.viewer_joined()
     try:
         while True:
             data = await websocket.receive_text()
             try:
                 msg = json.loads(data)
                 if msg.get("type") == "danmaku":
-                    room.live_danmaku.append({
-                        "text": msg.get("text", ""),
-                        "user": msg.get("user", "观众"),
-                        "timestamp": datetime.now().isoformat(),
-                    })
-                    await room.broadcast({
-                        "type": "danmaku",
-                        "text": msg.get("text", ""),
-                        "user": msg.get("user", "观众"),
-                    })
+                    room.danmaku_ingest.submit(
+                        msg.get("text", ""),
+                        msg.get("user", "观众"),
+                        f"ws:{id(connection)}",
+                        timestamp=datetime.now().isoformat(),
+                    )
             except json.JSONDecodeError:
                 pass
-    except WebSocketDisconnect:
-        if websocket in room.active_connections:
-            room.active_connections.remove(websocket)
-        await room.broadcast_user_count()
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: 连接已被扇出层踢出并关闭
+        pass
+    finally:
+        was_active = connection in room.active_connections
+        await room.remove_connection(connection)
+        if was_active:
+            await room.viewer_left()
 
 
 @app.get("/api/online-count")
 async def get_online_count(room_id: Optional[str] = Query(None)):
     if not room_id:
         return {"count": 0}
-    room = get_room(room_id)
+    room = await resolve_room(room_id)
     if not room:
         return {"count": 0}
-    return {"count": len(room.active_connections)}
+    return {"count": await room.online_count()}
 
 
 @app.get("/api/status")
 async def get_status(room_id: Optional[str] = Query(None)):
     if not room_id:
         raise HTTPException(status_code=400, detail="room_id required")
-    room = get_room(room_id)
+    room = await resolve_room(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
+    status = room.status_snapshot()
+    if event_bus.distributed and not room.is_running:
+        # 引擎可能在其他 worker 上运行
+        status.update(await room_store.get_status(room_id) or {})
+    return {
+        **status,
+        "online_count": await room.online_count(),
+        "worker_id": WORKER_ID,
+        "fanout": {
+            **room.fanout_stats.to_dict(),
+            "max_queue_depth": max(room.queue_depths(), default=0),
+        },
+        "danmaku_ingest": room.danmaku_ingest.stats.to_dict(),
+        "danmaku_buffer": room.live_danmaku.snapshot(),
+    }
+
+
+@app.get("/api/rooms/stats")
+async def get_rooms_stats():
+    """进程级房间统计：房间数、连接数、内存、回收计数与音频存储占用。"""
     return {
-        "is_running": room.is_running,
-        "stream_state": room.stream_state,
-        "current_step": room.current_step,
-        "total_steps": room.total_steps,
-        "current_stage": room.current_stage,
-        "info_message": room.info_message,
-        "error_message": room.error_message,
-        "online_count": len(room.active_connections),
+        "rooms": len(rooms),
+        "running": sum(1 for room in rooms.values() if room.is_running),
+        "connections": sum(len(room.active_connections) for room in rooms.values()),
+        "max_rooms": room_reaper.max_rooms,
+        "rss_mb": current_rss_mb(),
+        "memory_cap_mb": room_reaper.memory_cap_mb or None,
+        "reaper": room_reaper.stats.to_dict(),
+        "audio_store": audio_store.stats.to_dict(),
     }
 
 
+def _update_metric_gauges():
+    """抓取时按当前房间重算 gauge（房间被回收后对应标签随之消失）。"""
+    ROOMS.clear()
+    CONNECTIONS.clear()
+    QUEUE_DEPTH.clear()
+    running = sum(1 for room in rooms.values() if room.is_running)
+    ROOMS.set(running, state="running")
+    ROOMS.set(len(rooms) - running, state="idle")
+
+    send_depths: List[int] = []
+    buffer_depths: List[int] = []
+    for room in rooms.values():
+        for connection in room.active_connections:
+            CONNECTIONS.inc(1, protocol=connection.protocol)
+            send_depths.append(connection.queue_depth)
+        buffer_depths.append(len(room.live_danmaku))
+    for queue, depths in (("send", send_depths), ("danmaku_buffer", buffer_depths)):
+        QUEUE_DEPTH.set(max(depths, default=0), queue=queue, stat="max")
+        QUEUE_DEPTH.set(sum(depths), queue=queue, stat="total")
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 指标（本 worker）。"""
+    _update_metric_gauges()
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 class DanmakuRequestWithRoom(DanmakuRequest):
     room_id: str = ""
 
 
 @app.post("/api/danmaku")
-async def post_danmaku(req: DanmakuRequestWithRoom):
+async def post_danmaku(req: DanmakuRequestWithRoom, request: Request):
     if not req.room_id:
         raise HTTPException(status_code=400, detail="room_id required")
-    room = get_room(req.room_id)
+    room = await resolve_room(req.room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
-    room.live_danmaku.append({
-        "text": req.text,
-        "user": req.user,
-        "timestamp": datetime.now().isoformat(),
-    })
-    await room.broadcast({"type": "danmaku", "text": req.text, "user": req.user})
-    return {"ok": True}
+    sender = f"http:{request.client.host if request.client else 'unknown'}"
+    accepted = room.danmaku_ingest.submit(
+        req.text, req.user, sender, timestamp=datetime.now().isoformat()
+    )
+    return {"ok": True, "accepted": accepted}
+
+
+def _parse_date(value: Optional[str], end_of_day: bool = False) -> Optional[datetime]:
+    """解析 ISO 日期 / 时间；只给日期时 end_of_day 表示取当天结束。"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"invalid date: {value}")
+    if end_of_day and len(value) <= 10:
+        parsed += timedelta(days=1, microseconds=-1)
+    return parsed
+
 
 @app.get("/api/history")
-async def get_history():
-    files = sorted(SCRIPTS_DIR.glob("*.json"), key=os.path.getmtime, reverse=True)
-    history = []
-    for f in files:
-        try:
-            with open(f, "r", encoding="utf-8") as jf:
-                data = json.load(jf)
-                meta = data.get("metadata", {})
-                history.append({
-                    "filename": f.name,
-                    "title": meta.get("topic", "未命名"),
-                    "name": meta.get("name", "未知"),
-                    "timestamp": meta.get("timestamp", "")
-                })
-        except:
-            continue
-    return history
+async def get_history(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    name: Optional[str] = Query(None),
+    topic: Optional[str] = Query(None),
+    since: Optional[str] = Query(None),
+    until: Optional[str] = Query(None),
+    q: Optional[str] = Query(None),
+):
+    """
+    剧本历史（按保存时间倒序）。
+
+    响应体仍是列表；下一页游标放在 X-Next-Cursor 响应头里（没有下一页时不返回）。
+    """
+    script_index = await get_script_index()
+    if script_index is None:
+        raise HTTPException(status_code=503, detail="Script index unavailable")
+    try:
+        items, next_cursor = await asyncio.to_thread(
+            script_index.query,
+            limit=limit,
+            cursor=cursor,
+            name=name,
+            topic=topic,
+            since=_parse_date(since),
+            until=_parse_date(until, end_of_day=True),
+            q=q,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+
+@app.api_route("/api/audio/{key}", methods=["GET", "HEAD"])
+async def get_step_audio(key: str, request: Request):
+    """按内容键提供单步音频，支持 Range / ETag 与长缓存。"""
+    if not audio_store.exists(key):
+        raise HTTPException(status_code=404, detail="Audio not found")
+
+    etag = etag_for(key)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        size = audio_store.path_for(key).stat().st_size
+    except FileNotFoundError:
+        # 刚好被清理
+        raise HTTPException(status_code=404, detail="Audio not found")
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=AUDIO_MIME)
+    try:
+        body = await asyncio.to_thread(audio_store.read, key, start, end)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return Response(content=body, status_code=status_code, headers=headers, media_type=AUDIO_MIME)
+
 
 class StartLiveRequest(LiveRequest):
     """开播请求：必须带 room_id 与 owner_token，仅房主可调用。"""
@@ -212,39 +711,154 @@ class StartLiveRequest(LiveRequest):
 
 
 @app.post("/api/start")
-async def start_live(req: StartLiveRequest, background_tasks: BackgroundTasks):
+async def start_live(req: StartLiveRequest):
     if not req.room_id or not req.owner_token:
         raise HTTPException(status_code=400, detail="room_id and owner_token required")
-    room = get_room(req.room_id)
+    room = await resolve_room(req.room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
-    if room.owner_token != req.owner_token:
+    if not check_owner_token(room.owner_token, req.owner_token):
         raise HTTPException(status_code=403, detail="Only room owner can start live")
+    try:
+        parse_llm_policies(req.llm_policy)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"invalid llm_policy: {e}")
     if room.is_running:
         raise HTTPException(status_code=400, detail="直播已经在运行中")
+    run_token = await room_store.try_acquire_run(room.room_id)
+    if run_token is None:
+        raise HTTPException(status_code=400, detail="直播已经在运行中")
 
     room.live_danmaku.clear()
+    room.started_at = time.monotonic()
+    room.touch()
     room.error_message = ""
     room.info_message = ""
     room.stream_state = "initializing"
-    background_tasks.add_task(run_engine_task, room, req)
+    room.is_running = True
+    room.run_token = run_token
+    room.cancel_token = CancelToken()
+    room.engine_task = asyncio.create_task(run_engine_task(room, req))
     return {"message": "直播任务已启动", "topic": req.topic, "room_id": req.room_id}
 
 
+class StopLiveRequest(BaseModel):
+    """停播请求：仅房主可调用。"""
+
+    room_id: str = ""
+    owner_token: str = ""
+
+
+@app.post("/api/stop")
+async def stop_live(req: StopLiveRequest):
+    if not req.room_id or not req.owner_token:
+        raise HTTPException(status_code=400, detail="room_id and owner_token required")
+    room = await resolve_room(req.room_id)
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if not check_owner_token(room.owner_token, req.owner_token):
+        raise HTTPException(status_code=403, detail="Only room owner can stop live")
+
+    if not room.request_stop("owner"):
+        # 引擎可能在其他 worker 上运行：经总线转发
+        status = await room_store.get_status(room.room_id) if event_bus.distributed else None
+        if not (status or {}).get("is_running"):
+            raise HTTPException(status_code=400, detail="直播未在运行")
+        event_bus.publish(room.room_id, BusMessage(MESSAGE_STOP, {"reason": "owner"}))
+    return {"message": "正在停止直播", "room_id": req.room_id}
+
+
+async def stream_step_audio(
+    room: RoomState, step_result: dict, audio_stream, stream_id: int
+) -> Tuple[Optional[bytes], Optional[float]]:
+    """
+    把流式合成的 PCM 分片推给 v2 观众（step_start + 二进制帧），返回完整 WAV
+    与第一帧的发送时间（time.monotonic()，即观众端开始播放的时间）。
+    """
+    room.publish(
+        {
+            "type": "step_start",
+            "stream": stream_id,
+            "step": step_result.get("step", 0),
+            "stage": step_result.get("stage", ""),
+            "speech": step_result.get("speech", ""),
+            "audio": {
+                "mime": audio_stream.mime,
+                "sample_rate": audio_stream.sample_rate,
+                "channels": 1,
+                "sample_width": 2,
+            },
+        },
+        protocols=[PROTOCOL_V2],
+    )
+    index = 0
+    pending = bytearray()
+    first_sent = None
+    async for chunk in audio_stream:
+        pending += chunk
+        if first_sent is not None and len(pending) < STREAM_FRAME_BYTES:
+            continue
+        room.publish(
+            {"type": "audio_chunk", "stream": stream_id, "index": index},
+            audio=bytes(pending),
+            protocols=[PROTOCOL_V2],
+        )
+        if first_sent is None:
+            first_sent = time.monotonic()
+        index += 1
+        pending.clear()
+    room.publish(
+        {"type": "audio_chunk", "stream": stream_id, "index": index, "last": True},
+        audio=bytes(pending),
+        protocols=[PROTOCOL_V2],
+    )
+
+    audio = await audio_stream.audio()
+    started_at = step_result.get("started_at")
+    if audio_stream.first_chunk_at and started_at:
+        STEP_FIRST_AUDIO_SECONDS.observe(audio_stream.first_chunk_at - started_at, mode="streamed")
+    return audio, first_sent
+
+
+async def keep_run_lock(room: RoomState, token: str):
+    """运行期间定期续期开播锁；锁丢失（续期失败超过 TTL 后被别人拿走）时停播，避免双开。"""
+    while True:
+        await asyncio.sleep(ROOM_RUN_LOCK_REFRESH)
+        try:
+            held = await room_store.refresh_run(room.room_id, token)
+        except Exception as e:
+            print(f"[room] refresh run lock room={room.room_id} failed: {e}")
+            continue
+        if not held:
+            print(f"[room] run lock lost room={room.room_id}")
+            room.request_stop("run_lock_lost")
+            return
+
+
 async def run_engine_task(room: RoomState, req: StartLiveRequest):
+    """运行引擎（调用方已经拿到共享存储里的开播锁，运行期间续期，结束时释放）。"""
     room.is_running = True
     room.current_step = 0
     room.current_stage = "initializing"
+    run_token = room.run_token
+    lock_keeper = asyncio.create_task(keep_run_lock(room, run_token)) if run_token else None
     try:
         voice = getattr(req, "voice", None) or "Cherry"
-        os.environ["TTS_VOICE"] = voice
         print(f"[start] room={room.room_id} TTS_VOICE={voice}")
 
         room.stream_state = "initializing"
         room.info_message = "正在初始化直播引擎..."
         await room.broadcast({"type": "info", "content": room.info_message})
 
-        engine = EchuuLiveEngine()
+        # 共享资源（语料 / 索引 / SDK 客户端）进程内只构建一次，之后每个房间只创建轻量会话对象；
+        # 首次构建可能读取大文件，放到工作线程避免阻塞其他房间
+        resources = await room.cancel_token.guard(asyncio.to_thread(get_shared_resources))
+        engine = EchuuLiveEngine(
+            resources=resources,
+            voice=voice,
+            cancel_token=room.cancel_token,
+            llm_policy=getattr(req, "llm_policy", None),
+        )
 
         # 语言：请求里指定 > 从 topic/persona 检测，否则默认 zh
         from echuu.live.language import detect_language
@@ -266,7 +880,7 @@ async def run_engine_task(room: RoomState, req: StartLiveRequest):
         room.current_stage = "generating_script"
         room.stream_state = "generating_script"
 
-        state = engine.setup(
+        state = await engine.asetup(
             name=req.character_name,
             persona=req.persona,
             background=req.background,
@@ -294,27 +908,56 @@ async def run_engine_task(room: RoomState, req: StartLiveRequest):
 
         def live_danmaku_getter(step: int):
             """每步取出并清空当前房间的实时弹幕，注入引擎供 AI 回应。"""
-            items = room.live_danmaku.copy()
-            room.live_danmaku.clear()
+            items = room.live_danmaku.drain()
             return [{"text": x.get("text", ""), "user": x.get("user", "观众")} for x in items]
 
-        for step_result in engine.run(
+        pacer = None
+        if STEP_PACING:
+            pacer = StepPacer(client_lead=STEP_PACING_CLIENT_LEAD, cancel_token=room.cancel_token)
+
+        async for step_result in engine.arun(
             danmaku_sim=simulated_danmaku,
             play_audio=False,
             save_audio=True,
             live_danmaku_getter=live_danmaku_getter,
+            stream_audio=TTS_STREAMING,
         ):
+            if pacer:
+                pacer.step_ready()
             step_num = step_result.get("step", 0)
             room.current_step = step_num
             room.current_stage = step_result.get("stage", "")
 
-            audio_data = step_result.get("audio")
-            audio_b64 = None
-            if audio_data and isinstance(audio_data, bytes):
-                audio_b64 = base64.b64encode(audio_data).decode("ascii")
-            elif step_result.get("speech") and not audio_data:
+            stream_id = None
+            playback_started = None
+            audio_stream = step_result.get("audio_stream")
+            if audio_stream is not None:
+                if pacer:
+                    await pacer.wait_release()
+                stream_id = room.next_stream_id()
+                audio_data, playback_started = await stream_step_audio(
+                    room, step_result, audio_stream, stream_id
+                )
+            else:
+                audio_data = step_result.get("audio")
+                if not isinstance(audio_data, bytes):
+                    audio_data = None
+                if audio_data and step_result.get("started_at"):
+                    STEP_FIRST_AUDIO_SECONDS.observe(
+                        time.perf_counter() - step_result["started_at"], mode="buffered"
+                    )
+            if step_result.get("speech") and not audio_data:
                 print(f"[warn] Step {step_num} has speech but no audio (TTS may have failed)")
 
+            audio_url = None
+            if audio_data:
+                # 音频不完整（如拼接的台词预取失败）时按实际合成的文本取键，
+                # 否则整句台词的键会永久指向截断的音频（音频缓存不覆盖、immutable）
+                audio_text = step_result.get("audio_text") or step_result.get("speech", "")
+                audio_key = audio_store.make_key(audio_text, voice, engine.tts.synthesis_params())
+                await asyncio.to_thread(audio_store.put, audio_key, audio_data)
+                audio_url = f"/api/audio/{audio_key}"
+
             cue = step_result.get("cue")
             cue_dict = None
             if cue is not None:
@@ -330,28 +973,54 @@ async def run_engine_task(room: RoomState, req: StartLiveRequest):
                 "speech": step_result.get("speech", ""),
                 "action": step_result.get("action", "continue"),
                 "cue": cue_dict,
-                "audio_b64": audio_b64,
                 "danmaku": step_result.get("danmaku"),
                 "emotion_break": step_result.get("emotion_break"),
             }
+            if step_result.get("danmaku_batch"):
+                # 本步合并回应的全部弹幕（danmaku 为其中优先级最高的一条）
+                broadcast_data["danmaku_batch"] = step_result["danmaku_batch"]
+            if stream_id is not None:
+                broadcast_data["stream"] = stream_id
 
-            await room.broadcast(broadcast_data)
+            if pacer:
+                # 上一步播完（+ 停顿）前不推送，避免客户端积压多步音频
+                await pacer.wait_release()
+            await room.broadcast(broadcast_data, audio=audio_data, audio_url=audio_url)
             try:
-                if engine.state and hasattr(engine.state, "memory") and hasattr(engine.state.memory, "to_dict"):
-                    await room.broadcast({"type": "memory", "memory": engine.state.memory.to_dict()})
+                if engine.state is not None:
+                    room.publish_memory(engine.state.memory)
             except Exception as e:
                 print(f"[memory] broadcast error: {e}")
-            await asyncio.sleep(0.1)
+            if pacer:
+                pacer.released(
+                    audio_data,
+                    broadcast_data["stage"],
+                    broadcast_data["speech"],
+                    started=playback_started,
+                )
+                # 按预计生成耗时倒推下一步的开始时间，期间到达的弹幕都能赶上
+                await pacer.wait_generate()
+            else:
+                await asyncio.sleep(0.1)
 
+        if pacer:
+            await pacer.wait_release()
+            print(f"[pacing] room={room.room_id} {pacer.to_dict()}")
         room.current_stage = "finished"
         room.stream_state = "finished"
         try:
-            if engine.state and hasattr(engine.state, "memory") and hasattr(engine.state.memory, "to_dict"):
-                await room.broadcast({"type": "memory", "memory": engine.state.memory.to_dict()})
+            if engine.state is not None:
+                room.publish_memory(engine.state.memory)
         except Exception as e:
             print(f"[memory] final broadcast error: {e}")
         await room.broadcast({"type": "success", "content": "直播表演圆满结束！"})
 
+    except (Cancelled, asyncio.CancelledError):
+        reason = room.cancel_token.reason if room.cancel_token else ""
+        print(f"[stop] room={room.room_id} engine stopped ({reason or 'cancelled'})")
+        room.stream_state = "stopped"
+        room.info_message = "直播已停止"
+        await room.broadcast({"type": "stopped", "content": room.info_message, "reason": reason})
     except Exception as e:
         error_msg = f"引擎运行出错: {str(e)}\n{traceback.format_exc()}"
         print(error_msg)
@@ -359,10 +1028,22 @@ async def run_engine_task(room: RoomState, req: StartLiveRequest):
         room.error_message = str(e)
         await room.broadcast({"type": "error", "content": error_msg})
     finally:
+        if lock_keeper is not None:
+            lock_keeper.cancel()
         room.is_running = False
+        room.run_token = None
+        room.engine_task = None
         room.current_stage = ""
-        if room.stream_state not in ["finished", "error"]:
+        room.touch()
+        if room.stream_state not in ["finished", "error", "stopped"]:
             room.stream_state = "idle"
+        try:
+            if event_bus.distributed:
+                await room_store.put_status(room.room_id, room.status_snapshot())
+            if run_token:
+                await room_store.release_run(room.room_id, run_token)
+        except Exception as e:
+            print(f"[room] release run lock failed: {e}")
 
 if __name__ == "__main__":
     import uvicorn
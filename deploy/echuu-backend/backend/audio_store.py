@@ -0,0 +1,234 @@
+"""
+按内容寻址的单步音频存储。
+
+每个合成片段以 sha256(文本 + 音色 + TTS 参数) 为键写入磁盘一次，之后通过
+GET /api/audio/{key} 提供（支持 Range / ETag / 长缓存），CDN 和浏览器缓存可以
+直接吸收回放与迟到观众的请求，WebSocket 只需要携带 URL。
+
+磁盘占用有上限：put 之后超过 AUDIO_STORE_MAX_BYTES，或距上次清理超过
+AUDIO_STORE_GC_INTERVAL 秒时做一次清理——先删超过 AUDIO_STORE_MAX_AGE 秒未访问的文件，
+仍然超限则按最久未访问（mtime，读取时刷新）删到上限的 90%。被清理的键再请求时返回 404。
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+AUDIO_MIME = "audio/wav"
+AUDIO_SUFFIX = ".wav"
+# 内容不可变，可以长期缓存
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+AUDIO_STORE_MAX_BYTES = int(os.getenv("AUDIO_STORE_MAX_BYTES", str(2 * 1024**3)))  # 0 表示不限
+AUDIO_STORE_MAX_AGE = float(os.getenv("AUDIO_STORE_MAX_AGE", str(7 * 86400)))  # 0 表示不限
+AUDIO_STORE_GC_INTERVAL = float(os.getenv("AUDIO_STORE_GC_INTERVAL", "600"))
+
+# 超限清理时删到上限的这个比例，避免每次 put 都触发清理
+GC_LOW_WATERMARK = 0.9
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(ValueError):
+    """Range 请求超出文件范围。"""
+
+
+@dataclass
+class AudioStoreStats:
+    """音频存储统计（进程级）。"""
+
+    files: int = 0
+    bytes: int = 0
+    gc_runs: int = 0
+    evicted_expired: int = 0
+    evicted_size: int = 0
+    evicted_bytes: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class AudioStore:
+    """本地磁盘上的内容寻址音频存储（key 的前两位作为子目录）。"""
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = AUDIO_STORE_MAX_BYTES,
+        max_age: float = AUDIO_STORE_MAX_AGE,
+        gc_interval: float = AUDIO_STORE_GC_INTERVAL,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.gc_interval = gc_interval
+        self.stats = AudioStoreStats()
+        # put / read 在线程池里执行
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+        self.gc()
+
+    @staticmethod
+    def make_key(text: str, voice: str = "", params: Optional[dict] = None) -> str:
+        """由文本、音色与 TTS 参数计算内容键。"""
+        payload = json.dumps(
+            {"text": text, "voice": voice, "params": params or {}},
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_valid_key(key: str) -> bool:
+        return bool(_KEY_RE.match(key or ""))
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}{AUDIO_SUFFIX}"
+
+    def exists(self, key: str) -> bool:
+        return self.is_valid_key(key) and self.path_for(key).exists()
+
+    def put(self, key: str, audio: bytes) -> Path:
+        """写入音频（已存在则跳过）。先写临时文件再原子替换，读者不会看到半个文件。"""
+        if not self.is_valid_key(key):
+            raise ValueError(f"invalid audio key: {key}")
+        path = self.path_for(key)
+        if path.exists():
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self.stats.files += 1
+            self.stats.bytes += len(audio)
+            over_budget = self.max_bytes > 0 and self.stats.bytes > self.max_bytes
+            due = self.gc_interval > 0 and time.time() - self._last_gc >= self.gc_interval
+        if over_budget or due:
+            self.gc()
+        return path
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """读取 [start, end] 闭区间的字节（end 为空时读到末尾），并刷新 LRU 时间。"""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with path.open("rb") as f:
+            f.seek(start)
+            if end is None:
+                return f.read()
+            return f.read(end - start + 1)
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        """列出所有音频文件的 (mtime, size, path)。"""
+        entries = []
+        for path in self.root.glob(f"*/*{AUDIO_SUFFIX}"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def gc(self, now: Optional[float] = None) -> int:
+        """按年龄与总大小清理，返回删除的文件数；同时重算 files / bytes。"""
+        with self._lock:
+            now = time.time() if now is None else now
+            self._last_gc = now
+            entries = sorted(self._scan(), key=lambda e: e[0])
+            total = sum(size for _, size, _ in entries)
+            over_budget = self.max_bytes > 0 and total > self.max_bytes
+            target = int(self.max_bytes * GC_LOW_WATERMARK)
+            kept = 0
+            removed = 0
+            for i, (mtime, size, path) in enumerate(entries):
+                expired = self.max_age > 0 and now - mtime > self.max_age
+                oversize = over_budget and total > target
+                if not expired and not oversize:
+                    # 已按 mtime 升序：后面的文件更新，也不会过期
+                    kept += len(entries) - i
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+                self.stats.evicted_bytes += size
+                if expired:
+                    self.stats.evicted_expired += 1
+                else:
+                    self.stats.evicted_size += 1
+            self.stats.gc_runs += 1
+            self.stats.files = kept
+            self.stats.bytes = total
+            return removed
+
+
+def etag_for(key: str) -> str:
+    return f'"{key}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否命中：支持逗号分隔的列表、* 与弱校验前缀 W/（弱比较）。"""
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 Range 头，返回闭区间 (start, end)。
+
+    无 Range 或格式不支持（如多段）时返回 None，按完整内容响应；
+    范围越界时抛出 RangeNotSatisfiable。
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # 后缀范围：最后 N 个字节
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+多 worker 扇出吞吐基准：同一直播间的观众分散到 N 个 worker 进程。
+
+启动一个 resp_server.py 本地替身，每轮启动 N 个 worker 进程，每个进程订阅房间事件
+并把事件扇出给 viewers / N 个观众（真实的 ViewerConnection + 只计数的假 WebSocket，
+v1 / v2 / v3 协议各占三分之一）。主进程发布 --events 个带音频的 step 事件，统计
+所有观众收完的总耗时，输出每秒投递数以及相对单 worker 的加速比。
+
+使用方法:
+    python bench_bus_workers.py --workers 1 2 4 --viewers 3000 --events 50
+
+注意：扇出是 CPU 密集的，加速比受机器核数限制（单核机器上不会有提升）。
+"""
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import time
+from typing import List
+
+from fanout import ViewerConnection
+from resp import RespAddress, RespConnection
+from resp_server import serve
+from room_bus import MESSAGE_EVENT, BusMessage, RespEventBus, _events_channel
+from ws_protocol import OutboundEvent
+
+ROOM_ID = "bench-room"
+
+
+class CountingWebSocket:
+    """只统计发送字节数的假 WebSocket。"""
+
+    def __init__(self):
+        self.sent_bytes = 0
+        self.frames = 0
+
+    async def send_text(self, data: str):
+        self.sent_bytes += len(data)
+        self.frames += 1
+
+    async def send_bytes(self, data: bytes):
+        self.sent_bytes += len(data)
+        self.frames += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def run_server(port: int):
+    asyncio.run(serve(port=port))
+
+
+def run_worker(port: int, viewers: int, events: int, ready, results):
+    asyncio.run(_worker(port, viewers, events, ready, results))
+
+
+async def _worker(port: int, viewers: int, events: int, ready, results):
+    connections = [
+        ViewerConnection(CountingWebSocket(), protocol=(i % 3) + 1, max_queue=events + 8)
+        for i in range(viewers)
+    ]
+    for connection in connections:
+        connection.start()
+
+    received = 0
+    first_at = None
+    done = asyncio.Event()
+
+    def deliver(room_id: str, message: BusMessage):
+        nonlocal received, first_at
+        if first_at is None:
+            first_at = time.perf_counter()
+        event = OutboundEvent(
+            message.data, audio=message.audio, audio_seq=received + 1, audio_url=message.audio_url
+        )
+        for connection in connections:
+            connection.enqueue(event)
+        received += 1
+        if received >= events:
+            done.set()
+
+    bus = RespEventBus(RespAddress(port=port))
+    await bus.start(deliver)
+    ready.set()
+
+    await done.wait()
+    while any(connection.queue_depth for connection in connections):
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - first_at
+    # 队列清空时最后一个事件可能还在发送，等发送计数稳定
+    frames = -1
+    while frames != sum(connection.websocket.frames for connection in connections):
+        frames = sum(connection.websocket.frames for connection in connections)
+        await asyncio.sleep(0.02)
+
+    for connection in connections:
+        await connection.aclose()
+    await bus.close()
+    results.put({"pid": os.getpid(), "viewers": viewers, "elapsed": elapsed, "frames": frames})
+
+
+async def publish_events(port: int, events: int, audio_bytes: int):
+    conn = RespConnection(RespAddress(port=port))
+    audio = os.urandom(audio_bytes)
+    channel = _events_channel(ROOM_ID)
+    commands = []
+    for step in range(events):
+        message = BusMessage(
+            MESSAGE_EVENT,
+            {
+                "type": "step",
+                "step": step,
+                "stage": "Build-up",
+                "speech": "这是一段用于压测的台词。" * 4,
+            },
+            audio=audio,
+            audio_url=f"/api/audio/{step:064x}",
+        )
+        commands.append(("PUBLISH", channel, message.encode()))
+    await conn.pipeline(commands)
+    await conn.close()
+
+
+def run_round(port: int, workers: int, viewers: int, events: int, audio_bytes: int) -> dict:
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    readies = [ctx.Event() for _ in range(workers)]
+    per_worker = [viewers // workers + (1 if i < viewers % workers else 0) for i in range(workers)]
+    procs = [
+        ctx.Process(target=run_worker, args=(port, per_worker[i], events, readies[i], results))
+        for i in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    for ready in readies:
+        ready.wait(timeout=30)
+
+    asyncio.run(publish_events(port, events, audio_bytes))
+
+    reports = [results.get(timeout=600) for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    elapsed = max(report["elapsed"] for report in reports)
+    deliveries = viewers * events
+    return {
+        "workers": workers,
+        "elapsed": elapsed,
+        "deliveries_per_s": deliveries / elapsed if elapsed else 0.0,
+        "frames": sum(report["frames"] for report in reports),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多 worker 扇出吞吐基准")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--viewers", type=int, default=3000, help="观众总数（平均分到各 worker）")
+    parser.add_argument("--events", type=int, default=50, help="发布的 step 事件数")
+    parser.add_argument("--audio-bytes", type=int, default=32 * 1024)
+    parser.add_argument("--port", type=int, default=6391)
+    args = parser.parse_args()
+
+    server = mp.get_context("spawn").Process(target=run_server, args=(args.port,), daemon=True)
+    server.start()
+    time.sleep(0.5)
+
+    print("\n" + "=" * 60)
+    print(f"   扇出吞吐（{args.viewers} 观众, {args.events} 事件, CPU {os.cpu_count()} 核）")
+    print("=" * 60)
+    rounds: List[dict] = []
+    try:
+        for workers in args.workers:
+            result = run_round(args.port, workers, args.viewers, args.events, args.audio_bytes)
+            rounds.append(result)
+            speedup = result["deliveries_per_s"] / rounds[0]["deliveries_per_s"]
+            print(
+                f"  workers={workers:<3d} elapsed={result['elapsed']:7.2f}s "
+                f"deliveries/s={result['deliveries_per_s']:10.0f} "
+                f"frames={result['frames']:<8d} speedup={speedup:.2f}x"
+            )
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+调用点 LLM 策略基准：对比不同 thinking level / 模型 / max_tokens 组合下各调用点的延迟与 token 用量。
+
+每组策略都生成 --runs 次完整剧本（main_llm、immersion，必要时 min_units_retry），
+再对剧本台词回应 --replies 条弹幕（danmaku_reply）。需要真实的 API Key；
+不经过 LLM 响应缓存与弹幕回应缓存。
+
+内置候选：
+- default: DEFAULT_LLM_POLICIES 叠加 LLM_POLICY_PATH（线上当前配置）
+- high / low / minimal: 所有调用点统一使用该 thinking level
+
+也可以用 --policies 传入 JSON 文件：
+
+    {"候选名": {"调用点": {"thinking_level": ..., "model": ..., "max_tokens": ...}}}
+
+使用方法:
+    python bench_llm_policy.py --provider gemini --runs 2 --replies 10
+    python bench_llm_policy.py --candidates default minimal --output policy_bench.json
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR.parent / "public"))
+
+from echuu.generators.script_generator_v4 import ScriptGeneratorV4
+from echuu.live.llm_context import current_call_site
+from echuu.live.llm_factory import create_llm_client
+from echuu.live.llm_policy import (
+    DEFAULT_LLM_POLICIES,
+    default_llm_policies,
+    llm_policy_scope,
+    merge_llm_policies,
+    parse_llm_policies,
+)
+from echuu.live.metrics import LLM_TOKENS, llm_labels
+from echuu.live.reply_cache import DanmakuReplyCache
+from echuu.live.resources import get_shared_resources
+from echuu.live.response_generator import DanmakuResponseGenerator
+from echuu.live.state import Danmaku, PerformerMemory
+
+SITES = tuple(DEFAULT_LLM_POLICIES)
+TOKEN_KINDS = ("input", "output", "thinking")
+
+BUILTIN_CANDIDATES = {
+    "default": {},
+    **{
+        level: {site: {"thinking_level": level} for site in SITES}
+        for level in ("high", "low", "minimal")
+    },
+}
+
+SAMPLE = {
+    "name": "六螺",
+    "persona": "一个性格古怪、喜欢碎碎念的虚拟主播",
+    "background": "正在直播，和观众聊天",
+    "topic": "关于上司的超劲爆八卦",
+}
+SAMPLE_DANMAKU = [
+    "主播快说！",
+    "真的假的？",
+    "这也太离谱了",
+    "后来呢后来呢",
+    "上司知道你在直播吗",
+    "笑死我了",
+    "我也遇到过这种人",
+    "主播今天状态好好",
+    "展开说说",
+    "awsl",
+]
+
+
+class TimedLLM:
+    """记录每次调用的调用点、耗时与是否成功，其余属性转发给被包装的客户端。"""
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def call(
+        self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000, **kwargs
+    ) -> str:
+        site = current_call_site() or "other"
+        t0 = time.perf_counter()
+        try:
+            result = self.llm.call(prompt, system=system, max_tokens=max_tokens, **kwargs)
+        except Exception:
+            self.errors[site] += 1
+            raise
+        self.samples[site].append(time.perf_counter() - t0)
+        return result
+
+
+def token_totals() -> Dict[str, Dict[str, float]]:
+    return {
+        site: {kind: LLM_TOKENS.total(call_site=site, kind=kind) for kind in TOKEN_KINDS}
+        for site in SITES
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+
+def run_candidate(
+    name: str, overrides: Dict, llm, example_sampler, runs: int, replies: int
+) -> Dict:
+    policies = merge_llm_policies(default_llm_policies(), parse_llm_policies(overrides))
+    timed = TimedLLM(llm)
+    generator = ScriptGeneratorV4(timed, example_sampler)
+    # 容量为 0：每条弹幕都真正调用 LLM
+    responder = DanmakuResponseGenerator(timed, reply_cache=DanmakuReplyCache(capacity=0))
+    before = token_totals()
+    failures = 0
+
+    with llm_policy_scope(policies):
+        for run in range(runs):
+            try:
+                lines = generator.generate(**SAMPLE, language="zh")
+            except Exception as e:
+                failures += 1
+                print(f"  [{name}] 剧本生成失败 ({run + 1}/{runs}): {e}")
+                continue
+            memory = PerformerMemory()
+            for i in range(replies):
+                current = lines[i % len(lines)]
+                following = lines[i % len(lines) + 1] if i % len(lines) + 1 < len(lines) else None
+                danmaku = Danmaku(text=SAMPLE_DANMAKU[i % len(SAMPLE_DANMAKU)], user=f"viewer{i}")
+                responder.generate_response(
+                    danmaku,
+                    current,
+                    following,
+                    memory,
+                    SAMPLE["name"],
+                    SAMPLE["persona"],
+                    SAMPLE["background"],
+                )
+
+    after = token_totals()
+    sites = {}
+    for site in SITES:
+        samples = timed.samples.get(site, [])
+        calls = len(samples) + timed.errors.get(site, 0)
+        if not calls:
+            continue
+        tokens = {kind: after[site][kind] - before[site][kind] for kind in TOKEN_KINDS}
+        sites[site] = {
+            "policy": policies[site].to_dict() if site in policies else {},
+            "calls": calls,
+            "errors": timed.errors.get(site, 0),
+            "p50_s": round(statistics.median(samples), 3) if samples else None,
+            "p95_s": round(percentile(samples, 0.95), 3) if samples else None,
+            "tokens_per_call": {kind: round(count / calls, 1) for kind, count in tokens.items()},
+        }
+    return {"script_failures": failures, "sites": sites}
+
+
+def print_report(results: Dict[str, Dict]):
+    print("\n" + "=" * 96)
+    print(
+        f"  {'候选':10s} {'调用点':16s} {'调用':>5s} {'失败':>5s} {'p50':>8s} {'p95':>8s} "
+        f"{'输入tok':>9s} {'输出tok':>9s} {'思考tok':>9s}"
+    )
+    print("=" * 96)
+    for name, result in results.items():
+        for site, row in result["sites"].items():
+            tokens = row["tokens_per_call"]
+            p50 = f"{row['p50_s']:.2f}s" if row["p50_s"] is not None else "-"
+            p95 = f"{row['p95_s']:.2f}s" if row["p95_s"] is not None else "-"
+            print(
+                f"  {name:10s} {site:16s} {row['calls']:5d} {row['errors']:5d} {p50:>8s} {p95:>8s} "
+                f"{tokens['input']:9.0f} {tokens['output']:9.0f} {tokens['thinking']:9.0f}"
+            )
+        if result["script_failures"]:
+            print(f"  {name:10s} 剧本生成失败 {result['script_failures']} 次")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="调用点 LLM 策略（模型 / thinking level / max_tokens）基准"
+    )
+    parser.add_argument("--provider", default=None, help="LLM 提供商（默认按 API Key 自动选择）")
+    parser.add_argument("--runs", type=int, default=1, help="每组策略生成剧本的次数")
+    parser.add_argument("--replies", type=int, default=10, help="每个剧本回应的弹幕数")
+    parser.add_argument("--candidates", nargs="*", default=None, help="只跑这些候选（默认全部）")
+    parser.add_argument("--policies", type=Path, default=None, help="额外候选策略的 JSON 文件")
+    parser.add_argument("--output", type=Path, default=None, help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    candidates = dict(BUILTIN_CANDIDATES)
+    if args.policies:
+        candidates.update(json.loads(args.policies.read_text(encoding="utf-8")))
+    if args.candidates:
+        candidates = {name: candidates[name] for name in args.candidates}
+
+    # 共享资源负责 load_dotenv 与语料；LLM 客户端单独创建，不经过响应缓存与相同请求合并
+    resources = get_shared_resources(llm_provider=args.provider)
+    llm = create_llm_client(provider=args.provider)
+    labels = llm_labels(llm)
+    print(
+        f"provider={labels['provider']} model={labels['model']} "
+        f"runs={args.runs} replies={args.replies}"
+    )
+
+    results = {}
+    for name, overrides in candidates.items():
+        print(f"\n[{name}] {json.dumps(overrides, ensure_ascii=False) or '{}'}")
+        t0 = time.perf_counter()
+        results[name] = run_candidate(
+            name, overrides, llm, resources.example_sampler, args.runs, args.replies
+        )
+        results[name]["wall_s"] = round(time.perf_counter() - t0, 2)
+
+    print_report(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+直播间启动开销基准：每个房间重建全部资源 vs 复用进程级共享资源。
+
+对比两种方式创建 N 个 EchuuLiveEngine 的耗时与内存增量：
+- rebuild: 每个房间都重新 load_dotenv、解析语料、创建 SDK 客户端、加载 TTS 类（旧行为）
+- shared:  资源只构建一次，每个房间只创建轻量会话对象
+
+使用方法:
+    python bench_room_startup.py --rooms 20
+"""
+
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from echuu.live.engine import EchuuLiveEngine
+from echuu.live.resources import SharedResources, get_shared_resources
+
+
+def measure(label: str, rooms: int, build):
+    """创建 rooms 个引擎，返回 (每房间耗时列表, 内存增量 MB)。"""
+    engines = []
+    latencies = []
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    for _ in range(rooms):
+        t0 = time.perf_counter()
+        engines.append(build())
+        latencies.append(time.perf_counter() - t0)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mem_mb = (current - base) / (1024 * 1024)
+    print(
+        f"  {label:8s} p50={statistics.median(latencies) * 1000:8.1f}ms "
+        f"max={max(latencies) * 1000:8.1f}ms "
+        f"mem={mem_mb:7.1f}MB (peak {(peak - base) / (1024 * 1024):.1f}MB) "
+        f"per_room={mem_mb / rooms:.2f}MB"
+    )
+    return latencies, mem_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EchuuLiveEngine 房间启动开销基准")
+    parser.add_argument("--rooms", type=int, default=20, help="创建的房间数")
+    args = parser.parse_args()
+
+    print("\n" + "=" * 60)
+    print(f"   房间启动开销（{args.rooms} 个房间）")
+    print("=" * 60)
+
+    measure(
+        "rebuild",
+        args.rooms,
+        lambda: EchuuLiveEngine(resources=SharedResources.load()),
+    )
+
+    # 首次构建计入注册表预热，不计入每房间开销
+    t0 = time.perf_counter()
+    shared = get_shared_resources()
+    print(f"  (shared 预热: {(time.perf_counter() - t0) * 1000:.1f}ms)")
+    measure("shared", args.rooms, lambda: EchuuLiveEngine(resources=shared))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+直播间实时弹幕缓冲区（定长环形缓冲）。
+
+live_danmaku 只在步骤边界被引擎取走，两次之间可能隔几十秒。缓冲区容量固定：
+
+- SC（打赏）弹幕优先保留；
+- 满了以后先淘汰最旧的普通弹幕；只剩 SC 时，新的普通弹幕直接丢弃，
+  新的 SC 淘汰最旧的 SC；
+- 统计高水位与丢弃数，供 /api/status 展示。
+"""
+
+import heapq
+import itertools
+import os
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Callable, Deque, Iterator, List, Tuple
+
+from echuu.live.state import Danmaku
+
+BUFFER_CAPACITY = int(os.getenv("DANMAKU_BUFFER_CAPACITY", "200"))
+
+
+@dataclass
+class BufferStats:
+    """单个直播间的弹幕缓冲统计。"""
+
+    appended: int = 0
+    drained: int = 0
+    dropped: int = 0
+    sc_dropped: int = 0
+    high_water: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def is_sc_item(item: dict) -> bool:
+    """按引擎的 SC 判定规则（Danmaku.from_text）识别打赏弹幕。"""
+    if item.get("is_sc"):
+        return True
+    return Danmaku.from_text(item.get("text", "")).is_sc
+
+
+class DanmakuRingBuffer:
+    """SC 优先的定长弹幕缓冲区（取出时保持到达顺序）。"""
+
+    def __init__(
+        self,
+        capacity: int = BUFFER_CAPACITY,
+        is_priority: Callable[[dict], bool] = is_sc_item,
+    ):
+        self.capacity = max(1, capacity)
+        self.is_priority = is_priority
+        self.stats = BufferStats()
+        self._seq = itertools.count()
+        self._sc: Deque[Tuple[int, dict]] = deque()
+        self._normal: Deque[Tuple[int, dict]] = deque()
+
+    def __len__(self) -> int:
+        return len(self._sc) + len(self._normal)
+
+    def __iter__(self) -> Iterator[dict]:
+        for _, item in heapq.merge(self._sc, self._normal, key=lambda entry: entry[0]):
+            yield item
+
+    def append(self, item: dict) -> bool:
+        """
+        放入一条弹幕。
+
+        Returns:
+            是否保留了这条弹幕（缓冲区已满且全是 SC 时，新的普通弹幕会被丢弃）。
+        """
+        priority = self.is_priority(item)
+        if len(self) >= self.capacity:
+            if self._normal:
+                self._normal.popleft()
+                self.stats.dropped += 1
+            elif priority:
+                self._sc.popleft()
+                self.stats.sc_dropped += 1
+            else:
+                self.stats.dropped += 1
+                return False
+
+        entry = (next(self._seq), item)
+        (self._sc if priority else self._normal).append(entry)
+        self.stats.appended += 1
+        self.stats.high_water = max(self.stats.high_water, len(self))
+        return True
+
+    def drain(self) -> List[dict]:
+        """按到达顺序取出并清空全部弹幕。"""
+        items = list(self)
+        self.clear()
+        self.stats.drained += len(items)
+        return items
+
+    def clear(self):
+        self._sc.clear()
+        self._normal.clear()
+
+    def snapshot(self) -> dict:
+        return {**self.stats.to_dict(), "size": len(self), "capacity": self.capacity}
@@ -0,0 +1,176 @@
+"""
+直播间弹幕入口：限流 + 合并批量广播。
+
+观众弹幕不再逐条广播（消息数 × 观众数次发送），而是：
+
+- 每个发送方（WebSocket 连接 / HTTP 客户端地址）一个令牌桶，超出速率的弹幕直接丢弃。
+  不按用户名限流：前端默认所有观众都叫“观众”，而改名就能绕过按名字的限流；
+- 通过限流的弹幕立即交给引擎（sink），但广播先进入待发批次；
+- 批次里相同内容的刷屏合并成一条并计数；
+- 每 flush_interval 最多广播一次 danmaku_batch 事件
+  （v1 客户端会被展开成逐条 danmaku 事件，见 ws_protocol）。
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+FLUSH_INTERVAL_MS = int(os.getenv("DANMAKU_FLUSH_MS", "200"))
+USER_RATE = float(os.getenv("DANMAKU_USER_RATE", "2"))  # 每个发送方每秒补充的令牌数
+USER_BURST = float(os.getenv("DANMAKU_USER_BURST", "5"))  # 令牌桶容量
+BATCH_MAX_ITEMS = int(os.getenv("DANMAKU_BATCH_MAX", "50"))
+
+# 合并后每条最多携带的用户名数量
+MAX_USERS_PER_ITEM = 5
+
+
+@dataclass
+class IngestStats:
+    """单个直播间的弹幕入口统计。"""
+
+    received: int = 0
+    accepted: int = 0
+    rate_limited: int = 0
+    coalesced: int = 0
+    truncated: int = 0
+    batches: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def normalize_text(text: str) -> str:
+    """刷屏判等用的归一化：去首尾空白、合并空白、忽略大小写。"""
+    return " ".join(text.split()).casefold()
+
+
+class TokenBucket:
+    """按发送方的令牌桶（只在单个事件循环里使用，不加锁）。"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def allow(self, key: str, now: Optional[float] = None) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def prune(self, now: Optional[float] = None):
+        """清理已经回满的桶，避免发送方表无限增长。"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic() if now is None else now
+        refill_time = self.burst / self.rate
+        self._buckets = {
+            key: value for key, value in self._buckets.items() if now - value[1] < refill_time
+        }
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class DanmakuIngest:
+    """
+    单个直播间的弹幕入口。
+
+    Args:
+        publish: 广播函数（RoomState.publish），接收事件 dict
+        sink: 通过限流的每条弹幕都会交给它（写入引擎的实时弹幕队列）
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[dict], None],
+        sink: Callable[[dict], None],
+        flush_interval_ms: int = FLUSH_INTERVAL_MS,
+        user_rate: float = USER_RATE,
+        user_burst: float = USER_BURST,
+        batch_max_items: int = BATCH_MAX_ITEMS,
+    ):
+        self.publish = publish
+        self.sink = sink
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_max_items = batch_max_items
+        self.limiter = TokenBucket(user_rate, user_burst)
+        self.stats = IngestStats()
+        self._pending: "OrderedDict[str, dict]" = OrderedDict()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def submit(self, text: str, user: str, sender: str, **extra) -> bool:
+        """
+        接收一条弹幕（非阻塞）。
+
+        Args:
+            text: 弹幕内容
+            user: 客户端自报的用户名，只用于展示与刷屏合并
+            sender: 发送方标识（连接 id / 客户端地址），限流按它计
+
+        Returns:
+            是否通过限流。
+        """
+        self.stats.received += 1
+        text = (text or "").strip()
+        if not text:
+            return False
+        if not self.limiter.allow(sender):
+            self.stats.rate_limited += 1
+            return False
+
+        self.stats.accepted += 1
+        self.sink({"text": text, "user": user, **extra})
+        self._add_to_batch(text, user)
+
+        if self.flush_interval <= 0:
+            self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+        return True
+
+    def _add_to_batch(self, text: str, user: str):
+        key = normalize_text(text)
+        item = self._pending.get(key)
+        if item is not None:
+            item["count"] += 1
+            if user not in item["users"] and len(item["users"]) < MAX_USERS_PER_ITEM:
+                item["users"].append(user)
+            self.stats.coalesced += 1
+            return
+        if len(self._pending) >= self.batch_max_items:
+            self.stats.truncated += 1
+            return
+        self._pending[key] = {"text": text, "user": user, "users": [user], "count": 1}
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+        finally:
+            self._flush_task = None
+
+    def flush(self):
+        """立即广播待发批次。"""
+        if not self._pending:
+            return
+        items: List[dict] = list(self._pending.values())
+        self._pending.clear()
+        self.stats.batches += 1
+        self.limiter.prune()
+        self.publish({"type": "danmaku_batch", "items": items})
+
+    def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._pending.clear()
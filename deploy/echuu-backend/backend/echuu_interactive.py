@@ -4,6 +4,7 @@ echuu 交互式直播入口
 """
 
 from pathlib import Path
+import os
 import sys
 
 # 确保项目根目录可导入
@@ -61,27 +62,30 @@ def main():
     print("\n" + "="*70)
     print("echuu 交互式直播系统")
     print("="*70 + "\n")
-    
+
     # 获取基础人物信息
     print("【第一步】设置人物信息\n")
     name = get_user_input("人物名称")
     persona = get_user_input("人设描述", "25岁主播，活泼自嘲，喜欢分享生活经历")
     background = get_user_input("背景设定", "目前在一家外企市场部工作")
-    
+
     print("\n【第二步】选择运行模式\n")
     print("1. 自定义主题（手动输入）")
     print("2. 运行预设案例（3个有趣话题）")
     print("3. 混合模式（先跑预设，再自定义）")
-    
+
     mode = input("\n请选择模式 (1/2/3，默认2): ").strip() or "2"
-    
+
+    # 预设话题会反复运行，默认缓存剧本生成的 LLM 调用（可用 LLM_CACHE_SITES 覆盖）；
+    # min_units_retry 不缓存：它的结果被判为太短时重放缓存只会得到同一个太短的结果
+    os.environ.setdefault("LLM_CACHE_SITES", "immersion,main_llm")
     engine = EchuuLiveEngine()
-    
+
     if mode == "1":
         # 仅自定义
         topic = get_user_input("\n请输入直播主题")
         run_live_session(engine, name, persona, background, topic)
-        
+
     elif mode == "2":
         # 仅预设案例
         preset_topics = [
@@ -89,20 +93,20 @@ def main():
             "大学时全班开卷考，但只有自己以为闭卷考结果没过",
             "第一次养猫时把猫粮当零食吃了",
         ]
-        
+
         print("\n【预设案例】")
         for i, topic in enumerate(preset_topics, 1):
             print(f"{i}. {topic}")
-        
+
         print("\n开始运行预设案例...\n")
-        
+
         for i, topic in enumerate(preset_topics, 1):
             print(f"\n>>> 案例 {i}/{len(preset_topics)} <<<")
             run_live_session(engine, name, persona, background, topic)
-            
+
             if i < len(preset_topics):
                 input("\n按 Enter 继续下一个案例...")
-        
+
     elif mode == "3":
         # 先预设，后自定义
         preset_topics = [
@@ -110,20 +114,20 @@ def main():
             "大学时全班开卷考，但只有自己以为闭卷考结果没过",
             "第一次养猫时把猫粮当零食吃了",
         ]
-        
+
         print("\n【第一步：运行预设案例】")
         for i, topic in enumerate(preset_topics, 1):
             print(f"{i}. {topic}")
-        
+
         print("\n开始运行预设案例...\n")
-        
+
         for i, topic in enumerate(preset_topics, 1):
             print(f"\n>>> 预设案例 {i}/{len(preset_topics)} <<<")
             run_live_session(engine, name, persona, background, topic)
-            
+
             if i < len(preset_topics):
                 input("\n按 Enter 继续下一个案例...")
-        
+
         # 自定义部分
         print("\n【第二步：自定义主题】")
         while True:
@@ -131,11 +135,11 @@ def main():
             if not topic:
                 break
             run_live_session(engine, name, persona, background, topic)
-            
+
             continue_custom = input("\n继续添加自定义主题？(y/n，默认n): ").strip().lower()
             if continue_custom != "y":
                 break
-    
+
     print("\n" + "="*70)
     print("所有直播会话已完成！")
     print("="*70 + "\n")
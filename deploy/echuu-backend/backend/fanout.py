@@ -0,0 +1,222 @@
+"""
+直播间广播扇出：每个观众一个有界发送队列 + 独立写协程。
+
+广播时事件只编码一次（按协议版本缓存，见 ws_protocol.OutboundEvent），然后
+非阻塞地放进每个连接的队列。慢观众只会拖慢自己：
+
+- memory / user_count 等状态类事件在队列里合并，只保留最新一条；
+- 队列满时优先丢弃最旧的可丢弃事件（弹幕、光标）；
+- 流式音频帧（audio_chunk）不占事件名额，另有字节预算；超出时丢掉该段流式音频的
+  剩余帧，并通知客户端（stream_dropped），客户端改用随后 step 事件里的 audio_url；
+- 队列满且无可丢弃事件，或单次发送超过 send_timeout，视为卡死并踢出。
+"""
+
+import asyncio
+import os
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Callable, Deque, Optional
+
+from fastapi import WebSocket
+from ws_protocol import OutboundEvent
+
+SEND_QUEUE_MAX = int(os.getenv("WS_SEND_QUEUE_MAX", "64"))
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+# 每个连接排队中的流式音频字节上限（24kHz 16bit 单声道约 20 秒）
+AUDIO_QUEUE_BYTES = int(os.getenv("WS_AUDIO_QUEUE_BYTES", str(1024 * 1024)))
+
+# 只需要最新值的事件：新事件替换队列里尚未发送的同类事件
+COALESCE_TYPES = frozenset({"memory", "user_count"})
+# 队列满时可以丢弃的事件
+DROPPABLE_TYPES = frozenset({"danmaku", "danmaku_batch", "cursor"})
+# 按字节预算限流的流式音频帧
+AUDIO_CHUNK_TYPE = "audio_chunk"
+
+# 踢出卡死连接时使用的关闭码（1013 = Try Again Later）
+EVICT_CLOSE_CODE = 1013
+
+
+@dataclass
+class FanoutStats:
+    """单个直播间的扇出统计。"""
+
+    published: int = 0
+    coalesced: int = 0
+    dropped: int = 0
+    audio_chunks_dropped: int = 0
+    streams_dropped: int = 0
+    evicted: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ViewerConnection:
+    """一个观众的 WebSocket 连接、协商的协议版本及其发送队列。"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        protocol: int,
+        stats: Optional[FanoutStats] = None,
+        on_evict: Optional[Callable[["ViewerConnection", str], None]] = None,
+        max_queue: int = SEND_QUEUE_MAX,
+        send_timeout: float = SEND_TIMEOUT,
+        max_audio_bytes: int = AUDIO_QUEUE_BYTES,
+    ):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.stats = stats or FanoutStats()
+        self.on_evict = on_evict
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.max_audio_bytes = max_audio_bytes
+        self.closed = False
+        self._queue: Deque[OutboundEvent] = deque()
+        # 队列里流式音频帧的数量与字节数
+        self._audio_chunks = 0
+        self._audio_bytes = 0
+        # 已放弃的流式音频段（该段后续的帧直接丢弃）
+        self._dropped_stream: Optional[int] = None
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def start(self):
+        """启动写协程。"""
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, event: OutboundEvent) -> bool:
+        """
+        非阻塞地把事件放进发送队列。
+
+        Returns:
+            事件是否入队（被丢弃或连接已关闭时返回 False）。
+        """
+        if self.closed or not event.accepts(self.protocol):
+            return False
+        if event.type == AUDIO_CHUNK_TYPE:
+            return self._enqueue_audio(event)
+
+        if event.type in COALESCE_TYPES:
+            for queued in self._queue:
+                if queued.type == event.type:
+                    self._queue.remove(queued)
+                    self.stats.coalesced += 1
+                    break
+
+        if len(self._queue) - self._audio_chunks >= self.max_queue:
+            victim = next((q for q in self._queue if q.type in DROPPABLE_TYPES), None)
+            if victim is not None:
+                self._queue.remove(victim)
+                self.stats.dropped += 1
+            elif event.type in DROPPABLE_TYPES:
+                self.stats.dropped += 1
+                return False
+            else:
+                self.evict("queue_full")
+                return False
+
+        self._queue.append(event)
+        self._wakeup.set()
+        return True
+
+    def _enqueue_audio(self, event: OutboundEvent) -> bool:
+        """流式音频帧：超出字节预算时放弃整段流，而不是踢出观众。"""
+        stream = event.data.get("stream")
+        if stream is not None and stream == self._dropped_stream:
+            self.stats.audio_chunks_dropped += 1
+            return False
+        size = len(event.audio or b"")
+        if self._audio_bytes + size > self.max_audio_bytes:
+            self._drop_stream(event)
+            return False
+        self._audio_chunks += 1
+        self._audio_bytes += size
+        self._queue.append(event)
+        self._wakeup.set()
+        return True
+
+    def _drop_stream(self, event: OutboundEvent):
+        """丢掉该段流式音频尚未发送的帧，并告诉客户端改用 step 事件里的 audio_url。"""
+        stream = event.data.get("stream")
+        kept: Deque[OutboundEvent] = deque()
+        for queued in self._queue:
+            if queued.type == AUDIO_CHUNK_TYPE and queued.data.get("stream") == stream:
+                self._forget_audio(queued)
+                self.stats.audio_chunks_dropped += 1
+            else:
+                kept.append(queued)
+        self._queue = kept
+        self._dropped_stream = stream
+        self.stats.audio_chunks_dropped += 1
+        self.stats.streams_dropped += 1
+        notice = {"type": "stream_dropped", "stream": stream, "seq": event.audio_seq}
+        self._queue.append(OutboundEvent(notice, protocols=[self.protocol]))
+        self._wakeup.set()
+
+    def _forget_audio(self, event: OutboundEvent):
+        self._audio_chunks -= 1
+        self._audio_bytes -= len(event.audio or b"")
+
+    async def _write_loop(self):
+        while not self.closed:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            event = self._queue.popleft()
+            if event.type == AUDIO_CHUNK_TYPE:
+                self._forget_audio(event)
+            try:
+                await asyncio.wait_for(self._send(event), self.send_timeout)
+            except asyncio.TimeoutError:
+                self.evict("send_timeout")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.evict("send_error")
+
+    async def _send(self, event: OutboundEvent):
+        for frame in event.frames(self.protocol):
+            if isinstance(frame, bytes):
+                await self.websocket.send_bytes(frame)
+            else:
+                await self.websocket.send_text(frame)
+
+    def evict(self, reason: str):
+        """踢出连接：清空队列、通知房间并异步关闭 socket。"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._audio_chunks = self._audio_bytes = 0
+        self._wakeup.set()
+        self.stats.evicted += 1
+        print(f"[fanout] evict viewer: {reason}")
+        if self.on_evict:
+            self.on_evict(self, reason)
+        asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            await self.websocket.close(code=EVICT_CLOSE_CODE)
+        except Exception:
+            pass
+
+    async def aclose(self):
+        """正常断开：停止写协程。"""
+        self.closed = True
+        self._queue.clear()
+        self._audio_chunks = self._audio_bytes = 0
+        self._wakeup.set()
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,789 @@
+#!/usr/bin/env python3
+"""
+端到端压测：进程内启动 app.py，模拟 N 个直播间 × M 个 WebSocket 观众。
+
+LLM / TTS 换成延迟可配置的假实现（通过 install_shared_resources 注入），其余链路
+（建房、开播、引擎、音频存储、事件总线、扇出、弹幕入口）都是真实代码：
+
+1. 通过 /api/room 建房，每个房间连入 --viewers 个 /ws 观众（协议版本按 --protocols 轮流分配）
+2. /api/start 开播，直播期间从随机观众的连接按 --danmaku-rate 注入弹幕
+3. 每个房间的第一个观众（协议为 --protocols 的第一项）作为探针，记录 step 间隔与首音频
+   到达时间（v1 / v3 为首个带音频的 step，v2 为首个流式音频帧）；
+   所有观众按 step 记录到达时间，统计同一 step 在房间内的扇出延迟
+
+报告（JSON）包含 step 延迟与首音频时间的 p50 / p95 / p99、扇出吞吐、CPU 与 RSS，
+以及当前 git 版本，便于不同版本之间对比。
+
+使用方法:
+    python loadtest.py --rooms 10 --viewers 200 --llm-latency 0.8 --tts-latency 0.3 \\
+        --danmaku-rate 5 --output loadtest_report.json
+
+注意：压测客户端与服务端在同一进程、同一事件循环里，CPU / RSS 包含客户端开销；
+观众很多时客户端本身可能成为瓶颈（报告里的 cpu_percent 接近 100 时结论要打折扣）。
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+BACKEND_DIR = Path(__file__).resolve().parent
+# 与部署一致：PYTHONPATH 指向 public（/app/public）
+sys.path.insert(0, str(BACKEND_DIR.parent / "public"))
+
+from echuu.live.metrics import (
+    observe_llm_arequest,
+    observe_llm_astream,
+    observe_llm_request,
+    observe_llm_stream,
+)
+
+STEP_PREFIX = re.compile(r'"type":\s*"step",\s*"step":\s*(\d+)')
+FINAL_TYPES = ("success", "error")
+
+DANMAKU_SAMPLES = [
+    "哈哈哈哈",
+    "主播好",
+    "真的假的",
+    "然后呢？",
+    "太离谱了吧",
+    "SC: 支持一下！",
+    "笑死",
+    "这个我熟",
+    "前排",
+    "晚上好",
+    "666",
+    "下次讲讲别的",
+]
+
+
+# ==================== 假 provider ====================
+
+
+def _jittered(latency: float, jitter: float) -> float:
+    return max(0.0, random.uniform(latency * (1 - jitter), latency * (1 + jitter)))
+
+
+class FakeLLM:
+    """按调用类型返回固定格式内容的假 LLM（在工作线程里 sleep 模拟网络延迟）。"""
+
+    provider = "fake"
+    model = "fake-llm"
+
+    def __init__(
+        self,
+        latency: float,
+        jitter: float,
+        script_lines: int,
+        script_latency: float,
+        tail: float = 0.0,
+        tail_factor: float = 10.0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.script_latency = script_latency
+        # 长尾：以 tail 的概率在首个分片前多等 (tail_factor - 1) 倍延迟（模拟排队 / 偶发的慢请求）
+        self.tail = tail
+        self.tail_factor = tail_factor
+        stages = ["Hook", "Build-up", "Climax", "Resolution"]
+        self.script = json.dumps(
+            [
+                {
+                    "id": f"line_{i}",
+                    "text": f"第{i}段，我跟你们说这件事真的离谱，那天我刚下班就碰到了，"
+                    f"一开始还以为是我看错了，后来越想越不对劲。",
+                    "stage": stages[min(i * len(stages) // script_lines, len(stages) - 1)],
+                    "cost": 0.4,
+                    "key_info": [f"细节{i}"],
+                    "disfluencies": [],
+                    "emotion_break": None,
+                }
+                for i in range(script_lines)
+            ],
+            ensure_ascii=False,
+        )
+
+    @observe_llm_request
+    def call(
+        self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000, **kwargs
+    ) -> str:
+        if max_tokens >= 8000:
+            time.sleep(_jittered(self.script_latency, self.jitter))
+            return self.script
+        time.sleep(sum(self._delay()))
+        if system:
+            # DanmakuResponseGenerator
+            return self._danmaku_reply(prompt, system)
+        return "刚下播回来，还有点兴奋，想跟大家说说今天的事。"
+
+    @staticmethod
+    def _danmaku_reply(prompt: str = "", system: Optional[str] = None) -> str:
+        if system and "JSON数组" in system:
+            # 批量回应：prompt 里每条弹幕一行 "1. 用户（...）: ..."
+            count = len(re.findall(r"^\d+\. ", prompt, re.M)) or 1
+            return json.dumps(
+                [{"id": i + 1, "response": f"哈哈第{i + 1}条说得对！"} for i in range(count)],
+                ensure_ascii=False,
+            )
+        return json.dumps(
+            {"response": "哈哈你说得对！这个真的离谱，我们接着讲。", "action": "continue"},
+            ensure_ascii=False,
+        )
+
+    @observe_llm_arequest
+    async def acall(
+        self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000, **kwargs
+    ) -> str:
+        """异步版本：asyncio.sleep 模拟网络延迟，不占用工作线程（同真实客户端的异步 SDK）。"""
+        await asyncio.sleep(sum(self._delay()))
+        if system:
+            return self._danmaku_reply(prompt, system)
+        return "刚下播回来，还有点兴奋，想跟大家说说今天的事。"
+
+    @observe_llm_astream
+    async def astream(
+        self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000, **kwargs
+    ):
+        """异步流式版本，分片节奏同 stream。"""
+        if not system:
+            yield await self.acall(prompt, system=system, max_tokens=max_tokens)
+            return
+        for pause, piece in self._reply_pieces(*self._delay()):
+            await asyncio.sleep(pause)
+            yield piece
+
+    def _delay(self) -> Tuple[float, float]:
+        """(正常延迟, 长尾请求在首个分片前额外的等待)。"""
+        delay = _jittered(self.latency, self.jitter)
+        stall = delay * (self.tail_factor - 1) if self.tail and random.random() < self.tail else 0.0
+        return delay, stall
+
+    def _reply_pieces(self, delay: float, stall: float = 0.0):
+        """弹幕回应的分片与到达前的等待：首个分片在 stall + 30% 延迟处，其余均匀到达。"""
+        text = self._danmaku_reply()
+        size = len(text) // 6 + 1
+        pieces = [text[i : i + size] for i in range(0, len(text), size)]
+        rest = delay * 0.7 / max(len(pieces) - 1, 1)
+        return [
+            (stall + delay * 0.3 if index == 0 else rest, piece)
+            for index, piece in enumerate(pieces)
+        ]
+
+    @observe_llm_stream
+    def stream(self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000, **kwargs):
+        """流式版本：弹幕回应的首个分片在 30% 延迟处，其余分片均匀到达。"""
+        if not system or max_tokens >= 8000:
+            yield self.call(prompt, system=system, max_tokens=max_tokens)
+            return
+        for pause, piece in self._reply_pieces(*self._delay()):
+            time.sleep(pause)
+            yield piece
+
+
+class SyncFakeLLM(FakeLLM):
+    """只有阻塞接口的假 LLM：异步调用走 llm_async 的工作线程回退（--sync-llm）。"""
+
+    acall = None
+    astream = None
+
+
+def make_fake_tts_class(
+    latency: float, jitter: float, chars_per_second: float, sample_rate: int = 24000
+):
+    """生成 CosyVoiceTTS 的假实现：按文本长度返回静音 WAV。"""
+
+    class FakeTTS:
+        def __init__(self, api_key: str = None, model: str = None, voice: str = None, **kwargs):
+            self.model = model or "fake-tts"
+            self.voice = voice or "Cherry"
+            self.sample_rate = sample_rate
+            self.response_format = "pcm"
+            self.observer = None
+
+        @staticmethod
+        def _sleep(seconds: float, cancel_token):
+            # 与真实 realtime 连接一样，取消时立即中断
+            if cancel_token is None:
+                time.sleep(seconds)
+            elif cancel_token.wait(seconds):
+                cancel_token.raise_if_cancelled()
+
+        @staticmethod
+        def streaming_format() -> str:
+            return "pcm"
+
+        def _speak(self, text: str, started: float, cancel_token, on_audio, first: bool) -> bytes:
+            delay = _jittered(latency, jitter)
+            seconds = max(len(text), 1) / chars_per_second
+            pcm = b"\x00\x00" * int(seconds * self.sample_rate)
+            # 与 realtime 接口一样分片回调：首包在 30% 延迟处，其余分片均匀到达
+            pieces = [pcm[i : i + len(pcm) // 4 + 2] for i in range(0, len(pcm), len(pcm) // 4 + 2)]
+            self._sleep(delay * 0.3, cancel_token)
+            if first and self.observer:
+                self.observer("first_chunk", time.perf_counter() - started)
+            for index, piece in enumerate(pieces):
+                if index:
+                    self._sleep(delay * 0.7 / (len(pieces) - 1), cancel_token)
+                if on_audio:
+                    on_audio(piece)
+            return pcm
+
+        def _wav(self, pcm: bytes, started: float) -> bytes:
+            header = struct.pack(
+                "<4sI4s4sIHHIIHH4sI",
+                b"RIFF",
+                36 + len(pcm),
+                b"WAVE",
+                b"fmt ",
+                16,
+                1,
+                1,
+                self.sample_rate,
+                self.sample_rate * 2,
+                2,
+                16,
+                b"data",
+                len(pcm),
+            )
+            if self.observer:
+                self.observer("total", time.perf_counter() - started)
+            return header + pcm
+
+        def synthesize(
+            self, text: str, save_path: str = None, cancel_token=None, on_audio=None
+        ) -> bytes:
+            started = time.perf_counter()
+            return self._wav(self._speak(text, started, cancel_token, on_audio, True), started)
+
+        def synthesize_streaming(
+            self, texts, save_path: str = None, on_audio=None, cancel_token=None
+        ) -> bytes:
+            # 每到一段文本就接着合成（同一会话内，不重复计连接开销）
+            started = time.perf_counter()
+            pcm = b"".join(
+                self._speak(text, started, cancel_token, on_audio, index == 0)
+                for index, text in enumerate(t for t in texts if t.strip())
+            )
+            return self._wav(pcm, started)
+
+    return FakeTTS
+
+
+# ==================== 统计 ====================
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50 / p95 / p99 / max（毫秒，最近秩法）。"""
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return round(ordered[index] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+@dataclass
+class RoomRun:
+    room_id: str
+    owner_token: str
+    viewers: List[aiohttp.ClientWebSocketResponse] = field(default_factory=list)
+    started_at: Optional[float] = None
+    first_audio_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    outcome: str = "pending"
+    step_times: List[float] = field(default_factory=list)
+    # step -> 各观众收到 step 事件的时间
+    arrivals: Dict[int, List[float]] = field(default_factory=dict)
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    danmaku_sent: int = 0
+
+
+@dataclass
+class ClientTotals:
+    connected: int = 0
+    connect_failed: int = 0
+    evicted: int = 0
+    frames: int = 0
+    bytes: int = 0
+
+
+# ==================== 观众 ====================
+
+
+async def run_viewer(
+    run: RoomRun, ws: aiohttp.ClientWebSocketResponse, probe: bool, totals: ClientTotals
+):
+    async for msg in ws:
+        now = time.perf_counter()
+        if msg.type == aiohttp.WSMsgType.BINARY:
+            totals.frames += 1
+            totals.bytes += len(msg.data)
+            if probe and run.first_audio_at is None:
+                # v2 流式音频：第一帧即可开始播放
+                run.first_audio_at = now
+            continue
+        if msg.type != aiohttp.WSMsgType.TEXT:
+            break
+        totals.frames += 1
+        totals.bytes += len(msg.data)
+
+        match = STEP_PREFIX.match(msg.data, 1)
+        if match:
+            step = int(match.group(1))
+            run.arrivals.setdefault(step, []).append(now)
+            if probe:
+                run.step_times.append(now)
+                if run.first_audio_at is None and '"audio_url": "' in msg.data:
+                    run.first_audio_at = now
+            continue
+        if not probe:
+            continue
+        event_type = json.loads(msg.data).get("type")
+        if event_type in FINAL_TYPES:
+            run.outcome = event_type
+            run.finished_at = now
+            run.done.set()
+    if ws.close_code == 1013:
+        totals.evicted += 1
+
+
+async def inject_danmaku(run: RoomRun, rate: float):
+    """按泊松过程从随机观众发送弹幕，直到房间结束。"""
+    if rate <= 0:
+        return
+    while not run.done.is_set():
+        await asyncio.sleep(random.expovariate(rate))
+        live = [ws for ws in run.viewers if not ws.closed]
+        if not live:
+            return
+        payload = {
+            "type": "danmaku",
+            "text": random.choice(DANMAKU_SAMPLES),
+            "user": f"压测观众{random.randrange(100000)}",
+        }
+        try:
+            await random.choice(live).send_str(json.dumps(payload, ensure_ascii=False))
+            run.danmaku_sent += 1
+        except Exception:
+            pass
+
+
+async def sample_rss(samples: List[float], stop: asyncio.Event, current_rss_mb):
+    while not stop.is_set():
+        rss = current_rss_mb()
+        if rss is not None:
+            samples.append(round(rss, 1))
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+# ==================== 主流程 ====================
+
+
+def prepare_environment(workdir: Path, pacing: bool = False):
+    """
+    在导入 app 之前把存储目录指向临时目录，并让 TTSClient 启用（假 provider 不需要真 key）。
+
+    默认关闭按音频时长放行（否则每个房间都要按真实播放时长跑完）。
+    """
+    os.environ["AUDIO_STORE_DIR"] = str(workdir / "audio")
+    os.environ["SCRIPT_INDEX_PATH"] = str(workdir / "script_index.sqlite3")
+    os.environ.setdefault("DASHSCOPE_API_KEY", "loadtest")
+    os.environ.setdefault("STEP_PACING", "1" if pacing else "0")
+
+
+def install_fake_providers(args, workdir: Path):
+    from echuu.live.resources import (
+        SharedResources,
+        install_shared_resources,
+        open_script_index,
+    )
+
+    scripts_dir = workdir / "scripts"
+    scripts_dir.mkdir(parents=True, exist_ok=True)
+    resources = SharedResources(
+        project_root=workdir,
+        scripts_dir=scripts_dir,
+        llm=(SyncFakeLLM if getattr(args, "sync_llm", False) else FakeLLM)(
+            args.llm_latency,
+            args.jitter,
+            args.script_lines,
+            args.script_latency,
+            tail=getattr(args, "llm_tail", 0.0),
+            tail_factor=getattr(args, "llm_tail_factor", 10.0),
+        ),
+        cosyvoice_cls=make_fake_tts_class(args.tts_latency, args.jitter, args.speech_rate),
+        script_index=open_script_index(scripts_dir),
+    )
+    install_shared_resources(resources)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return (
+            subprocess.run(
+                ["git", "describe", "--always", "--dirty"],
+                cwd=BACKEND_DIR,
+                capture_output=True,
+                text=True,
+                timeout=5,
+            ).stdout.strip()
+            or None
+        )
+    except Exception:
+        return None
+
+
+async def open_room(session: aiohttp.ClientSession, base: str) -> RoomRun:
+    async with session.post(f"{base}/api/room") as resp:
+        resp.raise_for_status()
+        data = await resp.json()
+    return RoomRun(room_id=data["room_id"], owner_token=data["owner_token"])
+
+
+async def connect_viewers(
+    session: aiohttp.ClientSession,
+    ws_base: str,
+    run: RoomRun,
+    count: int,
+    protocols: List[int],
+    limiter: asyncio.Semaphore,
+    totals: ClientTotals,
+) -> List[asyncio.Task]:
+    async def connect(index: int):
+        protocol = protocols[index % len(protocols)]
+        async with limiter:
+            try:
+                ws = await session.ws_connect(
+                    f"{ws_base}/ws?room_id={run.room_id}&protocol={protocol}",
+                    max_msg_size=0,
+                    heartbeat=None,
+                )
+            except Exception:
+                totals.connect_failed += 1
+                return None
+        totals.connected += 1
+        return ws
+
+    sockets = await asyncio.gather(*(connect(i) for i in range(count)))
+    run.viewers = [ws for ws in sockets if ws is not None]
+    return [
+        asyncio.create_task(run_viewer(run, ws, probe=(i == 0), totals=totals))
+        for i, ws in enumerate(run.viewers)
+    ]
+
+
+async def start_room(session: aiohttp.ClientSession, base: str, run: RoomRun, args):
+    payload = {
+        "room_id": run.room_id,
+        "owner_token": run.owner_token,
+        "character_name": "压测主播",
+        "persona": "一个喜欢碎碎念的虚拟主播",
+        "background": "正在直播，和观众聊天",
+        "topic": f"压测话题 {run.room_id[:8]}",
+        "language": "zh",
+        "danmaku": [],
+    }
+    run.started_at = time.perf_counter()
+    async with session.post(f"{base}/api/start", json=payload) as resp:
+        if resp.status != 200:
+            run.outcome = f"start_failed:{resp.status}"
+            run.done.set()
+
+
+async def run_load(args, app_module) -> dict:
+    import uvicorn
+    from room_reaper import current_rss_mb
+
+    config = uvicorn.Config(
+        app_module.app,
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+        backlog=max(2048, args.rooms * args.viewers),
+    )
+    server = uvicorn.Server(config)
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            server_task.result()
+        await asyncio.sleep(0.05)
+
+    base = f"http://127.0.0.1:{args.port}"
+    ws_base = f"ws://127.0.0.1:{args.port}"
+    totals = ClientTotals()
+    rss_samples: List[float] = []
+    stop_sampling = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(rss_samples, stop_sampling, current_rss_mb))
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        runs = [await open_room(session, base) for _ in range(args.rooms)]
+
+        limiter = asyncio.Semaphore(args.connect_concurrency)
+        viewer_tasks: List[asyncio.Task] = []
+        for run in runs:
+            viewer_tasks += await connect_viewers(
+                session, ws_base, run, args.viewers, args.protocols, limiter, totals
+            )
+        connected_at = time.perf_counter()
+
+        await asyncio.gather(*(start_room(session, base, run, args) for run in runs))
+        injectors = [asyncio.create_task(inject_danmaku(run, args.danmaku_rate)) for run in runs]
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(run.done.wait() for run in runs)), args.timeout)
+        except asyncio.TimeoutError:
+            for run in runs:
+                if not run.done.is_set():
+                    run.outcome = "timeout"
+                    run.done.set()
+        live_elapsed = time.perf_counter() - connected_at
+
+        for task in injectors:
+            task.cancel()
+        async with session.get(f"{base}/api/rooms/stats") as resp:
+            rooms_stats = await resp.json()
+        # 给扇出队列一点时间发完最后的事件，再断开观众
+        await asyncio.sleep(args.drain)
+        for run in runs:
+            await asyncio.gather(*(ws.close() for ws in run.viewers), return_exceptions=True)
+        await asyncio.gather(*viewer_tasks, return_exceptions=True)
+
+    cpu_seconds = time.process_time() - cpu_start
+    wall_seconds = time.perf_counter() - wall_start
+    stop_sampling.set()
+    await sampler
+    server.should_exit = True
+    await server_task
+
+    step_latencies: List[float] = []
+    first_audio: List[float] = []
+    fanout_lag: List[float] = []
+    for run in runs:
+        step_latencies += [b - a for a, b in zip(run.step_times, run.step_times[1:])]
+        if run.first_audio_at is not None and run.started_at is not None:
+            first_audio.append(run.first_audio_at - run.started_at)
+        fanout_lag += [max(times) - min(times) for times in run.arrivals.values() if len(times) > 1]
+
+    outcomes: Dict[str, int] = {}
+    for run in runs:
+        outcomes[run.outcome] = outcomes.get(run.outcome, 0) + 1
+
+    return {
+        "version": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "rooms": args.rooms,
+            "viewers_per_room": args.viewers,
+            "protocols": args.protocols,
+            "llm_latency": args.llm_latency,
+            "script_latency": args.script_latency,
+            "tts_latency": args.tts_latency,
+            "jitter": args.jitter,
+            "danmaku_rate": args.danmaku_rate,
+            "script_lines": args.script_lines,
+            "sync_llm": args.sync_llm,
+            "llm_tail": args.llm_tail,
+            "llm_tail_factor": args.llm_tail_factor,
+            "reply_budget": os.getenv("DANMAKU_REPLY_BUDGET"),
+            "batch_size": os.getenv("DANMAKU_BATCH_SIZE"),
+            "cpu_count": os.cpu_count(),
+        },
+        "rooms": outcomes,
+        "viewers": {
+            "connected": totals.connected,
+            "connect_failed": totals.connect_failed,
+            "evicted": totals.evicted,
+        },
+        "step_latency_ms": percentiles(step_latencies),
+        "time_to_first_audio_ms": percentiles(first_audio),
+        "fanout": {
+            "frames": totals.frames,
+            "bytes": totals.bytes,
+            "frames_per_s": round(totals.frames / live_elapsed, 1) if live_elapsed else None,
+            "mbytes_per_s": round(totals.bytes / live_elapsed / 1e6, 2) if live_elapsed else None,
+            "step_spread_ms": percentiles(fanout_lag),
+        },
+        "danmaku_sent": sum(run.danmaku_sent for run in runs),
+        "danmaku_reply": danmaku_reply_stats(),
+        "process": {
+            "wall_seconds": round(wall_seconds, 2),
+            "cpu_seconds": round(cpu_seconds, 2),
+            "cpu_percent": round(cpu_seconds / wall_seconds * 100, 1) if wall_seconds else None,
+            "rss_mb_start": rss_samples[0] if rss_samples else None,
+            "rss_mb_peak": max(rss_samples) if rss_samples else None,
+            "rss_mb_end": rss_samples[-1] if rss_samples else None,
+        },
+        "server": rooms_stats,
+    }
+
+
+def danmaku_reply_stats() -> dict:
+    """服务端弹幕回应耗时（由 echuu_danmaku_response_seconds 分桶估算）与对冲结果。"""
+    from echuu.live.metrics import DANMAKU_BATCH_SIZE, DANMAKU_RESPONSE_SECONDS, LLM_HEDGE
+
+    def ms(q: float) -> Optional[float]:
+        value = DANMAKU_RESPONSE_SECONDS.quantile(q)
+        return round(value * 1000, 1) if value is not None else None
+
+    hedge = {}
+    for kind in ("call", "first_token"):
+        for outcome in ("primary", "primary_won", "hedge_won", "budget_exceeded"):
+            count = LLM_HEDGE.value(kind=kind, outcome=outcome)
+            if count:
+                hedge[f"{kind}.{outcome}"] = int(count)
+    labels = {"provider": FakeLLM.provider, "model": FakeLLM.model}
+    calls = sum(
+        DANMAKU_RESPONSE_SECONDS.count(outcome=o, **labels) for o in ("ok", "error", "timeout")
+    )
+    # 单条回应每次调用回应 1 条，批量回应每次回应 DANMAKU_BATCH_SIZE 记录的条数
+    batch_calls = DANMAKU_BATCH_SIZE.count()
+    answered = calls - batch_calls + DANMAKU_BATCH_SIZE.sum()
+    return {
+        "latency_ms": {"p50": ms(0.5), "p95": ms(0.95), "p99": ms(0.99)},
+        "timeouts": DANMAKU_RESPONSE_SECONDS.count(outcome="timeout", **labels),
+        "hedge": hedge,
+        "llm_calls": calls,
+        "batch_calls": batch_calls,
+        "answered_per_call": round(answered / calls, 2) if calls else None,
+    }
+
+
+def raise_fd_limit():
+    """每个观众占一对 socket，尽量把文件描述符上限调到硬上限。"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        with contextlib.suppress(ValueError, OSError):
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def print_summary(report: dict):
+    print("\n" + "=" * 60)
+    cfg = report["config"]
+    print(
+        f"   压测结果（{cfg['rooms']} 房间 × {cfg['viewers_per_room']} 观众, 版本 {report['version']}）"
+    )
+    print("=" * 60)
+    print(f"  房间结果:     {report['rooms']}")
+    print(f"  观众:         {report['viewers']}")
+    for key in ("step_latency_ms", "time_to_first_audio_ms"):
+        p = report[key]
+        print(f"  {key:22s} p50={p['p50']} p95={p['p95']} p99={p['p99']} (n={p['count']})")
+    fanout = report["fanout"]
+    print(
+        f"  fanout: {fanout['frames_per_s']} frames/s, {fanout['mbytes_per_s']} MB/s, "
+        f"step spread p99={fanout['step_spread_ms']['p99']}ms"
+    )
+    reply = report["danmaku_reply"]
+    print(
+        f"  danmaku reply (server) p50={reply['latency_ms']['p50']} "
+        f"p95={reply['latency_ms']['p95']} "
+        f"p99={reply['latency_ms']['p99']}ms timeouts={reply['timeouts']} hedge={reply['hedge']}"
+    )
+    print(
+        f"  danmaku LLM calls={reply['llm_calls']} (batched {reply['batch_calls']}) "
+        f"answered/call={reply['answered_per_call']}"
+    )
+    proc = report["process"]
+    print(
+        f"  CPU {proc['cpu_percent']}%  "
+        f"RSS start={proc['rss_mb_start']} peak={proc['rss_mb_peak']} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ECHUU 端到端压测（假 LLM / TTS）")
+    parser.add_argument("--rooms", type=int, default=5)
+    parser.add_argument("--viewers", type=int, default=100, help="每个房间的观众数")
+    parser.add_argument(
+        "--protocols", type=int, nargs="+", default=[1, 2, 3], help="观众协议版本（轮流分配）"
+    )
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="普通 LLM 调用延迟（秒）")
+    parser.add_argument(
+        "--script-latency", type=float, default=3.0, help="剧本生成 LLM 调用延迟（秒）"
+    )
+    parser.add_argument("--tts-latency", type=float, default=0.3, help="TTS 合成延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.2, help="延迟随机抖动比例")
+    parser.add_argument("--speech-rate", type=float, default=4.5, help="假音频时长：每秒字数")
+    parser.add_argument("--script-lines", type=int, default=10, help="剧本单元数（至少 8）")
+    parser.add_argument("--danmaku-rate", type=float, default=2.0, help="每个房间每秒注入的弹幕数")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=600.0, help="等待所有房间结束的上限（秒）")
+    parser.add_argument("--drain", type=float, default=1.0, help="结束后等待扇出发完的时间（秒）")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default="loadtest_report.json")
+    parser.add_argument("--verbose", action="store_true", help="保留服务端日志输出")
+    parser.add_argument(
+        "--pacing", action="store_true", help="按音频时长放行步骤（与线上一致，耗时按真实播放时长）"
+    )
+    parser.add_argument(
+        "--sync-llm", action="store_true", help="假 LLM 只提供阻塞接口（对比工作线程回退）"
+    )
+    parser.add_argument("--llm-tail", type=float, default=0.0, help="LLM 慢请求的概率（长尾）")
+    parser.add_argument("--llm-tail-factor", type=float, default=10.0, help="慢请求的延迟倍数")
+    parser.add_argument(
+        "--reply-budget",
+        type=float,
+        default=None,
+        help="弹幕回应延迟预算（秒，0 关闭对冲；默认沿用环境变量）",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=None, help="每步最多合并回应的弹幕数（默认沿用环境变量）"
+    )
+    args = parser.parse_args()
+    args.script_lines = max(args.script_lines, 8)
+
+    raise_fd_limit()
+    if args.reply_budget is not None:
+        os.environ["DANMAKU_REPLY_BUDGET"] = str(args.reply_budget)
+    if args.batch_size is not None:
+        os.environ["DANMAKU_BATCH_SIZE"] = str(args.batch_size)
+    workdir = Path(tempfile.mkdtemp(prefix="echuu-loadtest-"))
+    prepare_environment(workdir, pacing=args.pacing)
+    sys.path.insert(0, str(BACKEND_DIR))
+    import app as app_module
+
+    install_fake_providers(args, workdir)
+
+    if args.verbose:
+        report = asyncio.run(run_load(args, app_module))
+    else:
+        # 引擎每步都会打印大量日志，压测时丢弃
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            report = asyncio.run(run_load(args, app_module))
+
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print_summary(report)
+    print(f"\n报告已写入 {args.output}（临时数据目录 {workdir}）")
+
+
+if __name__ == "__main__":
+    main()
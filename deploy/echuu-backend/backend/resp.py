@@ -0,0 +1,191 @@
+"""
+最小的 RESP2（Redis 协议）asyncio 客户端。
+
+只实现房间存储 / 事件总线用到的部分：普通命令、流水线与 PSUBSCRIBE 订阅。
+不依赖 redis 包；可以连 Redis，也可以连本目录的 resp_server.py 本地替身。
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+DEFAULT_PORT = 6379
+
+
+class RespError(Exception):
+    """服务端返回的错误回复（-ERR ...）。"""
+
+
+@dataclass(frozen=True)
+class RespAddress:
+    host: str = "127.0.0.1"
+    port: int = DEFAULT_PORT
+    db: int = 0
+    password: Optional[str] = None
+
+    @classmethod
+    def from_url(cls, url: str) -> "RespAddress":
+        """解析 redis://[:password@]host[:port][/db]。"""
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "resp", "tcp"):
+            raise ValueError(f"unsupported RESP url: {url}")
+        db = parsed.path.lstrip("/")
+        return cls(
+            host=parsed.hostname or "127.0.0.1",
+            port=parsed.port or DEFAULT_PORT,
+            db=int(db) if db else 0,
+            password=parsed.password,
+        )
+
+
+def _to_bytes(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    if isinstance(value, (int, float)):
+        return str(value).encode("ascii")
+    raise TypeError(f"unsupported RESP argument: {type(value).__name__}")
+
+
+def encode_command(*args: Any) -> bytes:
+    """把命令编码成 RESP 数组。"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = _to_bytes(arg)
+        parts.append(b"$%d\r\n" % len(data))
+        parts.append(data)
+        parts.append(b"\r\n")
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """
+    读取一条回复。
+
+    错误回复以 RespError 实例返回（不抛出），由调用方决定如何处理。
+    """
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("RESP connection closed")
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body.decode("utf-8")
+    if prefix == b"-":
+        return RespError(body.decode("utf-8"))
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"invalid RESP reply: {line!r}")
+
+
+class RespConnection:
+    """单条命令连接（请求 / 回复按顺序匹配，内部加锁）。"""
+
+    def __init__(self, address: RespAddress):
+        self.address = address
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self.address.host, self.address.port
+        )
+        if self.address.password:
+            await self._roundtrip([("AUTH", self.address.password)])
+        if self.address.db:
+            await self._roundtrip([("SELECT", self.address.db)])
+
+    async def _roundtrip(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        self._writer.write(b"".join(encode_command(*cmd) for cmd in commands))
+        await self._writer.drain()
+        replies = [await read_reply(self._reader) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    async def execute(self, *args: Any) -> Any:
+        """执行一条命令并返回回复。"""
+        return (await self.pipeline([args]))[0]
+
+    async def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """一次写出多条命令，按顺序返回回复。"""
+        async with self._lock:
+            if not self.connected:
+                await self.connect()
+            try:
+                return await self._roundtrip(commands)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                raise
+
+    async def close(self):
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+class RespSubscriber:
+    """PSUBSCRIBE 专用连接（订阅状态下不能再执行普通命令）。"""
+
+    def __init__(self, address: RespAddress):
+        self.address = address
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def psubscribe(self, *patterns: str):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.address.host, self.address.port
+            )
+            if self.address.password:
+                self._writer.write(encode_command("AUTH", self.address.password))
+                await self._writer.drain()
+                reply = await read_reply(self._reader)
+                if isinstance(reply, RespError):
+                    raise reply
+        self._writer.write(encode_command("PSUBSCRIBE", *patterns))
+        await self._writer.drain()
+        for _ in patterns:
+            reply = await read_reply(self._reader)
+            if isinstance(reply, RespError):
+                raise reply
+
+    async def messages(self) -> AsyncIterator[Tuple[bytes, bytes]]:
+        """逐条产出 (channel, payload)。"""
+        while True:
+            reply = await read_reply(self._reader)
+            if isinstance(reply, list) and reply and reply[0] == b"pmessage":
+                yield reply[2], reply[3]
+            elif isinstance(reply, list) and reply and reply[0] == b"message":
+                yield reply[1], reply[2]
+
+    async def close(self):
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+本地 RESP 替身服务（开发 / 压测用，不要用于生产）。
+
+实现房间存储与事件总线用到的 Redis 命令子集：
+PING ECHO AUTH SELECT QUIT GET SET(NX/XX/EX/PX) DEL EXISTS EXPIRE TTL
+INCR INCRBY DECR DECRBY PUBLISH SUBSCRIBE PSUBSCRIBE，
+以及 EVAL（不执行 Lua，只识别 room_bus 里开播锁的比对后删除 / 比对后续期两段脚本）。
+
+使用方法:
+    python resp_server.py --port 6390
+    ROOM_BACKEND_URL=redis://127.0.0.1:6390 uvicorn app:app --workers 4
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from resp import RespError, encode_command, read_reply
+from room_bus import REFRESH_RUN_SCRIPT, RELEASE_RUN_SCRIPT
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _int(value: int) -> bytes:
+    return b":%d\r\n" % value
+
+
+def _error(message: str) -> bytes:
+    return b"-ERR %s\r\n" % message.encode("utf-8")
+
+
+OK = b"+OK\r\n"
+
+
+class _Subscriber:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.channels: Set[bytes] = set()
+        self.patterns: Set[bytes] = set()
+
+
+class RespServer:
+    """单线程内存实现；key 过期在读取时惰性检查。"""
+
+    def __init__(self):
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._subscribers: Dict[asyncio.StreamWriter, _Subscriber] = {}
+        self.published = 0
+
+    # ==================== 存储 ====================
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _ttl_deadline(self, args: List[bytes]) -> Tuple[Optional[float], bool, bool]:
+        deadline, nx, xx = None, False, False
+        i = 0
+        while i < len(args):
+            option = args[i].upper()
+            if option == b"NX":
+                nx = True
+            elif option == b"XX":
+                xx = True
+            elif option in (b"EX", b"PX"):
+                amount = float(args[i + 1])
+                deadline = time.monotonic() + (amount if option == b"EX" else amount / 1000)
+                i += 1
+            i += 1
+        return deadline, nx, xx
+
+    def _incr(self, key: bytes, delta: int) -> bytes:
+        current = self._get(key)
+        try:
+            value = int(current or 0) + delta
+        except ValueError:
+            return _error("value is not an integer or out of range")
+        expires_at = self._data.get(key, (None, None))[1]
+        self._data[key] = (str(value).encode("ascii"), expires_at)
+        return _int(value)
+
+    def _eval(self, args: List[bytes], now: float) -> bytes:
+        script, numkeys = args[0].decode("utf-8"), int(args[1])
+        keys, argv = args[2 : 2 + numkeys], args[2 + numkeys :]
+        if script not in (RELEASE_RUN_SCRIPT, REFRESH_RUN_SCRIPT):
+            return _error("only the room_bus run lock scripts are supported")
+        # 单线程处理命令，比对与删除 / 续期之间不会插入其他客户端的命令
+        if self._get(keys[0]) != argv[0]:
+            return _int(0)
+        if script == RELEASE_RUN_SCRIPT:
+            del self._data[keys[0]]
+        else:
+            self._data[keys[0]] = (argv[0], now + float(argv[1]))
+        return _int(1)
+
+    # ==================== 发布订阅 ====================
+
+    def _publish(self, channel: bytes, message: bytes) -> int:
+        delivered = 0
+        for sub in list(self._subscribers.values()):
+            if channel in sub.channels:
+                sub.writer.write(encode_command("message", channel, message))
+                delivered += 1
+            for pattern in sub.patterns:
+                if fnmatch.fnmatchcase(channel.decode("latin-1"), pattern.decode("latin-1")):
+                    sub.writer.write(encode_command("pmessage", pattern, channel, message))
+                    delivered += 1
+        self.published += 1
+        return delivered
+
+    def _subscribe(self, writer, kind: bytes, names: List[bytes]) -> bytes:
+        sub = self._subscribers.setdefault(writer, _Subscriber(writer))
+        target = sub.patterns if kind == b"psubscribe" else sub.channels
+        replies = []
+        for name in names:
+            target.add(name)
+            count = len(sub.channels) + len(sub.patterns)
+            replies.append(b"*3\r\n" + _bulk(kind) + _bulk(name) + _int(count))
+        return b"".join(replies)
+
+    # ==================== 命令分发 ====================
+
+    def handle(self, writer, command: List[bytes]) -> Optional[bytes]:
+        name, args = command[0].upper(), command[1:]
+        now = time.monotonic()
+
+        if name == b"PING":
+            return _bulk(args[0]) if args else b"+PONG\r\n"
+        if name == b"ECHO":
+            return _bulk(args[0])
+        if name in (b"AUTH", b"SELECT"):
+            return OK
+        if name == b"QUIT":
+            return None
+        if name == b"GET":
+            return _bulk(self._get(args[0]))
+        if name == b"SET":
+            deadline, nx, xx = self._ttl_deadline(args[2:])
+            exists = self._get(args[0]) is not None
+            if (nx and exists) or (xx and not exists):
+                return _bulk(None)
+            self._data[args[0]] = (args[1], deadline)
+            return OK
+        if name == b"DEL":
+            removed = sum(1 for key in args if self._get(key) is not None and self._data.pop(key))
+            return _int(removed)
+        if name == b"EXISTS":
+            return _int(sum(1 for key in args if self._get(key) is not None))
+        if name == b"EXPIRE":
+            value = self._get(args[0])
+            if value is None:
+                return _int(0)
+            self._data[args[0]] = (value, now + float(args[1]))
+            return _int(1)
+        if name == b"TTL":
+            if self._get(args[0]) is None:
+                return _int(-2)
+            expires_at = self._data[args[0]][1]
+            return _int(-1 if expires_at is None else int(expires_at - now))
+        if name in (b"INCR", b"INCRBY", b"DECR", b"DECRBY"):
+            delta = int(args[1]) if name in (b"INCRBY", b"DECRBY") else 1
+            if name.startswith(b"DECR"):
+                delta = -delta
+            return self._incr(args[0], delta)
+        if name == b"EVAL":
+            return self._eval(args, now)
+        if name == b"PUBLISH":
+            return _int(self._publish(args[0], args[1]))
+        if name in (b"SUBSCRIBE", b"PSUBSCRIBE"):
+            return self._subscribe(writer, name.lower(), args)
+        return _error(f"unknown command '{name.decode('latin-1')}'")
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    command = await read_reply(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                if isinstance(command, RespError) or not isinstance(command, list) or not command:
+                    writer.write(_error("protocol error"))
+                    break
+                reply = self.handle(writer, command)
+                if reply is None:
+                    writer.write(OK)
+                    break
+                writer.write(reply)
+                await writer.drain()
+        finally:
+            self._subscribers.pop(writer, None)
+            writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 6390, ready: Optional[asyncio.Event] = None):
+    server = RespServer()
+    tcp = await asyncio.start_server(server.serve_client, host, port)
+    print(f"[resp_server] listening on {host}:{port}")
+    if ready is not None:
+        ready.set()
+    async with tcp:
+        await tcp.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 RESP 替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
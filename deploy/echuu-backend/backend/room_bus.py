@@ -0,0 +1,389 @@
+"""
+直播间状态存储（RoomStore）与事件总线（EventBus）。
+
+单进程部署时使用内存实现，行为与原来的 rooms dict 相同；设置 ROOM_BACKEND_URL
+（redis://host:port/db）后改用 RESP 实现，多个 uvicorn worker / 副本共享：
+
+- 房间元数据：owner_token、开播锁、状态快照、在线人数
+
+开播锁的值是每次开播生成的随机令牌（不是 worker id，同一 worker 的前后两次开播也能区分）：
+运行期间每 ROOM_RUN_LOCK_REFRESH 秒凭令牌续期，结束时凭令牌比对后删除（RESP 实现用 EVAL
+脚本保证原子性，resp_server.py 也支持这两段脚本）。worker 崩溃后锁在 ROOM_RUN_LOCK_TTL 秒内过期。
+- 房间事件：引擎所在 worker 发布，每个 worker 把事件扇出给自己的观众
+- 观众弹幕 / 停播请求：任意 worker 收到后经总线转给正在运行引擎的 worker
+
+可以连真实 Redis，也可以连本目录的 resp_server.py 本地替身。
+"""
+
+import asyncio
+import json
+import os
+import secrets
+import socket
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Protocol, Tuple
+
+from resp import RespAddress, RespConnection, RespSubscriber
+
+ROOM_BACKEND_URL = os.getenv("ROOM_BACKEND_URL", "")
+ROOM_KEY_PREFIX = os.getenv("ROOM_KEY_PREFIX", "echuu")
+# 房间记录与开播锁的过期时间（秒）；worker 崩溃后锁会自动释放
+ROOM_RECORD_TTL = int(os.getenv("ROOM_RECORD_TTL", str(24 * 3600)))
+ROOM_RUN_LOCK_TTL = int(os.getenv("ROOM_RUN_LOCK_TTL", "60"))
+# 开播锁续期间隔（秒）；须明显小于 ROOM_RUN_LOCK_TTL
+ROOM_RUN_LOCK_REFRESH = float(os.getenv("ROOM_RUN_LOCK_REFRESH", str(ROOM_RUN_LOCK_TTL / 3)))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+MESSAGE_EVENT = "event"
+MESSAGE_DANMAKU = "danmaku"
+# 停播请求：任意 worker 收到 /api/stop 后转给正在运行引擎的 worker
+MESSAGE_STOP = "stop"
+
+# 开播锁的比对后删除 / 比对后续期（KEYS[1] = 锁, ARGV[1] = 令牌, ARGV[2] = TTL 秒）
+RELEASE_RUN_SCRIPT = (
+    'if redis.call("GET", KEYS[1]) == ARGV[1] then return redis.call("DEL", KEYS[1]) end return 0'
+)
+REFRESH_RUN_SCRIPT = (
+    'if redis.call("GET", KEYS[1]) == ARGV[1] then '
+    'return redis.call("EXPIRE", KEYS[1], ARGV[2]) end return 0'
+)
+
+
+@dataclass
+class BusMessage:
+    """总线上传递的房间消息。"""
+
+    kind: str
+    data: dict
+    audio: Optional[bytes] = None
+    audio_url: Optional[str] = None
+    protocols: Optional[List[int]] = None
+    origin: str = field(default=WORKER_ID)
+
+    def encode(self) -> bytes:
+        """JSON 头 + 换行 + 原始音频（JSON 里的换行都会被转义，可以安全分隔）。"""
+        header = json.dumps(
+            {
+                "kind": self.kind,
+                "data": self.data,
+                "audio_url": self.audio_url,
+                "protocols": self.protocols,
+                "origin": self.origin,
+            },
+            ensure_ascii=False,
+            default=str,
+        ).encode("utf-8")
+        return header + b"\n" + (self.audio or b"")
+
+    @classmethod
+    def decode(cls, payload: bytes) -> "BusMessage":
+        header, _, audio = payload.partition(b"\n")
+        meta = json.loads(header)
+        return cls(
+            kind=meta["kind"],
+            data=meta["data"],
+            audio=audio or None,
+            audio_url=meta.get("audio_url"),
+            protocols=meta.get("protocols"),
+            origin=meta.get("origin", ""),
+        )
+
+
+Deliver = Callable[[str, BusMessage], None]
+
+
+def new_run_token() -> str:
+    """一次开播的锁令牌。"""
+    return f"{WORKER_ID}:{uuid.uuid4().hex}"
+
+
+def check_owner_token(expected: Optional[str], provided: Optional[str]) -> bool:
+    """常量时间比较 owner_token。"""
+    if not expected or not provided:
+        return False
+    return secrets.compare_digest(expected, provided)
+
+
+# ==================== 接口 ====================
+
+
+class RoomStore(Protocol):
+    """房间元数据存储（接口）。"""
+
+    async def create_room(self, room_id: str, owner_token: str) -> None: ...
+
+    async def get_owner_token(self, room_id: str) -> Optional[str]: ...
+
+    async def delete_room(self, room_id: str) -> None: ...
+
+    async def try_acquire_run(self, room_id: str) -> Optional[str]:
+        """抢开播锁；成功时返回本次开播的令牌，已被占用时返回 None。"""
+        ...
+
+    async def refresh_run(self, room_id: str, token: str) -> bool:
+        """续期开播锁；锁已不属于 token（过期后被别人拿走）时返回 False。"""
+        ...
+
+    async def release_run(self, room_id: str, token: str) -> None: ...
+
+    async def put_status(self, room_id: str, status: dict) -> None: ...
+
+    async def get_status(self, room_id: str) -> Optional[dict]: ...
+
+    async def add_viewers(self, room_id: str, delta: int) -> int: ...
+
+    async def close(self) -> None: ...
+
+
+class EventBus(Protocol):
+    """房间事件总线（接口）。publish 不阻塞，投递顺序与发布顺序一致。"""
+
+    distributed: bool
+
+    async def start(self, deliver: Deliver) -> None: ...
+
+    def publish(self, room_id: str, message: BusMessage) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+# ==================== 内存实现 ====================
+
+
+class InMemoryRoomStore:
+    """单进程实现。"""
+
+    def __init__(self):
+        self._owners: Dict[str, str] = {}
+        self._runs: Dict[str, str] = {}
+        self._status: Dict[str, dict] = {}
+        self._viewers: Dict[str, int] = {}
+
+    async def create_room(self, room_id: str, owner_token: str) -> None:
+        self._owners[room_id] = owner_token
+
+    async def get_owner_token(self, room_id: str) -> Optional[str]:
+        return self._owners.get(room_id)
+
+    async def delete_room(self, room_id: str) -> None:
+        for table in (self._owners, self._runs, self._status, self._viewers):
+            table.pop(room_id, None)
+
+    async def try_acquire_run(self, room_id: str) -> Optional[str]:
+        if room_id in self._runs:
+            return None
+        token = new_run_token()
+        self._runs[room_id] = token
+        return token
+
+    async def refresh_run(self, room_id: str, token: str) -> bool:
+        return self._runs.get(room_id) == token
+
+    async def release_run(self, room_id: str, token: str) -> None:
+        if self._runs.get(room_id) == token:
+            del self._runs[room_id]
+
+    async def put_status(self, room_id: str, status: dict) -> None:
+        self._status[room_id] = status
+
+    async def get_status(self, room_id: str) -> Optional[dict]:
+        return self._status.get(room_id)
+
+    async def add_viewers(self, room_id: str, delta: int) -> int:
+        count = max(0, self._viewers.get(room_id, 0) + delta)
+        self._viewers[room_id] = count
+        return count
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryEventBus:
+    """单进程实现：publish 直接同步投递。"""
+
+    distributed = False
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    def publish(self, room_id: str, message: BusMessage) -> None:
+        if self._deliver is not None:
+            self._deliver(room_id, message)
+
+    async def close(self) -> None:
+        self._deliver = None
+
+
+# ==================== RESP 实现 ====================
+
+
+def _key(room_id: str, name: str) -> str:
+    return f"{ROOM_KEY_PREFIX}:room:{room_id}:{name}"
+
+
+def _events_channel(room_id: str) -> str:
+    return f"{ROOM_KEY_PREFIX}:room:{room_id}:events"
+
+
+class RespRoomStore:
+    """基于 RESP（Redis 协议）的房间存储。"""
+
+    def __init__(self, address: RespAddress):
+        self.conn = RespConnection(address)
+
+    async def create_room(self, room_id: str, owner_token: str) -> None:
+        await self.conn.execute("SET", _key(room_id, "owner"), owner_token, "EX", ROOM_RECORD_TTL)
+
+    async def get_owner_token(self, room_id: str) -> Optional[str]:
+        value = await self.conn.execute("GET", _key(room_id, "owner"))
+        return value.decode("utf-8") if value is not None else None
+
+    async def delete_room(self, room_id: str) -> None:
+        await self.conn.execute(
+            "DEL",
+            _key(room_id, "owner"),
+            _key(room_id, "run"),
+            _key(room_id, "status"),
+            _key(room_id, "viewers"),
+        )
+
+    async def try_acquire_run(self, room_id: str) -> Optional[str]:
+        token = new_run_token()
+        reply = await self.conn.execute(
+            "SET", _key(room_id, "run"), token, "NX", "EX", ROOM_RUN_LOCK_TTL
+        )
+        if reply is None:
+            return None
+        # 开播时顺便续期房间记录
+        await self.conn.execute("EXPIRE", _key(room_id, "owner"), ROOM_RECORD_TTL)
+        return token
+
+    async def refresh_run(self, room_id: str, token: str) -> bool:
+        reply = await self.conn.execute(
+            "EVAL", REFRESH_RUN_SCRIPT, 1, _key(room_id, "run"), token, ROOM_RUN_LOCK_TTL
+        )
+        if reply:
+            # 长时间直播时房间记录也不能过期
+            await self.conn.execute("EXPIRE", _key(room_id, "owner"), ROOM_RECORD_TTL)
+        return bool(reply)
+
+    async def release_run(self, room_id: str, token: str) -> None:
+        # GET + DEL 分两步不安全：两步之间锁可能过期并被别的 worker 拿到，必须原子比对后删除
+        await self.conn.execute("EVAL", RELEASE_RUN_SCRIPT, 1, _key(room_id, "run"), token)
+
+    async def put_status(self, room_id: str, status: dict) -> None:
+        payload = json.dumps(status, ensure_ascii=False, default=str)
+        await self.conn.execute("SET", _key(room_id, "status"), payload, "EX", ROOM_RECORD_TTL)
+
+    async def get_status(self, room_id: str) -> Optional[dict]:
+        value = await self.conn.execute("GET", _key(room_id, "status"))
+        return json.loads(value) if value is not None else None
+
+    async def add_viewers(self, room_id: str, delta: int) -> int:
+        count = await self.conn.execute("INCRBY", _key(room_id, "viewers"), delta)
+        if count < 0:
+            await self.conn.execute("SET", _key(room_id, "viewers"), 0)
+            count = 0
+        return count
+
+    async def close(self) -> None:
+        await self.conn.close()
+
+
+class RespEventBus:
+    """
+    基于 RESP PUBLISH / PSUBSCRIBE 的事件总线。
+
+    publish 只把消息放进本地队列；发送协程把积压的消息合并成一次流水线发出，
+    订阅协程收到消息后（包括本 worker 自己发布的）调用 deliver。
+    """
+
+    distributed = True
+
+    def __init__(self, address: RespAddress, max_pipeline: int = 128):
+        self.address = address
+        self.max_pipeline = max_pipeline
+        self.conn = RespConnection(address)
+        self.subscriber = RespSubscriber(address)
+        self.published = 0
+        self.delivered = 0
+        self._queue: "asyncio.Queue[Tuple[str, bytes]]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        await self.subscriber.psubscribe(_events_channel("*"))
+        self._tasks = [
+            asyncio.create_task(self._send_loop()),
+            asyncio.create_task(self._receive_loop()),
+        ]
+
+    def publish(self, room_id: str, message: BusMessage) -> None:
+        self._queue.put_nowait((_events_channel(room_id), message.encode()))
+
+    async def _send_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_pipeline and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self.conn.pipeline(
+                    [("PUBLISH", channel, payload) for channel, payload in batch]
+                )
+                self.published += len(batch)
+            except Exception as e:
+                print(f"[room_bus] publish failed ({len(batch)} messages dropped): {e}")
+                await asyncio.sleep(0.5)
+
+    async def _receive_loop(self):
+        prefix = f"{ROOM_KEY_PREFIX}:room:".encode("utf-8")
+        suffix = b":events"
+        while True:
+            try:
+                async for channel, payload in self.subscriber.messages():
+                    room_id = channel[len(prefix) : -len(suffix)].decode("utf-8")
+                    try:
+                        message = BusMessage.decode(payload)
+                    except Exception as e:
+                        print(f"[room_bus] bad message on {channel!r}: {e}")
+                        continue
+                    self.delivered += 1
+                    if self._deliver is not None:
+                        self._deliver(room_id, message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[room_bus] subscription lost, reconnecting: {e}")
+                await self.subscriber.close()
+                await asyncio.sleep(1)
+                try:
+                    await self.subscriber.psubscribe(_events_channel("*"))
+                except Exception as e2:
+                    print(f"[room_bus] resubscribe failed: {e2}")
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+        await self.subscriber.close()
+        await self.conn.close()
+
+
+def create_room_backend(url: Optional[str] = None) -> Tuple[RoomStore, EventBus]:
+    """按 ROOM_BACKEND_URL 创建存储与总线（为空时使用内存实现）。"""
+    url = ROOM_BACKEND_URL if url is None else url
+    if not url or url == "memory://":
+        return InMemoryRoomStore(), InMemoryEventBus()
+    address = RespAddress.from_url(url)
+    return RespRoomStore(address), RespEventBus(address)
@@ -0,0 +1,214 @@
+"""
+直播间回收：按 TTL 清理空闲 / 已结束 / 被遗弃的房间，并对新房间做容量准入。
+
+房间分类（只回收未在运行的房间）：
+
+- idle:      从未开播、无观众，且超过 ROOM_IDLE_TTL 秒无活动
+- finished:  已开播过（结束 / 出错），无观众，且超过 ROOM_FINISHED_TTL 秒无活动
+- abandoned: 超过 ROOM_ABANDONED_TTL 秒无活动（即使还有残留连接，也会被关闭）
+
+容量上限：
+
+- ROOM_MAX_ROOMS: 房间总数上限
+- ROOM_MEMORY_CAP_MB: 进程 RSS 上限（0 表示不限制；读取 /proc/self/statm，其他平台不生效）
+
+达到上限时，先按最久未活动的顺序回收无观众、且至少 ROOM_PRESSURE_MIN_IDLE 秒无活动的
+房间，仍然不够则拒绝新房间（HTTP 503）。
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+ROOM_IDLE_TTL = float(os.getenv("ROOM_IDLE_TTL", "1800"))
+ROOM_FINISHED_TTL = float(os.getenv("ROOM_FINISHED_TTL", "600"))
+ROOM_ABANDONED_TTL = float(os.getenv("ROOM_ABANDONED_TTL", "7200"))
+ROOM_MAX_ROOMS = int(os.getenv("ROOM_MAX_ROOMS", "1000"))
+ROOM_MEMORY_CAP_MB = float(os.getenv("ROOM_MEMORY_CAP_MB", "0"))
+ROOM_REAP_INTERVAL = float(os.getenv("ROOM_REAP_INTERVAL", "30"))
+
+# 超限时也不回收刚创建 / 刚活动过的房间（房主可能马上开播）
+ROOM_PRESSURE_MIN_IDLE = float(os.getenv("ROOM_PRESSURE_MIN_IDLE", "60"))
+
+# 内存超限时每轮最多回收的候选比例（RSS 不会随回收立即下降，避免一次清空所有房间）
+PRESSURE_EVICT_FRACTION = 0.25
+
+
+def current_rss_mb() -> Optional[float]:
+    """当前进程常驻内存（MB）；无法获取时返回 None。"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+@dataclass
+class ReaperStats:
+    """房间回收统计（进程级）。"""
+
+    sweeps: int = 0
+    reclaimed_idle: int = 0
+    reclaimed_finished: int = 0
+    reclaimed_abandoned: int = 0
+    reclaimed_pressure: int = 0
+    rejected: int = 0
+
+    @property
+    def reclaimed(self) -> int:
+        return (
+            self.reclaimed_idle
+            + self.reclaimed_finished
+            + self.reclaimed_abandoned
+            + self.reclaimed_pressure
+        )
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "reclaimed": self.reclaimed}
+
+
+class RoomReaper:
+    """
+    后台回收协程 + 新房间准入。
+
+    Args:
+        rooms: room_id -> RoomState（与 app 共用同一个 dict）
+        close_room: 回收前调用，负责关闭连接、停止弹幕入口等
+    """
+
+    def __init__(
+        self,
+        rooms: Dict[str, "RoomState"],
+        close_room: Callable[["RoomState"], Awaitable[None]],
+        idle_ttl: float = ROOM_IDLE_TTL,
+        finished_ttl: float = ROOM_FINISHED_TTL,
+        abandoned_ttl: float = ROOM_ABANDONED_TTL,
+        max_rooms: int = ROOM_MAX_ROOMS,
+        memory_cap_mb: float = ROOM_MEMORY_CAP_MB,
+        interval: float = ROOM_REAP_INTERVAL,
+        pressure_min_idle: float = ROOM_PRESSURE_MIN_IDLE,
+    ):
+        self.rooms = rooms
+        self.close_room = close_room
+        self.idle_ttl = idle_ttl
+        self.finished_ttl = finished_ttl
+        self.abandoned_ttl = abandoned_ttl
+        self.max_rooms = max_rooms
+        self.memory_cap_mb = memory_cap_mb
+        self.interval = interval
+        self.pressure_min_idle = pressure_min_idle
+        self.stats = ReaperStats()
+        self._task: Optional[asyncio.Task] = None
+
+    # ==================== 分类 ====================
+
+    def classify(self, room: "RoomState", now: Optional[float] = None) -> Optional[str]:
+        """返回房间应被回收的原因；不应回收时返回 None。"""
+        if room.is_running:
+            return None
+        now = time.monotonic() if now is None else now
+        inactive = now - room.last_activity
+
+        if inactive >= self.abandoned_ttl:
+            return "abandoned"
+        if room.active_connections:
+            return None
+        if room.started_at is None:
+            return "idle" if inactive >= self.idle_ttl else None
+        return "finished" if inactive >= self.finished_ttl else None
+
+    def _pressure_candidates(self) -> List["RoomState"]:
+        """内存 / 数量超限时可回收的房间：未运行、无观众且空闲足够久，按最久未活动排序。"""
+        cutoff = time.monotonic() - self.pressure_min_idle
+        candidates = [
+            room
+            for room in self.rooms.values()
+            if not room.is_running and not room.active_connections and room.last_activity <= cutoff
+        ]
+        return sorted(candidates, key=lambda room: room.last_activity)
+
+    def over_memory_cap(self) -> bool:
+        if self.memory_cap_mb <= 0:
+            return False
+        rss = current_rss_mb()
+        return rss is not None and rss >= self.memory_cap_mb
+
+    # ==================== 回收 ====================
+
+    async def _reclaim(self, room: "RoomState", reason: str):
+        if self.rooms.get(room.room_id) is not room:
+            return
+        del self.rooms[room.room_id]
+        setattr(self.stats, f"reclaimed_{reason}", getattr(self.stats, f"reclaimed_{reason}") + 1)
+        print(f"[reaper] reclaim room={room.room_id} reason={reason}")
+        try:
+            await self.close_room(room)
+        except Exception as e:
+            print(f"[reaper] close room={room.room_id} failed: {e}")
+
+    async def sweep(self) -> int:
+        """执行一轮回收，返回回收的房间数。"""
+        self.stats.sweeps += 1
+        now = time.monotonic()
+        reclaimed = 0
+        for room in list(self.rooms.values()):
+            reason = self.classify(room, now)
+            if reason:
+                await self._reclaim(room, reason)
+                reclaimed += 1
+
+        if self.over_memory_cap():
+            candidates = self._pressure_candidates()
+            budget = max(1, int(len(candidates) * PRESSURE_EVICT_FRACTION))
+            for room in candidates[:budget]:
+                await self._reclaim(room, "pressure")
+                reclaimed += 1
+        return reclaimed
+
+    async def admit(self) -> bool:
+        """
+        新房间准入检查（创建房间前调用）。
+
+        超出数量上限时回收最久未活动的空房间腾出位置；内存超限时先做一轮回收。
+        """
+        if self.over_memory_cap():
+            await self.sweep()
+            if self.over_memory_cap():
+                self.stats.rejected += 1
+                return False
+
+        if len(self.rooms) >= self.max_rooms:
+            await self.sweep()
+            overflow = len(self.rooms) - self.max_rooms + 1
+            for room in self._pressure_candidates()[: max(0, overflow)]:
+                await self._reclaim(room, "pressure")
+            if len(self.rooms) >= self.max_rooms:
+                self.stats.rejected += 1
+                return False
+        return True
+
+    # ==================== 后台任务 ====================
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"[reaper] sweep failed: {e}")
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
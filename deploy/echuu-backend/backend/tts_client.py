@@ -9,9 +9,9 @@ import os
 import re
 import struct
 import threading
+import time
 from datetime import datetime
-from typing import Callable, List, Optional
-
+from typing import Callable, Iterable, Optional, Union
 
 def detect_language(text: str) -> str:
     """
@@ -189,54 +189,60 @@ def pcm_to_wav(pcm_data: bytes, sample_rate: int = 24000, channels: int = 1, sam
 
 class TTSCallback(ResultCallback):
     """TTS 流式回调处理"""
-    
-    def __init__(self, 
-                 on_audio: Callable[[bytes], None] = None,
-                 save_path: str = None):
+
+    def __init__(
+        self,
+        on_audio: Callable[[bytes], None] = None,
+        save_path: str = None,
+        on_first_chunk: Callable[[], None] = None,
+    ):
         self.on_audio = on_audio
         self.save_path = save_path
+        self.on_first_chunk = on_first_chunk
         self.audio_buffer = io.BytesIO()
         self.file = None
         self.first_chunk_time = None
         self.start_time = None
-        
+
     def on_open(self):
         self.start_time = datetime.now()
         if self.save_path:
             self.file = open(self.save_path, "wb")
         print(f"[TTS] 连接建立")
-    
+
     def on_data(self, data: bytes):
         if self.first_chunk_time is None:
             self.first_chunk_time = datetime.now()
             latency = (self.first_chunk_time - self.start_time).total_seconds() * 1000
             print(f"[TTS] 首包延迟: {latency:.0f}ms")
-        
+            if self.on_first_chunk:
+                self.on_first_chunk()
+
         # 写入 buffer
         self.audio_buffer.write(data)
-        
+
         # 写入文件
         if self.file:
             self.file.write(data)
-        
+
         # 回调处理
         if self.on_audio:
             self.on_audio(data)
-    
+
     def on_complete(self):
         print(f"[TTS] 合成完成，音频大小: {self.audio_buffer.tell()} bytes")
-    
+
     def on_error(self, message: str):
         print(f"[TTS] 错误: {message}")
-    
+
     def on_close(self):
         if self.file:
             self.file.close()
         print("[TTS] 连接关闭")
-    
+
     def on_event(self, message):
         pass
-    
+
     def get_audio(self) -> bytes:
         """获取完整音频数据"""
         return self.audio_buffer.getvalue()
@@ -245,10 +251,17 @@ class TTSCallback(ResultCallback):
 class QwenRealtimeCallback(QwenTtsRealtimeCallback):
     """Qwen3 Realtime 回调处理"""
 
-    def __init__(self, on_audio: Callable[[bytes], None] = None, save_path: str = None, 
-                 response_format: str = "pcm", sample_rate: int = 24000):
+    def __init__(
+        self,
+        on_audio: Callable[[bytes], None] = None,
+        save_path: str = None,
+        response_format: str = "pcm",
+        sample_rate: int = 24000,
+        on_first_chunk: Callable[[], None] = None,
+    ):
         super().__init__()
         self.on_audio = on_audio
+        self.on_first_chunk = on_first_chunk
         self.save_path = save_path
         self.response_format = response_format.lower()
         self.sample_rate = sample_rate
@@ -286,29 +299,31 @@ class QwenRealtimeCallback(QwenTtsRealtimeCallback):
                     response = json.loads(response)
                 except:
                     return
-            
+
             event_type = response.get("type")
             # print(f"[TTS] on_event: {event_type}")
-            
+
             if event_type == "response.audio.delta":
                 recv_audio_b64 = response.get("delta")
                 if recv_audio_b64:
                     chunk = base64.b64decode(recv_audio_b64)
+                    if self.on_first_chunk and self.audio_buffer.tell() == 0:
+                        self.on_first_chunk()
                     self.audio_buffer.write(chunk)
                     if self.file:
                         self.file.write(chunk)
                     if self.on_audio:
                         self.on_audio(chunk)
-            
+
             if event_type in ("response.done", "session.finished"):
                 if event_type == "response.done":
                     print(f"[TTS] 收到音频分片完成: {self.audio_buffer.tell()} bytes")
                 self.complete_event.set()
-            
+
             if event_type == "error":
                 print(f"[TTS] 收到错误事件: {response}")
                 self.complete_event.set()
-                
+
         except Exception as exc:
             print(f"[TTS] Realtime 回调错误: {exc}")
 
@@ -327,14 +342,14 @@ class CosyVoiceTTS:
         tts = CosyVoiceTTS()
         audio = tts.synthesize("你好，世界！")
     """
-    
+
     # 音频格式映射
     FORMAT_MAP = {
         "mp3": OfflineAudioFormat.MP3_22050HZ_MONO_256KBPS if DASHSCOPE_AVAILABLE else None,
         "wav": OfflineAudioFormat.WAV_22050HZ_MONO_16BIT if DASHSCOPE_AVAILABLE else None,
         "pcm": OfflineAudioFormat.PCM_22050HZ_MONO_16BIT if DASHSCOPE_AVAILABLE else None,
     }
-    
+
     def __init__(
         self,
         api_key: str = None,
@@ -353,13 +368,13 @@ class CosyVoiceTTS:
         """
         if not DASHSCOPE_AVAILABLE:
             raise ImportError("dashscope 未安装，请运行: pip install dashscope")
-        
+
         self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
         if not self.api_key:
             raise ValueError("请设置 DASHSCOPE_API_KEY 环境变量或传入 api_key 参数")
-        
+
         dashscope.api_key = self.api_key
-        
+
         self.model = model or os.getenv("TTS_MODEL", "qwen3-tts-flash-realtime")
         self.voice = voice or os.getenv("TTS_VOICE", "Cherry")
         self.audio_format = self.FORMAT_MAP.get(audio_format.lower(), self.FORMAT_MAP["mp3"])
@@ -387,17 +402,37 @@ class CosyVoiceTTS:
         if realtime and not REALTIME_AVAILABLE:
             raise ImportError("dashscope 版本过低，需 >= 1.25.2 才能使用 QwenTTS Realtime")
 
+        # 延迟观测回调 observer(stage, seconds)，stage 为 connect / first_chunk / total
+        self.observer: Optional[Callable[[str, float], None]] = None
+
         print(f"✅ TTS Client 初始化: model={self.model}, voice={self.voice}, mode={self.mode}")
-    
+
+    def _observe(self, stage: str, started: float):
+        if self.observer is None:
+            return
+        try:
+            self.observer(stage, time.perf_counter() - started)
+        except Exception as exc:
+            print(f"[TTS] observer 错误: {exc}")
+
     def _is_realtime_model(self) -> bool:
         return "realtime" in self.model
 
+    def streaming_format(self) -> Optional[str]:
+        """
+        synthesize(on_audio=...) 回调分片的格式："pcm"（16-bit 单声道，采样率 sample_rate），
+        分片不能直接拼接播放时返回 None。
+        """
+        if self._is_realtime_model() and self.response_format.lower() == "pcm":
+            return "pcm"
+        return None
+
     def _resolve_realtime_audio_format(self):
         if not RealtimeAudioFormat:
             return None
         fmt = self.response_format.lower()
         sample_rate = self.sample_rate
-        
+
         # Qwen3 Realtime 常见的 MP3 枚举名通常是 MP3_22050HZ_MONO_256KBPS 等
         # 我们根据实际返回的可用枚举进行匹配
         if fmt == "pcm":
@@ -421,11 +456,20 @@ class CosyVoiceTTS:
             return getattr(RealtimeAudioFormat, name, RealtimeAudioFormat.PCM_24000HZ_MONO_16BIT)
         return RealtimeAudioFormat.PCM_24000HZ_MONO_16BIT
 
-    def _synthesize_realtime(self, text: str, save_path: str = None) -> bytes:
+    def _synthesize_realtime(
+        self,
+        text: Union[str, Iterable[str]],
+        save_path: str = None,
+        cancel_token=None,
+        on_audio: Callable[[bytes], None] = None,
+    ) -> bytes:
+        started = time.perf_counter()
         callback = QwenRealtimeCallback(
+            on_audio=on_audio,
             save_path=save_path,
             response_format=self.response_format,
-            sample_rate=self.sample_rate
+            sample_rate=self.sample_rate,
+            on_first_chunk=lambda: self._observe("first_chunk", started),
         )
         qwen_tts_realtime = QwenTtsRealtime(
             model=self.model,
@@ -433,11 +477,64 @@ class CosyVoiceTTS:
             url=self.ws_url,
         )
         qwen_tts_realtime.connect()
+        self._observe("connect", started)
+
+        # 取消时关闭 WebSocket 并唤醒等待，释放连接与 DashScope 计费时长
+        unregister = None
+        if cancel_token is not None:
+            unregister = cancel_token.on_cancel(
+                lambda: self._abort_realtime(qwen_tts_realtime, callback)
+            )
+        try:
+            self._run_realtime_session(qwen_tts_realtime, callback, text)
+        except Exception:
+            # 连接被取消回调关闭后，发送文本会报错：按取消处理
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            raise
+        finally:
+            if unregister:
+                unregister()
+            try:
+                qwen_tts_realtime.close()
+            except Exception as exc:
+                print(f"[TTS] Realtime 关闭失败: {exc}")
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        self._observe("total", started)
+
+        audio_data = callback.get_audio()
+        # 如果返回的是PCM，转换为WAV
+        if self.response_format.lower() == "pcm" and audio_data:
+            audio_data = pcm_to_wav(audio_data, sample_rate=self.sample_rate)
+
+        return audio_data
+
+    @staticmethod
+    def _abort_realtime(qwen_tts_realtime, callback: "QwenRealtimeCallback"):
+        print("[TTS] 直播已停止，关闭 Realtime 连接")
+        callback.complete_event.set()
+        try:
+            qwen_tts_realtime.close()
+        except Exception as exc:
+            print(f"[TTS] Realtime 关闭失败: {exc}")
+
+    def _run_realtime_session(
+        self, qwen_tts_realtime, callback: "QwenRealtimeCallback", text: Union[str, Iterable[str]]
+    ):
+        """
+        配置会话、发送文本并等待合成完成。
+
+        text 可以是文本片段的迭代器（如 LLM 边生成边切出的句子）：每取到一段就
+        append_text，迭代器耗尽后才 finish。
+        """
+        pieces = iter([text] if isinstance(text, str) else text)
+        first = next(pieces, "")
 
         # Auto-detect language if set to "auto" or empty
         language = self.language_type
         if language.lower() in ("auto", ""):
-            language = detect_language(text)
+            language = detect_language(first)
             if language == "auto":
                 language = "Chinese"  # Fallback
 
@@ -462,69 +559,96 @@ class CosyVoiceTTS:
             kwargs["bit_rate"] = self.bit_rate
 
         qwen_tts_realtime.update_session(**kwargs)
-        qwen_tts_realtime.append_text(text)
-        if self.mode == "commit":
-            qwen_tts_realtime.commit()
+        piece = first
+        while True:
+            if piece.strip():
+                qwen_tts_realtime.append_text(piece)
+                if self.mode == "commit":
+                    qwen_tts_realtime.commit()
+            piece = next(pieces, None)
+            if piece is None:
+                break
         qwen_tts_realtime.finish()
 
         callback.wait_for_complete(self.timeout)
-        qwen_tts_realtime.close()
-        
-        audio_data = callback.get_audio()
-        # 如果返回的是PCM，转换为WAV
-        if self.response_format.lower() == "pcm" and audio_data:
-            audio_data = pcm_to_wav(audio_data, sample_rate=self.sample_rate)
-        
-        return audio_data
 
     def _synthesize_offline(self, text: str, save_path: str = None) -> bytes:
+        started = time.perf_counter()
         synthesizer = SpeechSynthesizer(
             model=self.model,
             voice=self.voice,
             format=self.audio_format,
         )
         audio = synthesizer.call(text)
+        self._observe("total", started)
         if save_path:
             with open(save_path, "wb") as f:
                 f.write(audio)
             print(f"[TTS] 音频已保存: {save_path}")
         return audio
 
-    def synthesize(self, text: str, save_path: str = None) -> bytes:
+    def synthesize(
+        self,
+        text: str,
+        save_path: str = None,
+        cancel_token=None,
+        on_audio: Callable[[bytes], None] = None,
+    ) -> bytes:
         """
-        非流式语音合成
-        
+        语音合成（返回完整音频，可选边合成边回调分片）
+
         Args:
             text: 待合成文本
             save_path: 保存路径 (可选)
-        
+            cancel_token: 取消标记 (可选，需提供 on_cancel / raise_if_cancelled，
+                          如 echuu.live.cancel.CancelToken)。取消时关闭 realtime 连接并抛出异常
+            on_audio: 音频分片回调 (可选，在合成线程里调用)。realtime 模型收到
+                      response.audio.delta 即回调（response_format 为 pcm 时是原始 PCM）；
+                      非 realtime 模型合成完成后回调一次完整音频
+
         Returns:
             音频二进制数据
         """
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
         if self._is_realtime_model():
-            return self._synthesize_realtime(text, save_path)
-        return self._synthesize_offline(text, save_path)
-    
-    def synthesize_streaming(self,
-                            texts: List[str],
-                            save_path: str = None,
-                            on_audio: Callable[[bytes], None] = None) -> bytes:
+            return self._synthesize_realtime(text, save_path, cancel_token, on_audio)
+        audio = self._synthesize_offline(text, save_path)
+        if on_audio and audio:
+            on_audio(audio)
+        return audio
+
+    def synthesize_streaming(
+        self,
+        texts: Iterable[str],
+        save_path: str = None,
+        on_audio: Callable[[bytes], None] = None,
+        cancel_token=None,
+    ) -> bytes:
         """
         双向流式语音合成
-        
+
         Args:
-            texts: 文本片段列表
+            texts: 文本片段（列表或迭代器；realtime 模型每取到一段立即发送，
+                   可以边生成文本边合成）
             save_path: 保存路径 (可选)
             on_audio: 音频数据回调函数
-        
+            cancel_token: 取消标记 (可选，同 synthesize)
+
         Returns:
             完整音频二进制数据
         """
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
         if self._is_realtime_model():
-            joined = "".join(texts)
-            return self._synthesize_realtime(joined, save_path)
+            return self._synthesize_realtime(texts, save_path, cancel_token, on_audio)
 
-        callback = TTSCallback(on_audio=on_audio, save_path=save_path)
+        started = time.perf_counter()
+        callback = TTSCallback(
+            on_audio=on_audio,
+            save_path=save_path,
+            on_first_chunk=lambda: self._observe("first_chunk", started),
+        )
 
         synthesizer = SpeechSynthesizer(
             model=self.model,
@@ -540,9 +664,10 @@ class CosyVoiceTTS:
 
         # 完成合成
         synthesizer.streaming_complete()
+        self._observe("total", started)
 
         return callback.get_audio()
-    
+
     def synthesize_with_callback(self,
                                 text: str,
                                 save_path: str = None,
@@ -561,7 +686,12 @@ class CosyVoiceTTS:
         if self._is_realtime_model():
             return self._synthesize_realtime(text, save_path)
 
-        callback = TTSCallback(on_audio=on_audio, save_path=save_path)
+        started = time.perf_counter()
+        callback = TTSCallback(
+            on_audio=on_audio,
+            save_path=save_path,
+            on_first_chunk=lambda: self._observe("first_chunk", started),
+        )
 
         synthesizer = SpeechSynthesizer(
             model=self.model,
@@ -571,6 +701,7 @@ class CosyVoiceTTS:
         )
 
         synthesizer.call(text)
+        self._observe("total", started)
 
         return callback.get_audio()
 
@@ -0,0 +1,234 @@
+"""
+直播间 WebSocket 协议（按连接协商版本）。
+
+客户端通过 /ws?room_id=...&protocol=N 选择版本，缺省为 v1：
+
+- v1: 与旧前端兼容。step 事件内联 base64 音频（audio_b64）。
+- v2: step 事件只带元数据，其中 audio 字段描述音频
+      {"seq", "bytes", "chunks", "mime", "url"}；音频本体随后以二进制帧发送，
+      客户端按 seq 拼接 chunk 即可播放。
+- v3: WebSocket 只传控制消息。step 事件的 audio 字段为 {"url", "bytes", "mime"}，
+      客户端通过 HTTP（GET /api/audio/{key}，支持 Range / ETag）取音频。
+
+所有版本的 step 事件都带 audio_url（没有音频时为 null）。
+
+流式音频（仅 v2）：TTS 边合成边推送时，v2 客户端先收到 step_start 事件
+{"step", "stage", "speech", "stream", "audio": {"seq", "mime": "audio/pcm", "sample_rate",
+"channels", "sample_width"}}，随后是该 seq 的 PCM 二进制帧（chunk_count 为 0，表示总数未知；
+最后一帧置 last 标志，chunk_count 为实际帧数，payload 可以为空），收到第一帧即可开始播放。
+合成完成后照常收到 step 事件，其 audio 字段带 "streamed": true，不再重复发送二进制帧。
+观众积压的流式音频超出字节预算时，服务端放弃该段剩余的帧并发送 stream_dropped 事件
+{"stream", "seq"}；客户端应停止拼接该 seq，改为播放 step 事件里 audio_url 指向的完整音频。
+弹幕回应边生成边合成时，step_start 的 speech 为空（台词要等 LLM 生成完才确定），
+以 step 事件里的 speech 为准。
+v1 / v3 客户端只收到完整的 step 事件。
+
+记忆同步：v1 每步收到完整的 memory 事件；v2+ 收到 memory_delta
+{"base", "version", "ops": [JSON Patch 风格操作]}，并定期收到带 version 的完整 memory
+快照。客户端本地版本与 base 不一致时应丢弃增量，等待下一个快照。
+
+观众弹幕按批次广播为 danmaku_batch 事件 {"items": [{"text", "user", "users", "count"}]}；
+v1 客户端收到的是展开后的逐条 danmaku 事件（合并的刷屏只发一条，附带 count）。
+
+二进制帧格式（网络字节序）::
+
+    magic        2 bytes  b"EA"
+    version      1 byte   协议版本（2）
+    flags        1 byte   bit0 = 最后一个 chunk
+    seq          4 bytes  音频序号，对应 step 事件里的 audio.seq
+    chunk_index  2 bytes
+    chunk_count  2 bytes
+    payload      音频数据（WAV 分片）
+
+每次广播只按实际在线的协议版本各编码一次，然后复用给该版本的所有连接。
+"""
+
+import base64
+import json
+import os
+import struct
+from typing import Collection, Dict, List, Optional, Union
+
+PROTOCOL_V1 = 1
+PROTOCOL_V2 = 2
+PROTOCOL_V3 = 3
+SUPPORTED_PROTOCOLS = (PROTOCOL_V1, PROTOCOL_V2, PROTOCOL_V3)
+DEFAULT_PROTOCOL = PROTOCOL_V1
+
+AUDIO_FRAME_MAGIC = b"EA"
+AUDIO_FRAME_HEADER = struct.Struct("!2sBBIHH")
+AUDIO_FLAG_LAST = 0x01
+AUDIO_MIME = "audio/wav"
+
+# 单个二进制帧的最大音频字节数；0 表示不分片
+AUDIO_CHUNK_BYTES = int(os.getenv("WS_AUDIO_CHUNK_BYTES", str(64 * 1024)))
+
+Frame = Union[str, bytes]
+
+# 只发给 v2 的流式音频事件
+STREAM_TYPES = frozenset({"step_start", "audio_chunk"})
+
+
+def parse_protocol(value: Optional[int]) -> int:
+    """把客户端请求的版本规范化为受支持的版本（未知版本回退到 v1）。"""
+    if value in SUPPORTED_PROTOCOLS:
+        return value
+    return DEFAULT_PROTOCOL
+
+
+def encode_json(data: dict) -> str:
+    """序列化 JSON 文本帧（datetime 等对象按 str 输出）。"""
+    return json.dumps(data, default=str, ensure_ascii=False)
+
+
+def split_chunks(audio: bytes, chunk_size: int = AUDIO_CHUNK_BYTES) -> List[bytes]:
+    if chunk_size <= 0 or len(audio) <= chunk_size:
+        return [audio]
+    return [audio[i : i + chunk_size] for i in range(0, len(audio), chunk_size)]
+
+
+def encode_stream_frame(seq: int, index: int, payload: bytes, last: bool = False) -> bytes:
+    """流式音频的一个二进制帧（总帧数未知，最后一帧才写入 chunk_count）。"""
+    header = AUDIO_FRAME_HEADER.pack(
+        AUDIO_FRAME_MAGIC,
+        PROTOCOL_V2,
+        AUDIO_FLAG_LAST if last else 0,
+        seq & 0xFFFFFFFF,
+        index & 0xFFFF,
+        (index + 1) & 0xFFFF if last else 0,
+    )
+    return header + payload
+
+
+def encode_audio_frames(seq: int, chunks: List[bytes]) -> List[bytes]:
+    """把音频分片编码成二进制帧。"""
+    count = len(chunks)
+    frames = []
+    for index, chunk in enumerate(chunks):
+        flags = AUDIO_FLAG_LAST if index == count - 1 else 0
+        header = AUDIO_FRAME_HEADER.pack(
+            AUDIO_FRAME_MAGIC, PROTOCOL_V2, flags, seq & 0xFFFFFFFF, index, count
+        )
+        frames.append(header + chunk)
+    return frames
+
+
+class OutboundEvent:
+    """
+    一次待广播的事件（JSON 元数据 + 可选音频）。
+
+    frames(protocol) 按版本懒编码并缓存，同一版本的所有连接共享编码结果。
+    """
+
+    def __init__(
+        self,
+        data: dict,
+        audio: Optional[bytes] = None,
+        audio_seq: int = 0,
+        audio_url: Optional[str] = None,
+        protocols: Optional[Collection[int]] = None,
+    ):
+        self.data = data
+        self.audio = audio
+        self.audio_seq = audio_seq
+        self.audio_url = audio_url
+        self.protocols = frozenset(protocols) if protocols else None
+        self._frames: Dict[int, List[Frame]] = {}
+
+    @property
+    def type(self) -> str:
+        return self.data.get("type", "")
+
+    def accepts(self, protocol: int) -> bool:
+        """事件是否发给该协议版本的连接（protocols 为空表示所有版本）。"""
+        return self.protocols is None or protocol in self.protocols
+
+    def frames(self, protocol: int) -> List[Frame]:
+        cached = self._frames.get(protocol)
+        if cached is None:
+            if protocol == PROTOCOL_V3:
+                cached = self._encode_v3()
+            elif protocol == PROTOCOL_V2:
+                cached = self._encode_v2()
+            else:
+                cached = self._encode_v1()
+            self._frames[protocol] = cached
+        return cached
+
+    def _encode_v1(self) -> List[Frame]:
+        if self.data.get("type") in STREAM_TYPES:
+            return []
+        if self.data.get("type") == "danmaku_batch":
+            return [
+                encode_json(
+                    {
+                        "type": "danmaku",
+                        "text": item.get("text", ""),
+                        "user": item.get("user", ""),
+                        "count": item.get("count", 1),
+                    }
+                )
+                for item in self.data.get("items", [])
+            ]
+        if self.data.get("type") != "step":
+            return [encode_json(self.data)]
+        audio_b64 = base64.b64encode(self.audio).decode("ascii") if self.audio else None
+        return [encode_json({**self.data, "audio_url": self.audio_url, "audio_b64": audio_b64})]
+
+    def _encode_v2(self) -> List[Frame]:
+        event_type = self.data.get("type")
+        if event_type == "audio_chunk":
+            return [
+                encode_stream_frame(
+                    self.audio_seq,
+                    self.data.get("index", 0),
+                    self.audio or b"",
+                    self.data.get("last", False),
+                )
+            ]
+        if event_type == "step_start":
+            return [
+                encode_json(
+                    {**self.data, "audio": {**self.data.get("audio", {}), "seq": self.audio_seq}}
+                )
+            ]
+        if event_type != "step":
+            return [encode_json(self.data)]
+        if self.audio and self.data.get("stream") is not None:
+            # 音频已经以流式二进制帧发过
+            meta = {
+                "seq": self.audio_seq,
+                "bytes": len(self.audio),
+                "chunks": 0,
+                "mime": AUDIO_MIME,
+                "url": self.audio_url,
+                "streamed": True,
+            }
+            return [encode_json({**self.data, "audio_url": self.audio_url, "audio": meta})]
+        if not self.audio:
+            return [encode_json({**self.data, "audio_url": self.audio_url, "audio": None})]
+        chunks = split_chunks(self.audio)
+        meta = {
+            "seq": self.audio_seq,
+            "bytes": len(self.audio),
+            "chunks": len(chunks),
+            "mime": AUDIO_MIME,
+            "url": self.audio_url,
+        }
+        return [
+            encode_json({**self.data, "audio_url": self.audio_url, "audio": meta})
+        ] + encode_audio_frames(self.audio_seq, chunks)
+
+    def _encode_v3(self) -> List[Frame]:
+        if self.data.get("type") in STREAM_TYPES:
+            return []
+        if self.data.get("type") != "step":
+            return [encode_json(self.data)]
+        meta = None
+        if self.audio_url:
+            meta = {
+                "url": self.audio_url,
+                "bytes": len(self.audio) if self.audio else None,
+                "mime": AUDIO_MIME,
+            }
+        return [encode_json({**self.data, "audio_url": self.audio_url, "audio": meta})]
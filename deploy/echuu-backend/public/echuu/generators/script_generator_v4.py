@@ -4,6 +4,7 @@ ScriptGeneratorV4 - 整合所有新组件的主生成器
 
 import json
 import re
+from contextlib import contextmanager
 from typing import List, Dict, Optional, Any
 from dataclasses import dataclass, field
 
@@ -25,7 +26,8 @@ from ..core.performer_cue import (
     infer_emotion_from_text,
 )
 from ..vrm.presets import get_gesture_for_stage, GESTURE_PRESETS
-
+from ..live.llm_context import llm_call_site
+from ..live.metrics import SCRIPT_PHASE_SECONDS, llm_labels
 
 @dataclass
 class ScriptLineV4:
@@ -240,7 +242,8 @@ class ScriptGeneratorV4_1:
                 on_phase_callback(msg)
 
         log_phase("Phase -1: 确定故事内核...")
-        nucleus = self.story_nucleus.generate_nucleus(topic, character_config)
+        with self._phase_timer("nucleus"):
+            nucleus = self.story_nucleus.generate_nucleus(topic, character_config)
         log_phase(f"   内核: {nucleus['pattern_name']}")
         log_phase(f"   分享欲: {nucleus['sharing_urge']['description']}")
         log_phase(f"   反常点: {nucleus['abnormality']['description']}")
@@ -253,7 +256,8 @@ class ScriptGeneratorV4_1:
         log_phase(f"   开场: {trigger['filled'][:50]}...")
 
         log_phase("Phase 1: 建立沉浸状态...")
-        immersion = self._build_immersion(name, persona, topic, trigger)
+        with self._phase_timer("immersion"):
+            immersion = self._build_immersion(name, persona, topic, trigger)
         log_phase(f"   沉浸: {immersion[:100]}...")
 
         primary_emotion = self._infer_emotion(topic, background)
@@ -322,15 +326,17 @@ class ScriptGeneratorV4_1:
 - 只输出JSON数组
 """
 
-        response = self.llm.call(user_prompt, system=system, max_tokens=8000)
+        with self._phase_timer("main_llm"):
+            response = self.llm.call(user_prompt, system=system, max_tokens=8000)
         lines = self._parse_response(response, trigger["type"])
         lines = self._ensure_min_units(lines, trigger["type"], min_units, max_units, user_prompt, system)
 
         log_phase("Phase 3: 结构破坏...")
         lines_dict = [self._line_to_dict(line) for line in lines]
-        broken_lines_dict = self.structure_breaker.break_structure(
-            lines_dict, topic, language, character_config
-        )
+        with self._phase_timer("structure_break"):
+            broken_lines_dict = self.structure_breaker.break_structure(
+                lines_dict, topic, language, character_config
+            )
         if len(broken_lines_dict) < min_units:
             log_phase("结构破坏后单元数过少，保留原始结构。")
         else:
@@ -341,6 +347,12 @@ class ScriptGeneratorV4_1:
         log_phase(f"生成完成，共 {len(result)} 个单元")
         return result
 
+    @contextmanager
+    def _phase_timer(self, phase: str):
+        """记录生成阶段耗时（echuu_script_phase_seconds），并把阶段名作为 LLM 调用点（供缓存按调用点启用）。"""
+        with SCRIPT_PHASE_SECONDS.time(phase=phase, **llm_labels(self.llm)), llm_call_site(phase):
+            yield
+
     def _build_immersion(self, name: str, persona: str, topic: str, trigger: dict) -> str:
         """构建沉浸状态描述"""
         prompt = f"""你是{name}，{persona}。
@@ -531,7 +543,8 @@ class ScriptGeneratorV4_1:
 原始要求如下：
 {original_prompt}
 """
-        response = self.llm.call(retry_prompt, system=system, max_tokens=8000)
+        with self._phase_timer("min_units_retry"):
+            response = self.llm.call(retry_prompt, system=system, max_tokens=8000)
         retry_lines = self._parse_response(response, trigger_type)
         if len(retry_lines) >= min_units:
             return retry_lines
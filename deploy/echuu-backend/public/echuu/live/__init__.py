@@ -8,6 +8,7 @@ This module contains:
 - TTSClient: Text-to-speech synthesis
 - State classes: Danmaku, PerformerMemory, PerformanceState
 - Danmaku handling: DanmakuHandler, DanmakuEvaluator
+- SharedResources: Process-wide corpora, indexes and SDK clients
 """
 
 from .engine import EchuuLiveEngine
@@ -17,6 +18,7 @@ from .tts_client import TTSClient
 from .state import Danmaku, PerformerMemory, PerformanceState
 from .danmaku import DanmakuHandler, DanmakuEvaluator
 from .response_generator import DanmakuResponseGenerator
+from .resources import SharedResources, get_shared_resources
 
 __all__ = [
     "EchuuLiveEngine",
@@ -29,4 +31,6 @@ __all__ = [
     "DanmakuHandler",
     "DanmakuEvaluator",
     "DanmakuResponseGenerator",
+    "SharedResources",
+    "get_shared_resources",
 ]
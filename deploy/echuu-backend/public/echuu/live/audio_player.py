@@ -3,12 +3,12 @@
 """
 
 import os
-import random
 import subprocess
 import time
 from pathlib import Path
 from typing import Optional
 
+from .pacing import natural_pause
 
 class AudioPlayer:
     """
@@ -39,23 +39,9 @@ class AudioPlayer:
             stage: 剧本阶段（Hook, Build-up, Climax, Resolution等）
 
         Returns:
-            停顿秒数（1-5秒）
+            停顿秒数（0.3-5秒）
         """
-        # 不同阶段有不同的停顿模式
-        pause_map = {
-            "Hook": (1.5, 3.0),      # 开场：较短停顿，保持吸引力
-            "Build-up": (2.0, 4.0),   # 铺垫：中等停顿
-            "But": (0.5, 1.5),        # 转折点：很短的停顿制造悬念
-            "Contradiction": (1.0, 2.0),  # 矛盾：短停顿
-            "Example": (2.5, 4.5),    # 举例：较长停顿
-            "Climax": (0.3, 1.0),     # 高潮：极短停顿，保持紧张
-            "Resolution": (3.0, 5.0), # 结尾：较长停顿，自然收尾
-            "Tangent": (2.0, 3.5),    # 跑题：中等停顿
-            "Inner-monologue": (2.5, 4.5),  # 独白：较长停顿，思考感
-        }
-
-        min_pause, max_pause = pause_map.get(stage, (1.5, 3.5))
-        return random.uniform(min_pause, max_pause)
+        return natural_pause(stage)
 
     def play_audio(self, audio_data: bytes, stage: str = "", auto_close: bool = True) -> float:
         """
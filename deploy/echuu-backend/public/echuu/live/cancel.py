@@ -0,0 +1,159 @@
+"""
+协作式取消。
+
+一场直播对应一个 CancelToken（EchuuLiveEngine.cancel_token）。取消后：
+
+- 引擎在每步开始前、Performer 在 LLM 与 TTS 之间检查，抛出 Cancelled；
+- 异步路径用 guard() 等待工作线程里的 LLM / TTS，取消时立即放弃等待
+  （线程里的请求结果被丢弃，不再占用这场直播）；
+- LLM 客户端发请求前检查；realtime TTS 注册 on_cancel 回调，直接关闭 WebSocket。
+
+当前 token 通过 contextvars 传递（cancel_scope），asyncio.to_thread 会把上下文
+复制到工作线程，所以共享的 LLM 客户端也能看到发起调用的那场直播的 token。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Cancelled(BaseException):
+    """
+    直播被取消。
+
+    继承 BaseException（与 asyncio.CancelledError 相同），避免被各处
+    `except Exception` 兜底逻辑吞掉（例如 LLM 失败时退回默认回应）。
+    """
+
+
+class CancelToken:
+    """线程安全的取消标记。"""
+
+    def __init__(self):
+        self.reason = ""
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """
+        取消并依次执行已注册的回调（只生效一次）。
+
+        Returns:
+            本次调用是否触发了取消。
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[cancel] callback error: {e}")
+        return True
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        注册取消回调（已取消时立即执行），返回注销函数。
+
+        回调在调用 cancel() 的线程里执行，应尽快返回。
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+
+                def unregister():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+
+                return unregister
+        callback()
+        return lambda: None
+
+    async def guard(self, awaitable: Awaitable[T]) -> T:
+        """
+        等待 awaitable，取消时立即放弃并抛出 Cancelled。
+
+        awaitable 先完成时优先返回它的结果。
+        """
+        if self.cancelled:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise Cancelled(self.reason)
+
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(awaitable)
+        waiter = loop.create_future()
+
+        def wake():
+            if not waiter.done():
+                waiter.set_result(None)
+
+        unregister = self.on_cancel(lambda: loop.call_soon_threadsafe(wake))
+        try:
+            await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            unregister()
+            waiter.cancel()
+
+        if task.done():
+            return task.result()
+        task.cancel()
+        raise Cancelled(self.reason)
+
+
+_current_token: ContextVar[Optional[CancelToken]] = ContextVar("echuu_cancel_token", default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    """当前上下文的取消标记（不在任何直播里时为 None）。"""
+    return _current_token.get()
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """在 with 块内把 token 设为当前取消标记。"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def raise_if_cancelled():
+    """当前上下文的直播已取消时抛出 Cancelled。"""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+async def guard(awaitable: Awaitable[T]) -> T:
+    """用当前上下文的 token 执行 CancelToken.guard；没有 token 时直接等待。"""
+    token = _current_token.get()
+    if token is None:
+        return await awaitable
+    return await token.guard(awaitable)
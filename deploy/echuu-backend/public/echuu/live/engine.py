@@ -5,35 +5,34 @@ echuu 实时引擎（解耦版，支持多语言）。
 
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import re
+import time
 from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
-from pathlib import Path
-from typing import Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
-from dotenv import load_dotenv
-
-from ..core.pattern_analyzer import PatternAnalyzer
-from ..generators.example_sampler import ExampleSampler
 from ..generators.script_generator_v4 import ScriptGeneratorV4
+from .cancel import CancelToken, cancel_scope
 from .danmaku import DanmakuEvaluator, DanmakuHandler
-from .llm_factory import create_llm_client
+from .llm_policy import (
+    default_llm_policies,
+    llm_policy_scope,
+    merge_llm_policies,
+    parse_llm_policies,
+)
+from .lookahead import TTSPrefetcher
 from .performer import PerformerV3
+from .resources import SharedResources, get_shared_resources
 from .state import Danmaku, PerformanceState, PerformerMemory
 from .tts_client import TTSClient
 from .language import setup_stream_language_from_topic, StreamLanguageContext
 from .audio_player import StreamSimulator
 
 
-def _find_project_root() -> Path:
-    root = Path.cwd()
-    while root.name != "echuu-agent" and root.parent != root:
-        root = root.parent
-    return root
-
-
 class EchuuLiveEngine:
     """
     echuu 实时直播引擎（整合版）。
@@ -42,7 +41,16 @@ class EchuuLiveEngine:
     - Phase 2: 实时表演 + 记忆系统 + 弹幕互动
     """
 
-    def __init__(self, data_path: Optional[str] = None, llm_provider: Optional[str] = None):
+    def __init__(
+        self,
+        data_path: Optional[str] = None,
+        llm_provider: Optional[str] = None,
+        resources: Optional[SharedResources] = None,
+        voice: Optional[str] = None,
+        cancel_token: Optional[CancelToken] = None,
+        lookahead: Optional[int] = None,
+        llm_policy: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
         """
         初始化 echuu 实时引擎。
 
@@ -50,33 +58,51 @@ class EchuuLiveEngine:
             data_path: 数据文件路径（可选）。
             llm_provider: LLM 提供商 ("gemini", "claude", "openai")。
                           如果未指定，根据可用的 API Key 自动选择。
+            resources: 共享资源（可选，默认从进程级注册表懒加载）。
+            voice: 本场直播的 TTS 音色（可选，默认 TTS_VOICE 环境变量）。
+            cancel_token: 取消标记（可选）。取消后剧本生成与表演在下一个检查点抛出 Cancelled，
+                          进行中的 LLM / TTS 请求被放弃或关闭。
+            lookahead: 异步表演时预取后面几句台词的 TTS（默认 TTS_LOOKAHEAD 环境变量，0 关闭）。
+            llm_policy: 本场直播覆盖的调用点 LLM 策略，如 {"danmaku_reply": {"thinking_level": "minimal"}}
+                        （逐字段覆盖进程默认策略，见 llm_policy；格式不对时抛出 ValueError）。
         """
-        self.project_root = _find_project_root()
-        load_dotenv(self.project_root / ".env")
-
-        self.llm = create_llm_client(provider=llm_provider)
-        self.tts = TTSClient()
+        self.cancel_token = cancel_token or CancelToken()
+        self.llm_policies = (
+            merge_llm_policies(default_llm_policies(), parse_llm_policies(llm_policy))
+            if llm_policy
+            else None
+        )
+        self.resources = resources or get_shared_resources(
+            data_path=data_path, llm_provider=llm_provider
+        )
+        self.project_root = self.resources.project_root
 
-        self.analyzer = None
-        data_file = Path(data_path) if data_path else self.project_root / "data" / "annotated_clips.json"
-        if data_file.exists():
-            with data_file.open("r", encoding="utf-8") as f:
-                clips = json.load(f)
-            self.analyzer = PatternAnalyzer(clips)
+        self.llm = self.resources.llm
+        self.tts = TTSClient(voice=voice, cosyvoice_cls=self.resources.cosyvoice_cls)
 
-        clips_file = self.project_root / "data" / "vtuber_raw_clips_for_notebook_full_30_cleaned.jsonl"
-        self.example_sampler = ExampleSampler(str(clips_file)) if clips_file.exists() else None
+        self.analyzer = self.resources.analyzer
+        self.example_sampler = self.resources.example_sampler
 
         self.script_gen = ScriptGeneratorV4(self.llm, self.example_sampler)
         self.danmaku_handler = DanmakuHandler(DanmakuEvaluator())
-        self.performer = PerformerV3(self.llm, self.tts, self.danmaku_handler)
+        self.performer = PerformerV3(
+            self.llm, self.tts, self.danmaku_handler, hedge_llm=self.resources.hedge_llm
+        )
+        if lookahead is None:
+            lookahead = int(os.getenv("TTS_LOOKAHEAD", "1"))
+        self.prefetcher = TTSPrefetcher(self.tts, depth=lookahead)
 
-        self.scripts_dir = self.project_root / "output" / "scripts"
-        self.scripts_dir.mkdir(parents=True, exist_ok=True)
+        self.scripts_dir = self.resources.scripts_dir
 
         self.state: Optional[PerformanceState] = None
         self.stream_lang_context: Optional[StreamLanguageContext] = None
 
+    @contextmanager
+    def _call_scope(self):
+        """本场直播的 LLM / TTS 调用上下文：取消标记与 LLM 策略。"""
+        with cancel_scope(self.cancel_token), llm_policy_scope(self.llm_policies):
+            yield
+
     @staticmethod
     def _sanitize_filename(value: str) -> str:
         if not value:
@@ -97,19 +123,55 @@ class EchuuLiveEngine:
     ) -> PerformanceState:
         """设置表演参数并生成剧本。"""
         # 在这里我们可以捕获推理过程并传给回调
-        self.state = self.create_performance(
-            name=name,
-            persona=persona,
-            background=background,
-            topic=topic,
-            language=language,
-            character_config=character_config,
-            on_phase_callback=on_phase_callback,
-        )
+        with self._call_scope():
+            self.cancel_token.raise_if_cancelled()
+            self.state = self.create_performance(
+                name=name,
+                persona=persona,
+                background=background,
+                topic=topic,
+                language=language,
+                character_config=character_config,
+                on_phase_callback=on_phase_callback,
+            )
         print(f"\n表演设置完成: {name} - {topic}")
         print(f"剧本行数: {len(self.state.script_lines)}")
         return self.state
 
+    async def asetup(
+        self,
+        name: str,
+        persona: str,
+        topic: str,
+        background: str = "",
+        language: str = "zh",
+        character_config: Optional[dict] = None,
+        on_phase_callback: Optional[callable] = None,
+    ) -> PerformanceState:
+        """
+        setup 的异步版本。
+
+        剧本生成包含多次阻塞的 LLM 调用，放到工作线程执行，避免卡住事件循环
+        （同一进程里的其他直播间 / WebSocket 可以继续收发）。取消时立即返回，
+        工作线程在下一次 LLM 调用前退出。
+        """
+        return await self.cancel_token.guard(
+            asyncio.to_thread(
+                self.setup,
+                name=name,
+                persona=persona,
+                topic=topic,
+                background=background,
+                language=language,
+                character_config=character_config,
+                on_phase_callback=on_phase_callback,
+            )
+        )
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """请求停止本场直播（线程安全，可从任意线程调用）。"""
+        return self.cancel_token.cancel(reason)
+
     def create_performance(
         self,
         name: str,
@@ -151,13 +213,15 @@ class EchuuLiveEngine:
         memory.script_progress["current_stage"] = script_lines[0].stage if script_lines else "Unknown"
         for line in script_lines:
             memory.story_points["upcoming"].extend(line.key_info)
+        memory.mark_dirty("script_progress", "story_points")
 
         # 更新performer以使用语言上下文
         self.performer = PerformerV3(
             self.llm,
             self.tts,
             self.danmaku_handler,
-            stream_lang_context=self.stream_lang_context
+            stream_lang_context=self.stream_lang_context,
+            hedge_llm=self.resources.hedge_llm,
         )
 
         return PerformanceState(
@@ -190,6 +254,84 @@ class EchuuLiveEngine:
             convert_to_mp3: 是否转换为 MP3（默认 True，减小文件大小）
             live_danmaku_getter: 每步调用 (step) -> [{"text", "user"}, ...]，用于注入直播间实时弹幕
         """
+        danmaku_by_step = self._begin_run(danmaku_sim, save_audio, convert_to_mp3)
+
+        total_steps = min(max_steps, len(self.state.script_lines))
+        for step in range(total_steps):
+            self.cancel_token.raise_if_cancelled()
+            new_danmaku = self._collect_danmaku(step, danmaku_by_step, live_danmaku_getter)
+            with self._call_scope():
+                result = self.performer.step(self.state, new_danmaku)
+            self._log_step(result, play_audio)
+
+            yield result
+
+            if result.get("action", "continue") == "end":
+                break
+
+        self._save_run_recording(save_audio, convert_to_mp3)
+        self._print_run_summary()
+
+    async def arun(
+        self,
+        max_steps: int = 12,
+        danmaku_sim: Optional[List[Dict]] = None,
+        play_audio: bool = False,
+        save_audio: bool = False,
+        convert_to_mp3: bool = True,
+        live_danmaku_getter: Optional[Callable[[int], List[Dict]]] = None,
+        stream_audio: bool = False,
+    ):
+        """
+        运行表演（异步生成器），其余参数与 run 相同。
+
+        stream_audio 为 True 时，TTS 支持流式的步骤不等合成完成就产出：audio 为 None，
+        audio_stream 为 AudioStream（调用方需在取下一步之前读完它）。
+        每步结果带 started_at（time.perf_counter()，本步开始处理的时间），用于统计首音频延迟。
+
+        每步通过 PerformerV3.astep 执行，LLM / TTS 等待期间事件循环可以继续
+        处理其他直播间，供 FastAPI 后端在单进程内驱动多个房间。
+        每步产出后立即预取后面的台词 TTS，与本步的播放重叠（见 TTSPrefetcher）。
+        取消时抛出 Cancelled，不再保存录音。
+        """
+        danmaku_by_step = self._begin_run(danmaku_sim, save_audio, convert_to_mp3)
+
+        total_steps = min(max_steps, len(self.state.script_lines))
+        try:
+            for step in range(total_steps):
+                self.cancel_token.raise_if_cancelled()
+                new_danmaku = self._collect_danmaku(step, danmaku_by_step, live_danmaku_getter)
+                started_at = time.perf_counter()
+                with self._call_scope():
+                    self.prefetcher.schedule(self.state)
+                    result = await self.cancel_token.guard(
+                        self.performer.astep(
+                            self.state, new_danmaku, self.prefetcher, stream=stream_audio
+                        )
+                    )
+                    if step + 1 < total_steps and result.get("action", "continue") != "end":
+                        self.prefetcher.schedule(self.state)
+                result["started_at"] = started_at
+                self._log_step(result, play_audio)
+
+                yield result
+
+                if result.get("action", "continue") == "end":
+                    break
+        finally:
+            self.prefetcher.close()
+
+        # 合并 / 转码录音是 CPU 密集操作，同样不能放在事件循环里
+        await asyncio.to_thread(self._save_run_recording, save_audio, convert_to_mp3)
+        self._print_run_summary()
+
+    def _begin_run(
+        self,
+        danmaku_sim: Optional[List[Dict]],
+        save_audio: bool,
+        convert_to_mp3: bool,
+    ) -> Dict[int, List[Danmaku]]:
+        """校验状态、整理模拟弹幕并开始录制。"""
         if not self.state:
             raise RuntimeError("请先调用 setup() 或 create_performance()")
 
@@ -210,65 +352,74 @@ class EchuuLiveEngine:
             print(f"正在录制... (输出格式: {'MP3' if convert_to_mp3 else 'WAV'})")
         print(f"{'='*60}\n")
 
-        total_steps = min(max_steps, len(self.state.script_lines))
-        for step in range(total_steps):
-            new_danmaku = list(danmaku_by_step.get(step, []))
-            if live_danmaku_getter:
-                for dm in live_danmaku_getter(step):
-                    text = dm.get("text", "")
-                    user = dm.get("user", "观众")
-                    if text:
-                        new_danmaku.append(Danmaku.from_text(text, user=user))
-            result = self.performer.step(self.state, new_danmaku)
-
-            step_num = result.get("step", 0)
-            stage = result.get("stage", "?")
-            action = result.get("action", "continue")
-            speech = result.get("speech", "")
-
-            action_icons = {
-                "continue": "[CONT]",
-                "tease": "[TEASE]",
-                "jump": "[JUMP]",
-                "improvise": "[IMPROV]",
-                "end": "[END]",
-            }
-            icon = action_icons.get(action, "[CONT]")
-
-            print(f"[Step {step_num}] {stage} {icon} {action.upper()}")
-            print(f"  Speech: {speech[:100]}{'...' if len(speech) > 100 else ''}")
-
-            if result.get("danmaku"):
-                print(f"  Danmaku: {result['danmaku']}")
-                print(
-                    "  priority={:.2f}, cost={:.2f}, relevance={:.2f}".format(
-                        result.get("priority", 0),
-                        result.get("cost", 0),
-                        result.get("relevance", 0),
-                    )
-                )
+        return danmaku_by_step
 
-            if isinstance(result.get("emotion_break"), dict):
-                level = result["emotion_break"].get("level", 0)
-                level_name = {1: "微破防", 2: "明显破防", 3: "完全破防"}.get(level, f"L{level}")
-                trigger = result["emotion_break"].get("trigger", "")
-                print(f"  情绪断点: {level_name} - {trigger}")
-            if result.get("disfluencies"):
-                print(f"  认知特征: {', '.join(result['disfluencies'])}")
+    @staticmethod
+    def _collect_danmaku(
+        step: int,
+        danmaku_by_step: Dict[int, List[Danmaku]],
+        live_danmaku_getter: Optional[Callable[[int], List[Dict]]],
+    ) -> List[Danmaku]:
+        """合并本步的模拟弹幕与直播间实时弹幕。"""
+        new_danmaku = list(danmaku_by_step.get(step, []))
+        if live_danmaku_getter:
+            for dm in live_danmaku_getter(step):
+                text = dm.get("text", "")
+                user = dm.get("user", "观众")
+                if text:
+                    new_danmaku.append(Danmaku.from_text(text, user=user))
+        return new_danmaku
 
-            if step_num % 3 == 0:
-                print(f"\n{result.get('memory_display', '')}")
+    @staticmethod
+    def _log_step(result: Dict, play_audio: bool):
+        """打印单步表演日志。"""
+        step_num = result.get("step", 0)
+        stage = result.get("stage", "?")
+        action = result.get("action", "continue")
+        speech = result.get("speech", "")
+        if not speech and result.get("audio_stream") is not None:
+            speech = "（弹幕回应流式生成中）"
+
+        action_icons = {
+            "continue": "[CONT]",
+            "tease": "[TEASE]",
+            "jump": "[JUMP]",
+            "improvise": "[IMPROV]",
+            "end": "[END]",
+        }
+        icon = action_icons.get(action, "[CONT]")
+
+        print(f"[Step {step_num}] {stage} {icon} {action.upper()}")
+        print(f"  Speech: {speech[:100]}{'...' if len(speech) > 100 else ''}")
+
+        if result.get("danmaku"):
+            print(f"  Danmaku: {' / '.join(result.get('danmaku_batch') or [result['danmaku']])}")
+            print(
+                "  priority={:.2f}, cost={:.2f}, relevance={:.2f}".format(
+                    result.get("priority", 0),
+                    result.get("cost", 0),
+                    result.get("relevance", 0),
+                )
+            )
 
-            if play_audio and result.get("audio"):
-                print("  语音已生成")
+        if isinstance(result.get("emotion_break"), dict):
+            level = result["emotion_break"].get("level", 0)
+            level_name = {1: "微破防", 2: "明显破防", 3: "完全破防"}.get(level, f"L{level}")
+            trigger = result["emotion_break"].get("trigger", "")
+            print(f"  情绪断点: {level_name} - {trigger}")
+        if result.get("disfluencies"):
+            print(f"  认知特征: {', '.join(result['disfluencies'])}")
 
-            print()
+        if step_num % 3 == 0:
+            print(f"\n{result.get('memory_display', '')}")
 
-            yield result
+        if play_audio and result.get("audio"):
+            print("  语音已生成")
 
-            if action == "end":
-                break
+        print()
 
+    def _save_run_recording(self, save_audio: bool, convert_to_mp3: bool):
+        """保存整场录音。"""
         if save_audio and self.tts.enabled:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             # 默认使用 .wav 扩展名（会自动转换为 mp3）
@@ -280,12 +431,15 @@ class EchuuLiveEngine:
             # 保存并转换
             self.tts.save_recording(str(audio_path), convert_to_mp3=convert_to_mp3, keep_wav=False)
 
+    def _print_run_summary(self):
         print(f"\n{'='*60}")
         print("表演结束！")
         print(f"{'='*60}\n")
 
         print("最终记忆状态：")
         print(self.state.memory.to_display())
+        if self.prefetcher.stats.prefetched:
+            print(f"TTS 预取: {self.prefetcher.stats.to_dict()}")
 
     def run_streaming(
         self,
@@ -371,6 +525,13 @@ class EchuuLiveEngine:
             json.dump(script_data, f, ensure_ascii=False, indent=2)
         print(f"剧本已保存: {filepath}")
 
+        if self.resources.script_index is not None:
+            try:
+                self.resources.script_index.upsert_file(filepath)
+            except Exception as e:
+                # 索引失败不影响开播，下次启动对账时会补上
+                print(f"[warn] 剧本索引更新失败: {e}")
+
     def _print_script_preview(self, script_lines):
         """打印剧本预览。"""
         print("\n生成的剧本：")
@@ -6,8 +6,18 @@ Supports Gemini 3 Pro, Flash, and Image generation models.
 from __future__ import annotations
 
 import os
-from typing import Optional, Literal
-
+import time
+from typing import AsyncIterator, Dict, Iterator, Literal, Optional, Tuple
+
+from .cancel import raise_if_cancelled
+from .llm_context import record_llm_usage, remaining_budget
+from .llm_policy import resolve_llm_policy
+from .metrics import (
+    observe_llm_arequest,
+    observe_llm_astream,
+    observe_llm_request,
+    observe_llm_stream,
+)
 
 # Valid thinking levels for Gemini 3
 ThinkingLevel = Literal["low", "medium", "high", "minimal"]
@@ -24,6 +34,8 @@ MediaResolution = Literal[
 class GeminiClient:
     """Google Gemini LLM 客户端（支持 Gemini 3）。"""
 
+    provider = "gemini"
+
     # Gemini 3 model constants
     MODEL_GEMINI_3_PRO = "gemini-3-pro-preview"
     MODEL_GEMINI_3_FLASH = "gemini-3-flash-preview"
@@ -38,6 +50,7 @@ class GeminiClient:
         api_key: Optional[str] = None,
         model: Optional[str] = None,
         thinking_level: Optional[ThinkingLevel] = None,
+        retry_empty: Optional[bool] = None,
     ):
         """
         Initialize Gemini client.
@@ -50,10 +63,16 @@ class GeminiClient:
                 - "high": Maximum reasoning depth (default for Gemini 3 Pro/Flash)
                 - "medium": Balanced (Gemini 3 Flash only)
                 - "minimal": Fastest, minimal thinking (Gemini 3 Flash only)
+            retry_empty: Retry an empty low/minimal-thinking response once with high thinking
+                (defaults to GEMINI_RETRY_EMPTY, on). Skipped anyway when the call's latency
+                budget (llm_budget) cannot cover a second attempt.
         """
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         self.model = model or os.getenv("GEMINI_MODEL", "gemini-3-flash-preview")
         self.thinking_level = thinking_level
+        if retry_empty is None:
+            retry_empty = os.getenv("GEMINI_RETRY_EMPTY", "1").lower() not in ("0", "false", "no")
+        self.retry_empty = retry_empty
         self.client = None
 
         if self.api_key:
@@ -72,6 +91,67 @@ class GeminiClient:
         # Determine if this is a Gemini 3 model
         self._is_gemini3 = self.model.startswith("gemini-3-")
 
+    def _config_kwargs(
+        self,
+        max_tokens: int,
+        thinking_level: Optional[ThinkingLevel],
+        temperature: Optional[float],
+    ) -> Tuple[str, Dict, Optional[str]]:
+        """按当前调用点的策略（llm_policy）生成 (实际使用的模型, 配置参数, 实际使用的 thinking level)。"""
+        from google.genai import types
+
+        model, max_tokens, thinking_level = resolve_llm_policy(
+            self.provider, self.model, max_tokens, thinking_level
+        )
+        is_gemini3 = model.startswith("gemini-3-")
+        config_kwargs = {}
+
+        if max_tokens:
+            config_kwargs["max_output_tokens"] = max_tokens
+
+        # Set thinking level for Gemini 3 models
+        effective_thinking = thinking_level or self.thinking_level
+
+        # For Gemini 3, if no thinking level is set, default to high
+        if is_gemini3 and not effective_thinking:
+            effective_thinking = "high"
+
+        if is_gemini3 and effective_thinking:
+            config_kwargs["thinking_config"] = types.ThinkingConfig(
+                thinking_level=effective_thinking
+            )
+
+        # Set temperature if specified (use with caution on Gemini 3)
+        if temperature is not None:
+            config_kwargs["temperature"] = temperature
+
+        return model, config_kwargs, effective_thinking
+
+    @staticmethod
+    def _record_usage(model: str, response) -> None:
+        """记录一次响应的 token 用量（prompt / 输出 / thinking）。"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        record_llm_usage(
+            "gemini",
+            model,
+            input_tokens=getattr(usage, "prompt_token_count", None) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", None) or 0,
+            thinking_tokens=getattr(usage, "thoughts_token_count", None) or 0,
+        )
+
+    @staticmethod
+    def _build_config(config_kwargs: Dict, system: Optional[str]):
+        from google.genai import types
+
+        config = types.GenerateContentConfig(**config_kwargs)
+        # Add system instruction if provided
+        if system:
+            config.system_instruction = system
+        return config
+
+    @observe_llm_request
     def call(
         self,
         prompt: str,
@@ -97,62 +177,117 @@ class GeminiClient:
         """
         if not self.client:
             raise RuntimeError("Gemini LLM 未初始化，无法调用")
+        # 所在直播已停止时不再发请求
+        raise_if_cancelled()
 
         try:
-            from google.genai import types
-
-            # Build generation config
-            config_kwargs = {}
-
-            if max_tokens:
-                config_kwargs["max_output_tokens"] = max_tokens
-
-            # Set thinking level for Gemini 3 models
-            effective_thinking = thinking_level or self.thinking_level
+            model, config_kwargs, effective_thinking = self._config_kwargs(
+                max_tokens, thinking_level, temperature
+            )
+            config = self._build_config(config_kwargs, system)
 
-            # For Gemini 3, if no thinking level is set, default to high
-            if self._is_gemini3 and not effective_thinking:
-                effective_thinking = "high"
+            started = time.monotonic()
+            response = self.client.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=config,
+            )
+            self._record_usage(model, response)
 
-            if self._is_gemini3 and effective_thinking:
-                config_kwargs["thinking_config"] = types.ThinkingConfig(
-                    thinking_level=effective_thinking
+            # Handle empty responses (can happen with minimal thinking)
+            result_text = response.text
+            retry_config = self._empty_retry_config(
+                result_text, config_kwargs, effective_thinking, system, time.monotonic() - started
+            )
+            if retry_config is not None:
+                raise_if_cancelled()
+                response = self.client.models.generate_content(
+                    model=model,
+                    contents=prompt,
+                    config=retry_config,
                 )
+                self._record_usage(model, response)
+                result_text = response.text
 
-            # Set temperature if specified (use with caution on Gemini 3)
-            if temperature is not None:
-                config_kwargs["temperature"] = temperature
+            if not result_text:
+                raise RuntimeError("Gemini 返回空响应")
 
-            config = types.GenerateContentConfig(**config_kwargs)
+            return result_text
+        except Exception as exc:
+            raise RuntimeError(f"Gemini LLM 调用失败: {exc}") from exc
 
-            # Add system instruction if provided
-            if system:
-                config.system_instruction = system
+    def _empty_retry_config(
+        self,
+        result_text: Optional[str],
+        config_kwargs: Dict,
+        effective_thinking: Optional[str],
+        system: Optional[str],
+        elapsed: float,
+    ):
+        """空响应时用更高 thinking level 重试的配置；不需要 / 不能重试时返回 None。"""
+        if result_text and result_text.strip():
+            return None
+        # Retry with higher thinking level
+        # 只有 Gemini 3（配置里带 thinking_config）才有 thinking level 可调
+        if not (
+            self.retry_empty
+            and "thinking_config" in config_kwargs
+            and effective_thinking in ["low", "minimal"]
+        ):
+            return None
+        # 剩余预算不够再来一次（high thinking 只会更慢）时直接失败，交给调用方对冲 / 兜底
+        remaining = remaining_budget()
+        if remaining is not None and remaining < elapsed:
+            print(f"[Gemini] 收到空响应，剩余预算 {remaining:.2f}s 不足以重试")
+            return None
+        print(f"[Gemini] 收到空响应，thinking_level={effective_thinking}，重试中...")
+        from google.genai import types
+
+        config_kwargs["thinking_config"] = types.ThinkingConfig(thinking_level="high")
+        return self._build_config(config_kwargs, system)
+
+    @observe_llm_arequest
+    async def acall(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        max_tokens: int = 1000,
+        thinking_level: Optional[ThinkingLevel] = None,
+        temperature: Optional[float] = None,
+    ) -> str:
+        """
+        call 的异步版本（client.aio，共享 genai 客户端的异步连接池，不占用工作线程）。
+        """
+        if not self.client:
+            raise RuntimeError("Gemini LLM 未初始化，无法调用")
+        raise_if_cancelled()
 
-            response = self.client.models.generate_content(
-                model=self.model,
+        try:
+            model, config_kwargs, effective_thinking = self._config_kwargs(
+                max_tokens, thinking_level, temperature
+            )
+            config = self._build_config(config_kwargs, system)
+
+            started = time.monotonic()
+            response = await self.client.aio.models.generate_content(
+                model=model,
                 contents=prompt,
                 config=config,
             )
-
-            # Handle empty responses (can happen with minimal thinking)
+            self._record_usage(model, response)
             result_text = response.text
-            if not result_text or result_text.strip() == "":
-                print(f"[Gemini] 收到空响应，thinking_level={effective_thinking}，重试中...")
-                # Retry with higher thinking level
-                if self._is_gemini3 and effective_thinking in ["low", "minimal"]:
-                    config_kwargs["thinking_config"] = types.ThinkingConfig(
-                        thinking_level="high"
-                    )
-                    config = types.GenerateContentConfig(**config_kwargs)
-                    if system:
-                        config.system_instruction = system
-                    response = self.client.models.generate_content(
-                        model=self.model,
-                        contents=prompt,
-                        config=config,
-                    )
-                    result_text = response.text
+            retry_config = self._empty_retry_config(
+                result_text, config_kwargs, effective_thinking, system, time.monotonic() - started
+            )
+            if retry_config is not None:
+                raise_if_cancelled()
+                response = await self.client.aio.models.generate_content(
+                    model=model,
+                    contents=prompt,
+                    config=retry_config,
+                )
+                self._record_usage(model, response)
+                result_text = response.text
 
             if not result_text:
                 raise RuntimeError("Gemini 返回空响应")
@@ -161,6 +296,88 @@ class GeminiClient:
         except Exception as exc:
             raise RuntimeError(f"Gemini LLM 调用失败: {exc}") from exc
 
+    @observe_llm_stream
+    def stream(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        max_tokens: int = 1000,
+        thinking_level: Optional[ThinkingLevel] = None,
+        temperature: Optional[float] = None,
+    ) -> Iterator[str]:
+        """
+        流式调用 Gemini，逐个产出文本分片（generate_content_stream）。
+
+        与 call 不同，空响应不会重试：已经产出的分片无法撤回。直播停止时在分片之间中断。
+        """
+        if not self.client:
+            raise RuntimeError("Gemini LLM 未初始化，无法调用")
+        raise_if_cancelled()
+
+        try:
+            model, config_kwargs, _ = self._config_kwargs(max_tokens, thinking_level, temperature)
+            config = self._build_config(config_kwargs, system)
+            produced = False
+            usage_chunk = None
+            for chunk in self.client.models.generate_content_stream(
+                model=model,
+                contents=prompt,
+                config=config,
+            ):
+                raise_if_cancelled()
+                # usage_metadata 在最后的分片里才是完整的
+                if getattr(chunk, "usage_metadata", None) is not None:
+                    usage_chunk = chunk
+                text = chunk.text
+                if text:
+                    produced = True
+                    yield text
+            if usage_chunk is not None:
+                self._record_usage(model, usage_chunk)
+            if not produced:
+                raise RuntimeError("Gemini 返回空响应")
+        except Exception as exc:
+            raise RuntimeError(f"Gemini LLM 调用失败: {exc}") from exc
+
+    @observe_llm_astream
+    async def astream(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        max_tokens: int = 1000,
+        thinking_level: Optional[ThinkingLevel] = None,
+        temperature: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """stream 的异步版本。"""
+        if not self.client:
+            raise RuntimeError("Gemini LLM 未初始化，无法调用")
+        raise_if_cancelled()
+
+        try:
+            model, config_kwargs, _ = self._config_kwargs(max_tokens, thinking_level, temperature)
+            config = self._build_config(config_kwargs, system)
+            produced = False
+            usage_chunk = None
+            async for chunk in await self.client.aio.models.generate_content_stream(
+                model=model,
+                contents=prompt,
+                config=config,
+            ):
+                raise_if_cancelled()
+                # usage_metadata 在最后的分片里才是完整的
+                if getattr(chunk, "usage_metadata", None) is not None:
+                    usage_chunk = chunk
+                text = chunk.text
+                if text:
+                    produced = True
+                    yield text
+            if usage_chunk is not None:
+                self._record_usage(model, usage_chunk)
+            if not produced:
+                raise RuntimeError("Gemini 返回空响应")
+        except Exception as exc:
+            raise RuntimeError(f"Gemini LLM 调用失败: {exc}") from exc
+
     def call_with_image(
         self,
         prompt: str,
@@ -0,0 +1,257 @@
+"""
+直播路径上的对冲请求（hedged request）与延迟预算。
+
+弹幕回应等直播路径上的 LLM 调用各带一个延迟预算：
+
+- 第一个请求超过该模型近期的 p90 延迟仍未返回时，再发一个请求（同一模型，或
+  LLM_HEDGE_MODEL 指定的更便宜的模型），谁先成功用谁，另一个取消；
+- 预算用完仍没有结果时抛出 BudgetExceeded，由调用方退回不调用 LLM 的快速回应。
+
+p90 由进程内按 (provider, model, kind) 统计的滚动窗口给出；样本不足时在预算的一半处对冲。
+对冲请求不参与相同请求合并（SingleFlightLLMClient），否则会直接等在第一个请求上。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from .llm_async import acall_llm, astream_llm
+from .llm_context import llm_budget
+from .llm_factory import LLMClientProtocol
+from .metrics import LLM_HEDGE, llm_labels
+from .singleflight import no_coalesce
+
+T = TypeVar("T")
+
+DEFAULT_HEDGE_QUANTILE = 0.9
+DEFAULT_HEDGE_WINDOW = 200
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+
+
+class BudgetExceeded(asyncio.TimeoutError):
+    """延迟预算内没有拿到结果。"""
+
+
+class LatencyTracker:
+    """最近若干次请求延迟的滚动窗口。"""
+
+    def __init__(
+        self, window: int = DEFAULT_HEDGE_WINDOW, min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES
+    ):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """样本不足 min_samples 时返回 None。"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))
+        return ordered[index]
+
+
+_trackers: Dict[Tuple[str, str, str], LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def latency_tracker(llm: LLMClientProtocol, kind: str) -> LatencyTracker:
+    """按 (provider, model, kind) 共享的延迟统计；kind 为 "call" 或 "first_token"。"""
+    labels = llm_labels(llm)
+    key = (labels["provider"], labels["model"], kind)
+    with _trackers_lock:
+        tracker = _trackers.get(key)
+        if tracker is None:
+            tracker = _trackers[key] = LatencyTracker()
+        return tracker
+
+
+class HedgePolicy:
+    """
+    一个调用点的对冲策略。
+
+    Args:
+        budget: 延迟预算（秒），<= 0 表示不设预算也不对冲
+        quantile: 超过该分位的延迟仍未返回时发出对冲请求
+        hedge_llm: 对冲请求使用的客户端（默认与主请求相同）
+    """
+
+    def __init__(
+        self,
+        budget: float,
+        quantile: float = DEFAULT_HEDGE_QUANTILE,
+        hedge_llm: Optional[LLMClientProtocol] = None,
+    ):
+        self.budget = budget
+        self.quantile = quantile
+        self.hedge_llm = hedge_llm
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def hedge_delay(self, tracker: LatencyTracker) -> float:
+        """主请求发出后多久发对冲请求。"""
+        threshold = tracker.quantile(self.quantile)
+        if threshold is None:
+            threshold = self.budget / 2
+        return min(threshold, self.budget)
+
+
+async def _race(
+    start: Callable[[], Awaitable[T]],
+    hedge: Callable[[], Awaitable[T]],
+    delay: float,
+    budget: float,
+) -> Tuple[T, str]:
+    """
+    先跑 start()，delay 秒后仍未完成（或已经失败）再跑 hedge()；返回 (先成功的结果, outcome)。
+
+    一方失败时等另一方，都失败时抛出最后的异常；预算用完抛出 BudgetExceeded。
+    """
+    loop = asyncio.get_running_loop()
+    now = loop.time()
+    deadline, hedge_at = now + budget, now + delay
+    primary = asyncio.ensure_future(start())
+    hedged: Optional[asyncio.Future] = None
+    pending = {primary}
+    error: Optional[BaseException] = None
+    try:
+        while True:
+            now = loop.time()
+            if hedged is None and (now >= hedge_at or not pending):
+                hedged = asyncio.ensure_future(hedge())
+                pending.add(hedged)
+            if not pending:
+                raise error
+            wake = deadline if hedged is not None else min(hedge_at, deadline)
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, wake - now), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    if hedged is None:
+                        return task.result(), "primary"
+                    return task.result(), "primary_won" if task is primary else "hedge_won"
+                error = task.exception()
+                if not isinstance(error, Exception):
+                    # Cancelled 等直接向上抛
+                    raise error
+            if not done and loop.time() >= deadline:
+                raise BudgetExceeded(f"no result within {budget:.2f}s")
+    finally:
+        losers = [t for t in (primary, hedged) if t is not None and not t.done()]
+        for task in losers:
+            task.cancel()
+        if losers:
+            await asyncio.gather(*losers, return_exceptions=True)
+
+
+async def hedged_acall(
+    llm: LLMClientProtocol,
+    policy: HedgePolicy,
+    prompt: str,
+    system: Optional[str] = None,
+    max_tokens: int = 1000,
+    **kwargs,
+) -> str:
+    """带预算与对冲的 acall_llm。"""
+    if not policy.enabled:
+        return await acall_llm(llm, prompt, system=system, max_tokens=max_tokens, **kwargs)
+
+    tracker = latency_tracker(llm, "call")
+    hedge_llm = policy.hedge_llm or llm
+    started = time.perf_counter()
+
+    async def primary() -> str:
+        result = await acall_llm(llm, prompt, system=system, max_tokens=max_tokens, **kwargs)
+        tracker.observe(time.perf_counter() - started)
+        return result
+
+    async def hedge() -> str:
+        with no_coalesce():
+            return await acall_llm(
+                hedge_llm, prompt, system=system, max_tokens=max_tokens, **kwargs
+            )
+
+    with llm_budget(policy.budget):
+        try:
+            result, outcome = await _race(
+                primary, hedge, policy.hedge_delay(tracker), policy.budget
+            )
+        except BudgetExceeded:
+            # 超出预算的这次也要计入分布，否则 p90 会被低估
+            tracker.observe(policy.budget)
+            LLM_HEDGE.inc(kind="call", outcome="budget_exceeded")
+            raise
+    if outcome == "hedge_won":
+        # 主请求被取消，至少花了这么久
+        tracker.observe(time.perf_counter() - started)
+    LLM_HEDGE.inc(kind="call", outcome=outcome)
+    return result
+
+
+async def hedged_astream(
+    llm: LLMClientProtocol,
+    policy: HedgePolicy,
+    prompt: str,
+    system: Optional[str] = None,
+    max_tokens: int = 1000,
+    **kwargs,
+) -> AsyncIterator[str]:
+    """
+    带预算与对冲的 astream_llm：预算与对冲只作用于首个分片（首个分片决定观众等多久），
+    之后沿用先给出首个分片的那条流。
+    """
+    if not policy.enabled:
+        async for delta in astream_llm(llm, prompt, system=system, max_tokens=max_tokens, **kwargs):
+            yield delta
+        return
+
+    tracker = latency_tracker(llm, "first_token")
+    hedge_llm = policy.hedge_llm or llm
+    streams = []
+    started = time.perf_counter()
+
+    def opener(client: LLMClientProtocol, is_primary: bool):
+        async def first() -> Tuple[AsyncIterator[str], str]:
+            stream = astream_llm(client, prompt, system=system, max_tokens=max_tokens, **kwargs)
+            streams.append(stream)
+            delta = await stream.__anext__()
+            if is_primary:
+                tracker.observe(time.perf_counter() - started)
+            return stream, delta
+
+        return first
+
+    try:
+        with llm_budget(policy.budget):
+            try:
+                (stream, delta), outcome = await _race(
+                    opener(llm, True),
+                    opener(hedge_llm, False),
+                    policy.hedge_delay(tracker),
+                    policy.budget,
+                )
+            except BudgetExceeded:
+                tracker.observe(policy.budget)
+                LLM_HEDGE.inc(kind="first_token", outcome="budget_exceeded")
+                raise
+        if outcome == "hedge_won":
+            tracker.observe(time.perf_counter() - started)
+        LLM_HEDGE.inc(kind="first_token", outcome=outcome)
+        yield delta
+        async for delta in stream:
+            yield delta
+    finally:
+        for stream in streams:
+            await stream.aclose()
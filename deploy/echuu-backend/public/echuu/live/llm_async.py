@@ -0,0 +1,127 @@
+"""
+LLM 的异步调用：优先使用客户端的异步 SDK，没有时放到工作线程；按 provider 限制并发。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import weakref
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from .llm_factory import LLMClientProtocol
+from .metrics import LLM_QUEUED, llm_labels
+
+# 每个 provider 同时进行的异步请求数上限：LLM_CONCURRENCY_<PROVIDER>，缺省为 LLM_CONCURRENCY
+DEFAULT_LLM_CONCURRENCY = 16
+
+# 事件循环 -> provider -> 信号量（asyncio.Semaphore 绑定在首次等待它的事件循环上）
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def provider_concurrency(provider: str) -> int:
+    """provider 的并发上限（环境变量配置）。"""
+    default = os.getenv("LLM_CONCURRENCY", str(DEFAULT_LLM_CONCURRENCY))
+    return max(1, int(os.getenv(f"LLM_CONCURRENCY_{provider.upper()}", default)))
+
+
+def provider_limiter(provider: str) -> asyncio.Semaphore:
+    """当前事件循环里 provider 共用的信号量（需在事件循环里调用）。"""
+    loop = asyncio.get_running_loop()
+    limiters = _limiters.setdefault(loop, {})
+    limiter = limiters.get(provider)
+    if limiter is None:
+        limiter = limiters[provider] = asyncio.Semaphore(provider_concurrency(provider))
+    return limiter
+
+
+class _ProviderSlot:
+    """占用一个 provider 并发名额，等待期间计入 echuu_llm_queued。"""
+
+    def __init__(self, llm):
+        self.provider = llm_labels(llm)["provider"]
+        self.limiter = provider_limiter(self.provider)
+
+    async def __aenter__(self):
+        if self.limiter.locked():
+            with LLM_QUEUED.track_inprogress(provider=self.provider):
+                await self.limiter.acquire()
+        else:
+            await self.limiter.acquire()
+
+    async def __aexit__(self, *exc_info):
+        self.limiter.release()
+
+
+async def acall_llm(
+    llm: LLMClientProtocol,
+    prompt: str,
+    system: Optional[str] = None,
+    max_tokens: int = 1000,
+    **kwargs,
+) -> str:
+    """
+    异步调用 LLM：优先使用客户端的 acall（异步 SDK，共享连接池），
+    否则把阻塞的 call 放到工作线程。受 provider 并发上限约束。
+    """
+    async with _ProviderSlot(llm):
+        native = getattr(llm, "acall", None)
+        if native is not None:
+            return await native(prompt, system=system, max_tokens=max_tokens, **kwargs)
+        return await asyncio.to_thread(
+            llm.call, prompt, system=system, max_tokens=max_tokens, **kwargs
+        )
+
+
+async def astream_llm(
+    llm: LLMClientProtocol,
+    prompt: str,
+    system: Optional[str] = None,
+    max_tokens: int = 1000,
+    **kwargs,
+) -> AsyncIterator[str]:
+    """
+    异步流式调用 LLM，逐个产出文本分片：依次尝试 astream、stream（在工作线程里迭代）、
+    call（整段作为一个分片）。整个流式过程占用一个 provider 并发名额。
+    """
+    async with _ProviderSlot(llm):
+        native = getattr(llm, "astream", None)
+        if native is not None:
+            async for delta in native(prompt, system=system, max_tokens=max_tokens, **kwargs):
+                yield delta
+            return
+
+        stream = getattr(llm, "stream", None)
+        if stream is not None:
+            async for delta in _iterate_in_thread(
+                stream(prompt, system=system, max_tokens=max_tokens, **kwargs)
+            ):
+                yield delta
+            return
+
+        yield await asyncio.to_thread(
+            llm.call, prompt, system=system, max_tokens=max_tokens, **kwargs
+        )
+
+
+_END = object()
+
+
+async def _iterate_in_thread(iterator: Iterator[str]) -> AsyncIterator[str]:
+    """在工作线程里逐个取出阻塞迭代器的元素。"""
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, _END)
+            if item is _END:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            try:
+                close()
+            except ValueError:
+                # 被取消时工作线程可能仍在执行 next，由它自行结束
+                pass
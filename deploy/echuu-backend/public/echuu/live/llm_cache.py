@@ -0,0 +1,303 @@
+"""
+LLM 响应缓存。
+
+剧本生成会反复发出相同的提示词：同一人设 + 触发器的 _build_immersion、
+演示脚本里的预设话题。CachedLLMClient 包装任意
+LLMClientProtocol，按 (model, system, prompt, max_tokens, thinking_level) 缓存结果：
+
+- 内存层：按最近使用淘汰的 LRU
+- 磁盘层：SQLite，重启 / 重跑基准测试后仍然有效
+
+只有在 llm_call_site(...) 标记的、并且在 sites 里登记过的调用点才走缓存（每个调用点
+可以有自己的 TTL），直播路径上的弹幕回应等调用不受影响。
+结果会被调用方校验后重试的调用点（如 _ensure_min_units 的 min_units_retry）不要登记：
+缓存会把被拒绝的结果原样重放给重试。
+
+环境变量（由 maybe_wrap_llm_cache 读取）：
+
+    LLM_CACHE_SITES=immersion,main_llm=3600          # 未设置时不启用缓存
+    LLM_CACHE_TTL=86400                              # 默认 TTL（秒），0 表示不过期
+    LLM_CACHE_PATH=output/llm_cache.sqlite3
+    LLM_CACHE_CAPACITY=256                           # 内存层条目数
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .llm_context import current_call_site
+from .llm_factory import LLMClientProtocol, llm_request_key
+from .metrics import LLM_CACHE
+
+CACHE_FILENAME = "llm_cache.sqlite3"
+DEFAULT_CACHE_TTL = 86400
+DEFAULT_CACHE_CAPACITY = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key        TEXT PRIMARY KEY,
+    call_site  TEXT NOT NULL DEFAULT '',
+    model      TEXT NOT NULL DEFAULT '',
+    value      TEXT NOT NULL,
+    created    REAL NOT NULL,
+    expires    REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache (expires);
+"""
+
+
+def parse_cache_sites(spec: str, default_ttl: float = DEFAULT_CACHE_TTL) -> Dict[str, float]:
+    """解析 "immersion,main_llm=3600" 形式的调用点列表，返回 {调用点: TTL 秒}。"""
+    sites: Dict[str, float] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, ttl = item.partition("=")
+        sites[name.strip()] = float(ttl) if ttl.strip() else default_ttl
+    return sites
+
+
+@dataclass
+class LLMCacheStats:
+    """缓存命中统计。"""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round(self.hit_ratio, 4),
+        }
+
+
+class CachedLLMClient:
+    """
+    带缓存的 LLM 客户端包装。
+
+    call / acall 在登记过的调用点上先查内存层、再查磁盘层，未命中才请求上游并写回两层；
+    其余属性（provider、model、stream 等）原样转发给被包装的客户端。
+    调用失败或返回空文本时不写缓存。
+    """
+
+    def __init__(
+        self,
+        llm: LLMClientProtocol,
+        sites: Dict[str, float],
+        path: Optional[Path] = None,
+        capacity: int = DEFAULT_CACHE_CAPACITY,
+    ):
+        self.llm = llm
+        self.sites = dict(sites)
+        self.capacity = max(0, capacity)
+        self.stats = LLMCacheStats()
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.path = Path(path) if path else None
+        self._conn: Optional[sqlite3.Connection] = None
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE expires > 0 AND expires <= ?", (time.time(),)
+            )
+            self._conn.commit()
+
+    def __getattr__(self, name: str) -> Any:
+        # 只有实例上找不到的属性才会到这里
+        return getattr(self.llm, name)
+
+    # ==================== 调用 ====================
+
+    def call(
+        self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000, **kwargs
+    ) -> str:
+        site = self._site()
+        if site is None:
+            return self.llm.call(prompt, system=system, max_tokens=max_tokens, **kwargs)
+        key = llm_request_key(self.llm, prompt, system, max_tokens, kwargs)
+        cached = self._lookup(key, site)
+        if cached is not None:
+            return cached
+        result = self.llm.call(prompt, system=system, max_tokens=max_tokens, **kwargs)
+        self._store(key, site, result)
+        return result
+
+    async def acall(
+        self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000, **kwargs
+    ) -> str:
+        site = self._site()
+        if site is None:
+            return await self._acall_inner(prompt, system, max_tokens, kwargs)
+        key = llm_request_key(self.llm, prompt, system, max_tokens, kwargs)
+        cached = self._lookup_memory(key, site)
+        if cached is None and self._conn is not None:
+            cached = await asyncio.to_thread(self._lookup_disk, key, site)
+        if cached is not None:
+            return cached
+        self._count(site, "miss")
+        result = await self._acall_inner(prompt, system, max_tokens, kwargs)
+        await asyncio.to_thread(self._store, key, site, result)
+        return result
+
+    async def _acall_inner(
+        self, prompt: str, system: Optional[str], max_tokens: int, kwargs: Dict
+    ) -> str:
+        acall = getattr(self.llm, "acall", None)
+        if acall is not None:
+            return await acall(prompt, system=system, max_tokens=max_tokens, **kwargs)
+        return await asyncio.to_thread(
+            self.llm.call, prompt, system=system, max_tokens=max_tokens, **kwargs
+        )
+
+    # ==================== 缓存 ====================
+
+    def _site(self) -> Optional[str]:
+        site = current_call_site()
+        if site in self.sites:
+            return site
+        with self._lock:
+            self.stats.bypassed += 1
+        return None
+
+    def _expires(self, site: str) -> float:
+        ttl = self.sites.get(site, DEFAULT_CACHE_TTL)
+        return time.time() + ttl if ttl > 0 else 0.0
+
+    def _lookup(self, key: str, site: str) -> Optional[str]:
+        cached = self._lookup_memory(key, site)
+        if cached is None and self._conn is not None:
+            cached = self._lookup_disk(key, site)
+        if cached is None:
+            self._count(site, "miss")
+        return cached
+
+    def _lookup_memory(self, key: str, site: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires and expires <= time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+        self._count(site, "memory_hit")
+        return value
+
+    def _lookup_disk(self, key: str, site: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if expires and expires <= now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._remember(key, value, expires)
+        self._count(site, "disk_hit")
+        return value
+
+    def _store(self, key: str, site: str, value: str):
+        if not value or not value.strip():
+            return
+        expires = self._expires(site)
+        with self._lock:
+            self._remember(key, value, expires)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache "
+                    "(key, call_site, model, value, created, expires) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        site,
+                        str(getattr(self.llm, "model", "") or ""),
+                        value,
+                        time.time(),
+                        expires,
+                    ),
+                )
+                self._conn.commit()
+
+    def _remember(self, key: str, value: str, expires: float):
+        """写入内存层（调用方持有锁）。"""
+        if not self.capacity:
+            return
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def _count(self, site: str, result: str):
+        with self._lock:
+            if result == "memory_hit":
+                self.stats.memory_hits += 1
+            elif result == "disk_hit":
+                self.stats.disk_hits += 1
+            else:
+                self.stats.misses += 1
+        LLM_CACHE.inc(call_site=site, result=result)
+
+    def clear(self):
+        """清空两层缓存。"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def maybe_wrap_llm_cache(llm: LLMClientProtocol, cache_dir: Path) -> LLMClientProtocol:
+    """按 LLM_CACHE_* 环境变量包装缓存；未配置调用点时原样返回。"""
+    spec = os.getenv("LLM_CACHE_SITES", "").strip()
+    if not spec:
+        return llm
+    default_ttl = float(os.getenv("LLM_CACHE_TTL", str(DEFAULT_CACHE_TTL)))
+    sites = parse_cache_sites(spec, default_ttl)
+    if not sites:
+        return llm
+    path = os.getenv("LLM_CACHE_PATH")
+    capacity = int(os.getenv("LLM_CACHE_CAPACITY", str(DEFAULT_CACHE_CAPACITY)))
+    try:
+        cached = CachedLLMClient(
+            llm, sites, Path(path) if path else Path(cache_dir) / CACHE_FILENAME, capacity
+        )
+    except Exception as e:
+        # 磁盘层不可用时只保留内存层
+        print(f"[llm_cache] disk cache unavailable, memory only: {e}")
+        cached = CachedLLMClient(llm, sites, None, capacity)
+    print(f"[llm_cache] enabled for: {', '.join(f'{s}({int(t)}s)' for s, t in sites.items())}")
+    return cached
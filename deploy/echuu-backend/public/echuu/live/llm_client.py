@@ -5,41 +5,130 @@ LLM 客户端封装（Claude）。
 from __future__ import annotations
 
 import os
-from typing import Optional
+from typing import AsyncIterator, Iterator, Optional
 
+from .cancel import raise_if_cancelled
+from .llm_context import record_llm_usage
+from .llm_policy import resolve_llm_policy
+from .metrics import (
+    observe_llm_arequest,
+    observe_llm_astream,
+    observe_llm_request,
+    observe_llm_stream,
+)
 
 class LLMClient:
     """Claude LLM 客户端（仅真实模式）。"""
 
+    provider = "claude"
+
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         self.model = model or os.getenv("DEFAULT_MODEL", "claude-3-haiku-20240307")
         self.client = None
+        # 异步客户端自带 httpx 连接池，进程内共享同一个 LLMClient 的直播间复用这些连接
+        self.async_client = None
 
         if self.api_key:
             try:
                 import anthropic
 
                 self.client = anthropic.Anthropic(api_key=self.api_key)
+                self.async_client = anthropic.AsyncAnthropic(api_key=self.api_key)
                 print(f"LLM 已初始化: {self.model}")
             except ImportError:
                 raise ImportError("anthropic 未安装，请先安装 anthropic")
         else:
             raise ValueError("未设置 ANTHROPIC_API_KEY，无法使用真实模式")
 
+    def _request_kwargs(self, prompt: str, system: Optional[str], max_tokens: int) -> dict:
+        # 按当前调用点的策略（llm_policy）替换模型与 max_tokens；Claude 没有 thinking level
+        model, max_tokens, _ = resolve_llm_policy(self.provider, self.model, max_tokens)
+        kwargs = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if system:
+            kwargs["system"] = system
+        return kwargs
+
+    @staticmethod
+    def _record_usage(model: str, usage) -> None:
+        if usage is not None:
+            record_llm_usage(
+                "claude",
+                model,
+                input_tokens=getattr(usage, "input_tokens", None) or 0,
+                output_tokens=getattr(usage, "output_tokens", None) or 0,
+            )
+
+    @observe_llm_request
     def call(self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000) -> str:
         """调用 LLM。"""
+        # 所在直播已停止时不再发请求
+        raise_if_cancelled()
         if self.client:
             try:
-                kwargs = {
-                    "model": self.model,
-                    "max_tokens": max_tokens,
-                    "messages": [{"role": "user", "content": prompt}],
-                }
-                if system:
-                    kwargs["system"] = system
-                response = self.client.messages.create(**kwargs)
+                request = self._request_kwargs(prompt, system, max_tokens)
+                response = self.client.messages.create(**request)
+                self._record_usage(request["model"], getattr(response, "usage", None))
                 return response.content[0].text
             except Exception as exc:
                 raise RuntimeError(f"LLM 调用失败: {exc}") from exc
         raise RuntimeError("LLM 未初始化，无法调用")
+
+    @observe_llm_stream
+    def stream(
+        self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000
+    ) -> Iterator[str]:
+        """流式调用 LLM，逐个产出文本分片。直播停止时在分片之间中断。"""
+        raise_if_cancelled()
+        if not self.client:
+            raise RuntimeError("LLM 未初始化，无法调用")
+        try:
+            request = self._request_kwargs(prompt, system, max_tokens)
+            with self.client.messages.stream(**request) as stream:
+                for text in stream.text_stream:
+                    raise_if_cancelled()
+                    if text:
+                        yield text
+                self._record_usage(
+                    request["model"], getattr(stream.get_final_message(), "usage", None)
+                )
+        except Exception as exc:
+            raise RuntimeError(f"LLM 调用失败: {exc}") from exc
+
+    @observe_llm_arequest
+    async def acall(self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000) -> str:
+        """call 的异步版本（AsyncAnthropic，不占用工作线程）。"""
+        raise_if_cancelled()
+        if not self.async_client:
+            raise RuntimeError("LLM 未初始化，无法调用")
+        try:
+            request = self._request_kwargs(prompt, system, max_tokens)
+            response = await self.async_client.messages.create(**request)
+            self._record_usage(request["model"], getattr(response, "usage", None))
+            return response.content[0].text
+        except Exception as exc:
+            raise RuntimeError(f"LLM 调用失败: {exc}") from exc
+
+    @observe_llm_astream
+    async def astream(
+        self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000
+    ) -> AsyncIterator[str]:
+        """stream 的异步版本。"""
+        raise_if_cancelled()
+        if not self.async_client:
+            raise RuntimeError("LLM 未初始化，无法调用")
+        try:
+            request = self._request_kwargs(prompt, system, max_tokens)
+            async with self.async_client.messages.stream(**request) as stream:
+                async for text in stream.text_stream:
+                    raise_if_cancelled()
+                    if text:
+                        yield text
+                final = await stream.get_final_message()
+                self._record_usage(request["model"], getattr(final, "usage", None))
+        except Exception as exc:
+            raise RuntimeError(f"LLM 调用失败: {exc}") from exc
@@ -0,0 +1,81 @@
+"""
+LLM 调用上下文：调用点、延迟预算与 token 用量统计。
+
+LLM 客户端、策略（llm_policy）、缓存与对冲都从这里读取；llm_factory 与 llm_policy
+都依赖本模块，本模块只依赖 metrics。
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from .metrics import LLM_TOKENS
+
+# ==================== 调用点 ====================
+
+# 当前 LLM 调用来自哪个调用点（如剧本生成的 "immersion"），与 cancel_scope 一样通过
+# contextvars 传递，asyncio.to_thread 会带到工作线程。缓存等包装器据此决定是否生效，
+# 客户端接口本身不需要改动。
+_current_call_site: ContextVar[Optional[str]] = ContextVar("echuu_llm_call_site", default=None)
+
+
+def current_call_site() -> Optional[str]:
+    """当前上下文的 LLM 调用点（未标记时为 None）。"""
+    return _current_call_site.get()
+
+
+@contextmanager
+def llm_call_site(name: Optional[str]) -> Iterator[Optional[str]]:
+    """在 with 块内把 name 设为当前 LLM 调用点。"""
+    reset = _current_call_site.set(name)
+    try:
+        yield name
+    finally:
+        _current_call_site.reset(reset)
+
+
+def record_llm_usage(
+    provider: str,
+    model: str,
+    input_tokens: int = 0,
+    output_tokens: int = 0,
+    thinking_tokens: int = 0,
+):
+    """按 (provider, model, 调用点) 累计一次请求的 token 用量（由各客户端在拿到响应后调用）。"""
+    call_site = current_call_site() or "other"
+    counts = (("input", input_tokens), ("output", output_tokens), ("thinking", thinking_tokens))
+    for kind, count in counts:
+        if count:
+            LLM_TOKENS.inc(count, provider=provider, model=model, call_site=call_site, kind=kind)
+
+
+# ==================== 延迟预算 ====================
+
+# 直播路径上的调用带一个截止时间（time.monotonic()），客户端据此决定是否值得做额外的
+# 重试（如 Gemini 的空响应重试），超时后的兜底由调用方负责。
+_current_deadline: ContextVar[Optional[float]] = ContextVar("echuu_llm_deadline", default=None)
+
+
+def remaining_budget() -> Optional[float]:
+    """当前 LLM 调用剩余的预算（秒）；不在 llm_budget 内时为 None。"""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@contextmanager
+def llm_budget(seconds: float) -> Iterator[float]:
+    """在 with 块内给 LLM 调用设定 seconds 秒的延迟预算（与外层预算取较紧的一个）。"""
+    deadline = time.monotonic() + seconds
+    outer = _current_deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    reset = _current_deadline.set(deadline)
+    try:
+        yield seconds
+    finally:
+        _current_deadline.reset(reset)
@@ -5,17 +5,57 @@ Supports Gemini 3, Claude, and OpenAI.
 
 from __future__ import annotations
 
+import hashlib
+import json
 import os
-from typing import Optional, Protocol
+from typing import Any, Dict, Optional, Protocol
 
+from .llm_policy import resolve_llm_policy
 
 class LLMClientProtocol(Protocol):
-    """LLM 客户端协议（接口）。"""
+    """
+    LLM 客户端协议（接口）。
+
+    只要求阻塞的 call；acall / astream（异步 SDK）与 stream 是可选的。
+    异步代码统一通过 llm_async 的 acall_llm / astream_llm 调用，没有异步实现的客户端会放到工作线程执行。
+    """
 
     def call(self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000) -> str:
         ...
 
 
+def llm_request_key(
+    llm: LLMClientProtocol,
+    prompt: str,
+    system: Optional[str],
+    max_tokens: int,
+    kwargs: Dict[str, Any],
+) -> str:
+    """
+    LLM 请求的指纹：(model, system, prompt, max_tokens, thinking_level) 及其余参数的 sha256。
+
+    结果缓存与相同请求合并都用它判断两次请求是否等价；model / max_tokens / thinking_level
+    取当前调用点的策略（llm_policy）解析后的实际值。
+    """
+    model, max_tokens, thinking_level = resolve_llm_policy(
+        getattr(llm, "provider", None),
+        str(getattr(llm, "model", "") or ""),
+        max_tokens,
+        kwargs.get("thinking_level"),
+    )
+    payload = {
+        "model": model,
+        "system": system or "",
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "thinking_level": thinking_level or getattr(llm, "thinking_level", None),
+        # temperature 等其余参数也会影响结果
+        "extra": {k: v for k, v in kwargs.items() if k != "thinking_level"},
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
 def create_llm_client(
     provider: Optional[str] = None,
     api_key: Optional[str] = None,
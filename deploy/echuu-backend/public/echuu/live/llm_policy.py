@@ -0,0 +1,178 @@
+"""
+按调用点配置的 LLM 策略（模型 / thinking level / max_tokens）。
+
+Gemini 3 默认 thinking_level="high"，对 400 token 的弹幕回应来说太慢。策略表按调用点
+（llm_call_site）给出各自的模型、thinking level 与 max_tokens：
+
+    main_llm          剧本主体生成
+    immersion         沉浸状态描述
+    min_units_retry   单元数不足时的补生成
+    danmaku_reply     弹幕回应
+    danmaku_batch     多条弹幕的批量回应
+
+进程默认表 = DEFAULT_LLM_POLICIES，再叠加 LLM_POLICY_PATH 指向的 JSON：
+
+    {"danmaku_reply": {"thinking_level": "minimal", "max_tokens": 300},
+     "main_llm": {"model": "gemini-3-pro-preview"}}
+
+每个直播间可以在开播请求里再覆盖（llm_policy_scope），只改写给出的字段。
+策略由 LLM 客户端在发请求时解析（resolve_llm_policy）：调用方显式传入的 thinking_level
+优先；max_tokens 是上限，只会压低调用方给的值（批量弹幕回应按条数放大 max_tokens，
+策略不能把它改回单条的大小）；provider 字段不为空时只对该 provider 的客户端生效。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+
+from .llm_context import current_call_site
+
+THINKING_LEVELS = ("minimal", "low", "medium", "high")
+
+
+@dataclass(frozen=True)
+class CallPolicy:
+    """一个调用点的策略；字段为 None 表示沿用客户端 / 调用方的默认值。"""
+
+    model: Optional[str] = None
+    thinking_level: Optional[str] = None
+    max_tokens: Optional[int] = None
+    provider: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "CallPolicy":
+        """从配置字典构建；字段名或取值不合法时抛出 ValueError。"""
+        unknown = set(data) - {"model", "thinking_level", "max_tokens", "provider"}
+        if unknown:
+            raise ValueError(f"unknown llm policy fields: {sorted(unknown)}")
+        thinking_level = data.get("thinking_level")
+        if thinking_level is not None and thinking_level not in THINKING_LEVELS:
+            raise ValueError(f"invalid thinking_level: {thinking_level}")
+        max_tokens = data.get("max_tokens")
+        if max_tokens is not None:
+            if isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or max_tokens <= 0:
+                raise ValueError(f"invalid max_tokens: {max_tokens}")
+        return cls(
+            model=data.get("model") or None,
+            thinking_level=thinking_level,
+            max_tokens=max_tokens,
+            provider=(data.get("provider") or None) and str(data["provider"]).lower(),
+        )
+
+    def merged(self, override: "CallPolicy") -> "CallPolicy":
+        """用 override 中非空的字段覆盖本策略。"""
+        return replace(self, **{k: v for k, v in asdict(override).items() if v is not None})
+
+    def to_dict(self) -> Dict:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+LLMPolicies = Dict[str, CallPolicy]
+
+DEFAULT_LLM_POLICIES: LLMPolicies = {
+    "main_llm": CallPolicy(),
+    "immersion": CallPolicy(thinking_level="low"),
+    "min_units_retry": CallPolicy(),
+    "danmaku_reply": CallPolicy(thinking_level="low"),
+    "danmaku_batch": CallPolicy(thinking_level="low"),
+}
+
+
+def parse_llm_policies(data: Optional[Mapping[str, Mapping[str, Any]]]) -> LLMPolicies:
+    """解析 {调用点: {字段: 值}}；格式不对时抛出 ValueError。"""
+    if not data:
+        return {}
+    if not isinstance(data, Mapping):
+        raise ValueError("llm policy must be an object keyed by call site")
+    policies = {}
+    for site, fields in data.items():
+        if not isinstance(fields, Mapping):
+            raise ValueError(f"llm policy for {site} must be an object")
+        policies[str(site)] = CallPolicy.from_dict(fields)
+    return policies
+
+
+def merge_llm_policies(base: LLMPolicies, overrides: LLMPolicies) -> LLMPolicies:
+    """逐字段合并：overrides 里给出的字段覆盖 base，其余沿用。"""
+    merged = dict(base)
+    for site, policy in overrides.items():
+        merged[site] = merged[site].merged(policy) if site in merged else policy
+    return merged
+
+
+def load_llm_policies(path: Optional[Path] = None) -> LLMPolicies:
+    """默认策略叠加 JSON 配置（path，默认 LLM_POLICY_PATH 环境变量）。"""
+    path = path or os.getenv("LLM_POLICY_PATH")
+    if not path:
+        return dict(DEFAULT_LLM_POLICIES)
+    with Path(path).open("r", encoding="utf-8") as f:
+        return merge_llm_policies(DEFAULT_LLM_POLICIES, parse_llm_policies(json.load(f)))
+
+
+_default_policies: Optional[LLMPolicies] = None
+
+
+def default_llm_policies() -> LLMPolicies:
+    """进程默认策略表（首次使用时加载；配置文件有误时退回内置默认值）。"""
+    global _default_policies
+    if _default_policies is None:
+        try:
+            _default_policies = load_llm_policies()
+        except (OSError, ValueError) as e:
+            print(f"[llm_policy] failed to load {os.getenv('LLM_POLICY_PATH')}: {e}")
+            _default_policies = dict(DEFAULT_LLM_POLICIES)
+    return _default_policies
+
+
+_current_policies: ContextVar[Optional[LLMPolicies]] = ContextVar(
+    "echuu_llm_policies", default=None
+)
+
+
+@contextmanager
+def llm_policy_scope(policies: Optional[LLMPolicies]) -> Iterator[Optional[LLMPolicies]]:
+    """在 with 块内使用 policies（完整的表，通常为默认表与直播间覆盖的合并结果）。"""
+    reset = _current_policies.set(policies)
+    try:
+        yield policies
+    finally:
+        _current_policies.reset(reset)
+
+
+def current_llm_policy(provider: Optional[str] = None) -> Optional[CallPolicy]:
+    """当前调用点对 provider 生效的策略；没有时返回 None。"""
+    site = current_call_site()
+    if site is None:
+        return None
+    policies = _current_policies.get()
+    if policies is None:
+        policies = default_llm_policies()
+    policy = policies.get(site)
+    if policy is None or (policy.provider and provider and policy.provider != provider):
+        return None
+    return policy
+
+
+def resolve_llm_policy(
+    provider: Optional[str],
+    model: str,
+    max_tokens: int,
+    thinking_level: Optional[str] = None,
+) -> Tuple[str, int, Optional[str]]:
+    """
+    按当前策略解析 (model, max_tokens, thinking_level)。
+
+    显式传入的 thinking_level 优先；策略的 max_tokens 只作为上限。
+    """
+    policy = current_llm_policy(provider)
+    if policy is None:
+        return model, max_tokens, thinking_level
+    if policy.max_tokens:
+        max_tokens = min(policy.max_tokens, max_tokens)
+    return policy.model or model, max_tokens, thinking_level or policy.thinking_level
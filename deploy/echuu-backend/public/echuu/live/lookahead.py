@@ -0,0 +1,236 @@
+"""
+TTS 预取（lookahead）。
+
+原来每步串行执行：弹幕处理 → LLM 回应（可选）→ TTS → yield，两句台词之间观众要
+等完整的 LLM + TTS 延迟。剧本台词在开播前就已确定，所以第 N 步播放期间可以先把
+后面 depth 句台词合成好：
+
+- 照剧本继续：直接使用预取的音频（hit）；
+- 弹幕回应拼在台词前（"回应 + 台词"）：只合成回应部分，再与预取的台词音频拼接（spliced）；
+- 弹幕改写了台词（adapt / digress）：丢弃预取结果，重新合成（invalidated）；
+- 预取了但没播出（跳过 / 结束 / 停播）：unused。
+
+统计命中率（hit + spliced 占取用次数）与浪费率（invalidated + unused 占预取次数）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .metrics import TTS_PREFETCH
+from .state import PerformanceState
+from .tts_client import AudioStream, TTSClient
+from .wav import concat_wav, wav_pcm
+
+
+@dataclass
+class LookaheadStats:
+    """预取统计。"""
+
+    prefetched: int = 0
+    hits: int = 0
+    spliced: int = 0
+    invalidated: int = 0
+    unused: int = 0
+    misses: int = 0
+    wasted_chars: int = 0
+
+    def record(self, result: str, chars: int = 0):
+        setattr(self, result, getattr(self, result) + 1)
+        TTS_PREFETCH.inc(result=result)
+        if result in ("invalidated", "unused"):
+            self.wasted_chars += chars
+
+    @property
+    def hit_ratio(self) -> float:
+        taken = self.hits + self.spliced + self.invalidated + self.misses
+        return (self.hits + self.spliced) / taken if taken else 0.0
+
+    @property
+    def waste_ratio(self) -> float:
+        return (self.invalidated + self.unused) / self.prefetched if self.prefetched else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "prefetched": self.prefetched,
+            "hits": self.hits,
+            "spliced": self.spliced,
+            "invalidated": self.invalidated,
+            "unused": self.unused,
+            "misses": self.misses,
+            "wasted_chars": self.wasted_chars,
+            "hit_ratio": round(self.hit_ratio, 3),
+            "waste_ratio": round(self.waste_ratio, 3),
+        }
+
+
+class TTSPrefetcher:
+    """
+    单场直播的台词预取器（异步路径使用）。
+
+    schedule() 为接下来 depth 句台词启动合成任务；take() 取出本步的音频，
+    stream() 是边合成边输出分片的版本。
+    预取任务在调用 schedule() 时的上下文里创建，会带上直播的取消标记。
+    """
+
+    def __init__(self, tts: TTSClient, depth: int = 1):
+        self.tts = tts
+        self.depth = depth
+        self.stats = LookaheadStats()
+        # line_idx -> (台词文本, 合成任务)
+        self._pending: Dict[int, Tuple[str, asyncio.Task]] = {}
+        # 已被某一步预定、但台词还没定下来的预取（不会被 schedule 当作越过的预取丢弃）
+        self._reserved: Dict[int, Tuple[str, asyncio.Task]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.depth > 0 and self.tts.enabled
+
+    def schedule(self, state: PerformanceState):
+        """预取 current_line_idx 起的 depth 句台词，并丢弃已经越过的预取。"""
+        if not self.enabled:
+            return
+        start = state.current_line_idx
+        for line_idx in [idx for idx in self._pending if idx < start]:
+            self._discard(line_idx, "unused")
+
+        end = min(start + self.depth, len(state.script_lines))
+        for line_idx in range(start, end):
+            if line_idx in self._pending:
+                continue
+            text = state.script_lines[line_idx].text
+            if not text:
+                continue
+            task = asyncio.ensure_future(self.tts.asynthesize(text, record=False))
+            self._pending[line_idx] = (text, task)
+            self.stats.prefetched += 1
+
+    def reserve(self, line_idx: int):
+        """
+        预定 line_idx 的预取：本步台词要等 LLM 流式生成完才能确定（见 claim），
+        期间剧本进度已经前移，schedule 不应把它当作 unused 丢弃。
+        """
+        entry = self._pending.pop(line_idx, None)
+        if entry is not None:
+            self._reserved[line_idx] = entry
+
+    def claim(self, line_idx: int, speech: str) -> Tuple[str, Optional[asyncio.Task], str]:
+        """
+        取出 line_idx 的预取并判断能否复用。
+
+        能复用时由调用方在取到音频后记录 stats（hits / spliced，失败按 misses）。
+
+        Returns:
+            (用法 "hits" / "spliced" / ""（不能复用）, 预取任务, 需要现场合成的回应前缀)
+        """
+        entry = self._pending.pop(line_idx, None) or self._reserved.pop(line_idx, None)
+        if entry is None:
+            self.stats.record("misses")
+            return "", None, ""
+        text, task = entry
+        if speech == text:
+            return "hits", task, ""
+        if speech.endswith(text):
+            return "spliced", task, speech[: -len(text)].strip()
+        self._cancel(task)
+        self.stats.record("invalidated", len(text))
+        return "", None, ""
+
+    async def take(self, line_idx: int, speech: str) -> Optional[bytes]:
+        """
+        本步的音频：尽量复用 line_idx 的预取结果，否则现场合成。
+
+        结果按播出顺序写入录制。
+        """
+        result, task, prefix = self.claim(line_idx, speech)
+        audio = None
+        if result == "hits":
+            audio = await task
+        elif result == "spliced":
+            audio = await self._splice(prefix, task)
+        if result:
+            # 预取失败（返回 None）时按未命中处理
+            self.stats.record(result if audio else "misses")
+
+        if not audio:
+            audio = await self.tts.asynthesize(speech, record=False)
+
+        self.tts.add_to_recording(audio)
+        return audio
+
+    def stream(self, line_idx: int, speech: str) -> AudioStream:
+        """
+        take 的流式版本（需 tts.streaming）。
+
+        命中时预取音频作为一个分片输出；拼接时先边合成边输出回应前缀，再输出预取的台词；
+        否则现场流式合成整句。
+        """
+        result, task, prefix = self.claim(line_idx, speech)
+
+        async def produce(push) -> Optional[bytes]:
+            pushed = []
+            outcome = result
+
+            def forward(chunk: bytes):
+                pushed.append(len(chunk))
+                push(chunk)
+
+            audio = None
+            if result == "hits" or (result == "spliced" and not prefix):
+                audio = await task
+                if audio:
+                    forward(wav_pcm(audio) or b"")
+            elif result == "spliced":
+                head = await self.tts.asynthesize_chunks(prefix, forward, record=False)
+                if head:
+                    tail = await task
+                else:
+                    self._cancel(task)
+                    tail = None
+                if tail:
+                    forward(wav_pcm(tail) or b"")
+                    audio = concat_wav([head, tail])
+                elif head:
+                    # 回应已经念出、台词预取失败：现场合成台词部分接在回应后面
+                    outcome = "misses"
+                    line_text = speech[speech.find(prefix) + len(prefix) :].strip()
+                    tail = await self.tts.asynthesize_chunks(line_text, forward, record=False)
+                    audio = concat_wav([head, tail]) if tail else head
+            if outcome:
+                self.stats.record(outcome if audio else "misses")
+
+            # 已经输出过分片时不能整句重来（观众会听到重复），只能放弃这一步的音频
+            if not audio and not pushed:
+                audio = await self.tts.asynthesize_chunks(speech, forward, record=False)
+
+            self.tts.add_to_recording(audio)
+            return audio
+
+        return AudioStream(produce, self.tts.sample_rate)
+
+    async def _splice(self, prefix: str, task: asyncio.Task) -> Optional[bytes]:
+        """只合成回应前缀，与预取的台词音频拼接（与台词合成并行）。"""
+        if not prefix:
+            return await task
+        head, tail = await asyncio.gather(self.tts.asynthesize(prefix, record=False), task)
+        if not head or not tail:
+            return None
+        return concat_wav([head, tail])
+
+    def _discard(self, line_idx: int, result: str):
+        text, task = self._pending.pop(line_idx, None) or self._reserved.pop(line_idx)
+        self._cancel(task)
+        self.stats.record(result, len(text))
+
+    @staticmethod
+    def _cancel(task: asyncio.Task):
+        # 工作线程里的合成无法中断，结果直接丢弃；停播时由取消标记关闭连接
+        task.cancel()
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def close(self):
+        """结束 / 停播：丢弃所有未取用的预取。"""
+        for line_idx in list(self._pending) + list(self._reserved):
+            self._discard(line_idx, "unused")
@@ -0,0 +1,143 @@
+"""
+PerformerMemory 增量同步。
+
+每步不再广播完整的 memory.to_dict()（用户档案、收到 / 回应过的弹幕会随直播时长
+无限增长），而是只对比 mark_dirty 标记过的字段，生成 JSON Patch 风格的操作：
+
+    {"op": "add", "path": "/danmaku_memory/received/-", "value": "..."}
+    {"op": "replace", "path": "/script_progress/current_line", "value": 12}
+    {"op": "replace", "path": "/user_profiles/六螺", "value": {...}}
+
+列表只追加时只发送新增元素，所以每步的数据量只与这一步的变化有关。
+每隔 snapshot_every 次增量发送一次完整快照，供错过增量的客户端重新同步。
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+from .state import PerformerMemory
+
+Op = Dict[str, Any]
+
+
+def escape_pointer(token: str) -> str:
+    """JSON Pointer 转义（RFC 6901）。"""
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def diff_json(old: Any, new: Any, path: str, ops: List[Op]) -> None:
+    """
+    对比两个 JSON 值，把差异追加到 ops。
+
+    列表以 old 为前缀时输出逐个 add（path/-）；等长时逐项对比；否则整体替换。
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old.keys() - new.keys():
+            ops.append({"op": "remove", "path": f"{path}/{escape_pointer(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{escape_pointer(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                diff_json(old[key], value, child, ops)
+        return
+
+    if isinstance(old, list) and isinstance(new, list):
+        size = len(old)
+        if len(new) >= size and new[:size] == old:
+            for item in new[size:]:
+                ops.append({"op": "add", "path": f"{path}/-", "value": item})
+        elif len(new) == size:
+            for index, (before, after) in enumerate(zip(old, new)):
+                if before != after:
+                    diff_json(before, after, f"{path}/{index}", ops)
+        else:
+            ops.append({"op": "replace", "path": path, "value": new})
+        return
+
+    if old != new:
+        ops.append({"op": "replace", "path": path, "value": new})
+
+
+class MemorySync:
+    """
+    单场直播的记忆同步器。
+
+    保存上次同步时各字段的 JSON 基线；delta() 只处理脏字段和脏用户。
+    """
+
+    def __init__(self, memory: PerformerMemory, snapshot_every: int = 20):
+        self.memory = memory
+        self.snapshot_every = snapshot_every
+        self.version = -1
+        self._baseline: Dict[str, Any] = {}
+        self._deltas_since_snapshot = 0
+
+    def snapshot(self) -> Dict:
+        """完整快照，同时重置同步基线。"""
+        memory = self.memory
+        self._baseline = memory.to_dict()
+        memory.dirty_fields.clear()
+        memory.dirty_users.clear()
+        self.version = memory.version
+        self._deltas_since_snapshot = 0
+        return self.baseline_snapshot()
+
+    def delta(self) -> Optional[Dict]:
+        """
+        自上次同步以来的增量；没有变化时返回 None。
+
+        Returns:
+            {"base": 上次版本, "version": 当前版本, "ops": [...]}
+        """
+        memory = self.memory
+        if memory.version == self.version:
+            return None
+
+        ops: List[Op] = []
+        for name in sorted(memory.dirty_fields):
+            if name == "user_profiles":
+                # 整个用户表被标脏时退化为逐用户对比
+                memory.dirty_users.update(memory.user_profiles.keys())
+                continue
+            current = memory.field_to_dict(name)
+            diff_json(self._baseline.get(name), current, f"/{name}", ops)
+            self._baseline[name] = current
+
+        users = self._baseline.setdefault("user_profiles", {})
+        for username in sorted(memory.dirty_users):
+            profile = memory.user_profiles.get(username)
+            path = f"/user_profiles/{escape_pointer(username)}"
+            if profile is None:
+                if users.pop(username, None) is not None:
+                    ops.append({"op": "remove", "path": path})
+                continue
+            current = profile.to_dict()
+            if username in users:
+                diff_json(users[username], current, path, ops)
+            else:
+                ops.append({"op": "add", "path": path, "value": current})
+            users[username] = current
+
+        memory.dirty_fields.clear()
+        memory.dirty_users.clear()
+        base, self.version = self.version, memory.version
+        self._deltas_since_snapshot += 1
+        return {"base": base, "version": self.version, "ops": ops}
+
+    def baseline_snapshot(self) -> Dict:
+        """
+        上次同步时的完整状态（不重置基线）。
+
+        基线字段只会被整体替换，唯独用户表是原地更新的，所以复制一层，
+        避免事件延迟编码时混入更新的版本。
+        """
+        memory = {
+            name: dict(value) if name == "user_profiles" else value
+            for name, value in self._baseline.items()
+        }
+        return {"version": self.version, "memory": memory}
+
+    def snapshot_due(self) -> bool:
+        return self.version < 0 or self._deltas_since_snapshot >= self.snapshot_every
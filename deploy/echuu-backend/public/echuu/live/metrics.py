@@ -0,0 +1,517 @@
+"""
+进程内指标（Prometheus 文本格式，不依赖 prometheus_client）。
+
+Counter / Gauge / Histogram 支持标签，线程安全（TTS 回调与 LLM 调用都在工作线程里）。
+backend 的 GET /metrics 调用 REGISTRY.render() 输出所有指标。
+
+    with SCRIPT_PHASE_SECONDS.time(phase="main_llm", **llm_labels(llm)):
+        response = llm.call(...)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .cancel import Cancelled
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 秒级延迟的默认分桶：覆盖毫秒级扇出到分钟级剧本生成
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        if len(labels) != len(self.labelnames) or any(n not in labels for n in self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self._samples())
+
+
+class Counter(_Metric):
+    """只增不减的计数。"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if amount < 0:
+            raise ValueError("counter can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def total(self, **labels) -> float:
+        """labels 可以只给一部分，返回匹配的所有序列之和。"""
+        positions = [self.labelnames.index(name) for name in labels]
+        wanted = [str(value) for value in labels.values()]
+        with self._lock:
+            return sum(
+                v for key, v in self._values.items() if [key[i] for i in positions] == wanted
+            )
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """可增可减的当前值。"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def clear(self):
+        """清空所有标签组合（每次抓取前整体重算的 gauge 使用）。"""
+        with self._lock:
+            self._values.clear()
+
+    @contextmanager
+    def track_inprogress(self, **labels) -> Iterator[None]:
+        """进入时 +1，退出时 -1。"""
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """分桶计数 + 总和 + 次数。"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        if "le" in labelnames:
+            raise ValueError("histogram label 'le' is reserved")
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        # key -> [各桶计数..., 总和, 次数]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return int(state[-1]) if state else 0
+
+    def sum(self, **labels) -> float:
+        state = self._values.get(self._key(labels))
+        return state[-2] if state else 0.0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """
+        由分桶估算分位数（桶内线性插值，同 PromQL histogram_quantile）。
+
+        labels 可以只给一部分，其余标签的所有序列合并统计；没有样本时返回 None。
+        """
+        positions = [self.labelnames.index(name) for name in labels]
+        wanted = [str(value) for value in labels.values()]
+        merged = [0.0] * (len(self.buckets) + 2)
+        with self._lock:
+            for key, state in self._values.items():
+                if [key[i] for i in positions] == wanted:
+                    merged = [a + b for a, b in zip(merged, state)]
+        total = merged[-1]
+        if not total:
+            return None
+        rank = q * total
+        cumulative, lower = 0.0, 0.0
+        for bound, count in zip(self.buckets, merged):
+            if count and cumulative + count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        # 落在 +Inf 桶里：只能给出最大的有限边界
+        return self.buckets[-1] if self.buckets else None
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """记录 with 块的耗时（秒），异常退出也记录。"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        names = self.labelnames + ("le",)
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(names, key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(names, key + ("+Inf",))
+            lines.append(f"{self.name}_bucket{labels} {_format_value(state[-1])}")
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{plain} {_format_value(state[-1])}")
+        return lines
+
+
+class Registry:
+    """指标注册表；同名指标只注册一次（模块重复加载时返回已有对象）。"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+# ==================== 指标定义 ====================
+
+SCRIPT_PHASE_SECONDS = REGISTRY.histogram(
+    "echuu_script_phase_seconds",
+    "Script generation phase duration "
+    "(nucleus, immersion, main_llm, min_units_retry, structure_break).",
+    ("phase", "provider", "model"),
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "echuu_llm_request_seconds",
+    "LLM provider request duration.",
+    ("provider", "model", "outcome"),
+)
+LLM_INFLIGHT = REGISTRY.gauge(
+    "echuu_llm_inflight",
+    "LLM provider requests in flight.",
+    ("provider", "model"),
+)
+LLM_QUEUED = REGISTRY.gauge(
+    "echuu_llm_queued",
+    "Async LLM requests waiting for a provider concurrency slot.",
+    ("provider",),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "echuu_llm_tokens_total",
+    "LLM tokens by provider, model, call site and kind (input, output, thinking).",
+    ("provider", "model", "call_site", "kind"),
+)
+LLM_CACHE = REGISTRY.counter(
+    "echuu_llm_cache_total",
+    "LLM response cache lookups by call site (memory_hit, disk_hit, miss).",
+    ("call_site", "result"),
+)
+SINGLEFLIGHT = REGISTRY.counter(
+    "echuu_singleflight_total",
+    "Coalesced upstream requests by group (llm, tts): leader = sent upstream, "
+    "shared = deduplicated, retry = re-sent after the leader's room was cancelled.",
+    ("group", "result"),
+)
+LLM_HEDGE = REGISTRY.counter(
+    "echuu_llm_hedge_total",
+    "Budgeted live-path LLM calls by kind (call, first_token) "
+    "and outcome (primary, primary_won, hedge_won, budget_exceeded).",
+    ("kind", "outcome"),
+)
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "echuu_llm_first_token_seconds",
+    "Time from a streaming LLM request to its first text delta.",
+    ("provider", "model"),
+)
+DANMAKU_RESPONSE_SECONDS = REGISTRY.histogram(
+    "echuu_danmaku_response_seconds",
+    "DanmakuResponseGenerator LLM call duration (outcome=ok|error|timeout).",
+    ("provider", "model", "outcome"),
+    # 直播回应的延迟预算在秒级，桶需要足够细才能看出 p99
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0, 30.0),
+)
+DANMAKU_BATCH_SIZE = REGISTRY.histogram(
+    "echuu_danmaku_batch_size",
+    "Danmaku answered per batched LLM reply call.",
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10),
+)
+DANMAKU_REPLY_CACHE = REGISTRY.counter(
+    "echuu_danmaku_reply_cache_total",
+    "Danmaku reply cache lookups (exact_hit, fuzzy_hit, miss).",
+    ("result",),
+)
+DANMAKU_FIRST_SENTENCE_SECONDS = REGISTRY.histogram(
+    "echuu_danmaku_first_sentence_seconds",
+    "Time from a streamed danmaku reply request to its first complete sentence being sent to TTS.",
+    ("provider", "model"),
+)
+TTS_SECONDS = REGISTRY.histogram(
+    "echuu_tts_seconds",
+    "TTS synthesis latency by stage (connect, first_chunk, total).",
+    ("stage", "model", "voice"),
+)
+TTS_INFLIGHT = REGISTRY.gauge(
+    "echuu_tts_inflight",
+    "TTS syntheses in flight.",
+    ("model", "voice"),
+)
+TTS_PREFETCH = REGISTRY.counter(
+    "echuu_tts_prefetch_total",
+    "Lookahead TTS prefetch outcomes (hits, spliced, invalidated, unused, misses).",
+    ("result",),
+)
+STEP_FIRST_AUDIO_SECONDS = REGISTRY.histogram(
+    "echuu_step_first_audio_seconds",
+    "Time from the start of a live step to its first audio bytes being ready to send "
+    "(mode=streamed|buffered).",
+    ("mode",),
+)
+FANOUT_SECONDS = REGISTRY.histogram(
+    "echuu_fanout_seconds",
+    "Time to enqueue one room event to every local viewer.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+ROOMS = REGISTRY.gauge("echuu_rooms", "Rooms on this worker.", ("state",))
+CONNECTIONS = REGISTRY.gauge(
+    "echuu_connections", "Viewer WebSocket connections on this worker.", ("protocol",)
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "echuu_queue_depth",
+    "Queue depth across rooms on this worker (stat=max|total).",
+    ("queue", "stat"),
+)
+
+
+def llm_labels(llm) -> Dict[str, str]:
+    """LLM 客户端的 provider / model 标签（model 为当前调用点策略下实际使用的模型）。"""
+    from .llm_policy import current_llm_policy
+
+    provider = str(getattr(llm, "provider", None) or type(llm).__name__.lower())
+    policy = current_llm_policy(provider)
+    model = policy.model if policy is not None and policy.model else getattr(llm, "model", "")
+    return {"provider": provider, "model": str(model or "")}
+
+
+def observe_llm_request(func: Callable) -> Callable:
+    """装饰 LLM 客户端的 call 方法：记录耗时、结果与进行中的请求数。"""
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        labels = llm_labels(self)
+        outcome = "error"
+        start = time.perf_counter()
+        with LLM_INFLIGHT.track_inprogress(**labels):
+            try:
+                result = func(self, *args, **kwargs)
+                outcome = "ok"
+                return result
+            except Cancelled:
+                outcome = "cancelled"
+                raise
+            finally:
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, outcome=outcome, **labels)
+
+    return wrapper
+
+
+def observe_llm_stream(func: Callable) -> Callable:
+    """
+    装饰 LLM 客户端的 stream 方法（生成器）：除 observe_llm_request 的指标外，
+    还记录首个文本分片的延迟。耗时算到生成器耗尽 / 关闭为止。
+    """
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        labels = llm_labels(self)
+        outcome = "error"
+        start = time.perf_counter()
+        first = True
+        with LLM_INFLIGHT.track_inprogress(**labels):
+            try:
+                for delta in func(self, *args, **kwargs):
+                    if first:
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, **labels)
+                        first = False
+                    yield delta
+                outcome = "ok"
+            except Cancelled:
+                outcome = "cancelled"
+                raise
+            except GeneratorExit:
+                # 调用方提前停止读取
+                outcome = "closed"
+                raise
+            finally:
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, outcome=outcome, **labels)
+
+    return wrapper
+
+
+def observe_llm_arequest(func: Callable) -> Callable:
+    """observe_llm_request 的协程版本（装饰 acall）。"""
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        labels = llm_labels(self)
+        outcome = "error"
+        start = time.perf_counter()
+        with LLM_INFLIGHT.track_inprogress(**labels):
+            try:
+                result = await func(self, *args, **kwargs)
+                outcome = "ok"
+                return result
+            except (Cancelled, asyncio.CancelledError):
+                outcome = "cancelled"
+                raise
+            finally:
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, outcome=outcome, **labels)
+
+    return wrapper
+
+
+def observe_llm_astream(func: Callable) -> Callable:
+    """observe_llm_stream 的异步生成器版本（装饰 astream）。"""
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        labels = llm_labels(self)
+        outcome = "error"
+        start = time.perf_counter()
+        first = True
+        with LLM_INFLIGHT.track_inprogress(**labels):
+            try:
+                async for delta in func(self, *args, **kwargs):
+                    if first:
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, **labels)
+                        first = False
+                    yield delta
+                outcome = "ok"
+            except (Cancelled, asyncio.CancelledError):
+                outcome = "cancelled"
+                raise
+            except GeneratorExit:
+                outcome = "closed"
+                raise
+            finally:
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, outcome=outcome, **labels)
+
+    return wrapper
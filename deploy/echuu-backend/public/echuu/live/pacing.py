@@ -0,0 +1,157 @@
+"""
+按音频时长调度直播步骤。
+
+原来每步之间固定 sleep 0.1 秒，LLM / TTS 产出多快就推多快：客户端一次缓冲好几步
+音频，播放期间到达的弹幕要等前面的音频全部播完才被回应。
+
+StepPacer 按观众端的播放进度放行：
+
+- 第 N 步的音频时长从 WAV 头直接算出（不解码）；
+- 第 N+1 步在第 N 步播完 + 自然停顿（按剧本阶段，与 AudioPlayer 相同）时播出，
+  提前 client_lead 秒推送，留给客户端下载；
+- 生成第 N+1 步（LLM + TTS）的开始时间按最近几步生成耗时的 EWMA 往前倒推，
+  既不让观众等，也尽量晚开始，让这段时间里的弹幕赶上下一步。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import Optional
+
+from .wav import wav_duration
+
+# 剧本阶段 -> 停顿区间（秒）
+PAUSE_MAP = {
+    "Hook": (1.5, 3.0),  # 开场：较短停顿，保持吸引力
+    "Build-up": (2.0, 4.0),  # 铺垫：中等停顿
+    "But": (0.5, 1.5),  # 转折点：很短的停顿制造悬念
+    "Contradiction": (1.0, 2.0),  # 矛盾：短停顿
+    "Example": (2.5, 4.5),  # 举例：较长停顿
+    "Climax": (0.3, 1.0),  # 高潮：极短停顿，保持紧张
+    "Resolution": (3.0, 5.0),  # 结尾：较长停顿，自然收尾
+    "Tangent": (2.0, 3.5),  # 跑题：中等停顿
+    "Inner-monologue": (2.5, 4.5),  # 独白：较长停顿，思考感
+}
+DEFAULT_PAUSE = (1.5, 3.5)
+
+
+def natural_pause(stage: str = "", rng: Optional[random.Random] = None) -> float:
+    """
+    根据剧本阶段生成自然的停顿时间
+
+    Args:
+        stage: 剧本阶段（Hook, Build-up, Climax, Resolution等）
+        rng: 随机数生成器（默认使用 random 模块）
+
+    Returns:
+        停顿秒数（0.3-5秒）
+    """
+    min_pause, max_pause = PAUSE_MAP.get(stage, DEFAULT_PAUSE)
+    return (rng or random).uniform(min_pause, max_pause)
+
+
+class StepPacer:
+    """
+    单场直播的步骤节拍器。
+
+    用法（在消费 engine.arun() 的循环里）：
+
+        async for result in engine.arun(...):
+            pacer.step_ready()
+            await pacer.wait_release()
+            ...广播...
+            pacer.released(result["audio"], result["stage"])
+            await pacer.wait_generate()
+    """
+
+    def __init__(
+        self,
+        client_lead: float = 0.5,
+        generation_alpha: float = 0.3,
+        initial_generation: float = 3.0,
+        cancel_token=None,
+    ):
+        """
+        Args:
+            client_lead: 提前多少秒把下一步推给客户端（下载 / 解码余量）
+            generation_alpha: 生成耗时 EWMA 的平滑系数
+            initial_generation: 还没有测量值时假定的生成耗时（秒）
+            cancel_token: 直播的 CancelToken，取消时立即结束等待
+        """
+        self.client_lead = client_lead
+        self.generation_alpha = generation_alpha
+        self.generation_estimate = initial_generation
+        self.cancel_token = cancel_token
+        self.release_at: Optional[float] = None
+        self.last_duration = 0.0
+        self.last_pause = 0.0
+        self._generation_started: Optional[float] = None
+        # 统计：观众端出现空白（下一步晚于预定播出时间）的次数与总时长
+        self.late_steps = 0
+        self.dead_air = 0.0
+
+    async def _sleep_until(self, deadline: float):
+        delay = deadline - time.monotonic()
+        if delay <= 0:
+            return
+        if self.cancel_token is not None:
+            await self.cancel_token.guard(asyncio.sleep(delay))
+        else:
+            await asyncio.sleep(delay)
+
+    def step_ready(self):
+        """一步生成完成：更新生成耗时的估计。"""
+        now = time.monotonic()
+        if self._generation_started is not None:
+            elapsed = now - self._generation_started
+            alpha = self.generation_alpha
+            self.generation_estimate = alpha * elapsed + (1 - alpha) * self.generation_estimate
+            self._generation_started = None
+        if self.release_at is not None and now > self.release_at:
+            self.late_steps += 1
+            self.dead_air += now - self.release_at
+
+    async def wait_release(self):
+        """等到可以把这一步推给客户端（上一步播完 + 停顿 - client_lead）。"""
+        if self.release_at is not None:
+            await self._sleep_until(self.release_at - self.client_lead)
+
+    def released(
+        self,
+        audio: Optional[bytes],
+        stage: str = "",
+        speech: str = "",
+        started: Optional[float] = None,
+    ):
+        """
+        这一步已推送：按音频时长 + 停顿计算下一步的播出时间。
+
+        没有音频时按字数粗略估计（约每秒 4.5 字），保证纯文字步骤也有节奏。
+        流式推送时 started 为第一帧的发送时间（time.monotonic()），客户端从那时开始播放。
+        """
+        duration = wav_duration(audio) if audio else None
+        if duration is None:
+            duration = len(speech) / 4.5 if speech else 0.0
+        now = started if started is not None else time.monotonic()
+        # 客户端在 max(预定播出时间, 收到时间) 开始播放
+        start = max(now, self.release_at) if self.release_at is not None else now
+        self.last_duration = duration
+        self.last_pause = natural_pause(stage)
+        self.release_at = start + duration + self.last_pause
+
+    async def wait_generate(self):
+        """等到该开始生成下一步的时间（播出时间 - 预计生成耗时）。"""
+        if self.release_at is not None:
+            await self._sleep_until(self.release_at - self.client_lead - self.generation_estimate)
+        self._generation_started = time.monotonic()
+
+    def to_dict(self) -> dict:
+        return {
+            "generation_estimate": round(self.generation_estimate, 3),
+            "last_duration": round(self.last_duration, 3),
+            "last_pause": round(self.last_pause, 3),
+            "late_steps": self.late_steps,
+            "dead_air": round(self.dead_air, 3),
+        }
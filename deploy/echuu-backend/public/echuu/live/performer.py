@@ -4,16 +4,20 @@
 
 from __future__ import annotations
 
+import asyncio
+import os
 import random
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
+from .cancel import raise_if_cancelled
 from .danmaku import DanmakuHandler
 from .llm_client import LLMClient
 from .response_generator import DanmakuResponseGenerator
 from .state import Danmaku, PerformanceState
-from .tts_client import TTSClient
+from .tts_client import AudioStream, PushChunk, TextFeed, TTSClient
 from .language import StreamLanguageContext
-
+from .lookahead import TTSPrefetcher
+from .wav import concat_wav, wav_pcm
 
 class PerformerV3:
     """
@@ -25,65 +29,180 @@ class PerformerV3:
         llm: LLMClient,
         tts: TTSClient,
         danmaku_handler: DanmakuHandler,
-        stream_lang_context: Optional[StreamLanguageContext] = None
+        stream_lang_context: Optional[StreamLanguageContext] = None,
+        hedge_llm: Optional[LLMClient] = None,
+        batch_size: Optional[int] = None,
     ):
         self.llm = llm
         self.tts = tts
         self.danmaku_handler = danmaku_handler
-        self.response_generator = DanmakuResponseGenerator(llm, stream_lang_context)
+        self.response_generator = DanmakuResponseGenerator(
+            llm, stream_lang_context, hedge_llm=hedge_llm
+        )
+        # 每步最多回应几条弹幕（>1 时多条弹幕合并为一次 LLM 调用，见 generate_batch_response）
+        if batch_size is None:
+            batch_size = int(os.getenv("DANMAKU_BATCH_SIZE", "1"))
+        self.batch_size = max(1, batch_size)
 
     def step(self, state: PerformanceState, new_danmaku: Optional[List[Danmaku]] = None) -> Dict:
         """
         执行一步表演。
         """
-        if new_danmaku:
-            state.danmaku_queue.extend(new_danmaku)
-            for dm in new_danmaku:
-                state.memory.danmaku_memory["received"].append(dm.text)
-                # 更新用户档案（自动记录互动）
-                state.memory.update_user_from_danmaku(dm)
+        self._ingest_danmaku(state, new_danmaku)
 
         if state.current_line_idx >= len(state.script_lines):
             return self._generate_ending(state)
 
         current_line = state.script_lines[state.current_line_idx]
+        selected = self._select_danmaku(state)
+
+        if len(selected) > 1:
+            output = self._handle_batch_response(selected, current_line, state)
+        elif selected:
+            output = self._handle_danmaku_response(*selected[0], current_line, state)
+        else:
+            output = self._continue_output(current_line)
+
+        self._advance(state, current_line, selected)
+        # 弹幕回应的 LLM 调用可能很慢，合成语音前再检查一次
+        raise_if_cancelled()
+
+        speech = output.get("speech", "")
+        audio = None
+        if speech and self.tts.enabled:
+            audio = self.tts.synthesize(
+                speech, emotion_boost=self._emotion_boost(current_line, output)
+            )
+
+        return self._finalize_output(state, current_line, output, audio)
+
+    async def astep(
+        self,
+        state: PerformanceState,
+        new_danmaku: Optional[List[Danmaku]] = None,
+        prefetcher: Optional[TTSPrefetcher] = None,
+        stream: bool = False,
+    ) -> Dict:
+        """
+        异步执行一步表演（与 step 逻辑一致，LLM / TTS 调用不阻塞事件循环）。
+
+        传入 prefetcher 时优先使用预取的台词音频。stream 为 True 且 TTS 支持流式时
+        不等合成完成：输出的 audio 为 None，audio_stream 为 AudioStream。
+        此时若 LLM 也支持流式，弹幕回应不等 LLM 完成就返回：回应逐句送入 TTS，
+        speech / llm_action 在 audio_stream 结束后才填好（见 _stream_danmaku_reply）；
+        音频只覆盖 speech 的一部分时另给 audio_text（实际合成的文本）。
+        """
+        self._ingest_danmaku(state, new_danmaku)
+
+        if state.current_line_idx >= len(state.script_lines):
+            return await self._agenerate_ending(state)
+
+        current_line = state.script_lines[state.current_line_idx]
+        selected = self._select_danmaku(state)
+        stream_audio = stream and self.tts.enabled and self.tts.streaming
 
-        best_danmaku = None
+        reply_kwargs = None
         handle_result = None
+        if len(selected) == 1 and stream_audio and self.response_generator.streaming:
+            best_danmaku, handle_result = selected[0]
+            reply_kwargs = self._response_kwargs(best_danmaku, current_line, state)
+            output = self._danmaku_fields(best_danmaku, handle_result)
+            output.update({"speech": "", "llm_action": "streaming"})
+        elif len(selected) > 1:
+            # 批量回应不走流式：要等整个 JSON 数组才能拼出台词
+            output = await self._ahandle_batch_response(selected, current_line, state)
+        elif selected:
+            output = await self._ahandle_danmaku_response(*selected[0], current_line, state)
+        else:
+            output = self._continue_output(current_line)
+
+        line_idx = state.current_line_idx
+        self._advance(state, current_line, selected)
+        raise_if_cancelled()
 
-        if state.danmaku_queue:
-            for danmaku in state.danmaku_queue:
-                result = self.danmaku_handler.handle(danmaku, state)
-                if result.get("should_interrupt"):
-                    if best_danmaku is None or result.get("priority", 0) > handle_result.get(
-                        "priority", 0
-                    ):
-                        best_danmaku = danmaku
-                        handle_result = result
-
-        if best_danmaku and handle_result:
-            output = self._handle_danmaku_response(best_danmaku, handle_result, current_line, state)
-            state.danmaku_queue = [d for d in state.danmaku_queue if d != best_danmaku]
-            state.memory.danmaku_memory["responded"].append(best_danmaku.text)
-
-            if best_danmaku.is_question() and handle_result.get("action") == "tease":
+        speech = output.get("speech", "")
+        audio = None
+        use_prefetch = prefetcher is not None and prefetcher.enabled
+        if reply_kwargs is not None:
+            if use_prefetch:
+                prefetcher.reserve(line_idx)
+            output["audio_stream"] = self._stream_danmaku_reply(
+                reply_kwargs, handle_result, output, line_idx, prefetcher if use_prefetch else None
+            )
+        elif speech and self.tts.enabled and stream and self.tts.streaming:
+            if use_prefetch:
+                output["audio_stream"] = prefetcher.stream(line_idx, speech)
+            else:
+                output["audio_stream"] = self.tts.stream(speech)
+        elif speech and self.tts.enabled:
+            if use_prefetch:
+                audio = await prefetcher.take(line_idx, speech)
+            else:
+                audio = await self.tts.asynthesize(
+                    speech, emotion_boost=self._emotion_boost(current_line, output)
+                )
+
+        return self._finalize_output(state, current_line, output, audio)
+
+    def _ingest_danmaku(self, state: PerformanceState, new_danmaku: Optional[List[Danmaku]]):
+        """新弹幕入队并写入记忆。"""
+        if not new_danmaku:
+            return
+        state.danmaku_queue.extend(new_danmaku)
+        for dm in new_danmaku:
+            state.memory.danmaku_memory["received"].append(dm.text)
+            # 更新用户档案（自动记录互动）
+            state.memory.update_user_from_danmaku(dm)
+        state.memory.mark_dirty("danmaku_memory")
+
+    def _select_danmaku(self, state: PerformanceState) -> List[Tuple[Danmaku, Dict]]:
+        """从队列中选出决定打断的弹幕，按优先级从高到低取前 batch_size 条。"""
+        candidates = []
+        for danmaku in state.danmaku_queue:
+            result = self.danmaku_handler.handle(danmaku, state)
+            if result.get("should_interrupt"):
+                candidates.append((danmaku, result))
+
+        # 稳定排序：同优先级时先到的弹幕在前
+        candidates.sort(key=lambda item: item[1].get("priority", 0), reverse=True)
+        return candidates[: self.batch_size]
+
+    @staticmethod
+    def _continue_output(current_line) -> Dict:
+        """无弹幕打断时照剧本继续。"""
+        return {
+            "speech": current_line.text,
+            "action": "continue",
+            "priority": 0.0,
+            "cost": current_line.interruption_cost,
+        }
+
+    def _advance(
+        self,
+        state: PerformanceState,
+        current_line,
+        selected: List[Tuple[Danmaku, Dict]],
+    ):
+        """记录已回应弹幕 / 承诺，并推进剧本进度。"""
+        if selected:
+            answered = [danmaku for danmaku, _ in selected]
+            state.danmaku_queue = [d for d in state.danmaku_queue if d not in answered]
+            state.memory.danmaku_memory["responded"].extend(d.text for d in answered)
+            state.memory.mark_dirty("danmaku_memory")
+
+        for danmaku, handle_result in selected:
+            if danmaku.is_question() and handle_result.get("action") == "tease":
                 answer_loc = handle_result.get("answer_loc", {})
                 if answer_loc.get("found"):
                     state.memory.promises.append(
                         {
-                            "content": best_danmaku.text,
+                            "content": danmaku.text,
                             "made_at_step": state.current_step,
                             "fulfilled": False,
                             "answer_at_line": answer_loc.get("line_idx"),
                         }
                     )
-        else:
-            output = {
-                "speech": current_line.text,
-                "action": "continue",
-                "priority": 0.0,
-                "cost": current_line.interruption_cost,
-            }
+                    state.memory.mark_dirty("promises")
 
         state.current_line_idx += 1
         state.current_step += 1
@@ -91,33 +210,38 @@ class PerformerV3:
         for info in current_line.key_info:
             if info not in state.memory.story_points["mentioned"]:
                 state.memory.story_points["mentioned"].append(info)
+                state.memory.mark_dirty("story_points")
 
         state.memory.script_progress["current_line"] = state.current_line_idx
         state.memory.script_progress["total_lines"] = len(state.script_lines)
         state.memory.script_progress["current_stage"] = current_line.stage
+        state.memory.mark_dirty("script_progress")
 
         self._check_promises(current_line, state)
 
-        speech = output.get("speech", "")
-        audio = None
-        if speech and self.tts.enabled:
-            emotion_boost = {
-                "Hook": 0.3,
-                "Build-up": 0.2,
-                "Climax": 0.8,
-                "Resolution": 0.4,
-            }.get(current_line.stage, 0.0)
+    @staticmethod
+    def _emotion_boost(current_line, output: Dict) -> float:
+        """根据阶段、情绪断点和叙事动作计算情绪增强。"""
+        emotion_boost = {
+            "Hook": 0.3,
+            "Build-up": 0.2,
+            "Climax": 0.8,
+            "Resolution": 0.4,
+        }.get(current_line.stage, 0.0)
 
-            if isinstance(current_line.emotion_break, dict):
-                level = current_line.emotion_break.get("level", 0)
-                emotion_boost += level * 0.15
+        if isinstance(current_line.emotion_break, dict):
+            level = current_line.emotion_break.get("level", 0)
+            emotion_boost += level * 0.15
 
-            if output.get("action") in ["tease", "improvise", "jump"]:
-                emotion_boost += 0.2
+        if output.get("action") in ["tease", "improvise", "jump"]:
+            emotion_boost += 0.2
 
-            emotion_boost = min(1.0, emotion_boost)
-            audio = self.tts.synthesize(speech, emotion_boost=emotion_boost)
+        return min(1.0, emotion_boost)
 
+    def _finalize_output(
+        self, state: PerformanceState, current_line, output: Dict, audio: Optional[bytes]
+    ) -> Dict:
+        """补全输出字段并记录情绪轨迹。"""
         output["audio"] = audio
         output["line_idx"] = state.current_line_idx - 1
         output["stage"] = current_line.stage
@@ -137,6 +261,7 @@ class PerformerV3:
                     "stage": current_line.stage,
                 }
             )
+            state.memory.mark_dirty("emotion_track")
 
         output["memory_display"] = state.memory.to_display()
         return output
@@ -149,20 +274,147 @@ class PerformerV3:
         state: PerformanceState,
     ) -> Dict:
         """处理弹幕回应 - 使用 LLM 基于用户档案生成自然回应。"""
+        llm_result = self.response_generator.generate_response(
+            **self._response_kwargs(danmaku, current_line, state)
+        )
+        return self._compose_danmaku_output(danmaku, handle_result, current_line, llm_result)
+
+    async def _ahandle_danmaku_response(
+        self,
+        danmaku: Danmaku,
+        handle_result: Dict,
+        current_line,
+        state: PerformanceState,
+    ) -> Dict:
+        """_handle_danmaku_response 的异步版本。"""
+        llm_result = await self.response_generator.agenerate_response(
+            **self._response_kwargs(danmaku, current_line, state)
+        )
+        return self._compose_danmaku_output(danmaku, handle_result, current_line, llm_result)
+
+    def _handle_batch_response(
+        self,
+        selected: List[Tuple[Danmaku, Dict]],
+        current_line,
+        state: PerformanceState,
+    ) -> Dict:
+        """一次 LLM 调用回应多条弹幕，回应依次接在本句台词前。"""
+        kwargs = self._response_kwargs(selected[0][0], current_line, state)
+        kwargs.pop("danmaku")
+        llm_results = self.response_generator.generate_batch_response(
+            [danmaku for danmaku, _ in selected], **kwargs
+        )
+        return self._compose_batch_output(selected, current_line, llm_results)
+
+    async def _ahandle_batch_response(
+        self,
+        selected: List[Tuple[Danmaku, Dict]],
+        current_line,
+        state: PerformanceState,
+    ) -> Dict:
+        """_handle_batch_response 的异步版本。"""
+        kwargs = self._response_kwargs(selected[0][0], current_line, state)
+        kwargs.pop("danmaku")
+        llm_results = await self.response_generator.agenerate_batch_response(
+            [danmaku for danmaku, _ in selected], **kwargs
+        )
+        return self._compose_batch_output(selected, current_line, llm_results)
+
+    def _stream_danmaku_reply(
+        self,
+        reply_kwargs: Dict,
+        handle_result: Dict,
+        output: Dict,
+        line_idx: int,
+        prefetcher: Optional[TTSPrefetcher],
+    ) -> AudioStream:
+        """
+        边生成边合成弹幕回应：LLM 每切出一句回应就 append 到同一个 TTS 会话，
+        观众听到回应的延迟取决于第一句的生成时间，而不是完整的 LLM + TTS 往返。
+
+        LLM 完成后按 llm_action 拼出完整台词并写回 output（speech / llm_action），
+        剩余部分（承接语 / 台词）接着送入同一会话；台词有预取时直接拼接预取音频。
+        """
+        danmaku = reply_kwargs["danmaku"]
+        current_line = reply_kwargs["current_line"]
+
+        async def produce(push: PushChunk) -> Optional[bytes]:
+            feed = TextFeed()
+            tts_task = asyncio.ensure_future(self.tts.asynthesize_texts(feed, push, record=False))
+            try:
+                llm_result = await self.response_generator.astream_response(
+                    **reply_kwargs, on_sentence=feed.put
+                )
+                response = llm_result.get("response", "")
+                # 已经念出去的回应以实际送入 TTS 的为准（流式中途失败时会走 fallback）
+                if feed.pieces and "".join(response.split()) != "".join(feed.text.split()):
+                    response = " ".join(feed.pieces)
+                elif not feed.pieces:
+                    feed.put(response)
+                output.update(
+                    self._compose_danmaku_output(
+                        danmaku, handle_result, current_line, {**llm_result, "response": response}
+                    )
+                )
+                raise_if_cancelled()
+
+                speech = output["speech"]
+                result, task, prefix = ("", None, "")
+                if prefetcher is not None:
+                    result, task, prefix = prefetcher.claim(line_idx, speech)
+                if result == "spliced":
+                    feed.put(prefix[len(response) :].strip())
+                    feed.close()
+                    head = await tts_task
+                    tail = await task
+                    audio = concat_wav([head, tail]) if head and tail else None
+                    if audio:
+                        push(wav_pcm(tail) or b"")
+                    prefetcher.stats.record(result if audio else "misses")
+                    if not audio:
+                        # 台词预取失败时至少保留已经念出的回应；audio_text 标明音频实际覆盖的文本
+                        audio = head
+                        output["audio_text"] = response
+                else:
+                    feed.put(speech[len(response) :].strip())
+                    feed.close()
+                    audio = await tts_task
+            except BaseException:
+                feed.close()
+                tts_task.cancel()
+                tts_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                raise
+
+            self.tts.add_to_recording(audio)
+            return audio
+
+        return AudioStream(produce, self.tts.sample_rate)
+
+    @staticmethod
+    def _response_kwargs(danmaku: Danmaku, current_line, state: PerformanceState) -> Dict:
+        """构造 DanmakuResponseGenerator 的调用参数。"""
         next_line = None
         if state.current_line_idx < len(state.script_lines) - 1:
             next_line = state.script_lines[state.current_line_idx + 1]
 
-        llm_result = self.response_generator.generate_response(
-            danmaku=danmaku,
-            current_line=current_line,
-            next_line=next_line,
-            memory=state.memory,
-            name=state.name,
-            persona=state.persona,
-            background=state.background,
-        )
+        return {
+            "danmaku": danmaku,
+            "current_line": current_line,
+            "next_line": next_line,
+            "memory": state.memory,
+            "name": state.name,
+            "persona": state.persona,
+            "background": state.background,
+        }
 
+    def _compose_danmaku_output(
+        self,
+        danmaku: Danmaku,
+        handle_result: Dict,
+        current_line,
+        llm_result: Dict,
+    ) -> Dict:
+        """把 LLM 回应与剧本台词拼成本步输出。"""
         response = llm_result.get("response", "")
         llm_action = llm_result.get("action", "continue")
         next_content = llm_result.get("next_content", "")
@@ -180,10 +432,40 @@ class PerformerV3:
         else:
             speech = f"{response} {current_line.text}"
 
+        output = self._danmaku_fields(danmaku, handle_result)
+        output.update({"speech": speech, "llm_action": llm_action})
+        return output
+
+    def _compose_batch_output(
+        self,
+        selected: List[Tuple[Danmaku, Dict]],
+        current_line,
+        llm_results: List[Dict],
+    ) -> Dict:
+        """把多条回应（按优先级顺序，去掉重复的）与剧本台词拼成本步输出。"""
+        responses = []
+        for result in llm_results:
+            response = result.get("response", "")
+            if response and response not in responses:
+                responses.append(response)
+        speech = " ".join(responses + [current_line.text])
+
+        # 排第一的弹幕决定叙事动作与优先级等字段
+        output = self._danmaku_fields(*selected[0])
+        output.update(
+            {
+                "speech": speech,
+                "llm_action": "continue",
+                "danmaku_batch": [danmaku.text for danmaku, _ in selected],
+            }
+        )
+        return output
+
+    @staticmethod
+    def _danmaku_fields(danmaku: Danmaku, handle_result: Dict) -> Dict:
+        """弹幕回应步骤中不依赖 LLM 结果的字段。"""
         return {
-            "speech": speech,
             "action": handle_result.get("action", "improvise"),
-            "llm_action": llm_action,
             "danmaku": danmaku.text,
             "priority": handle_result.get("priority", 0),
             "cost": handle_result.get("cost", 0),
@@ -202,11 +484,26 @@ class PerformerV3:
                 continue
             if promise.get("answer_at_line") == state.current_line_idx - 1:
                 promise["fulfilled"] = True
+                state.memory.mark_dirty("promises")
 
     def _generate_ending(self, state: PerformanceState) -> Dict:
         """生成结尾。"""
-        speech = f"好啦，今天关于{state.topic}就聊到这里，谢谢大家！"
+        speech = self._ending_speech(state)
         audio = self.tts.synthesize(speech) if self.tts.enabled else None
+        return self._ending_output(state, speech, audio)
+
+    async def _agenerate_ending(self, state: PerformanceState) -> Dict:
+        """_generate_ending 的异步版本。"""
+        speech = self._ending_speech(state)
+        audio = await self.tts.asynthesize(speech) if self.tts.enabled else None
+        return self._ending_output(state, speech, audio)
+
+    @staticmethod
+    def _ending_speech(state: PerformanceState) -> str:
+        return f"好啦，今天关于{state.topic}就聊到这里，谢谢大家！"
+
+    @staticmethod
+    def _ending_output(state: PerformanceState, speech: str, audio: Optional[bytes]) -> Dict:
         return {
             "speech": speech,
             "action": "end",
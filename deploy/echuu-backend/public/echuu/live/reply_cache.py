@@ -0,0 +1,209 @@
+"""
+弹幕回应的近似缓存。
+
+观众会反复发同几句弹幕（"真的假的"、"然后呢"、"哈哈哈"、"主播快说"），每条赢得打断的
+弹幕都要一次 LLM 调用。DanmakuReplyCache 按 (弹幕类型, 亲密度, 当前台词) 分桶，
+桶内用归一化文本精确匹配，匹配不到时再做近似匹配：
+
+- 归一化：NFKC、小写、去掉标点空白、把连续重复的字符压成两个（"哈哈哈哈" → "哈哈"）
+- 近似：64 位 SimHash（字符 bigram）做粗筛，再用 bigram Jaccard 相似度确认
+
+回应里出现的用户名存成 {user} 占位符，命中时替换成当前发弹幕的用户。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Hashable, Optional, Tuple
+
+from .metrics import DANMAKU_REPLY_CACHE
+
+USER_PLACEHOLDER = "{user}"
+# Danmaku 的默认用户名；"观众" 会出现在普通回应里（"观众们"），不做占位替换
+_ANONYMOUS_USER = "观众"
+DEFAULT_REPLY_CACHE_SIZE = 256
+DEFAULT_REPLY_SIMILARITY = 0.6
+# SimHash 粗筛的汉明距离上限；短文本特征少，阈值放宽，最终以 Jaccard 为准
+SIMHASH_MAX_DISTANCE = 20
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+_REPEATS = re.compile(r"(.)\1{2,}")
+
+
+def normalize_danmaku(text: str) -> str:
+    """弹幕归一化（用于缓存键）。"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _NON_WORD.sub("", text)
+    return _REPEATS.sub(r"\1\1", text)
+
+
+def char_ngrams(text: str, n: int = 2) -> FrozenSet[str]:
+    """字符 n-gram 集合；短于 n 的文本整体作为一个特征。"""
+    if len(text) < n:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i : i + n] for i in range(len(text) - n + 1))
+
+
+def simhash(features: FrozenSet[str]) -> int:
+    """64 位 SimHash。"""
+    weights = [0] * 64
+    for feature in features:
+        value = int.from_bytes(
+            hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big"
+        )
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# 缓存键：(分桶键, 归一化文本)
+ReplyKey = Tuple[Hashable, str]
+
+
+@dataclass
+class _Entry:
+    grams: FrozenSet[str]
+    fingerprint: int
+    result: Dict
+
+
+@dataclass
+class ReplyCacheStats:
+    """回应缓存命中统计。"""
+
+    exact_hits: int = 0
+    fuzzy_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.exact_hits + self.fuzzy_hits + self.misses
+        return (self.exact_hits + self.fuzzy_hits) / lookups if lookups else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio, 4),
+        }
+
+
+class DanmakuReplyCache:
+    """
+    LRU 淘汰的弹幕回应缓存。
+
+        key = cache.key(danmaku.text, danmaku_type, bonding_level, line_key)
+        result = cache.get(key, danmaku.user)      # 未命中返回 None
+        cache.put(key, result, danmaku.user)
+
+    key() 在归一化后为空（纯表情 / 标点）时返回 None，这类弹幕不缓存。
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_REPLY_CACHE_SIZE,
+        similarity: float = DEFAULT_REPLY_SIMILARITY,
+    ):
+        self.capacity = max(0, capacity)
+        self.similarity = similarity
+        self.stats = ReplyCacheStats()
+        self._entries: "OrderedDict[ReplyKey, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(
+        text: str, danmaku_type: str, bonding_level: int, line_key: Hashable
+    ) -> Optional[ReplyKey]:
+        normalized = normalize_danmaku(text)
+        if not normalized:
+            return None
+        return (danmaku_type, bonding_level, line_key), normalized
+
+    def get(self, key: Optional[ReplyKey], user: str) -> Optional[Dict]:
+        if key is None or not self.enabled:
+            return None
+        bucket, normalized = key
+        with self._lock:
+            entry = self._entries.get(key)
+            result = "exact_hit"
+            if entry is None:
+                entry = self._nearest(bucket, normalized)
+                result = "fuzzy_hit"
+            if entry is None:
+                self.stats.misses += 1
+                result = "miss"
+            elif result == "exact_hit":
+                self.stats.exact_hits += 1
+                self._entries.move_to_end(key)
+            else:
+                self.stats.fuzzy_hits += 1
+        DANMAKU_REPLY_CACHE.inc(result=result)
+        if entry is None:
+            return None
+        return {k: _fill_user(v, user) for k, v in entry.result.items()}
+
+    def put(self, key: Optional[ReplyKey], result: Dict, user: str):
+        if key is None or not self.enabled or not result.get("response"):
+            return
+        _, normalized = key
+        grams = char_ngrams(normalized)
+        stored = {k: _strip_user(v, user) for k, v in result.items()}
+        with self._lock:
+            self._entries[key] = _Entry(grams, simhash(grams), stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _nearest(self, bucket: Hashable, normalized: str) -> Optional[_Entry]:
+        """桶内最相似的条目（调用方持有锁）。"""
+        grams = char_ngrams(normalized)
+        fingerprint = simhash(grams)
+        best_key, best_score = None, self.similarity
+        for (entry_bucket, entry_text), entry in self._entries.items():
+            if entry_bucket != bucket:
+                continue
+            if bin(entry.fingerprint ^ fingerprint).count("1") > SIMHASH_MAX_DISTANCE:
+                continue
+            score = _jaccard(grams, entry.grams)
+            if score >= best_score:
+                best_key, best_score = (entry_bucket, entry_text), score
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key]
+
+
+def _strip_user(value, user: str):
+    # 单字用户名太容易误伤正文
+    if isinstance(value, str) and len(user) >= 2 and user != _ANONYMOUS_USER:
+        return value.replace(user, USER_PLACEHOLDER)
+    return value
+
+
+def _fill_user(value, user: str):
+    if isinstance(value, str):
+        return value.replace(USER_PLACEHOLDER, user)
+    return value
@@ -0,0 +1,178 @@
+"""
+进程级共享资源注册表。
+
+语料（annotated_clips / clips JSONL）、由其构建的索引（PatternAnalyzer /
+ExampleSampler）、LLM SDK 客户端、动态加载的 CosyVoiceTTS 类以及剧本历史索引，
+在一个进程里只需构建一次。EchuuLiveEngine 默认从这里取用，每个直播间只创建轻量的会话对象
+（剧本生成器、Performer、TTSClient 包装器）。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from ..core.pattern_analyzer import PatternAnalyzer
+from ..generators.example_sampler import ExampleSampler
+from .llm_cache import maybe_wrap_llm_cache
+from .llm_factory import LLMClientProtocol, create_llm_client
+from .script_index import INDEX_FILENAME, ScriptIndex
+from .singleflight import SingleFlightLLMClient
+from .tts_client import load_cosyvoice_class
+
+CLIPS_FILENAME = "vtuber_raw_clips_for_notebook_full_30_cleaned.jsonl"
+
+
+def find_project_root() -> Path:
+    """从当前工作目录向上寻找 echuu-agent 根目录（找不到时返回文件系统根）。"""
+    root = Path.cwd()
+    while root.name != "echuu-agent" and root.parent != root:
+        root = root.parent
+    return root
+
+
+def default_scripts_dir(project_root: Optional[Path] = None) -> Path:
+    """剧本与直播音频的保存目录（不存在时创建）。"""
+    scripts_dir = (project_root or find_project_root()) / "output" / "scripts"
+    scripts_dir.mkdir(parents=True, exist_ok=True)
+    return scripts_dir
+
+
+_script_indexes: Dict[Path, ScriptIndex] = {}
+_script_index_lock = threading.Lock()
+
+
+def open_script_index(scripts_dir: Path) -> Optional[ScriptIndex]:
+    """
+    剧本目录的历史索引；同一个索引文件在进程内只打开一次（引擎写入与 /api/history 共用）。
+
+    索引文件默认在剧本目录旁边，可用 SCRIPT_INDEX_PATH 指定；打不开时返回 None。
+    """
+    index_path = os.getenv("SCRIPT_INDEX_PATH")
+    db_path = Path(index_path) if index_path else Path(scripts_dir).parent / INDEX_FILENAME
+    key = db_path.resolve()
+    with _script_index_lock:
+        index = _script_indexes.get(key)
+        if index is None:
+            try:
+                index = _script_indexes[key] = ScriptIndex(scripts_dir, db_path)
+            except Exception as e:
+                print(f"[resources] script index unavailable: {e}")
+        return index
+
+
+@dataclass(frozen=True)
+class SharedResources:
+    """
+    只读的共享资源。
+
+    构建完成后不应再修改其中的对象：多个直播间（以及工作线程）会并发读取。
+    """
+
+    project_root: Path
+    scripts_dir: Path
+    llm: LLMClientProtocol
+    # 直播路径对冲请求用的（更便宜的）模型，未配置 LLM_HEDGE_MODEL 时与 llm 相同
+    hedge_llm: Optional[LLMClientProtocol] = None
+    analyzer: Optional[PatternAnalyzer] = None
+    example_sampler: Optional[ExampleSampler] = None
+    cosyvoice_cls: Optional[type] = None
+    script_index: Optional[ScriptIndex] = None
+
+    @classmethod
+    def load(
+        cls,
+        data_path: Optional[str] = None,
+        llm_provider: Optional[str] = None,
+    ) -> "SharedResources":
+        """读取 .env、语料与索引，并创建 SDK 客户端。"""
+        project_root = find_project_root()
+        load_dotenv(project_root / ".env")
+
+        analyzer = None
+        data_file = Path(data_path) if data_path else project_root / "data" / "annotated_clips.json"
+        if data_file.exists():
+            with data_file.open("r", encoding="utf-8") as f:
+                clips = json.load(f)
+            analyzer = PatternAnalyzer(clips)
+
+        clips_file = project_root / "data" / CLIPS_FILENAME
+        example_sampler = ExampleSampler(str(clips_file)) if clips_file.exists() else None
+
+        scripts_dir = default_scripts_dir(project_root)
+        script_index = open_script_index(scripts_dir)
+
+        # 进程内共享的客户端：相同的并发请求合并为一次，再按配置套上结果缓存
+        llm = SingleFlightLLMClient(create_llm_client(provider=llm_provider))
+        llm = maybe_wrap_llm_cache(llm, scripts_dir.parent)
+
+        hedge_llm = None
+        hedge_model = os.getenv("LLM_HEDGE_MODEL")
+        if hedge_model:
+            try:
+                hedge_llm = SingleFlightLLMClient(
+                    create_llm_client(
+                        provider=getattr(llm, "provider", llm_provider), model=hedge_model
+                    )
+                )
+            except Exception as e:
+                print(f"[resources] hedge model {hedge_model} unavailable: {e}")
+
+        return cls(
+            project_root=project_root,
+            scripts_dir=scripts_dir,
+            llm=llm,
+            hedge_llm=hedge_llm,
+            analyzer=analyzer,
+            example_sampler=example_sampler,
+            cosyvoice_cls=load_cosyvoice_class() if os.getenv("DASHSCOPE_API_KEY") else None,
+            script_index=script_index,
+        )
+
+
+_registry: Dict[Tuple[Optional[str], Optional[str]], SharedResources] = {}
+_registry_lock = threading.Lock()
+
+
+def get_shared_resources(
+    data_path: Optional[str] = None,
+    llm_provider: Optional[str] = None,
+) -> SharedResources:
+    """
+    获取（必要时懒加载）共享资源。
+
+    同一组 (data_path, llm_provider) 在进程内只构建一次；并发调用会等待首次构建完成。
+    """
+    key = (data_path, llm_provider)
+    resources = _registry.get(key)
+    if resources is not None:
+        return resources
+
+    with _registry_lock:
+        resources = _registry.get(key)
+        if resources is None:
+            resources = SharedResources.load(data_path=data_path, llm_provider=llm_provider)
+            _registry[key] = resources
+        return resources
+
+
+def install_shared_resources(
+    resources: SharedResources,
+    data_path: Optional[str] = None,
+    llm_provider: Optional[str] = None,
+):
+    """注册预先构建好的资源（压测 / 替换 provider 时使用）。"""
+    with _registry_lock:
+        _registry[(data_path, llm_provider)] = resources
+
+
+def reset_shared_resources():
+    """清空注册表，下次获取时重新构建。"""
+    with _registry_lock:
+        _registry.clear()
@@ -6,11 +6,34 @@ LLM 驱动的弹幕响应生成器（基于记忆系统、人格倾向和多语
 from __future__ import annotations
 
 import json
+import os
 import re
-from typing import Dict, Optional
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
 
 from .llm_client import LLMClient
+from .hedging import (
+    DEFAULT_HEDGE_QUANTILE,
+    BudgetExceeded,
+    HedgePolicy,
+    hedged_acall,
+    hedged_astream,
+)
+from .llm_context import llm_call_site
+from .metrics import (
+    DANMAKU_BATCH_SIZE,
+    DANMAKU_FIRST_SENTENCE_SECONDS,
+    DANMAKU_RESPONSE_SECONDS,
+    llm_labels,
+)
+from .reply_cache import (
+    DEFAULT_REPLY_CACHE_SIZE,
+    DEFAULT_REPLY_SIMILARITY,
+    DanmakuReplyCache,
+    ReplyKey,
+)
 from .state import Danmaku, PerformerMemory, UserProfile
+from .text_stream import ResponseFieldExtractor, SentenceSplitter
 from .language import (
     detect_language,
     detect_danmaku_language,
@@ -19,12 +42,29 @@ from .language import (
 )
 
 
+class _PendingReply(NamedTuple):
+    """批量回应里等待 LLM 回答的一条弹幕。"""
+
+    index: int  # 在 danmaku_list 里的序号
+    danmaku: Danmaku
+    user_profile: UserProfile
+    cache_key: Optional[ReplyKey]
+
+
 class DanmakuResponseGenerator:
     """
     使用LLM生成个性化、自然的弹幕响应。
     基于用户档案、互动历史、人格倾向、语言生成回应。
     """
 
+    # LLM 调用点名称（llm_policy 按它选择模型 / thinking level）
+    CALL_SITE = "danmaku_reply"
+    BATCH_CALL_SITE = "danmaku_batch"
+
+    SYSTEM_PROMPT = (
+        "你是一个VTuber主播，正在直播。你记得你的观众，会根据关系不同而回应。用JSON格式回复。"
+    )
+
     RESPONSE_PROMPT = """你是正在直播的VTuber主播{name}。
 
 ## 你的人设
@@ -91,9 +131,72 @@ class DanmakuResponseGenerator:
 
 只输出JSON，不要其他内容。"""
 
-    def __init__(self, llm: LLMClient, stream_lang_context: Optional[StreamLanguageContext] = None):
+    BATCH_SYSTEM_PROMPT = (
+        "你是一个VTuber主播，正在直播。你记得你的观众，会根据关系不同而回应。用JSON数组回复。"
+    )
+
+    BATCH_PROMPT = """你是正在直播的VTuber主播{name}。
+
+## 你的人设
+- 人设: {persona}
+- 背景: {background}
+- 说话风格: 自然口语化，像真人一样
+
+## 语言要求
+{language_hint}
+
+## 当前情况
+- 正在讲到: {stage}
+- 刚才说: {current_text_preview}
+- 接下来要讲: {next_text_preview}
+
+## 同时收到的弹幕（按重要程度排序）
+{danmaku_list}
+
+## 回应原则（非常重要）
+1. **逐条回应** - 每条弹幕一句短回应（20字以内），按编号对应
+2. **点名** - 这几句会连着说出来，回应里带上观众的名字，让大家知道在回谁
+3. **不要复述弹幕** - 不要说"有人说xxx"
+4. **根据关系调整** - 熟人更随意，新人更热情
+5. **不要重复** - 每句回应换一种说法
+
+## 输出格式（纯JSON数组，无markdown）
+[
+    {{"id": 1, "response": "对1号弹幕的回应"}},
+    {{"id": 2, "response": "对2号弹幕的回应"}}
+]
+
+只输出JSON数组，不要其他内容。"""
+
+    # 批量回应每多一条弹幕增加的 max_tokens
+    BATCH_TOKENS_PER_ITEM = 100
+
+    def __init__(
+        self,
+        llm: LLMClient,
+        stream_lang_context: Optional[StreamLanguageContext] = None,
+        reply_cache: Optional[DanmakuReplyCache] = None,
+        hedge_llm: Optional[LLMClient] = None,
+    ):
         self.llm = llm
         self.stream_lang_context = stream_lang_context
+        # 异步路径的延迟预算：超过 p90 未返回时发对冲请求，预算用完退回快速回应
+        # （DANMAKU_REPLY_BUDGET=0 关闭）
+        self.hedge_policy = HedgePolicy(
+            budget=float(os.getenv("DANMAKU_REPLY_BUDGET", "8")),
+            quantile=float(os.getenv("LLM_HEDGE_QUANTILE", str(DEFAULT_HEDGE_QUANTILE))),
+            hedge_llm=hedge_llm,
+        )
+        # 重复弹幕直接复用之前的回应（DANMAKU_CACHE_SIZE=0 关闭）
+        # （DanmakuReplyCache 定义了 __len__，空缓存为假值，不能用 or）
+        if reply_cache is None:
+            reply_cache = DanmakuReplyCache(
+                capacity=int(os.getenv("DANMAKU_CACHE_SIZE", str(DEFAULT_REPLY_CACHE_SIZE))),
+                similarity=float(
+                    os.getenv("DANMAKU_CACHE_SIMILARITY", str(DEFAULT_REPLY_SIMILARITY))
+                ),
+            )
+        self.reply_cache = reply_cache
 
     def generate_response(
         self,
@@ -109,22 +212,357 @@ class DanmakuResponseGenerator:
         生成对弹幕的个性化响应。
         使用LLM根据用户档案、关系、历史、语言生成回应。
         """
-        # 更新用户档案（自动记录互动）
-        user_profile = memory.update_user_from_danmaku(danmaku)
+        user_profile, early, prompt, cache_key = self._prepare(
+            danmaku, current_line, next_line, memory, name, persona, background
+        )
+        if early is not None:
+            return early
+
+        with llm_call_site(self.CALL_SITE):
+            start = time.perf_counter()
+            try:
+                response_text = self.llm.call(
+                    system=self.SYSTEM_PROMPT,
+                    prompt=prompt,
+                    max_tokens=400,
+                )
+            except Exception as exc:
+                self._observe(start, "error")
+                print(f"[DanmakuResponse] LLM调用失败: {exc}")
+                return self._fallback_result(user_profile, danmaku)
+            self._observe(start, "ok")
+
+        return self._finish(response_text, user_profile, danmaku, cache_key)
+
+    async def agenerate_response(
+        self,
+        danmaku: Danmaku,
+        current_line,
+        next_line: Optional,
+        memory: PerformerMemory,
+        name: str,
+        persona: str,
+        background: str,
+    ) -> Dict:
+        """
+        generate_response 的异步版本：LLM 走异步 SDK（或工作线程），不阻塞事件循环。
 
-        # 判断是否应该用欢迎消息（新观众或明显支持）
-        if self.stream_lang_context and self.stream_lang_context.should_use_welcome_message(user_profile, danmaku.text):
-            # 生成欢迎消息
-            danmaku_lang = detect_language(danmaku.text)
-            welcome_msg = danmaku_lang.get_welcome_message(danmaku.user, name)
-            return {
-                "response": welcome_msg,
-                "action": "continue",
-                "next_content": "",
-            }
+        带延迟预算与对冲请求（见 hedging）；预算用完时返回 generate_quick_response 的回应。
+        """
+        user_profile, early, prompt, cache_key = self._prepare(
+            danmaku, current_line, next_line, memory, name, persona, background
+        )
+        if early is not None:
+            return early
+
+        with llm_call_site(self.CALL_SITE):
+            start = time.perf_counter()
+            try:
+                response_text = await hedged_acall(
+                    self.llm,
+                    self.hedge_policy,
+                    system=self.SYSTEM_PROMPT,
+                    prompt=prompt,
+                    max_tokens=400,
+                )
+            except BudgetExceeded:
+                self._observe(start, "timeout")
+                print(
+                    f"[DanmakuResponse] LLM超出 {self.hedge_policy.budget:.1f}s 预算，使用快速回应"
+                )
+                return self._fallback_result(user_profile, danmaku)
+            except Exception as exc:
+                self._observe(start, "error")
+                print(f"[DanmakuResponse] LLM调用失败: {exc}")
+                return self._fallback_result(user_profile, danmaku)
+            self._observe(start, "ok")
+
+        return self._finish(response_text, user_profile, danmaku, cache_key)
+
+    @property
+    def streaming(self) -> bool:
+        """LLM 客户端是否支持流式输出（astream / stream）。"""
+        return any(callable(getattr(self.llm, name, None)) for name in ("astream", "stream"))
+
+    async def astream_response(
+        self,
+        danmaku: Danmaku,
+        current_line,
+        next_line: Optional,
+        memory: PerformerMemory,
+        name: str,
+        persona: str,
+        background: str,
+        on_sentence: Callable[[str], None],
+    ) -> Dict:
+        """
+        流式生成回应：边接收 LLM 输出边从 JSON 里解出 response 字段，
+        每切出一句就调用 on_sentence，不等整段 JSON 完成。
 
-        # 判断弹幕类型
-        danmaku_type = self._classify_danmaku(danmaku)
+        返回值与 agenerate_response 相同。欢迎语、缓存命中、调用失败或首个分片超出预算时
+        不会调用 on_sentence，由调用方使用返回的 response。
+        """
+        user_profile, early, prompt, cache_key = self._prepare(
+            danmaku, current_line, next_line, memory, name, persona, background
+        )
+        if early is not None:
+            return early
+
+        with llm_call_site(self.CALL_SITE):
+            start = time.perf_counter()
+            labels = llm_labels(self.llm)
+            extractor = ResponseFieldExtractor("response")
+            splitter = SentenceSplitter()
+            parts = []
+            first = True
+
+            def emit(sentence: str):
+                nonlocal first
+                if first:
+                    DANMAKU_FIRST_SENTENCE_SECONDS.observe(time.perf_counter() - start, **labels)
+                    first = False
+                on_sentence(sentence)
+
+            try:
+                async for delta in hedged_astream(
+                    self.llm,
+                    self.hedge_policy,
+                    system=self.SYSTEM_PROMPT,
+                    prompt=prompt,
+                    max_tokens=400,
+                ):
+                    parts.append(delta)
+                    for sentence in splitter.feed(extractor.feed(delta)):
+                        emit(sentence)
+                tail = splitter.flush()
+                if tail:
+                    emit(tail)
+            except BudgetExceeded:
+                self._observe(start, "timeout")
+                print(
+                    f"[DanmakuResponse] LLM首个分片超出 {self.hedge_policy.budget:.1f}s 预算，使用快速回应"
+                )
+                return self._fallback_result(user_profile, danmaku)
+            except Exception as exc:
+                self._observe(start, "error")
+                print(f"[DanmakuResponse] LLM流式调用失败: {exc}")
+                return self._fallback_result(user_profile, danmaku)
+            self._observe(start, "ok")
+
+        return self._finish("".join(parts), user_profile, danmaku, cache_key)
+
+    def generate_batch_response(
+        self,
+        danmaku_list: List[Danmaku],
+        current_line,
+        next_line: Optional,
+        memory: PerformerMemory,
+        name: str,
+        persona: str,
+        background: str,
+    ) -> List[Dict]:
+        """
+        一次 LLM 调用回应多条弹幕（LLM 返回 JSON 数组，每条一句短回应）。
+
+        返回与 danmaku_list 一一对应的结果，格式同 generate_response（action 固定为 continue）。
+        欢迎语与回应缓存命中的弹幕不进入 prompt；数组里缺失或解析失败的条目走 fallback。
+        """
+        results, pending, prompt = self._prepare_batch(
+            danmaku_list, current_line, next_line, memory, name, persona, background
+        )
+        if not pending:
+            return results
+
+        with llm_call_site(self.BATCH_CALL_SITE):
+            start = time.perf_counter()
+            try:
+                response_text = self.llm.call(
+                    system=self.BATCH_SYSTEM_PROMPT,
+                    prompt=prompt,
+                    max_tokens=self._batch_max_tokens(len(pending)),
+                )
+            except Exception as exc:
+                self._observe(start, "error")
+                print(f"[DanmakuResponse] 批量LLM调用失败: {exc}")
+                return self._finish_batch("", results, pending)
+            self._observe(start, "ok")
+
+        return self._finish_batch(response_text, results, pending)
+
+    async def agenerate_batch_response(
+        self,
+        danmaku_list: List[Danmaku],
+        current_line,
+        next_line: Optional,
+        memory: PerformerMemory,
+        name: str,
+        persona: str,
+        background: str,
+    ) -> List[Dict]:
+        """generate_batch_response 的异步版本（带延迟预算与对冲请求，超出预算时全部走 fallback）。"""
+        results, pending, prompt = self._prepare_batch(
+            danmaku_list, current_line, next_line, memory, name, persona, background
+        )
+        if not pending:
+            return results
+
+        with llm_call_site(self.BATCH_CALL_SITE):
+            start = time.perf_counter()
+            try:
+                response_text = await hedged_acall(
+                    self.llm,
+                    self.hedge_policy,
+                    system=self.BATCH_SYSTEM_PROMPT,
+                    prompt=prompt,
+                    max_tokens=self._batch_max_tokens(len(pending)),
+                )
+            except BudgetExceeded:
+                self._observe(start, "timeout")
+                print(
+                    f"[DanmakuResponse] 批量LLM超出 {self.hedge_policy.budget:.1f}s 预算，使用快速回应"
+                )
+                return self._finish_batch("", results, pending)
+            except Exception as exc:
+                self._observe(start, "error")
+                print(f"[DanmakuResponse] 批量LLM调用失败: {exc}")
+                return self._finish_batch("", results, pending)
+            self._observe(start, "ok")
+
+        return self._finish_batch(response_text, results, pending)
+
+    def _batch_max_tokens(self, count: int) -> int:
+        return 400 + self.BATCH_TOKENS_PER_ITEM * (count - 1)
+
+    def _prepare_batch(
+        self,
+        danmaku_list: List[Danmaku],
+        current_line,
+        next_line: Optional,
+        memory: PerformerMemory,
+        name: str,
+        persona: str,
+        background: str,
+    ) -> Tuple[List[Optional[Dict]], List[_PendingReply], Optional[str]]:
+        """
+        逐条更新用户档案，把需要 LLM 的弹幕编进同一个 prompt。
+
+        Returns:
+            (results, pending, prompt)。results 与 danmaku_list 对齐，需要 LLM 的位置为 None；
+            pending 为等待 LLM 的弹幕，为空时 prompt 为 None。
+        """
+        results: List[Optional[Dict]] = []
+        pending: List[_PendingReply] = []
+        entries = []
+        for index, danmaku in enumerate(danmaku_list):
+            user_profile, early, danmaku_type, cache_key = self._lookup(
+                danmaku, current_line, memory, name
+            )
+            results.append(early)
+            if early is not None:
+                continue
+            pending.append(_PendingReply(index, danmaku, user_profile, cache_key))
+            entries.append(
+                f"{len(entries) + 1}. {danmaku.user}（{user_profile.get_bonding_description()}，"
+                f'互动{user_profile.interaction_count}次）: "{danmaku.text}" —— {danmaku_type}'
+            )
+        if not pending:
+            return results, pending, None
+
+        prompt = self.BATCH_PROMPT.format(
+            name=name,
+            persona=persona,
+            background=background,
+            stage=current_line.stage,
+            current_text_preview=current_line.text[:60] + "...",
+            next_text_preview=next_line.text[:60] + "..." if next_line else "（故事即将结束）",
+            danmaku_list="\n".join(entries),
+            language_hint=self._language_hint(" ".join(p.danmaku.text for p in pending)),
+        )
+        return results, pending, prompt
+
+    def _finish_batch(
+        self,
+        response_text: str,
+        results: List[Optional[Dict]],
+        pending: List[_PendingReply],
+    ) -> List[Dict]:
+        """按编号填回各条回应；解析成功的写入回应缓存，其余走 fallback。"""
+        DANMAKU_BATCH_SIZE.observe(len(pending))
+        replies = (
+            self._parse_batch(response_text, len(pending))
+            if response_text
+            else [None] * len(pending)
+        )
+        for item, reply in zip(pending, replies):
+            if reply:
+                result = {"response": reply, "action": "continue", "next_content": ""}
+                self.reply_cache.put(item.cache_key, result, item.danmaku.user)
+            else:
+                result = self._fallback_result(item.user_profile, item.danmaku)
+            results[item.index] = result
+        return results
+
+    def _parse_batch(self, response_text: str, count: int) -> List[Optional[str]]:
+        """解析 JSON 数组形式的批量回应，返回按编号排列的 count 条回应（缺失为 None）。"""
+        try:
+            items = json.loads(self._clean_json_response(response_text))
+        except json.JSONDecodeError as exc:
+            print(f"[DanmakuResponse] 批量JSON解析失败: {exc}")
+            # 输出被截断时保留已经完整的条目
+            found = re.findall(r'"response"\s*:\s*"([^"]*)"', response_text)
+            return (found + [None] * count)[:count]
+
+        if isinstance(items, dict):
+            items = items.get("replies") or items.get("responses") or [items]
+        replies: List[Optional[str]] = [None] * count
+        if not isinstance(items, list):
+            return replies
+        for position, item in enumerate(items):
+            if isinstance(item, dict):
+                reply = item.get("response")
+                item_id = item.get("id")
+                # 编号缺失或越界时按数组顺序对应
+                index = (
+                    item_id - 1 if isinstance(item_id, int) and 1 <= item_id <= count else position
+                )
+            else:
+                reply, index = item, position
+            if (
+                index < count
+                and replies[index] is None
+                and isinstance(reply, str)
+                and reply.strip()
+            ):
+                replies[index] = reply.strip()
+        return replies
+
+    def _observe(self, start: float, outcome: str):
+        DANMAKU_RESPONSE_SECONDS.observe(
+            time.perf_counter() - start, outcome=outcome, **llm_labels(self.llm)
+        )
+
+    def _prepare(
+        self,
+        danmaku: Danmaku,
+        current_line,
+        next_line: Optional,
+        memory: PerformerMemory,
+        name: str,
+        persona: str,
+        background: str,
+    ) -> Tuple[UserProfile, Optional[Dict], Optional[str], Optional[ReplyKey]]:
+        """
+        更新用户档案并构建 prompt。
+
+        Returns:
+            (user_profile, early_result, prompt, cache_key)。early_result 不为空时
+            （欢迎语或回应缓存命中）无需调用 LLM。
+        """
+        user_profile, early, danmaku_type, cache_key = self._lookup(
+            danmaku, current_line, memory, name
+        )
+        if early is not None:
+            return user_profile, early, None, cache_key
 
         # 获取用户上下文
         user_context = self._build_user_context(user_profile, memory)
@@ -132,11 +570,6 @@ class DanmakuResponseGenerator:
         # 获取关系描述
         user_relationship = user_profile.get_bonding_description()
 
-        # 获取语言提示
-        language_hint = "用中文回应，自然口语化，像真人一样"
-        if self.stream_lang_context:
-            language_hint = self.stream_lang_context.get_language_hint_for_llm(danmaku.text)
-
         # 构建prompt
         prompt = self.RESPONSE_PROMPT.format(
             name=name,
@@ -150,22 +583,84 @@ class DanmakuResponseGenerator:
             danmaku_text=danmaku.text,
             danmaku_type=danmaku_type,
             user_context=user_context,
-            language_hint=language_hint,
+            language_hint=self._language_hint(danmaku.text),
         )
+        return user_profile, None, prompt, cache_key
 
-        try:
-            response_text = self.llm.call(
-                system="你是一个VTuber主播，正在直播。你记得你的观众，会根据关系不同而回应。用JSON格式回复。",
-                prompt=prompt,
-                max_tokens=400,
+    def _lookup(
+        self,
+        danmaku: Danmaku,
+        current_line,
+        memory: PerformerMemory,
+        name: str,
+    ) -> Tuple[UserProfile, Optional[Dict], str, Optional[ReplyKey]]:
+        """
+        更新用户档案，判断能否不调用 LLM（欢迎语 / 回应缓存命中）。
+
+        Returns:
+            (user_profile, early_result, danmaku_type, cache_key)
+        """
+        # 更新用户档案（自动记录互动）
+        user_profile = memory.update_user_from_danmaku(danmaku)
+
+        # 判断是否应该用欢迎消息（新观众或明显支持）
+        if self.stream_lang_context and self.stream_lang_context.should_use_welcome_message(
+            user_profile, danmaku.text
+        ):
+            # 生成欢迎消息
+            danmaku_lang = detect_language(danmaku.text)
+            welcome_msg = danmaku_lang.get_welcome_message(danmaku.user, name)
+            return (
+                user_profile,
+                {
+                    "response": welcome_msg,
+                    "action": "continue",
+                    "next_content": "",
+                },
+                "",
+                None,
             )
 
+        # 判断弹幕类型
+        danmaku_type = self._classify_danmaku(danmaku)
+
+        # 同一句台词下同类、同亲密度的重复弹幕复用之前的回应
+        cache_key = self.reply_cache.key(
+            danmaku.text, danmaku_type, user_profile.bonding_level, current_line.text
+        )
+        cached = self.reply_cache.get(cache_key, danmaku.user)
+        return user_profile, cached, danmaku_type, cache_key
+
+    def _language_hint(self, text: str) -> str:
+        if self.stream_lang_context:
+            return self.stream_lang_context.get_language_hint_for_llm(text)
+        return "用中文回应，自然口语化，像真人一样"
+
+    def _finish(
+        self,
+        response_text: str,
+        user_profile: UserProfile,
+        danmaku: Danmaku,
+        cache_key: Optional[ReplyKey],
+    ) -> Dict:
+        """解析 LLM 输出；解析成功的回应写入回应缓存（fallback 不缓存）。"""
+        result, parsed = self._parse_result(response_text, user_profile, danmaku)
+        if parsed:
+            self.reply_cache.put(cache_key, result, danmaku.user)
+        return result
+
+    def _parse_result(
+        self, response_text: str, user_profile: UserProfile, danmaku: Danmaku
+    ) -> Tuple[Dict, bool]:
+        """解析 LLM 输出，失败时走 fallback。返回 (result, 是否来自 LLM 输出)。"""
+        try:
             # 清理和解析响应
             response_text = self._clean_json_response(response_text)
             result = json.loads(response_text)
 
             # 确保必要字段存在
-            if "response" not in result or not result["response"]:
+            parsed = bool(result.get("response"))
+            if not parsed:
                 # Fallback: 根据关系生成简单回应
                 result = {
                     "response": self._generate_fallback_response(user_profile, danmaku),
@@ -175,7 +670,7 @@ class DanmakuResponseGenerator:
             result.setdefault("action", "continue")
             result.setdefault("next_content", "")
 
-            return result
+            return result, parsed
 
         except json.JSONDecodeError as exc:
             print(f"[DanmakuResponse] JSON解析失败: {exc}")
@@ -187,20 +682,19 @@ class DanmakuResponseGenerator:
                     "response": extracted,
                     "action": "continue",
                     "next_content": "",
-                }
+                }, True
             # 使用智能fallback
-            return {
-                "response": self._generate_fallback_response(user_profile, danmaku),
-                "action": "continue",
-                "next_content": "",
-            }
+            return self._fallback_result(user_profile, danmaku), False
         except Exception as exc:
-            print(f"[DanmakuResponse] LLM调用失败: {exc}")
-            return {
-                "response": self._generate_fallback_response(user_profile, danmaku),
-                "action": "continue",
-                "next_content": "",
-            }
+            print(f"[DanmakuResponse] 响应处理失败: {exc}")
+            return self._fallback_result(user_profile, danmaku), False
+
+    def _fallback_result(self, user_profile: UserProfile, danmaku: Danmaku) -> Dict:
+        return {
+            "response": self._generate_fallback_response(user_profile, danmaku),
+            "action": "continue",
+            "next_content": "",
+        }
 
     def _classify_danmaku(self, danmaku: Danmaku) -> str:
         """分类弹幕类型。"""
@@ -0,0 +1,289 @@
+"""
+剧本历史的元数据索引（SQLite）。
+
+output/scripts/*.json 每个文件对应一行元数据；EchuuLiveEngine._save_script 保存后
+增量写入，进程启动时 reconcile() 与目录对账（补录新增 / 修改的文件，删除已不存在的）。
+查询走索引，不再逐个读取 JSON：
+
+- 按 (mtime, filename) 倒序的游标分页
+- 按 name / topic（子串）与日期范围过滤
+- 剧本全文搜索（SQLite 带 FTS5 时使用 FTS5，否则退化为 LIKE）
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+INDEX_FILENAME = "scripts_index.sqlite3"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scripts (
+    filename    TEXT PRIMARY KEY,
+    name        TEXT NOT NULL DEFAULT '',
+    topic       TEXT NOT NULL DEFAULT '',
+    timestamp   TEXT NOT NULL DEFAULT '',
+    total_lines INTEGER NOT NULL DEFAULT 0,
+    body        TEXT NOT NULL DEFAULT '',
+    mtime       REAL NOT NULL,
+    size        INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scripts_order ON scripts (mtime DESC, filename DESC);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS scripts_fts USING fts5(
+    filename UNINDEXED, name, topic, body, tokenize = 'trigram'
+);
+"""
+
+
+def _fts5_available(conn: sqlite3.Connection) -> bool:
+    """检测 SQLite 是否编译了 FTS5（trigram 分词器可直接处理中日文子串）。"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts_probe USING fts5(x, tokenize = 'trigram')")
+        conn.execute("DROP TABLE temp._fts_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def encode_cursor(mtime: float, filename: str) -> str:
+    raw = json.dumps([mtime, filename], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """解析游标；格式不对时抛出 ValueError。"""
+    try:
+        mtime, filename = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(mtime), str(filename)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+def _read_script_file(path: Path) -> Dict:
+    """读取剧本文件，抽取需要入索引的字段。"""
+    with path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    meta = data.get("metadata", {})
+    lines = data.get("script", [])
+    return {
+        "name": meta.get("name", ""),
+        "topic": meta.get("topic", ""),
+        "timestamp": meta.get("timestamp", ""),
+        "total_lines": meta.get("total_lines", len(lines)),
+        "body": "\n".join(line.get("text", "") for line in lines if isinstance(line, dict)),
+    }
+
+
+class ScriptIndex:
+    """
+    剧本元数据索引。
+
+    连接在多个线程间共享（FastAPI 通过 asyncio.to_thread 调用），所有访问都加锁。
+    """
+
+    def __init__(self, scripts_dir: Path, db_path: Optional[Path] = None):
+        self.scripts_dir = Path(scripts_dir)
+        self.db_path = Path(db_path) if db_path else self.scripts_dir.parent / INDEX_FILENAME
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self.fts_enabled = _fts5_available(self._conn)
+        if self.fts_enabled:
+            self._conn.executescript(_FTS_SCHEMA)
+        self._conn.commit()
+
+    # ==================== 写入 ====================
+
+    def upsert_file(self, path: Path):
+        """把单个剧本文件写入（或更新）索引。"""
+        path = Path(path)
+        stat = path.stat()
+        fields = _read_script_file(path)
+        with self._lock:
+            self._upsert(path.name, fields, stat.st_mtime, stat.st_size)
+            self._conn.commit()
+
+    def remove(self, filename: str):
+        with self._lock:
+            self._delete(filename)
+            self._conn.commit()
+
+    def reconcile(self) -> Dict[str, int]:
+        """
+        与剧本目录对账。
+
+        Returns:
+            {"added": n, "updated": n, "removed": n, "failed": n}
+        """
+        stats = {"added": 0, "updated": 0, "removed": 0, "failed": 0}
+        on_disk = {}
+        for path in self.scripts_dir.glob("*.json"):
+            try:
+                on_disk[path.name] = (path, path.stat())
+            except OSError:
+                continue
+
+        with self._lock:
+            indexed = {
+                row["filename"]: (row["mtime"], row["size"])
+                for row in self._conn.execute("SELECT filename, mtime, size FROM scripts")
+            }
+
+            for filename in indexed.keys() - on_disk.keys():
+                self._delete(filename)
+                stats["removed"] += 1
+
+            for filename, (path, stat) in on_disk.items():
+                known = indexed.get(filename)
+                if known == (stat.st_mtime, stat.st_size):
+                    continue
+                try:
+                    fields = _read_script_file(path)
+                except Exception as e:
+                    print(f"[script_index] skip {filename}: {e}")
+                    stats["failed"] += 1
+                    continue
+                self._upsert(filename, fields, stat.st_mtime, stat.st_size)
+                stats["updated" if known else "added"] += 1
+
+            self._conn.commit()
+        return stats
+
+    def _upsert(self, filename: str, fields: Dict, mtime: float, size: int):
+        self._conn.execute(
+            """
+            INSERT INTO scripts (filename, name, topic, timestamp, total_lines, body, mtime, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(filename) DO UPDATE SET
+                name = excluded.name, topic = excluded.topic, timestamp = excluded.timestamp,
+                total_lines = excluded.total_lines, body = excluded.body,
+                mtime = excluded.mtime, size = excluded.size
+            """,
+            (
+                filename,
+                fields["name"],
+                fields["topic"],
+                fields["timestamp"],
+                int(fields["total_lines"] or 0),
+                fields["body"],
+                mtime,
+                size,
+            ),
+        )
+        if self.fts_enabled:
+            self._conn.execute("DELETE FROM scripts_fts WHERE filename = ?", (filename,))
+            self._conn.execute(
+                "INSERT INTO scripts_fts (filename, name, topic, body) VALUES (?, ?, ?, ?)",
+                (filename, fields["name"], fields["topic"], fields["body"]),
+            )
+
+    def _delete(self, filename: str):
+        self._conn.execute("DELETE FROM scripts WHERE filename = ?", (filename,))
+        if self.fts_enabled:
+            self._conn.execute("DELETE FROM scripts_fts WHERE filename = ?", (filename,))
+
+    # ==================== 查询 ====================
+
+    def query(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        name: Optional[str] = None,
+        topic: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        q: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        按保存时间倒序分页查询。
+
+        Args:
+            limit: 每页条数（1 ~ MAX_PAGE_SIZE）
+            cursor: 上一页返回的 next_cursor
+            name / topic: 子串过滤
+            since / until: 保存时间范围（闭区间）
+            q: 全文搜索（角色名、话题与剧本台词）
+
+        Returns:
+            (items, next_cursor)；没有下一页时 next_cursor 为 None。
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        where, params = [], []
+
+        if cursor:
+            c_mtime, c_filename = decode_cursor(cursor)
+            where.append("(s.mtime < ? OR (s.mtime = ? AND s.filename < ?))")
+            params += [c_mtime, c_mtime, c_filename]
+        if name:
+            where.append("s.name LIKE ?")
+            params.append(f"%{name}%")
+        if topic:
+            where.append("s.topic LIKE ?")
+            params.append(f"%{topic}%")
+        if since:
+            where.append("s.mtime >= ?")
+            params.append(since.timestamp())
+        if until:
+            where.append("s.mtime <= ?")
+            params.append(until.timestamp())
+        if q:
+            q = q.strip()
+            # trigram 至少需要 3 个字符，更短的查询退化为 LIKE
+            if self.fts_enabled and len(q) >= 3:
+                where.append(
+                    "s.filename IN (SELECT filename FROM scripts_fts WHERE scripts_fts MATCH ?)"
+                )
+                params.append('"' + q.replace('"', '""') + '"')
+            else:
+                where.append("(s.name LIKE ? OR s.topic LIKE ? OR s.body LIKE ?)")
+                params += [f"%{q}%"] * 3
+
+        sql = (
+            "SELECT s.filename, s.name, s.topic, s.timestamp, s.total_lines, s.mtime FROM scripts s"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY s.mtime DESC, s.filename DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last["mtime"], last["filename"])
+
+        items = [
+            {
+                "filename": row["filename"],
+                "title": row["topic"] or "未命名",
+                "name": row["name"] or "未知",
+                "timestamp": row["timestamp"],
+                "total_lines": row["total_lines"],
+            }
+            for row in rows
+        ]
+        return items, next_cursor
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scripts").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
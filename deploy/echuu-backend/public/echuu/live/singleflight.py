@@ -0,0 +1,275 @@
+"""
+相同请求的合并（single-flight）。
+
+多个直播间同时开播同一个预设话题、同一直播间一秒内两次合成同一句欢迎语 / 兜底台词时，
+相同的 LLM 或 TTS 请求只发一次：第一个调用方（leader）真正请求上游，同一时刻到达的
+相同请求（follower）等待并共享它的结果或异常。
+
+- do()：同步版本，供工作线程里的 LLM call / TTS synthesize 使用；leader 在执行过程中
+  可以 publish 中间结果（如 PCM 分片），follower 订阅时先补发已有的分片再接收后续分片
+- ado()：异步版本，相同请求共享一个 Task；某个调用方被取消只放弃自己的等待，
+  所有调用方都放弃时才取消 Task
+
+leader 在自己的上下文里执行，所以会响应 leader 所在直播的 CancelToken。leader 因此
+抛出 Cancelled 而 follower 自己并未取消时，follower 重新发起请求（已经收到过分片的
+follower 无法重放，改为抛出 RuntimeError，按普通失败处理）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from .cancel import Cancelled, current_token
+from .llm_factory import LLMClientProtocol, llm_request_key
+from .metrics import SINGLEFLIGHT
+
+T = TypeVar("T")
+Publish = Callable[[Any], None]
+
+_POLL_INTERVAL = 0.05
+
+# 为 False 时 SingleFlightLLMClient 不合并请求（对冲请求必须独立发出）
+_coalesce: ContextVar[bool] = ContextVar("echuu_llm_coalesce", default=True)
+
+
+@contextmanager
+def no_coalesce() -> Iterator[None]:
+    """with 块内的 LLM 请求不与进行中的相同请求合并。"""
+    reset = _coalesce.set(False)
+    try:
+        yield
+    finally:
+        _coalesce.reset(reset)
+
+
+class _Call:
+    """一次进行中的同步请求。"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._items: List[Any] = []
+        self._subscribers: List[Callable[[Any], None]] = []
+
+    def publish(self, item: Any):
+        # 在锁内分发，保证每个订阅者收到的顺序一致（订阅者应只做入队之类的轻量操作）
+        with self._lock:
+            self._items.append(item)
+            for subscriber in self._subscribers:
+                subscriber(item)
+
+    def subscribe(self, subscriber: Callable[[Any], None]) -> int:
+        """订阅并补发已有的中间结果，返回补发的数量。"""
+        with self._lock:
+            for item in self._items:
+                subscriber(item)
+            self._subscribers.append(subscriber)
+            return len(self._items)
+
+    def unsubscribe(self, subscriber: Callable[[Any], None]):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    @property
+    def published(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    按 key 合并同时进行的相同请求。
+
+        flights = SingleFlight("tts")
+        audio = flights.do(key, lambda publish: tts.synthesize(text, on_audio=publish),
+                           subscriber=on_chunk)
+        text = await flights.ado(key, lambda: llm.acall(prompt))
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], _AsyncCall] = {}
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._async_calls)
+
+    # ==================== 同步 ====================
+
+    def do(
+        self,
+        key: Hashable,
+        fn: Callable[[Publish], T],
+        subscriber: Optional[Callable[[Any], None]] = None,
+    ) -> T:
+        """
+        执行 fn(publish)，或等待同 key 的进行中请求并返回它的结果。
+
+        subscriber 收到该请求 publish 的全部中间结果（包括加入前已经产生的）。
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if subscriber is not None:
+                call.subscribe(subscriber)
+            self._count("leader" if leader else "shared")
+
+            if leader:
+                try:
+                    call.result = fn(call.publish)
+                    return call.result
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    self._forget(key, call)
+                    call.done.set()
+
+            try:
+                self._wait(call)
+            finally:
+                if subscriber is not None:
+                    call.unsubscribe(subscriber)
+            if call.error is None:
+                return call.result
+            if not self._foreign_cancel(call.error):
+                raise call.error
+            if subscriber is not None and call.published:
+                raise RuntimeError(f"shared {self.group} request was cancelled by another caller")
+            self._count("retry")
+
+    def _wait(self, call: _Call):
+        """等待 call 完成；自己所在的直播被取消时抛出 Cancelled。"""
+        token = current_token()
+        while not call.done.wait(_POLL_INTERVAL):
+            if token is not None:
+                token.raise_if_cancelled()
+
+    def _forget(self, key: Hashable, call: _Call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    # ==================== 异步 ====================
+
+    async def ado(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """异步版本：等待 factory() 的结果，同 key 的并发调用共享同一个 Task。"""
+        loop = asyncio.get_running_loop()
+        slot = (loop, key)
+        while True:
+            with self._lock:
+                call = self._async_calls.get(slot)
+                leader = call is None
+                if leader:
+                    call = self._async_calls[slot] = _AsyncCall(asyncio.ensure_future(factory()))
+                    call.task.add_done_callback(lambda _, call=call: self._aforget(slot, call))
+                call.waiters += 1
+            self._count("leader" if leader else "shared")
+
+            try:
+                return await asyncio.shield(call.task)
+            except asyncio.CancelledError:
+                # 只有自己放弃等待；最后一个调用方放弃时取消上游请求
+                if call.waiters == 1:
+                    call.task.cancel()
+                raise
+            except Cancelled as e:
+                if leader or not self._foreign_cancel(e):
+                    raise
+                self._aforget(slot, call)
+                self._count("retry")
+            finally:
+                call.waiters -= 1
+
+    def _aforget(self, slot: Tuple[asyncio.AbstractEventLoop, Hashable], call: _AsyncCall):
+        with self._lock:
+            if self._async_calls.get(slot) is call:
+                del self._async_calls[slot]
+
+    # ==================== 内部 ====================
+
+    @staticmethod
+    def _foreign_cancel(error: BaseException) -> bool:
+        """error 是 leader 所在直播的取消，而当前调用方自己没有被取消。"""
+        if not isinstance(error, Cancelled):
+            return False
+        token = current_token()
+        return token is None or not token.cancelled
+
+    def _count(self, result: str):
+        SINGLEFLIGHT.inc(group=self.group, result=result)
+
+
+class SingleFlightLLMClient:
+    """
+    合并相同 LLM 请求的客户端包装。
+
+    call / acall 按 llm_request_key 合并同时进行的相同请求（no_coalesce() 内除外）；
+    stream 等其余属性原样转发（流式回应各自消费分片，不合并）。
+    """
+
+    def __init__(self, llm: LLMClientProtocol, flights: Optional[SingleFlight] = None):
+        self.llm = llm
+        self.flights = flights or SingleFlight("llm")
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+    def call(
+        self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000, **kwargs
+    ) -> str:
+        if not _coalesce.get():
+            return self.llm.call(prompt, system=system, max_tokens=max_tokens, **kwargs)
+        key = llm_request_key(self.llm, prompt, system, max_tokens, kwargs)
+        return self.flights.do(
+            key, lambda _: self.llm.call(prompt, system=system, max_tokens=max_tokens, **kwargs)
+        )
+
+    async def acall(
+        self, prompt: str, system: Optional[str] = None, max_tokens: int = 1000, **kwargs
+    ) -> str:
+        if not _coalesce.get():
+            return await self._acall_inner(prompt, system, max_tokens, kwargs)
+        key = llm_request_key(self.llm, prompt, system, max_tokens, kwargs)
+        return await self.flights.ado(
+            key, lambda: self._acall_inner(prompt, system, max_tokens, kwargs)
+        )
+
+    async def _acall_inner(
+        self, prompt: str, system: Optional[str], max_tokens: int, kwargs: Dict
+    ) -> str:
+        acall = getattr(self.llm, "acall", None)
+        if acall is not None:
+            return await acall(prompt, system=system, max_tokens=max_tokens, **kwargs)
+        return await asyncio.to_thread(
+            self.llm.call, prompt, system=system, max_tokens=max_tokens, **kwargs
+        )
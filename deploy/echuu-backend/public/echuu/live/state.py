@@ -7,7 +7,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 from collections import defaultdict
 
 
@@ -128,19 +128,34 @@ class UserProfile:
             "interaction_count": self.interaction_count,
             "first_seen": self.first_seen.isoformat() if self.first_seen else None,
             "last_seen": self.last_seen.isoformat() if self.last_seen else None,
-            "preferred_topics": self.preferred_topics,
+            "preferred_topics": list(self.preferred_topics),
             "reaction_style": self.reaction_style,
-            "favorite_phrases": self.favorite_phrases,
+            "favorite_phrases": list(self.favorite_phrases),
             "bonding_level": self.bonding_level,
-            "special_moments": self.special_moments,
+            "special_moments": list(self.special_moments),
             "total_sc_amount": self.total_sc_amount,
-            "sc_history": self.sc_history,
+            "sc_history": list(self.sc_history),
         }
 
 
 @dataclass
 class PerformerMemory:
-    """记忆系统 - 可视化展示AI记住了什么。Enhanced with user profiles."""
+    """
+    记忆系统 - 可视化展示AI记住了什么。Enhanced with user profiles.
+
+    修改字段后调用 mark_dirty(字段名)（用户档案用 mark_user_dirty），version 随之递增，
+    MemorySync 据此只同步变化的部分。
+    """
+
+    # 参与同步的顶层字段（与 to_dict 的键一致）
+    SYNC_FIELDS = (
+        "script_progress",
+        "danmaku_memory",
+        "user_profiles",
+        "promises",
+        "story_points",
+        "emotion_track",
+    )
 
     script_progress: Dict = field(
         default_factory=lambda: {
@@ -173,16 +188,32 @@ class PerformerMemory:
     )
     emotion_track: List[Dict] = field(default_factory=list)
 
+    version: int = 0
+    dirty_fields: Set[str] = field(default_factory=set, repr=False)
+    dirty_users: Set[str] = field(default_factory=set, repr=False)
+
+    def mark_dirty(self, *names: str) -> None:
+        """标记顶层字段已修改。"""
+        self.dirty_fields.update(names)
+        self.version += 1
+
+    def mark_user_dirty(self, username: str) -> None:
+        """标记单个用户档案已修改。"""
+        self.dirty_users.add(username)
+        self.version += 1
+
     def get_or_create_user(self, username: str) -> UserProfile:
         """获取或创建用户档案。"""
         if username not in self.user_profiles:
             self.user_profiles[username] = UserProfile(username=username)
+            self.mark_user_dirty(username)
         return self.user_profiles[username]
 
     def update_user_from_danmaku(self, danmaku: Danmaku) -> UserProfile:
         """根据弹幕更新用户档案。"""
         user = self.get_or_create_user(danmaku.user)
         user.update_interaction(danmaku)
+        self.mark_user_dirty(danmaku.user)
 
         # 分析用户反应风格（简单启发式）
         if any(kw in danmaku.text for kw in ["哈哈", "笑", "xswl", "233"]):
@@ -234,21 +265,33 @@ class PerformerMemory:
 
         return relevant
 
+    def field_to_dict(self, name: str):
+        """
+        单个顶层字段的 JSON 形式。
+
+        返回的容器都是新建的（不与运行时状态共享），可以直接保存作为同步基线。
+        """
+        if name == "script_progress":
+            return {
+                k: list(v) if isinstance(v, list) else v for k, v in self.script_progress.items()
+            }
+        if name == "danmaku_memory":
+            return {
+                k: list(v) if isinstance(v, list) else v for k, v in self.danmaku_memory.items()
+            }
+        if name == "user_profiles":
+            return {uid: p.to_dict() for uid, p in self.user_profiles.items()}
+        if name == "promises":
+            return [dict(p) for p in self.promises]
+        if name == "story_points":
+            return {k: list(v) if isinstance(v, list) else v for k, v in self.story_points.items()}
+        if name == "emotion_track":
+            return [dict(e) for e in self.emotion_track]
+        raise KeyError(name)
+
     def to_dict(self) -> Dict:
         """序列化为 JSON 可序列化 dict（供 WebSocket / Calendar Memory 同步）。"""
-        return {
-            "script_progress": dict(self.script_progress),
-            "danmaku_memory": {
-                k: list(v) if isinstance(v, list) else v
-                for k, v in self.danmaku_memory.items()
-            },
-            "user_profiles": {
-                uid: p.to_dict() for uid, p in self.user_profiles.items()
-            },
-            "promises": list(self.promises),
-            "story_points": dict(self.story_points),
-            "emotion_track": list(self.emotion_track),
-        }
+        return {name: self.field_to_dict(name) for name in self.SYNC_FIELDS}
 
     def to_display(self) -> str:
         """生成用户可见的记忆状态。"""
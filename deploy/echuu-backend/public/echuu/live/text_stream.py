@@ -0,0 +1,151 @@
+"""
+LLM 流式输出的增量处理。
+
+弹幕回应的 LLM 输出是 JSON（{"response": "...", "action": "..."}）。流式接收时：
+
+- ResponseFieldExtractor 从不完整的 JSON 文本里增量解出某个字符串字段的值
+  （处理转义，包括跨分片的 \\uXXXX）；
+- SentenceSplitter 把增量文本按句切开，每凑够一句就交给 TTS。
+"""
+
+from __future__ import annotations
+
+import re
+from typing import List
+
+# 句末标点：中日文全角标点直接断句；英文句点 / 问号 / 叹号后面要跟空白才断（避免 3.5、e.g.）
+_STRONG_BREAKS = "。！？!?；;…\n"
+_SOFT_BREAKS = "，、,：:"
+_LATIN_END = re.compile(r"[.?!](?=\s)")
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class ResponseFieldExtractor:
+    """
+    从流式 JSON 文本中增量提取一个字符串字段。
+
+        extractor = ResponseFieldExtractor("response")
+        for delta in llm.stream(...):
+            text = extractor.feed(delta)   # 本次新解出的字段内容（可能为空）
+
+    只认第一个出现的同名键；字段值不是字符串时不输出任何内容。
+    """
+
+    def __init__(self, field: str = "response"):
+        self._key = f'"{field}"'
+        self._buffer = ""
+        # seek_key -> seek_colon -> seek_quote -> value -> done
+        self._phase = "seek_key"
+        self._pos = 0
+        self._escape = ""
+
+    @property
+    def done(self) -> bool:
+        return self._phase == "done"
+
+    def feed(self, delta: str) -> str:
+        if self._phase == "done" or not delta:
+            return ""
+        self._buffer += delta
+        out = []
+
+        if self._phase == "seek_key":
+            index = self._buffer.find(self._key, self._pos)
+            if index < 0:
+                # 保留可能是键前缀的尾部
+                self._pos = max(0, len(self._buffer) - len(self._key) + 1)
+                return ""
+            self._pos = index + len(self._key)
+            self._phase = "seek_colon"
+
+        while self._pos < len(self._buffer) and self._phase in ("seek_colon", "seek_quote"):
+            char = self._buffer[self._pos]
+            self._pos += 1
+            if char.isspace():
+                continue
+            if self._phase == "seek_colon" and char == ":":
+                self._phase = "seek_quote"
+            elif self._phase == "seek_quote" and char == '"':
+                self._phase = "value"
+            else:
+                self._phase = "done"
+                return ""
+
+        while self._pos < len(self._buffer) and self._phase == "value":
+            char = self._buffer[self._pos]
+            self._pos += 1
+            if self._escape:
+                self._escape += char
+                if self._escape[1] == "u":
+                    if len(self._escape) == 6:
+                        try:
+                            out.append(chr(int(self._escape[2:], 16)))
+                        except ValueError:
+                            pass
+                        self._escape = ""
+                else:
+                    out.append(_ESCAPES.get(char, char))
+                    self._escape = ""
+            elif char == "\\":
+                self._escape = char
+            elif char == '"':
+                self._phase = "done"
+            else:
+                out.append(char)
+
+        # 已消费的部分不再需要
+        self._buffer = self._buffer[self._pos :]
+        self._pos = 0
+        return "".join(out)
+
+
+class SentenceSplitter:
+    """
+    把增量文本切成句子。
+
+    遇到句末标点即输出一句；积累超过 max_chars 仍没有句末标点时，在最后一个
+    逗号类标点处切开，避免长句迟迟不能开始合成。短于 min_chars 的句子并入下一句。
+    """
+
+    def __init__(self, min_chars: int = 4, max_chars: int = 40):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        sentences = []
+        while True:
+            cut = self._find_cut()
+            if cut <= 0:
+                break
+            sentence, self._buffer = self._buffer[:cut], self._buffer[cut:]
+            sentences.append(sentence.strip())
+        return [s for s in sentences if s]
+
+    def flush(self) -> str:
+        rest, self._buffer = self._buffer.strip(), ""
+        return rest
+
+    def _find_cut(self) -> int:
+        buffer = self._buffer
+        start = self.min_chars - 1
+        for index in range(start, len(buffer)):
+            if buffer[index] in _STRONG_BREAKS:
+                # 连续的标点（"！！"、"？！"）归入同一句
+                end = index + 1
+                while end < len(buffer) and buffer[end] in _STRONG_BREAKS:
+                    end += 1
+                if end == len(buffer) and buffer[index] != "\n":
+                    # 后面可能还有连续标点，等下一个分片
+                    return 0
+                return end
+        match = _LATIN_END.search(buffer, start)
+        if match:
+            return match.end()
+        if len(buffer) > self.max_chars:
+            soft = max(buffer.rfind(mark, self.min_chars) for mark in _SOFT_BREAKS)
+            if soft > 0:
+                return soft + 1
+        return 0
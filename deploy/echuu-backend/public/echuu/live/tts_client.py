@@ -6,10 +6,24 @@ TTS 客户端封装（基于 Qwen TTS Realtime API）。
 
 from __future__ import annotations
 
+import asyncio
 import importlib.util
 import os
+import queue
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, Optional
+
+from .cancel import current_token
+from .metrics import TTS_INFLIGHT, TTS_SECONDS
+from .singleflight import SingleFlight
+from .wav import wav_pcm
+
+PushChunk = Callable[[bytes], None]
+
+# 进程内共享：不同直播间（各自的 TTSClient）同时合成同一句、同样参数的文本时只请求一次
+_TTS_FLIGHTS = SingleFlight("tts")
 
 
 def convert_wav_to_mp3(wav_path: str, mp3_path: str = None, bitrate: str = "128k") -> Optional[str]:
@@ -60,14 +74,184 @@ def convert_wav_to_mp3(wav_path: str, mp3_path: str = None, bitrate: str = "128k
         return None
 
 
+def _find_project_root() -> Path:
+    """寻找项目根目录（包含 workflow 目录）。"""
+    current = Path(__file__).resolve()
+    # Go up directories to find the root
+    for parent in [current] + list(current.parents):
+        # Check for workflow directory (indicating echuu-agent root)
+        if (parent / "workflow").exists() and (parent / "workflow" / "backend").exists():
+            return parent
+        # Also check for .git or requirements.txt as fallback
+        if (parent / ".git").exists() or (parent / "requirements.txt").exists():
+            return parent
+    # Fallback to current working directory
+    return Path.cwd()
+
+
+_cosyvoice_cls_cache: Dict[str, Optional[type]] = {}
+_cosyvoice_cls_lock = threading.Lock()
+
+
+def load_cosyvoice_class() -> Optional[type]:
+    """
+    动态加载 workflow/backend/tts_client.py 中的 CosyVoiceTTS。
+
+    模块在进程内只加载一次，之后所有 TTSClient 复用同一个类对象。
+    """
+    with _cosyvoice_cls_lock:
+        if "cls" not in _cosyvoice_cls_cache:
+            _cosyvoice_cls_cache["cls"] = _import_cosyvoice_class()
+        return _cosyvoice_cls_cache["cls"]
+
+
+def _import_cosyvoice_class() -> Optional[type]:
+    project_root = _find_project_root()
+    module_path = project_root / "workflow" / "backend" / "tts_client.py"
+
+    if not module_path.exists():
+        # Try going up one more level (in case we're in echuu-sdk-release)
+        alt_root = project_root.parent
+        module_path = alt_root / "workflow" / "backend" / "tts_client.py"
+
+    # 部署时 workflow/backend 常被复制为 /app/backend，CWD 即 /app/backend
+    if not module_path.exists():
+        cwd_tts = Path.cwd() / "tts_client.py"
+        if cwd_tts.exists():
+            module_path = cwd_tts
+
+    if not module_path.exists():
+        print(f"⚠️ 找不到 TTS 模块: {module_path}")
+        print(f"   当前工作目录: {Path.cwd()}")
+        print(f"   项目根目录: {project_root}")
+        return None
+
+    spec = importlib.util.spec_from_file_location("workflow_backend_tts_client", module_path)
+    if not spec or not spec.loader:
+        print(f"⚠️ 无法加载 TTS 模块规范")
+        return None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, "CosyVoiceTTS", None)
+
+
+class AudioStream:
+    """
+    一段正在合成的语音。
+
+    async for 依次得到 PCM 分片（16-bit 单声道，采样率 sample_rate），合成完成后
+    await audio() 得到完整 WAV。produce(push) 在后台运行，push 可以在任意线程调用。
+    """
+
+    mime = "audio/pcm"
+
+    def __init__(
+        self, produce: Callable[[PushChunk], Awaitable[Optional[bytes]]], sample_rate: int
+    ):
+        self.sample_rate = sample_rate
+        self.started_at = time.perf_counter()
+        self.first_chunk_at: Optional[float] = None
+        self._loop = asyncio.get_running_loop()
+        self._queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._run(produce))
+
+    def push(self, chunk: bytes):
+        if not chunk:
+            return
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, chunk)
+
+    async def _run(self, produce) -> Optional[bytes]:
+        try:
+            return await produce(self.push)
+        finally:
+            # 工作线程里的 push 先于线程结束排进事件循环，结束标记一定排在所有分片之后
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await self._queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    async def audio(self) -> Optional[bytes]:
+        """完整 WAV（合成失败时为 None，取消时抛出 Cancelled）。"""
+        return await self._task
+
+    def cancel(self):
+        self._task.cancel()
+
+
+class TextFeed:
+    """
+    线程安全的文本片段队列：一边 put（如 LLM 流式输出切出的句子），
+    一边由 TTS 工作线程迭代取出，close() 后迭代结束。
+    """
+
+    _CLOSED = object()
+
+    def __init__(self):
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self.pieces = []
+
+    def put(self, text: str):
+        if text and not self._closed:
+            self.pieces.append(text)
+            self._queue.put(text)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(self._CLOSED)
+
+    @property
+    def text(self) -> str:
+        """已经放入的全部文本。"""
+        return "".join(self.pieces)
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            item = self._queue.get()
+            if item is self._CLOSED:
+                return
+            yield item
+
+
 class TTSClient:
     """轻量 TTS 包装器，提供统一接口。"""
 
-    def __init__(self):
+    # 影响合成结果的 CosyVoiceTTS 属性（用于内容寻址 / 缓存键）
+    SYNTHESIS_PARAM_NAMES = (
+        "model",
+        "voice",
+        "mode",
+        "language_type",
+        "response_format",
+        "sample_rate",
+        "speech_rate",
+        "volume",
+        "pitch_rate",
+        "bit_rate",
+    )
+
+    def __init__(self, voice: Optional[str] = None, cosyvoice_cls: Optional[type] = None):
+        """
+        Args:
+            voice: 音色（默认读取 TTS_VOICE 环境变量，再默认 Cherry）。
+                   每个直播间可以使用不同音色，无需修改进程环境变量。
+            cosyvoice_cls: 已加载的 CosyVoiceTTS 类（默认使用进程级缓存）。
+        """
         self.enabled = False
         self._recording = False
         self._recording_buffer = []
         self.tts = None
+        # CosyVoiceTTS 能边合成边回调 PCM 分片时为 True（见 stream）
+        self.streaming = False
+        self.sample_rate = 24000
+        self._metric_labels = {"model": "", "voice": ""}
 
         api_key = os.getenv("DASHSCOPE_API_KEY")
         if not api_key:
@@ -75,19 +259,25 @@ class TTSClient:
             return
 
         try:
-            cosyvoice_cls = self._load_cosyvoice_class()
+            cosyvoice_cls = cosyvoice_cls or self._load_cosyvoice_class()
             if not cosyvoice_cls:
                 raise ImportError("无法加载 CosyVoiceTTS")
 
             # Use qwen3-tts-flash-realtime model for multilingual support
             model = os.getenv("TTS_MODEL", "qwen3-tts-flash-realtime")
-            voice = os.getenv("TTS_VOICE", "Cherry")
+            voice = voice or os.getenv("TTS_VOICE", "Cherry")
 
             self.tts = cosyvoice_cls(
                 api_key=api_key,
                 model=model,
                 voice=voice,
             )
+            self._metric_labels = {"model": model, "voice": voice}
+            # CosyVoiceTTS 在连接建立 / 首包 / 完成时回调，记录到 echuu_tts_seconds
+            self.tts.observer = self._observe_latency
+            streaming_format = getattr(self.tts, "streaming_format", None)
+            self.streaming = callable(streaming_format) and streaming_format() == "pcm"
+            self.sample_rate = int(getattr(self.tts, "sample_rate", self.sample_rate))
             self.enabled = True
             print(f"✅ TTS 已启用: model={model}, voice={voice}")
         except Exception as exc:
@@ -98,72 +288,152 @@ class TTSClient:
     @staticmethod
     def _find_project_root() -> Path:
         """寻找项目根目录（包含 workflow 目录）。"""
-        current = Path(__file__).resolve()
-        # Go up directories to find the root
-        for parent in [current] + list(current.parents):
-            # Check for workflow directory (indicating echuu-agent root)
-            if (parent / "workflow").exists() and (parent / "workflow" / "backend").exists():
-                return parent
-            # Also check for .git or requirements.txt as fallback
-            if (parent / ".git").exists() or (parent / "requirements.txt").exists():
-                return parent
-        # Fallback to current working directory
-        return Path.cwd()
+        return _find_project_root()
 
     def _load_cosyvoice_class(self):
         """
-        动态加载 workflow/backend/tts_client.py 中的 CosyVoiceTTS。
+        动态加载 workflow/backend/tts_client.py 中的 CosyVoiceTTS（进程级缓存）。
+        """
+        return load_cosyvoice_class()
+
+    def _observe_latency(self, stage: str, seconds: float):
+        TTS_SECONDS.observe(seconds, stage=stage, **self._metric_labels)
+
+    def synthesis_params(self) -> Dict:
+        """当前合成参数（同样的文本 + 参数应得到同样的音频）。"""
+        if not self.tts:
+            return {}
+        return {
+            name: getattr(self.tts, name)
+            for name in self.SYNTHESIS_PARAM_NAMES
+            if hasattr(self.tts, name)
+        }
+
+    def synthesize(
+        self,
+        text: str,
+        emotion_boost: float = 0.0,
+        record: bool = True,
+        on_chunk: Optional[PushChunk] = None,
+    ) -> Optional[bytes]:
         """
-        project_root = self._find_project_root()
-        module_path = project_root / "workflow" / "backend" / "tts_client.py"
-
-        if not module_path.exists():
-            # Try going up one more level (in case we're in echuu-sdk-release)
-            alt_root = project_root.parent
-            module_path = alt_root / "workflow" / "backend" / "tts_client.py"
-
-        # 部署时 workflow/backend 常被复制为 /app/backend，CWD 即 /app/backend
-        if not module_path.exists():
-            cwd_tts = Path.cwd() / "tts_client.py"
-            if cwd_tts.exists():
-                module_path = cwd_tts
-
-        if not module_path.exists():
-            print(f"⚠️ 找不到 TTS 模块: {module_path}")
-            print(f"   当前工作目录: {Path.cwd()}")
-            print(f"   项目根目录: {project_root}")
+        合成语音。
+
+        Args:
+            text: 合成文本
+            emotion_boost: 情绪增强参数（保留接口，不影响当前实现）
+            record: 是否写入录制（预取的音频在真正播出时再调用 add_to_recording）
+            on_chunk: PCM 分片回调（仅 streaming 为 True 时生效，在工作线程里调用）
+        """
+        if not self.enabled or not self.tts:
             return None
 
-        spec = importlib.util.spec_from_file_location("workflow_backend_tts_client", module_path)
-        if not spec or not spec.loader:
-            print(f"⚠️ 无法加载 TTS 模块规范")
+        # 所在直播被取消时，CosyVoiceTTS 关闭 realtime 连接并抛出 Cancelled
+        token = current_token()
+        kwargs = {"cancel_token": token} if token is not None else {}
+
+        def run(publish: PushChunk) -> bytes:
+            # 流式时始终经 publish 分发分片，中途合并进来的调用方也能补齐前面的分片
+            if self.streaming:
+                kwargs["on_audio"] = publish
+            with TTS_INFLIGHT.track_inprogress(**self._metric_labels):
+                return self.tts.synthesize(text, **kwargs)
+
+        subscriber = on_chunk if self.streaming else None
+        try:
+            audio = _TTS_FLIGHTS.do(self._flight_key(text), run, subscriber)
+        except Exception as exc:
+            print(f"[TTS] 合成错误: {exc}")
             return None
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        return getattr(module, "CosyVoiceTTS", None)
 
-    def synthesize(self, text: str, emotion_boost: float = 0.0) -> Optional[bytes]:
+        if record:
+            self.add_to_recording(audio)
+
+        return audio
+
+    def _flight_key(self, text: str):
+        return tuple(sorted(self.synthesis_params().items())), text
+
+    async def asynthesize(
+        self, text: str, emotion_boost: float = 0.0, record: bool = True
+    ) -> Optional[bytes]:
         """
-        合成语音。
+        异步合成语音：阻塞的 realtime WebSocket 合成放到工作线程执行。
 
         Args:
             text: 合成文本
-            emotion_boost: 情绪增强参数（保留接口，不影响当前实现）
+            emotion_boost: 情绪增强参数（同 synthesize）
+            record: 是否写入录制（同 synthesize）
         """
         if not self.enabled or not self.tts:
             return None
+        return await asyncio.to_thread(self.synthesize, text, emotion_boost, record)
 
+    async def asynthesize_chunks(
+        self, text: str, push: PushChunk, record: bool = True
+    ) -> Optional[bytes]:
+        """
+        异步合成并把 PCM 分片交给 push；返回完整 WAV。
+
+        不支持流式时合成完成后一次性 push 全部 PCM。
+        """
+        if not self.enabled or not self.tts:
+            return None
+        audio = await asyncio.to_thread(self.synthesize, text, 0.0, record, push)
+        if audio and not self.streaming:
+            push(wav_pcm(audio) or b"")
+        return audio
+
+    def stream(self, text: str, record: bool = True) -> AudioStream:
+        """开始流式合成（需在事件循环里调用）。"""
+        return AudioStream(
+            lambda push: self.asynthesize_chunks(text, push, record), self.sample_rate
+        )
+
+    def synthesize_texts(
+        self, texts: Iterable[str], record: bool = True, on_chunk: Optional[PushChunk] = None
+    ) -> Optional[bytes]:
+        """
+        合成一串陆续到达的文本片段（如 TextFeed），realtime 模型每取到一段立即 append_text。
+
+        CosyVoiceTTS 不支持流式时先收齐全部片段再整句合成。
+        """
+        if not self.enabled or not self.tts:
+            return None
+        if not self.streaming:
+            return self.synthesize("".join(texts), record=record, on_chunk=on_chunk)
+
+        token = current_token()
+        kwargs = {"cancel_token": token} if token is not None else {}
+        if on_chunk is not None:
+            kwargs["on_audio"] = on_chunk
         try:
-            audio = self.tts.synthesize(text)
+            with TTS_INFLIGHT.track_inprogress(**self._metric_labels):
+                audio = self.tts.synthesize_streaming(texts, **kwargs)
         except Exception as exc:
             print(f"[TTS] 合成错误: {exc}")
             return None
 
-        if self._recording and audio:
-            self._recording_buffer.append(audio)
+        if record:
+            self.add_to_recording(audio)
+        return audio
 
+    async def asynthesize_texts(
+        self, texts: Iterable[str], push: PushChunk, record: bool = True
+    ) -> Optional[bytes]:
+        """synthesize_texts 的异步版本，PCM 分片交给 push（同 asynthesize_chunks）。"""
+        if not self.enabled or not self.tts:
+            return None
+        audio = await asyncio.to_thread(self.synthesize_texts, texts, record, push)
+        if audio and not self.streaming:
+            push(wav_pcm(audio) or b"")
         return audio
 
+    def add_to_recording(self, audio: Optional[bytes]):
+        """把一段音频追加到录制（正在录制时）。"""
+        if self._recording and audio:
+            self._recording_buffer.append(audio)
+
     def start_recording(self):
         """开始录制音频片段。"""
         self._recording = True
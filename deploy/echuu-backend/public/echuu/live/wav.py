@@ -0,0 +1,102 @@
+"""
+WAV 工具：只读写 RIFF 头，不解码音频。
+
+TTS 返回的 WAV 在这里取时长、取出 PCM、按相同格式拼接；步骤节拍（pacing）、
+TTS 预取拼接（lookahead / performer）与流式合成（tts_client）共用。
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Optional, Sequence, Tuple
+
+
+def pcm_duration(
+    size: int, sample_rate: int = 24000, channels: int = 1, sample_width: int = 2
+) -> float:
+    """原始 PCM 的时长（秒）。"""
+    frame_size = channels * sample_width
+    if size <= 0 or sample_rate <= 0 or frame_size <= 0:
+        return 0.0
+    return (size // frame_size) / sample_rate
+
+
+def parse_wav(data: bytes) -> Optional[Tuple[bytes, int, int]]:
+    """
+    解析 WAV 头（不解码音频）。
+
+    遍历 RIFF 子块找到 fmt 与 data；data 块长度写成 0 / 0xFFFFFFFF（流式写出）
+    或超出实际数据时，按实际字节数计算。
+
+    Returns:
+        (fmt 块内容, data 起始偏移, data 字节数)；不是 WAV 时返回 None。
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+
+    fmt = b""
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset : offset + 4]
+        (chunk_size,) = struct.unpack_from("<I", data, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt " and chunk_size >= 16 and body + 16 <= len(data):
+            fmt = data[body : body + chunk_size]
+        elif chunk_id == b"data":
+            if not fmt:
+                return None
+            available = len(data) - body
+            if chunk_size == 0 or chunk_size > available:
+                chunk_size = available
+            return fmt, body, chunk_size
+        # 子块按偶数字节对齐
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def wav_duration(data: bytes) -> Optional[float]:
+    """从 WAV 头计算时长（秒）；不是 WAV 时返回 None。"""
+    parsed = parse_wav(data)
+    if parsed is None:
+        return None
+    fmt, _, size = parsed
+    _, channels, sample_rate, byte_rate, block_align, _ = struct.unpack_from("<HHIIHH", fmt)
+    byte_rate = byte_rate or sample_rate * block_align
+    if not byte_rate:
+        return None
+    return size / byte_rate
+
+
+def wav_pcm(data: bytes) -> Optional[bytes]:
+    """WAV 里的音频数据（不含头）；不是 WAV 时返回 None。"""
+    parsed = parse_wav(data)
+    if parsed is None:
+        return None
+    _, start, size = parsed
+    return data[start : start + size]
+
+
+def concat_wav(parts: Sequence[bytes]) -> Optional[bytes]:
+    """
+    拼接格式相同的 WAV 片段（只改写头，不重新编码）。
+
+    任一片段不是 WAV 或格式不一致时返回 None。
+    """
+    fmt = None
+    pcm = []
+    for part in parts:
+        parsed = parse_wav(part)
+        if parsed is None:
+            return None
+        part_fmt, start, size = parsed
+        if fmt is not None and part_fmt != fmt:
+            return None
+        fmt = part_fmt
+        pcm.append(part[start : start + size])
+    if fmt is None:
+        return None
+    body = b"".join(pcm)
+    fmt_chunk = b"fmt " + struct.pack("<I", len(fmt)) + fmt + (b"\0" if len(fmt) & 1 else b"")
+    data_chunk = b"data" + struct.pack("<I", len(body)) + body
+    riff_size = 4 + len(fmt_chunk) + len(data_chunk)
+    return b"RIFF" + struct.pack("<I", riff_size) + b"WAVE" + fmt_chunk + data_chunk
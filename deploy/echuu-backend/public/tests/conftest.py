@@ -0,0 +1,106 @@
+"""测试公共配置：让 echuu 包和 backend/ 下的模块都可以直接导入。"""
+
+import io
+import sys
+import wave
+from pathlib import Path
+
+import pytest
+
+PUBLIC_DIR = Path(__file__).resolve().parents[1]
+BACKEND_DIR = PUBLIC_DIR.parent / "backend"
+
+for path in (PUBLIC_DIR, BACKEND_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = 24000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class FakeCosyVoice:
+    """
+    假的流式 CosyVoiceTTS：PCM 就是文本的 UTF-16-LE 编码（每字一个采样），
+    按 chunk_bytes 分片回调，方便断言分片能拼回原文。
+    """
+
+    sample_rate = 24000
+    chunk_bytes = 4
+
+    def __init__(self, api_key=None, model=None, voice=None):
+        self.voice = voice
+        self.calls = []
+        # 只失败一次的文本（再次合成同一文本会成功）
+        self.fail_once = set()
+
+    def streaming_format(self):
+        return "pcm"
+
+    def synthesize(self, text, on_audio=None, cancel_token=None):
+        self.calls.append(text)
+        if text in self.fail_once:
+            self.fail_once.discard(text)
+            raise RuntimeError(f"synthesis failed: {text}")
+        pcm = text.encode("utf-16-le")
+        if on_audio is not None:
+            for start in range(0, len(pcm), self.chunk_bytes):
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                on_audio(pcm[start : start + self.chunk_bytes])
+        return pcm_to_wav(pcm, self.sample_rate)
+
+    def synthesize_streaming(self, texts, on_audio=None, cancel_token=None):
+        return self.synthesize("".join(texts), on_audio=on_audio, cancel_token=cancel_token)
+
+
+@pytest.fixture
+def fake_tts(monkeypatch):
+    """创建使用 FakeCosyVoice 的 TTSClient（每次调用一个新实例）。"""
+    from echuu.live.tts_client import TTSClient
+
+    monkeypatch.setenv("DASHSCOPE_API_KEY", "test")
+
+    def make(voice: str = "test") -> TTSClient:
+        return TTSClient(voice=voice, cosyvoice_cls=FakeCosyVoice)
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def backend_app(tmp_path_factory):
+    """
+    进程内导入 backend/app.py：存储目录指向临时目录，LLM / TTS 换成 loadtest 的假实现，
+    不启动 HTTP 服务，测试直接调用路由函数。
+    """
+    from types import SimpleNamespace
+
+    import loadtest
+
+    from echuu.live.resources import reset_shared_resources
+
+    workdir = tmp_path_factory.mktemp("app")
+    args = SimpleNamespace(
+        llm_latency=0.01,
+        jitter=0.0,
+        script_lines=8,
+        script_latency=1.0,
+        tts_latency=0.01,
+        speech_rate=200.0,
+    )
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("AUDIO_STORE_DIR", str(workdir / "audio"))
+        mp.setenv("SCRIPT_INDEX_PATH", str(workdir / "script_index.sqlite3"))
+        mp.setenv("DASHSCOPE_API_KEY", "test")
+        mp.setenv("STEP_PACING", "0")
+        loadtest.install_fake_providers(args, workdir)
+        import app
+
+        yield app
+    reset_shared_resources()
@@ -0,0 +1,60 @@
+import pytest
+from audio_store import AudioStore, RangeNotSatisfiable, etag_for, etag_matches, parse_range
+
+
+def test_parse_range_basic():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=10-", 100) == (10, 99)
+    # 结束位置超出文件大小时截断
+    assert parse_range("bytes=90-200", 100) == (90, 99)
+
+
+def test_parse_range_suffix():
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=-0", 100)
+
+
+def test_parse_range_unsupported_returns_none():
+    assert parse_range("items=0-1", 100) is None
+    assert parse_range("bytes=0-1,5-9", 100) is None
+    assert parse_range("bytes=-", 100) is None
+
+
+def test_parse_range_not_satisfiable():
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=9-3", 100)
+
+
+def test_make_key_is_stable():
+    key = AudioStore.make_key("你好", voice="v1", params={"speed": 1.0})
+    assert key == AudioStore.make_key("你好", voice="v1", params={"speed": 1.0})
+    assert len(key) == 64
+    assert AudioStore.is_valid_key(key)
+    assert key != AudioStore.make_key("你好", voice="v2", params={"speed": 1.0})
+    assert key != AudioStore.make_key("你好", voice="v1", params={"speed": 1.2})
+
+
+def test_put_and_read(tmp_path):
+    store = AudioStore(tmp_path)
+    key = AudioStore.make_key("hello")
+    store.put(key, b"0123456789")
+    assert store.exists(key)
+    assert store.read(key, 2, 5) == b"2345"
+    with pytest.raises(ValueError):
+        store.put("../evil", b"x")
+
+
+def test_etag_matches():
+    etag = etag_for("abc")
+    assert etag == '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"x", "abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"x"', etag)
+    assert not etag_matches(None, etag)
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import pytest
+from fanout import ViewerConnection
+from test_ws_protocol import decode_frame
+from ws_protocol import PROTOCOL_V2
+
+from echuu.live.tts_client import AudioStream, TextFeed
+from echuu.live.wav import wav_pcm
+
+
+async def test_stream_chunks_reassemble_to_final_wav(fake_tts):
+    tts = fake_tts()
+    text = "边合成边推送的一整句台词"
+    stream = tts.stream(text, record=False)
+    chunks = [chunk async for chunk in stream]
+    audio = await stream.audio()
+
+    assert len(chunks) == len(text) // 2
+    assert b"".join(chunks) == wav_pcm(audio) == text.encode("utf-16-le")
+    assert stream.first_chunk_at is not None
+
+
+async def test_text_feed_chunks_reassemble_to_final_wav(fake_tts):
+    tts = fake_tts()
+    feed = TextFeed()
+    pieces = ["先回应一句，", "再接着讲", "台词。"]
+
+    async def speak(push):
+        task = asyncio.ensure_future(tts.asynthesize_texts(feed, push, record=False))
+        for piece in pieces:
+            await asyncio.sleep(0.01)
+            feed.put(piece)
+        feed.close()
+        return await task
+
+    stream = AudioStream(speak, tts.sample_rate)
+    chunks = [chunk async for chunk in stream]
+    audio = await stream.audio()
+
+    assert feed.text == "".join(pieces)
+    assert b"".join(chunks) == wav_pcm(audio) == feed.text.encode("utf-16-le")
+
+
+async def test_stream_ends_when_synthesis_fails(fake_tts):
+    tts = fake_tts()
+
+    async def produce(push):
+        push(b"\x01\x00")
+        raise RuntimeError("connection reset")
+
+    stream = AudioStream(produce, tts.sample_rate)
+    assert [chunk async for chunk in stream] == [b"\x01\x00"]
+    with pytest.raises(RuntimeError):
+        await stream.audio()
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_text(self, data: str):
+        self.frames.append(json.loads(data))
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(decode_frame(data))
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def test_streamed_steps_send_chunks_before_step_event(backend_app):
+    app = backend_app
+    # 不跑 startup（会启动回收器），只接上内存事件总线
+    await app.event_bus.start(app.deliver_room_message)
+    created = await app.create_room()
+    room = app.rooms[created["room_id"]]
+    websocket = RecordingWebSocket()
+    connection = ViewerConnection(websocket, PROTOCOL_V2)
+    room.active_connections.add(connection)
+    connection.start()
+
+    await app.start_live(app.StartLiveRequest(**created, danmaku=[]))
+    await asyncio.wait_for(room.engine_task, timeout=30)
+    while connection.queue_depth:
+        await asyncio.sleep(0.01)
+    assert room.stream_state == "finished"
+
+    streams = {}
+    current = None
+    steps = 0
+    for frame in websocket.frames:
+        if "payload" in frame:
+            # 二进制帧只能出现在 step_start 之后、本步 step 事件之前，且按序号连续
+            assert current is not None and frame["seq"] == current["seq"]
+            assert not current["done"] and frame["index"] == len(current["chunks"])
+            current["chunks"].append(frame["payload"])
+            current["done"] = frame["last"]
+        elif frame["type"] == "step_start":
+            assert current is None
+            current = streams[frame["stream"]] = {
+                "seq": frame["audio"]["seq"],
+                "chunks": [],
+                "done": False,
+            }
+        elif frame["type"] == "step":
+            assert current is not None and current["done"]
+            assert frame["stream"] in streams and frame["audio"]["seq"] == current["seq"]
+            assert frame["audio"]["streamed"] is True
+            key = frame["audio_url"].rsplit("/", 1)[-1]
+            assert b"".join(current["chunks"]) == wav_pcm(app.audio_store.read(key))
+            current = None
+            steps += 1
+
+    assert steps == room.total_steps > 0
+    await room.aclose()
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from echuu.live.cancel import Cancelled, CancelToken, cancel_scope, raise_if_cancelled
+from echuu.live.reply_cache import DanmakuReplyCache
+from echuu.live.response_generator import DanmakuResponseGenerator
+from echuu.live.state import Danmaku, PerformerMemory
+
+
+class CancellingLLM:
+    """请求进行到一半时直播被停掉的 LLM：取消 token 后按真实客户端的方式检查。"""
+
+    provider = "fake"
+    model = "fake-llm"
+
+    def __init__(self, token: CancelToken):
+        self.token = token
+
+    def _stop(self):
+        self.token.cancel("owner")
+        raise_if_cancelled()
+
+    def call(self, prompt, system=None, max_tokens=1000, **kwargs):
+        self._stop()
+
+    async def acall(self, prompt, system=None, max_tokens=1000, **kwargs):
+        await asyncio.sleep(0)
+        self._stop()
+
+    async def astream(self, prompt, system=None, max_tokens=1000, **kwargs):
+        yield '{"response": "先说一句。'
+        self._stop()
+
+
+def _reply_kwargs():
+    return {
+        "danmaku": Danmaku(text="主播快说！", user="观众"),
+        "current_line": SimpleNamespace(text="第一句台词", stage="Hook"),
+        "next_line": None,
+        "memory": PerformerMemory(),
+        "name": "六螺",
+        "persona": "虚拟主播",
+        "background": "",
+    }
+
+
+@pytest.fixture
+def cancelling():
+    token = CancelToken()
+    generator = DanmakuResponseGenerator(
+        llm=CancellingLLM(token), reply_cache=DanmakuReplyCache(capacity=0)
+    )
+    return generator, token
+
+
+def test_sync_reply_does_not_swallow_cancelled(cancelling):
+    generator, token = cancelling
+    with cancel_scope(token), pytest.raises(Cancelled):
+        generator.generate_response(**_reply_kwargs())
+
+
+@pytest.mark.parametrize("budget", ["8", "0"])
+async def test_async_reply_does_not_swallow_cancelled(monkeypatch, budget):
+    monkeypatch.setenv("DANMAKU_REPLY_BUDGET", budget)
+    token = CancelToken()
+    generator = DanmakuResponseGenerator(
+        llm=CancellingLLM(token), reply_cache=DanmakuReplyCache(capacity=0)
+    )
+    with cancel_scope(token), pytest.raises(Cancelled):
+        await generator.agenerate_response(**_reply_kwargs())
+
+
+async def test_streamed_reply_does_not_swallow_cancelled(cancelling):
+    generator, token = cancelling
+    with cancel_scope(token), pytest.raises(Cancelled):
+        await generator.astream_response(**_reply_kwargs(), on_sentence=lambda sentence: None)
+
+
+async def test_cancel_interrupts_inflight_tts(fake_tts):
+    tts = fake_tts()
+    token = CancelToken()
+    chunks = []
+
+    def on_chunk(chunk: bytes):
+        chunks.append(chunk)
+        if len(chunks) == 2:
+            token.cancel("owner")
+
+    with cancel_scope(token), pytest.raises(Cancelled):
+        await tts.asynthesize_chunks("一二三四五六七八", on_chunk, record=False)
+    # 每片 2 个字，取消后不再产出后面的分片，也不会当作合成失败返回 None
+    assert b"".join(chunks) == "一二三四".encode("utf-16-le")
+
+
+async def test_guard_abandons_inflight_work():
+    token = CancelToken()
+    release = asyncio.Event()
+
+    async def stop_soon():
+        await asyncio.sleep(0.01)
+        token.cancel("owner")
+
+    stopper = asyncio.create_task(stop_soon())
+    with pytest.raises(Cancelled, match="owner"):
+        await token.guard(release.wait())
+    await stopper
+    # 已取消的 token 不再启动新的工作
+    work = release.wait()
+    with pytest.raises(Cancelled):
+        await token.guard(work)
+    assert work.cr_frame is None
+
+
+async def _wait_for_state(room, state: str, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while room.stream_state != state:
+        assert time.monotonic() < deadline, f"room stuck in {room.stream_state}"
+        await asyncio.sleep(0.01)
+
+
+async def test_stop_abandons_script_generation_and_restart_gets_fresh_token(backend_app):
+    app = backend_app
+    created = await app.create_room()
+    start = app.StartLiveRequest(**created, danmaku=[])
+    stop = app.StopLiveRequest(**created)
+    room = app.rooms[created["room_id"]]
+
+    await app.start_live(start)
+    first_token, first_task = room.cancel_token, room.engine_task
+    await _wait_for_state(room, "generating_script")
+
+    # 剧本生成（假 LLM 在工作线程里阻塞 1 秒）进行中停播：引擎不等它返回
+    stopped_at = time.monotonic()
+    await app.stop_live(stop)
+    await asyncio.wait_for(first_task, timeout=0.5)
+    assert time.monotonic() - stopped_at < 0.5
+    assert first_token.cancelled and first_token.reason == "owner"
+    assert room.stream_state == "stopped"
+    assert not room.is_running and room.run_token is None
+
+    # 重新开播换一个新的 token，上一场的取消不会影响这一场
+    await app.start_live(start)
+    assert room.cancel_token is not first_token
+    assert not room.cancel_token.cancelled
+    await _wait_for_state(room, "generating_script")
+    await app.stop_live(stop)
+    await asyncio.wait_for(room.engine_task or asyncio.sleep(0), timeout=0.5)
+    assert room.stream_state == "stopped"
+    await room.aclose()
@@ -0,0 +1,35 @@
+from danmaku_buffer import DanmakuRingBuffer
+
+
+def _item(text, sc=False):
+    return {"text": text, "is_sc": sc}
+
+
+def test_drain_keeps_arrival_order():
+    buffer = DanmakuRingBuffer(capacity=5)
+    for item in [_item("a"), _item("sc1", True), _item("b")]:
+        buffer.append(item)
+    assert [item["text"] for item in buffer.drain()] == ["a", "sc1", "b"]
+    assert len(buffer) == 0
+    assert buffer.stats.drained == 3
+
+
+def test_full_buffer_evicts_oldest_normal_first():
+    buffer = DanmakuRingBuffer(capacity=3)
+    for item in [_item("sc1", True), _item("a"), _item("b"), _item("c")]:
+        assert buffer.append(item)
+    assert [item["text"] for item in buffer.drain()] == ["sc1", "b", "c"]
+    assert buffer.stats.dropped == 1
+    assert buffer.stats.sc_dropped == 0
+
+
+def test_full_of_sc_rejects_normal_and_rotates_sc():
+    buffer = DanmakuRingBuffer(capacity=2)
+    buffer.append(_item("sc1", True))
+    buffer.append(_item("sc2", True))
+    assert not buffer.append(_item("a"))
+    assert buffer.append(_item("sc3", True))
+    assert [item["text"] for item in buffer.drain()] == ["sc2", "sc3"]
+    assert buffer.stats.dropped == 1
+    assert buffer.stats.sc_dropped == 1
+    assert buffer.stats.high_water == 2
@@ -0,0 +1,60 @@
+from danmaku_ingest import DanmakuIngest, TokenBucket, normalize_text
+
+
+def test_token_bucket_limits_per_key():
+    bucket = TokenBucket(rate=1.0, burst=2)
+    assert bucket.allow("a", now=0.0)
+    assert bucket.allow("a", now=0.0)
+    assert not bucket.allow("a", now=0.0)
+    # 其它发送方不受影响
+    assert bucket.allow("b", now=0.0)
+    # 一秒后回填一个令牌
+    assert bucket.allow("a", now=1.0)
+    assert not bucket.allow("a", now=1.0)
+
+
+def test_token_bucket_prune():
+    bucket = TokenBucket(rate=1.0, burst=2)
+    bucket.allow("a", now=0.0)
+    bucket.allow("b", now=5.0)
+    bucket.prune(now=5.5)
+    assert len(bucket) == 1
+
+
+def test_normalize_text():
+    assert normalize_text("  Hello   World ") == "hello world"
+
+
+def test_rate_limit_is_keyed_by_sender_not_user():
+    published, sunk = [], []
+    ingest = DanmakuIngest(published.append, sunk.append, flush_interval_ms=0, user_burst=1)
+    assert ingest.submit("hi", user="a", sender="conn-1")
+    # 换一个自报用户名也绕不过同一连接的限流
+    assert not ingest.submit("hi", user="b", sender="conn-1")
+    assert ingest.submit("hi", user="a", sender="conn-2")
+    assert ingest.stats.rate_limited == 1
+    assert len(sunk) == 2
+
+
+async def test_batch_coalesces_repeated_text():
+    published, sunk = [], []
+    ingest = DanmakuIngest(
+        published.append, sunk.append, flush_interval_ms=10_000, batch_max_items=2
+    )
+    ingest.submit("666", user="a", sender="1")
+    ingest.submit(" 666 ", user="b", sender="2")
+    ingest.submit("hello", user="c", sender="3")
+    ingest.submit("overflow", user="d", sender="4")
+    ingest.flush()
+    ingest.close()
+
+    assert len(sunk) == 4
+    assert len(published) == 1
+    batch = published[0]
+    assert batch["type"] == "danmaku_batch"
+    first, second = batch["items"]
+    assert first["count"] == 2 and first["users"] == ["a", "b"]
+    assert second["text"] == "hello"
+    assert ingest.stats.coalesced == 1
+    assert ingest.stats.truncated == 1
+    assert ingest.stats.batches == 1
@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+from fanout import EVICT_CLOSE_CODE, FanoutStats, ViewerConnection
+from ws_protocol import PROTOCOL_V1, PROTOCOL_V2, OutboundEvent
+
+
+class FakeWebSocket:
+    """记录发送的帧；release 未 set 时发送会一直阻塞（模拟慢观众）。"""
+
+    def __init__(self, blocked: bool = False):
+        self.frames = []
+        self.closed_with = None
+        self.release = asyncio.Event()
+        if not blocked:
+            self.release.set()
+
+    async def send_text(self, data: str):
+        await self.release.wait()
+        self.frames.append(json.loads(data))
+
+    async def send_bytes(self, data: bytes):
+        await self.release.wait()
+        self.frames.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def _event(event_type, **data):
+    return OutboundEvent({"type": event_type, **data})
+
+
+def _chunk(stream, index, size=4):
+    return OutboundEvent(
+        {"type": "audio_chunk", "stream": stream, "index": index},
+        audio=b"\x00" * size,
+        audio_seq=stream,
+        protocols=[PROTOCOL_V2],
+    )
+
+
+async def _drain(connection):
+    while connection.queue_depth:
+        await asyncio.sleep(0.005)
+    await asyncio.sleep(0.01)
+
+
+async def test_coalesces_state_events():
+    websocket = FakeWebSocket()
+    connection = ViewerConnection(websocket, PROTOCOL_V1)
+    connection.enqueue(_event("memory", version=1))
+    connection.enqueue(_event("user_count", count=1))
+    connection.enqueue(_event("memory", version=2))
+    connection.enqueue(_event("user_count", count=2))
+    assert connection.queue_depth == 2
+    assert connection.stats.coalesced == 2
+
+    connection.start()
+    await _drain(connection)
+    assert websocket.frames == [
+        {"type": "memory", "version": 2},
+        {"type": "user_count", "count": 2},
+    ]
+    await connection.aclose()
+
+
+async def test_full_queue_drops_oldest_droppable_first():
+    websocket = FakeWebSocket()
+    connection = ViewerConnection(websocket, PROTOCOL_V1, max_queue=3)
+    connection.enqueue(_event("danmaku", text="a"))
+    connection.enqueue(_event("step", step=1))
+    connection.enqueue(_event("danmaku", text="b"))
+    assert connection.enqueue(_event("step", step=2))
+    assert connection.stats.dropped == 1
+
+    connection.start()
+    await _drain(connection)
+    assert [frame.get("text", frame.get("step")) for frame in websocket.frames] == [1, "b", 2]
+    assert not connection.closed
+    await connection.aclose()
+
+
+async def test_full_queue_without_droppable_evicts():
+    evicted = []
+    websocket = FakeWebSocket()
+    connection = ViewerConnection(
+        websocket, PROTOCOL_V1, on_evict=lambda conn, reason: evicted.append(reason), max_queue=2
+    )
+    connection.enqueue(_event("step", step=1))
+    connection.enqueue(_event("step", step=2))
+    # 新的可丢弃事件直接丢掉，不踢人
+    assert not connection.enqueue(_event("danmaku", text="x"))
+    assert not connection.closed
+
+    assert not connection.enqueue(_event("step", step=3))
+    assert connection.closed
+    assert evicted == ["queue_full"]
+    assert connection.queue_depth == 0
+    await asyncio.sleep(0)
+    assert websocket.closed_with == EVICT_CLOSE_CODE
+    assert not connection.enqueue(_event("step", step=4))
+
+
+async def test_stuck_send_evicts_after_timeout():
+    stats = FanoutStats()
+    websocket = FakeWebSocket(blocked=True)
+    connection = ViewerConnection(websocket, PROTOCOL_V1, stats=stats, send_timeout=0.05)
+    connection.start()
+    connection.enqueue(_event("step", step=1))
+    await asyncio.sleep(0.2)
+    assert connection.closed
+    assert stats.evicted == 1
+    await connection.aclose()
+
+
+async def test_slow_v2_viewer_is_budgeted_not_evicted():
+    websocket = FakeWebSocket()
+    connection = ViewerConnection(websocket, PROTOCOL_V2, max_queue=3, max_audio_bytes=20)
+    connection.enqueue(_event("step_start", stream=7))
+    # 流式帧不占事件名额（5 帧远超 max_queue）
+    for index in range(5):
+        assert connection.enqueue(_chunk(7, index))
+    # 超出字节预算：放弃这一段流，改发 stream_dropped
+    assert not connection.enqueue(_chunk(7, 5))
+    assert not connection.enqueue(_chunk(7, 6))
+    assert connection.enqueue(_event("step", step=7))
+    # 下一段流重新计预算
+    assert connection.enqueue(_chunk(8, 0))
+    assert not connection.closed
+    assert connection.stats.streams_dropped == 1
+    assert connection.stats.audio_chunks_dropped == 7
+
+    connection.start()
+    await _drain(connection)
+    texts = [frame["type"] for frame in websocket.frames if isinstance(frame, dict)]
+    assert texts == ["step_start", "stream_dropped", "step"]
+    binary = [frame for frame in websocket.frames if isinstance(frame, bytes)]
+    assert len(binary) == 1
+    await connection.aclose()
+
+
+async def test_stream_events_skip_v1_viewers():
+    connection = ViewerConnection(FakeWebSocket(), PROTOCOL_V1)
+    assert not connection.enqueue(_chunk(1, 0))
+    assert connection.queue_depth == 0
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from echuu.live.hedging import BudgetExceeded, _race
+
+
+def _job(value, delay, log=None, fail=False):
+    async def run():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"{value} cancelled")
+            raise
+        if fail:
+            raise RuntimeError(value)
+        return value
+
+    return run
+
+
+async def test_primary_before_hedge():
+    started = []
+
+    def hedge():
+        started.append("hedge")
+        return _job("hedge", 0)()
+
+    assert await _race(_job("primary", 0.01), hedge, delay=0.5, budget=1) == (
+        "primary",
+        "primary",
+    )
+    assert started == []
+
+
+async def test_hedge_wins_and_primary_is_cancelled():
+    log = []
+    result = await _race(_job("primary", 1, log), _job("hedge", 0.01), delay=0.02, budget=2)
+    assert result == ("hedge", "hedge_won")
+    assert log == ["primary cancelled"]
+
+
+async def test_primary_wins_after_hedge_started():
+    log = []
+    result = await _race(_job("primary", 0.05), _job("hedge", 1, log), delay=0.01, budget=2)
+    assert result == ("primary", "primary_won")
+    assert log == ["hedge cancelled"]
+
+
+async def test_early_failure_starts_hedge_immediately():
+    loop = asyncio.get_running_loop()
+    began = loop.time()
+    result = await _race(_job("primary", 0, fail=True), _job("hedge", 0), delay=5, budget=10)
+    assert result == ("hedge", "hedge_won")
+    assert loop.time() - began < 1
+
+
+async def test_both_fail_raises_last_error():
+    with pytest.raises(RuntimeError, match="hedge"):
+        await _race(
+            _job("primary", 0, fail=True), _job("hedge", 0.01, fail=True), delay=5, budget=10
+        )
+
+
+async def test_budget_exceeded():
+    log = []
+    with pytest.raises(BudgetExceeded):
+        await _race(_job("primary", 1, log), _job("hedge", 1, log), delay=0.01, budget=0.05)
+    assert sorted(log) == ["hedge cancelled", "primary cancelled"]
+    # 预算比对冲延迟还短时不等到对冲时间
+    loop = asyncio.get_running_loop()
+    began = loop.time()
+    with pytest.raises(asyncio.TimeoutError):
+        await _race(_job("primary", 1), _job("hedge", 1), delay=5, budget=0.05)
+    assert loop.time() - began < 1
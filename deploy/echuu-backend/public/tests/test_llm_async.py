@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from echuu.live.llm_async import acall_llm, astream_llm, provider_concurrency
+from echuu.live.metrics import LLM_QUEUED
+
+
+class CountingLLM:
+    """记录同时进行的请求数；release 之前每个请求都停在半路。"""
+
+    model = "fake-llm"
+
+    def __init__(self, provider: str, sync: bool = False):
+        self.provider = provider
+        self.inflight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        if sync:
+            self.acall = None
+
+    def _enter(self):
+        with self.lock:
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+
+    def _exit(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def call(self, prompt, system=None, max_tokens=1000, **kwargs):
+        self._enter()
+        try:
+            self.release.wait(5)
+            return prompt
+        finally:
+            self._exit()
+
+    async def acall(self, prompt, system=None, max_tokens=1000, **kwargs):
+        self._enter()
+        try:
+            while not self.release.is_set():
+                await asyncio.sleep(0.005)
+            return prompt
+        finally:
+            self._exit()
+
+    async def astream(self, prompt, system=None, max_tokens=1000, **kwargs):
+        self._enter()
+        try:
+            yield prompt[:1]
+            while not self.release.is_set():
+                await asyncio.sleep(0.005)
+            yield prompt[1:]
+        finally:
+            self._exit()
+
+
+async def _collect(llm, prompt):
+    return "".join([delta async for delta in astream_llm(llm, prompt)])
+
+
+async def _run_capped(llm, call, requests=8):
+    tasks = [asyncio.ensure_future(call(llm, f"p{i}")) for i in range(requests)]
+    await asyncio.sleep(0.1)
+    peak, queued = llm.peak, LLM_QUEUED.value(provider=llm.provider)
+    llm.release.set()
+    results = await asyncio.gather(*tasks)
+    assert results == [f"p{i}" for i in range(requests)]
+    return peak, queued
+
+
+def test_provider_concurrency_env(monkeypatch):
+    monkeypatch.setenv("LLM_CONCURRENCY", "5")
+    assert provider_concurrency("gemini") == 5
+    monkeypatch.setenv("LLM_CONCURRENCY_GEMINI", "2")
+    assert provider_concurrency("gemini") == 2
+    monkeypatch.setenv("LLM_CONCURRENCY_GEMINI", "0")
+    assert provider_concurrency("gemini") == 1
+
+
+@pytest.mark.parametrize(
+    "mode",
+    ["acall", "thread", "astream"],
+)
+async def test_concurrency_capped_at_provider_limit(monkeypatch, mode):
+    provider = f"capped_{mode}"
+    monkeypatch.setenv(f"LLM_CONCURRENCY_{provider.upper()}", "3")
+    llm = CountingLLM(provider, sync=mode == "thread")
+    call = _collect if mode == "astream" else acall_llm
+
+    peak, queued = await _run_capped(llm, call)
+
+    assert peak == 3
+    # 排队中的请求计入 echuu_llm_queued，全部完成后归零
+    assert queued == 5
+    assert LLM_QUEUED.value(provider=provider) == 0
+    assert llm.inflight == 0
+
+
+async def test_providers_have_independent_limits(monkeypatch):
+    monkeypatch.setenv("LLM_CONCURRENCY_SLOW", "1")
+    monkeypatch.setenv("LLM_CONCURRENCY_FAST", "4")
+    slow, fast = CountingLLM("slow"), CountingLLM("fast")
+    blocked = [asyncio.ensure_future(acall_llm(slow, f"s{i}")) for i in range(3)]
+
+    started = time.perf_counter()
+    fast.release.set()
+    assert await asyncio.gather(*(acall_llm(fast, f"f{i}") for i in range(4))) == [
+        f"f{i}" for i in range(4)
+    ]
+    # slow 的名额占满不影响 fast
+    assert time.perf_counter() - started < 1
+    assert slow.peak == 1
+    slow.release.set()
+    await asyncio.gather(*blocked)
@@ -0,0 +1,116 @@
+import pytest
+
+from echuu.live import llm_cache
+from echuu.live.llm_cache import CachedLLMClient, parse_cache_sites
+from echuu.live.llm_context import llm_call_site
+
+
+class FakeLLM:
+    provider = "fake"
+    model = "fake-model"
+
+    def __init__(self, reply="ok"):
+        self.reply = reply
+        self.calls = 0
+
+    def call(self, prompt, system=None, max_tokens=1000, **kwargs):
+        self.calls += 1
+        return self.reply if self.reply is not None else f"{prompt}#{self.calls}"
+
+
+class FakeTime:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    return clock
+
+
+def test_parse_cache_sites():
+    assert parse_cache_sites("immersion, main_llm=60,", default_ttl=10) == {
+        "immersion": 10.0,
+        "main_llm": 60.0,
+    }
+
+
+def test_only_listed_sites_are_cached(clock):
+    llm = FakeLLM()
+    cached = CachedLLMClient(llm, {"immersion": 60})
+    cached.call("p")
+    cached.call("p")
+    with llm_call_site("main_llm"):
+        cached.call("p")
+    assert llm.calls == 3
+    assert cached.stats.bypassed == 3
+
+    with llm_call_site("immersion"):
+        assert cached.call("p") == "ok"
+        assert cached.call("p") == "ok"
+    assert llm.calls == 4
+    assert cached.stats.memory_hits == 1
+    assert cached.stats.misses == 1
+
+
+def test_ttl_expiry(clock):
+    llm = FakeLLM()
+    cached = CachedLLMClient(llm, {"immersion": 60})
+    with llm_call_site("immersion"):
+        cached.call("p")
+        clock.now += 59
+        cached.call("p")
+        assert llm.calls == 1
+        clock.now += 2
+        cached.call("p")
+    assert llm.calls == 2
+
+
+def test_lru_capacity(clock):
+    llm = FakeLLM(reply=None)
+    cached = CachedLLMClient(llm, {"immersion": 0}, capacity=2)
+    with llm_call_site("immersion"):
+        cached.call("a")
+        cached.call("b")
+        cached.call("a")  # a 变为最近使用
+        cached.call("c")  # 淘汰 b
+        assert cached.call("a") == "a#1"
+        assert cached.call("b") == "b#4"
+    assert llm.calls == 4
+
+
+def test_empty_result_not_cached(clock):
+    llm = FakeLLM(reply="  ")
+    cached = CachedLLMClient(llm, {"immersion": 60})
+    with llm_call_site("immersion"):
+        cached.call("p")
+        cached.call("p")
+    assert llm.calls == 2
+
+
+def test_disk_layer_survives_restart(clock, tmp_path):
+    path = tmp_path / "llm_cache.sqlite3"
+    llm = FakeLLM()
+    with llm_call_site("immersion"):
+        first = CachedLLMClient(llm, {"immersion": 60}, path)
+        first.call("p")
+        first.close()
+        second = CachedLLMClient(llm, {"immersion": 60}, path)
+        assert second.call("p") == "ok"
+        second.close()
+    assert llm.calls == 1
+    assert second.stats.disk_hits == 1
+
+
+async def test_acall_uses_cache(clock):
+    llm = FakeLLM()
+    cached = CachedLLMClient(llm, {"immersion": 60})
+    with llm_call_site("immersion"):
+        assert await cached.acall("p") == "ok"
+        assert await cached.acall("p") == "ok"
+    assert llm.calls == 1
@@ -0,0 +1,54 @@
+import pytest
+
+from echuu.live.llm_context import llm_call_site
+from echuu.live.llm_policy import (
+    CallPolicy,
+    llm_policy_scope,
+    merge_llm_policies,
+    parse_llm_policies,
+    resolve_llm_policy,
+)
+
+
+def test_from_dict_validation():
+    policy = CallPolicy.from_dict({"model": "m", "max_tokens": 300, "provider": "Claude"})
+    assert policy == CallPolicy(model="m", max_tokens=300, provider="claude")
+    for bad in (
+        {"temperature": 0.2},
+        {"thinking_level": "extreme"},
+        {"max_tokens": 0},
+        {"max_tokens": True},
+        {"max_tokens": "100"},
+    ):
+        with pytest.raises(ValueError):
+            CallPolicy.from_dict(bad)
+
+
+def test_parse_and_merge():
+    with pytest.raises(ValueError):
+        parse_llm_policies({"main_llm": "fast"})
+    base = {"main_llm": CallPolicy(model="a", thinking_level="low")}
+    merged = merge_llm_policies(base, parse_llm_policies({"main_llm": {"model": "b"}}))
+    assert merged["main_llm"] == CallPolicy(model="b", thinking_level="low")
+
+
+def test_resolve_without_call_site_keeps_inputs():
+    with llm_policy_scope({"main_llm": CallPolicy(model="x", max_tokens=10)}):
+        assert resolve_llm_policy("claude", "m", 500) == ("m", 500, None)
+
+
+def test_resolve_max_tokens_is_a_cap():
+    policies = {"danmaku_reply": CallPolicy(max_tokens=400, thinking_level="low")}
+    with llm_policy_scope(policies), llm_call_site("danmaku_reply"):
+        assert resolve_llm_policy("claude", "m", 1000) == ("m", 400, "low")
+        # 调用方请求得更少时不放大
+        assert resolve_llm_policy("claude", "m", 200) == ("m", 200, "low")
+        # 显式传入的 thinking_level 优先
+        assert resolve_llm_policy("claude", "m", 200, "high")[2] == "high"
+
+
+def test_resolve_ignores_other_provider():
+    policies = {"main_llm": CallPolicy(model="gemini-x", provider="gemini")}
+    with llm_policy_scope(policies), llm_call_site("main_llm"):
+        assert resolve_llm_policy("claude", "m", 500) == ("m", 500, None)
+        assert resolve_llm_policy("gemini", "m", 500) == ("gemini-x", 500, None)
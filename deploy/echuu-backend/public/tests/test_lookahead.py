@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+from echuu.live.lookahead import TTSPrefetcher
+from echuu.live.wav import wav_pcm
+
+
+def _state(*lines, current=0):
+    return SimpleNamespace(
+        current_line_idx=current, script_lines=[SimpleNamespace(text=text) for text in lines]
+    )
+
+
+async def _consume(stream):
+    chunks = [chunk async for chunk in stream]
+    return b"".join(chunks), await stream.audio()
+
+
+async def test_stream_hit_uses_prefetch(fake_tts):
+    tts = fake_tts()
+    prefetcher = TTSPrefetcher(tts, depth=1)
+    prefetcher.schedule(_state("今天聊猫。"))
+    pcm, audio = await _consume(prefetcher.stream(0, "今天聊猫。"))
+    assert pcm.decode("utf-16-le") == "今天聊猫。"
+    assert wav_pcm(audio) == pcm
+    assert prefetcher.stats.hits == 1
+    assert tts.tts.calls == ["今天聊猫。"]
+
+
+async def test_stream_splice_prefix_and_prefetched_line(fake_tts):
+    tts = fake_tts()
+    prefetcher = TTSPrefetcher(tts, depth=1)
+    prefetcher.schedule(_state("今天聊猫。"))
+    pcm, audio = await _consume(prefetcher.stream(0, "谢谢六螺！ 今天聊猫。"))
+    assert pcm.decode("utf-16-le") == "谢谢六螺！今天聊猫。"
+    assert wav_pcm(audio) == pcm
+    assert prefetcher.stats.spliced == 1
+
+
+async def test_stream_splice_resynthesizes_line_when_prefetch_fails(fake_tts):
+    tts = fake_tts()
+    tts.tts.fail_once.add("今天聊猫。")
+    tts.start_recording()
+    prefetcher = TTSPrefetcher(tts, depth=1)
+    prefetcher.schedule(_state("今天聊猫。"))
+    pcm, audio = await _consume(prefetcher.stream(0, "谢谢六螺！今天聊猫。"))
+
+    # 回应前缀已经推给观众，台词只补合成一次，不重复整句
+    assert pcm.decode("utf-16-le") == "谢谢六螺！今天聊猫。"
+    assert wav_pcm(audio) == pcm
+    assert tts.tts.calls.count("谢谢六螺！") == 1
+    assert "谢谢六螺！今天聊猫。" not in tts.tts.calls
+    assert prefetcher.stats.spliced == 0 and prefetcher.stats.misses == 1
+    assert tts._recording_buffer == [audio]
+
+
+async def test_stream_invalidated_prefetch_synthesizes_whole_speech(fake_tts):
+    tts = fake_tts()
+    prefetcher = TTSPrefetcher(tts, depth=1)
+    prefetcher.schedule(_state("今天聊猫。"))
+    pcm, audio = await _consume(prefetcher.stream(0, "改成聊狗。"))
+    assert pcm.decode("utf-16-le") == "改成聊狗。"
+    assert prefetcher.stats.invalidated == 1
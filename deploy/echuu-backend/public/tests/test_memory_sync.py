@@ -0,0 +1,79 @@
+import copy
+
+from echuu.live.memory_sync import MemorySync, diff_json, escape_pointer
+from echuu.live.state import Danmaku, PerformerMemory
+
+
+def _unescape(token):
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def apply_ops(document, ops):
+    """测试用的最小 JSON Patch 实现（只覆盖 diff_json 会产生的操作）。"""
+    for op in ops:
+        *parents, last = [_unescape(t) for t in op["path"].split("/")[1:]]
+        target = document
+        for token in parents:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+        if op["op"] == "remove":
+            del target[last]
+        elif isinstance(target, list):
+            if last == "-":
+                target.append(op["value"])
+            else:
+                target[int(last)] = op["value"]
+        else:
+            target[last] = op["value"]
+    return document
+
+
+def test_escape_pointer():
+    assert escape_pointer("a/b~c") == "a~1b~0c"
+
+
+def test_diff_json_append_only_list():
+    ops = []
+    diff_json([1, 2], [1, 2, 3, 4], "/xs", ops)
+    assert ops == [
+        {"op": "add", "path": "/xs/-", "value": 3},
+        {"op": "add", "path": "/xs/-", "value": 4},
+    ]
+
+
+def test_diff_json_dict_and_replace():
+    old = {"a": 1, "b": [1, 2], "gone": True}
+    new = {"a": 2, "b": [2], "new": "x"}
+    ops = []
+    diff_json(old, new, "", ops)
+    assert {"op": "remove", "path": "/gone"} in ops
+    assert {"op": "replace", "path": "/a", "value": 2} in ops
+    assert {"op": "replace", "path": "/b", "value": [2]} in ops
+    assert {"op": "add", "path": "/new", "value": "x"} in ops
+    assert apply_ops(copy.deepcopy(old), ops) == new
+
+
+def test_delta_round_trip():
+    memory = PerformerMemory()
+    sync = MemorySync(memory)
+    client = copy.deepcopy(sync.snapshot()["memory"])
+    assert sync.delta() is None
+
+    memory.script_progress["current_line"] = 3
+    memory.script_progress["completed_stages"].append("Hook")
+    memory.mark_dirty("script_progress")
+    memory.danmaku_memory["received"].append("你好")
+    memory.mark_dirty("danmaku_memory")
+    memory.update_user_from_danmaku(Danmaku(text="哈哈哈", user="六/螺"))
+
+    delta = sync.delta()
+    assert delta["base"] == 0 and delta["version"] == memory.version
+    assert {"op": "add", "path": "/danmaku_memory/received/-", "value": "你好"} in delta["ops"]
+    apply_ops(client, delta["ops"])
+    assert client == memory.to_dict()
+
+    # 第二轮只包含新变化
+    memory.update_user_from_danmaku(Danmaku(text="加油", user="六/螺"))
+    delta = sync.delta()
+    assert all(op["path"].startswith("/user_profiles/六~1螺") for op in delta["ops"])
+    apply_ops(client, delta["ops"])
+    assert client == memory.to_dict()
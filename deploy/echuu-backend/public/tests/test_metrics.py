@@ -0,0 +1,89 @@
+import pytest
+
+from echuu.live.metrics import Registry
+
+
+def test_histogram_render_cumulative_buckets_sum_and_count():
+    registry = Registry()
+    latency = registry.histogram("t_seconds", "Step latency.", ("mode",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, mode="streamed")
+    latency.observe(2, mode="buffered")
+
+    assert registry.render() == (
+        "# HELP t_seconds Step latency.\n"
+        "# TYPE t_seconds histogram\n"
+        't_seconds_bucket{mode="buffered",le="0.1"} 0\n'
+        't_seconds_bucket{mode="buffered",le="1"} 0\n'
+        't_seconds_bucket{mode="buffered",le="+Inf"} 1\n'
+        't_seconds_sum{mode="buffered"} 2\n'
+        't_seconds_count{mode="buffered"} 1\n'
+        't_seconds_bucket{mode="streamed",le="0.1"} 2\n'
+        't_seconds_bucket{mode="streamed",le="1"} 3\n'
+        't_seconds_bucket{mode="streamed",le="+Inf"} 4\n'
+        't_seconds_sum{mode="streamed"} 3.65\n'
+        't_seconds_count{mode="streamed"} 4\n'
+    )
+    assert latency.count(mode="streamed") == 4
+    assert latency.sum(mode="streamed") == pytest.approx(3.65)
+
+
+def test_histogram_without_labels_and_inf_bucket_dropped():
+    registry = Registry()
+    histogram = registry.histogram("h", "No labels.", buckets=(float("inf"), 2, 1))
+    assert histogram.buckets == (1.0, 2.0)
+    histogram.observe(1.5)
+    lines = registry.render().splitlines()[2:]
+    assert lines == [
+        'h_bucket{le="1"} 0',
+        'h_bucket{le="2"} 1',
+        'h_bucket{le="+Inf"} 1',
+        "h_sum 1.5",
+        "h_count 1",
+    ]
+
+
+def test_histogram_quantile_interpolates_within_bucket():
+    registry = Registry()
+    histogram = registry.histogram("q", "Quantile.", ("kind",), buckets=(1, 2, 4))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 3):
+        histogram.observe(value, kind="a")
+    histogram.observe(100, kind="b")
+    assert histogram.quantile(0.5, kind="a") == pytest.approx(1.5)
+    # 不给标签时合并所有序列；落在 +Inf 桶时给出最大的有限边界
+    assert histogram.quantile(1.0) == 4
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    counter = registry.counter("c_total", "Escaping.", ("value",))
+    counter.inc(value='say "hi"\nC:\\tmp')
+    gauge = registry.gauge("g", "Escaping.", ("room",))
+    gauge.set(0.25, room="中文")
+
+    assert 'c_total{value="say \\"hi\\"\\nC:\\\\tmp"} 1\n' in registry.render()
+    assert 'g{room="中文"} 0.25\n' in registry.render()
+
+
+def test_labels_must_match_declaration():
+    registry = Registry()
+    counter = registry.counter("c_total", "Labels.", ("a", "b"))
+    with pytest.raises(ValueError):
+        counter.inc(a="1")
+    with pytest.raises(ValueError):
+        counter.inc(a="1", c="2")
+    with pytest.raises(ValueError):
+        counter.inc(-1, a="1", b="2")
+    with pytest.raises(ValueError):
+        registry.histogram("h", "Reserved.", ("le",))
+
+
+def test_registry_reuses_same_metric_and_rejects_conflicts():
+    registry = Registry()
+    first = registry.counter("c_total", "Reuse.", ("a",))
+    assert registry.counter("c_total", "Reuse.", ("a",)) is first
+    with pytest.raises(ValueError):
+        registry.gauge("c_total", "Reuse.", ("a",))
+    with pytest.raises(ValueError):
+        registry.counter("c_total", "Reuse.", ("b",))
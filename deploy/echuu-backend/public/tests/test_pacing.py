@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from echuu.live import pacing
+from echuu.live.pacing import DEFAULT_PAUSE, PAUSE_MAP, StepPacer, natural_pause
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(pacing.time, "monotonic", clock)
+    return clock
+
+
+def test_natural_pause_range():
+    rng = random.Random(0)
+    low, high = PAUSE_MAP["Climax"]
+    assert all(low <= natural_pause("Climax", rng) <= high for _ in range(50))
+    low, high = DEFAULT_PAUSE
+    assert low <= natural_pause("unknown", rng) <= high
+
+
+def test_released_schedules_next_step(clock):
+    pacer = StepPacer()
+    # 没有音频时按每秒 4.5 字估算
+    pacer.released(None, stage="Climax", speech="一二三四五六七八九")
+    assert pacer.last_duration == pytest.approx(2.0)
+    assert pacer.release_at == pytest.approx(clock.now + 2.0 + pacer.last_pause)
+
+    # 下一步在上一步播完之后才开始播放
+    previous = pacer.release_at
+    pacer.released(None, speech="一二三四五六七八九")
+    assert pacer.release_at == pytest.approx(previous + 2.0 + pacer.last_pause)
+
+
+async def test_step_ready_tracks_generation_and_dead_air(clock):
+    pacer = StepPacer(generation_alpha=0.5, initial_generation=3.0)
+    await pacer.wait_generate()
+    pacer.released(None, speech="一二三四五六七八九", started=clock.now)
+    release_at = pacer.release_at
+
+    clock.now = release_at + 1.0
+    pacer.step_ready()
+    assert pacer.generation_estimate == pytest.approx(0.5 * (release_at + 1.0 - 1000.0) + 1.5)
+    assert pacer.late_steps == 1
+    assert pacer.dead_air == pytest.approx(1.0)
+
+
+async def test_wait_release_returns_when_due(clock):
+    pacer = StepPacer()
+    await pacer.wait_release()
+    pacer.release_at = clock.now - 1.0
+    await pacer.wait_release()
+    await pacer.wait_generate()
+    assert pacer.to_dict()["late_steps"] == 0
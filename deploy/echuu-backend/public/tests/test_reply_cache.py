@@ -0,0 +1,52 @@
+from echuu.live.reply_cache import DanmakuReplyCache, normalize_danmaku
+
+
+def _key(text, line=1):
+    return DanmakuReplyCache.key(text, "question", 0, line)
+
+
+def test_normalize_danmaku():
+    assert normalize_danmaku("Ｈｅｌｌｏ！！ 哈哈哈哈哈") == "hello哈哈"
+    assert normalize_danmaku("？？？") == ""
+    assert DanmakuReplyCache.key("！！", "chat", 0, 1) is None
+
+
+def test_exact_hit_fills_user():
+    cache = DanmakuReplyCache(capacity=8)
+    cache.put(_key("主播吃了吗？"), {"response": "六螺，我吃过啦", "action": "笑"}, user="六螺")
+    result = cache.get(_key("主播吃了吗"), user="阿伟")
+    assert result == {"response": "阿伟，我吃过啦", "action": "笑"}
+    assert cache.stats.exact_hits == 1
+
+
+def test_anonymous_user_not_replaced():
+    cache = DanmakuReplyCache(capacity=8)
+    cache.put(_key("你好"), {"response": "观众们好"}, user="观众")
+    assert cache.get(_key("你好"), user="阿伟") == {"response": "观众们好"}
+
+
+def test_fuzzy_hit_in_same_bucket_only():
+    cache = DanmakuReplyCache(capacity=8, similarity=0.6)
+    cache.put(_key("主播今天吃了什么"), {"response": "火锅"}, user="a")
+    assert cache.get(_key("主播今天吃了什么呀"), user="b") == {"response": "火锅"}
+    assert cache.stats.fuzzy_hits == 1
+    # 不同台词（分桶）不复用
+    assert cache.get(_key("主播今天吃了什么呀", line=2), user="b") is None
+    assert cache.get(_key("完全不相关的弹幕"), user="b") is None
+    assert cache.stats.misses == 2
+
+
+def test_lru_and_disabled():
+    cache = DanmakuReplyCache(capacity=2)
+    for text in ["苹果好吃", "香蕉好甜", "西瓜解渴"]:
+        cache.put(_key(text), {"response": text}, user="a")
+    assert len(cache) == 2
+    assert cache.get(_key("苹果好吃"), user="a") is None
+    assert cache.get(_key("西瓜解渴"), user="a") == {"response": "西瓜解渴"}
+
+    disabled = DanmakuReplyCache(capacity=0)
+    disabled.put(_key("你好"), {"response": "hi"}, user="a")
+    assert disabled.get(_key("你好"), user="a") is None
+    # 空回应不缓存
+    cache.put(_key("空的"), {"response": ""}, user="a")
+    assert cache.get(_key("空的"), user="a") is None
@@ -0,0 +1,35 @@
+import pytest
+
+from echuu.live.reply_cache import DanmakuReplyCache
+from echuu.live.response_generator import DanmakuResponseGenerator
+
+
+@pytest.fixture
+def generator():
+    return DanmakuResponseGenerator(llm=None, reply_cache=DanmakuReplyCache(capacity=0))
+
+
+def test_parse_batch_by_id(generator):
+    text = '```json\n[{"id": 2, "response": " 第二条 "}, {"id": 1, "response": "第一条"}]\n```'
+    assert generator._parse_batch(text, 3) == ["第一条", "第二条", None]
+
+
+def test_parse_batch_falls_back_to_position(generator):
+    text = '[{"response": "a"}, "b", {"id": 9, "response": "c"}, {"response": "extra"}]'
+    assert generator._parse_batch(text, 3) == ["a", "b", "c"]
+
+
+def test_parse_batch_wrapped_object(generator):
+    assert generator._parse_batch('{"replies": [{"id": 1, "response": "x"}]}', 2) == ["x", None]
+    assert generator._parse_batch('{"response": "only"}', 1) == ["only"]
+    assert generator._parse_batch('{"replies": "nope"}', 2) == [None, None]
+
+
+def test_parse_batch_ignores_blank_and_duplicates(generator):
+    text = '[{"id": 1, "response": "  "}, {"id": 1, "response": "x"}, {"id": 1, "response": "y"}]'
+    assert generator._parse_batch(text, 2) == ["x", None]
+
+
+def test_parse_batch_truncated_output(generator):
+    text = '[{"id": 1, "response": "完整的"}, {"id": 2, "response": "被截'
+    assert generator._parse_batch(text, 3) == ["完整的", None, None]
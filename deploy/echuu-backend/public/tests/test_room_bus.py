@@ -0,0 +1,156 @@
+import asyncio
+import socket
+
+import pytest
+from resp import RespAddress, RespConnection
+from resp_server import serve
+from room_bus import (
+    MESSAGE_EVENT,
+    BusMessage,
+    InMemoryRoomStore,
+    RespEventBus,
+    RespRoomStore,
+    _key,
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+async def resp_address():
+    """进程内启动 resp_server 本地替身。"""
+    port = _free_port()
+    ready = asyncio.Event()
+    server = asyncio.create_task(serve(port=port, ready=ready))
+    await asyncio.wait_for(ready.wait(), 5)
+    yield RespAddress(port=port)
+    server.cancel()
+    await asyncio.gather(server, return_exceptions=True)
+
+
+@pytest.fixture(params=["memory", "resp"])
+async def store(request, resp_address):
+    store = InMemoryRoomStore() if request.param == "memory" else RespRoomStore(resp_address)
+    yield store
+    await store.close()
+
+
+async def _until(predicate, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+def test_bus_message_round_trip():
+    message = BusMessage(MESSAGE_EVENT, {"type": "step", "text": "a\nb"}, audio=b"\n\x00RIFF")
+    decoded = BusMessage.decode(message.encode())
+    assert decoded.data == message.data
+    assert decoded.audio == message.audio
+    assert decoded.origin == message.origin
+
+
+async def test_store_round_trip(store):
+    await store.create_room("r1", "owner-token")
+    assert await store.get_owner_token("r1") == "owner-token"
+    assert await store.get_owner_token("missing") is None
+
+    await store.put_status("r1", {"running": True, "step": 3})
+    assert await store.get_status("r1") == {"running": True, "step": 3}
+
+    assert await store.add_viewers("r1", 2) == 2
+    assert await store.add_viewers("r1", -5) == 0
+
+    await store.delete_room("r1")
+    assert await store.get_owner_token("r1") is None
+    assert await store.get_status("r1") is None
+
+
+async def test_run_lock_requires_matching_token(store):
+    token = await store.try_acquire_run("r1")
+    assert token
+    assert await store.try_acquire_run("r1") is None
+
+    # 令牌不对时既不能续期也不能释放
+    assert not await store.refresh_run("r1", "stale-token")
+    await store.release_run("r1", "stale-token")
+    assert await store.try_acquire_run("r1") is None
+
+    assert await store.refresh_run("r1", token)
+    await store.release_run("r1", token)
+    assert not await store.refresh_run("r1", token)
+
+    second = await store.try_acquire_run("r1")
+    assert second and second != token
+
+
+async def test_resp_refresh_extends_lock_ttl(resp_address):
+    store = RespRoomStore(resp_address)
+    conn = RespConnection(resp_address)
+    token = await store.try_acquire_run("r1")
+    await conn.execute("EXPIRE", _key("r1", "run"), 5)
+    assert await conn.execute("TTL", _key("r1", "run")) <= 5
+    assert await store.refresh_run("r1", token)
+    assert await conn.execute("TTL", _key("r1", "run")) > 5
+    await conn.close()
+    await store.close()
+
+
+async def test_pubsub_delivers_to_every_bus(resp_address):
+    received = {"a": [], "b": []}
+    buses = {name: RespEventBus(resp_address) for name in received}
+    for name, bus in buses.items():
+        await bus.start(
+            lambda room_id, message, name=name: received[name].append((room_id, message))
+        )
+
+    buses["a"].publish("r1", BusMessage(MESSAGE_EVENT, {"type": "step", "step": 1}, audio=b"wav"))
+    buses["b"].publish("r2", BusMessage(MESSAGE_EVENT, {"type": "status"}))
+    await _until(lambda: all(len(messages) == 2 for messages in received.values()))
+
+    for messages in received.values():
+        by_room = {room_id: message for room_id, message in messages}
+        assert by_room["r1"].data == {"type": "step", "step": 1}
+        assert by_room["r1"].audio == b"wav"
+        assert by_room["r2"].data == {"type": "status"}
+    for bus in buses.values():
+        await bus.close()
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+async def test_fanout_split_across_workers(resp_address, workers):
+    """
+    观众分散到 N 个 worker 时每个观众都收到全部事件，且每个 worker 只为自己的观众扇出。
+
+    多进程的吞吐加速比取决于机器核数，见 bench_bus_workers.py。
+    """
+    viewers, events = 30, 20
+    per_worker = [list(range(i, viewers, workers)) for i in range(workers)]
+    delivered = {viewer: [] for viewer in range(viewers)}
+    fanout_work = [0] * workers
+
+    def make_deliver(index):
+        def deliver(room_id, message):
+            for viewer in per_worker[index]:
+                delivered[viewer].append(message.data["step"])
+                fanout_work[index] += 1
+
+        return deliver
+
+    buses = [RespEventBus(resp_address) for _ in range(workers)]
+    for index, bus in enumerate(buses):
+        await bus.start(make_deliver(index))
+
+    for step in range(events):
+        buses[0].publish("room", BusMessage(MESSAGE_EVENT, {"type": "step", "step": step}))
+    await _until(lambda: sum(fanout_work) == viewers * events)
+
+    assert all(steps == list(range(events)) for steps in delivered.values())
+    assert max(fanout_work) == -(-viewers // workers) * events
+    for bus in buses:
+        await bus.close()
@@ -0,0 +1,141 @@
+import time
+from types import SimpleNamespace
+
+import room_reaper
+from fanout import ViewerConnection
+from room_reaper import PRESSURE_EVICT_FRACTION, RoomReaper
+from ws_protocol import PROTOCOL_V2
+
+
+def _room(room_id, inactive=0.0, started=False, running=False, viewers=0):
+    now = time.monotonic()
+    return SimpleNamespace(
+        room_id=room_id,
+        is_running=running,
+        last_activity=now - inactive,
+        started_at=now - inactive - 1 if started else None,
+        active_connections={object() for _ in range(viewers)},
+    )
+
+
+def _reaper(rooms, **kwargs):
+    closed = []
+
+    async def close_room(room):
+        closed.append(room.room_id)
+
+    options = dict(idle_ttl=100, finished_ttl=50, abandoned_ttl=1000, pressure_min_idle=10)
+    options.update(kwargs)
+    reaper = RoomReaper({room.room_id: room for room in rooms}, close_room, interval=0, **options)
+    return reaper, closed
+
+
+def test_classify_ttl_classes():
+    reaper, _ = _reaper([])
+    now = 10_000.0
+
+    def classify(inactive, **kwargs):
+        room = _room("r", **kwargs)
+        room.last_activity = now - inactive
+        return reaper.classify(room, now)
+
+    assert classify(99) is None
+    assert classify(100) == "idle"
+    assert classify(49, started=True) is None
+    assert classify(50, started=True) == "finished"
+    # 有观众时只有超过 abandoned_ttl 才回收
+    assert classify(999, viewers=1) is None
+    assert classify(999, started=True, viewers=2) is None
+    assert classify(1000, viewers=1) == "abandoned"
+    # 正在运行的房间永远不回收
+    assert classify(5000, running=True) is None
+
+
+async def test_sweep_reclaims_and_counts_by_reason():
+    rooms = [
+        _room("idle", inactive=200),
+        _room("fresh", inactive=5),
+        _room("finished", inactive=60, started=True),
+        _room("watched", inactive=60, started=True, viewers=1),
+        _room("abandoned", inactive=2000, viewers=3),
+        _room("running", inactive=2000, running=True, viewers=1),
+    ]
+    reaper, closed = _reaper(rooms)
+
+    assert await reaper.sweep() == 3
+    assert sorted(closed) == ["abandoned", "finished", "idle"]
+    assert sorted(reaper.rooms) == ["fresh", "running", "watched"]
+    stats = reaper.stats.to_dict()
+    assert stats["reclaimed_idle"] == stats["reclaimed_finished"] == 1
+    assert stats["reclaimed_abandoned"] == 1
+    assert stats["reclaimed"] == 3 and stats["sweeps"] == 1
+
+
+async def test_memory_pressure_reclaims_oldest_fraction(monkeypatch):
+    monkeypatch.setattr(room_reaper, "current_rss_mb", lambda: 512.0)
+    rooms = [_room(f"r{i}", inactive=20 + i) for i in range(8)]
+    rooms += [_room("recent", inactive=1), _room("watched", inactive=90, viewers=1)]
+    reaper, closed = _reaper(rooms, memory_cap_mb=256)
+
+    await reaper.sweep()
+    # 8 个候选按比例回收 2 个，最久未活动的先回收
+    assert int(8 * PRESSURE_EVICT_FRACTION) == 2
+    assert closed == ["r7", "r6"]
+    assert reaper.stats.reclaimed_pressure == 2
+    assert "recent" in reaper.rooms and "watched" in reaper.rooms
+
+
+async def test_admit_makes_room_by_reclaiming_the_oldest_empty_room():
+    rooms = [_room("old", inactive=30), _room("older", inactive=40), _room("busy", viewers=1)]
+    reaper, closed = _reaper(rooms, max_rooms=3)
+
+    assert await reaper.admit()
+    assert closed == ["older"]
+    assert reaper.stats.reclaimed_pressure == 1 and reaper.stats.rejected == 0
+
+
+async def test_admit_rejects_when_nothing_can_be_reclaimed(monkeypatch):
+    rooms = [_room("recent", inactive=1), _room("busy", inactive=30, viewers=1)]
+    reaper, closed = _reaper(rooms, max_rooms=2)
+    assert not await reaper.admit()
+    assert closed == [] and reaper.stats.rejected == 1
+
+    # 内存超限且回收后仍然超限：拒绝
+    monkeypatch.setattr(room_reaper, "current_rss_mb", lambda: 512.0)
+    reaper, _ = _reaper([], memory_cap_mb=256)
+    assert not await reaper.admit()
+    assert reaper.stats.rejected == 1
+
+
+class ClosingWebSocket:
+    def __init__(self):
+        self.closed_with = None
+
+    async def send_text(self, data):
+        pass
+
+    async def send_bytes(self, data):
+        pass
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+async def test_abandoned_room_with_live_viewers_is_closed(backend_app):
+    app = backend_app
+    created = await app.create_room()
+    room = app.rooms[created["room_id"]]
+    websockets = [ClosingWebSocket(), ClosingWebSocket()]
+    for websocket in websockets:
+        connection = ViewerConnection(websocket, PROTOCOL_V2)
+        room.active_connections.add(connection)
+        connection.start()
+    room.last_activity = time.monotonic() - app.room_reaper.abandoned_ttl - 1
+
+    assert app.room_reaper.classify(room) == "abandoned"
+    await app.room_reaper.sweep()
+
+    assert created["room_id"] not in app.rooms
+    assert not room.active_connections
+    assert [websocket.closed_with for websocket in websockets] == [1001, 1001]
+    assert await app.room_store.get_owner_token(created["room_id"]) is None
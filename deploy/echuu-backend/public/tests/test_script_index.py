@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+from echuu.live.resources import open_script_index
+from echuu.live.script_index import ScriptIndex, decode_cursor, encode_cursor
+
+
+def _write_script(directory, filename, mtime, name="六螺", topic="话题", lines=("台词",)):
+    path = directory / filename
+    data = {
+        "metadata": {"name": name, "topic": topic, "timestamp": "", "total_lines": len(lines)},
+        "script": [{"text": text} for text in lines],
+    }
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def index(tmp_path):
+    scripts_dir = tmp_path / "scripts"
+    scripts_dir.mkdir()
+    index = ScriptIndex(scripts_dir, tmp_path / "index.sqlite3")
+    yield index
+    index.close()
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(12.5, "a.json")) == (12.5, "a.json")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_query_pages_in_mtime_order(index):
+    # 两个文件 mtime 相同，按文件名倒序
+    for i, mtime in enumerate([100, 200, 200, 300, 400]):
+        _write_script(index.scripts_dir, f"s{i}.json", mtime, topic=f"t{i}")
+    assert index.reconcile()["added"] == 5
+
+    seen, cursor = [], None
+    while True:
+        items, cursor = index.query(limit=2, cursor=cursor)
+        seen += [item["filename"] for item in items]
+        if cursor is None:
+            break
+    assert seen == ["s4.json", "s3.json", "s2.json", "s1.json", "s0.json"]
+
+
+def test_query_filters(index):
+    _write_script(index.scripts_dir, "a.json", 100, name="六螺", topic="猫咪日常")
+    _write_script(index.scripts_dir, "b.json", 200, name="阿伟", topic="", lines=("今天吃火锅",))
+    index.reconcile()
+
+    items, cursor = index.query(name="六螺")
+    assert [item["filename"] for item in items] == ["a.json"]
+    assert cursor is None
+    items, _ = index.query(q="吃火锅")
+    assert [item["title"] for item in items] == ["未命名"]
+
+
+def test_reconcile_tracks_changes(index):
+    path = _write_script(index.scripts_dir, "a.json", 100)
+    index.reconcile()
+    _write_script(index.scripts_dir, "a.json", 150, topic="新话题")
+    _write_script(index.scripts_dir, "b.json", 200)
+    assert index.reconcile() == {"added": 1, "updated": 1, "removed": 0, "failed": 0}
+    path.unlink()
+    assert index.reconcile()["removed"] == 1
+    assert index.count() == 1
+
+
+def test_open_script_index_shares_one_connection(tmp_path, monkeypatch):
+    monkeypatch.delenv("SCRIPT_INDEX_PATH", raising=False)
+    scripts_dir = tmp_path / "scripts"
+    scripts_dir.mkdir()
+    index = open_script_index(scripts_dir)
+    assert open_script_index(scripts_dir) is index
+    assert index.db_path == tmp_path / "scripts_index.sqlite3"
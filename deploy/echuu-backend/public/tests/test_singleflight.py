@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from echuu.live.cancel import Cancelled, CancelToken, cancel_scope
+from echuu.live.singleflight import SingleFlight
+
+
+def _run_in_thread(target):
+    box = {}
+
+    def run():
+        try:
+            box["result"] = target()
+        except BaseException as e:  # Cancelled 继承 BaseException
+            box["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, box
+
+
+def test_do_shares_result_and_replays_chunks():
+    flights = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def leader_fn(publish):
+        calls.append("leader")
+        publish("a")
+        started.set()
+        release.wait(5)
+        publish("b")
+        return "done"
+
+    leader, leader_box = _run_in_thread(lambda: flights.do("k", leader_fn))
+    started.wait(5)
+    chunks = []
+    follower, follower_box = _run_in_thread(
+        lambda: flights.do("k", lambda _: calls.append("follower"), subscriber=chunks.append)
+    )
+    # 订阅时先补发已有的分片
+    deadline = time.monotonic() + 5
+    while not chunks and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert leader_box["result"] == follower_box["result"] == "done"
+    assert chunks == ["a", "b"]
+    assert calls == ["leader"]
+    assert flights.inflight() == 0
+
+
+def test_do_shares_error():
+    flights = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+
+    def fail(_):
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    leader, leader_box = _run_in_thread(lambda: flights.do("k", fail))
+    started.wait(5)
+    follower, follower_box = _run_in_thread(lambda: flights.do("k", lambda _: "unused"))
+    time.sleep(0.2)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert isinstance(leader_box["error"], ValueError)
+    assert follower_box["error"] is leader_box["error"]
+
+
+def test_do_retries_after_foreign_cancel():
+    flights = SingleFlight("test")
+    token = CancelToken()
+    started = threading.Event()
+
+    def leader_fn(_):
+        started.set()
+        token.wait(5)
+        token.raise_if_cancelled()
+
+    def run_leader():
+        with cancel_scope(token):
+            return flights.do("k", leader_fn)
+
+    leader, leader_box = _run_in_thread(run_leader)
+    started.wait(5)
+    follower, follower_box = _run_in_thread(lambda: flights.do("k", lambda _: "retried"))
+    time.sleep(0.2)
+    token.cancel("leader room closed")
+    leader.join(5)
+    follower.join(5)
+    assert isinstance(leader_box["error"], Cancelled)
+    assert follower_box["result"] == "retried"
+
+
+async def test_ado_shares_task():
+    flights = SingleFlight("test")
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    results = await asyncio.gather(*(flights.ado("k", work) for _ in range(3)))
+    assert results == ["ok"] * 3
+    assert calls == 1
+    assert flights.inflight() == 0
+
+
+async def test_ado_cancel_one_waiter_keeps_task():
+    flights = SingleFlight("test")
+    release = asyncio.Event()
+    upstream_cancelled = False
+
+    async def work():
+        nonlocal upstream_cancelled
+        try:
+            await release.wait()
+            return "ok"
+        except asyncio.CancelledError:
+            upstream_cancelled = True
+            raise
+
+    first = asyncio.create_task(flights.ado("k", work))
+    second = asyncio.create_task(flights.ado("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    release.set()
+    assert await second == "ok"
+    assert not upstream_cancelled
+
+
+async def test_ado_cancel_all_waiters_cancels_task():
+    flights = SingleFlight("test")
+    upstream_cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            upstream_cancelled.set()
+            raise
+
+    waiters = [asyncio.create_task(flights.ado("k", work)) for _ in range(2)]
+    await asyncio.sleep(0)
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.wait_for(upstream_cancelled.wait(), 1)
+    assert flights.inflight() == 0
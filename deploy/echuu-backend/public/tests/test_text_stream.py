@@ -0,0 +1,46 @@
+from echuu.live.text_stream import ResponseFieldExtractor, SentenceSplitter
+
+
+def _extract(chunks, field="response"):
+    extractor = ResponseFieldExtractor(field)
+    text = "".join(extractor.feed(chunk) for chunk in chunks)
+    return text, extractor.done
+
+
+def test_extractor_across_chunks():
+    chunks = ['{"act', 'ion": "wave", "resp', 'onse"', ' : "你好', '呀！", "x": 1}']
+    assert _extract(chunks) == ("你好呀！", True)
+
+
+def test_extractor_escapes():
+    raw = r'{"response": "a\"b\\c\nd\u4f60\u597d"}'
+    # 每次只喂一个字符，\uXXXX 跨分片
+    assert _extract(list(raw)) == ('a"b\\c\nd你好', True)
+
+
+def test_extractor_non_string_value():
+    assert _extract(['{"response": 12}']) == ("", True)
+    assert _extract(['{"other": "x"}']) == ("", False)
+
+
+def test_splitter_strong_breaks():
+    splitter = SentenceSplitter(min_chars=2)
+    assert splitter.feed("今天天气很好。我们") == ["今天天气很好。"]
+    assert splitter.feed("出去玩吧！") == []
+    # 句末标点在缓冲区末尾时等下一个分片（可能还有连续标点）
+    assert splitter.feed("！好") == ["我们出去玩吧！！"]
+    assert splitter.flush() == "好"
+    assert splitter.flush() == ""
+
+
+def test_splitter_min_chars_and_latin():
+    splitter = SentenceSplitter(min_chars=4)
+    assert splitter.feed("嗯。好的呢。然后") == ["嗯。好的呢。"]
+    splitter.flush()
+    assert splitter.feed("It costs 3.5 dollars. OK") == ["It costs 3.5 dollars."]
+
+
+def test_splitter_soft_break_when_too_long():
+    splitter = SentenceSplitter(min_chars=2, max_chars=10)
+    assert splitter.feed("一二三四五，六七八九十一二") == ["一二三四五，"]
+    assert splitter.flush() == "六七八九十一二"
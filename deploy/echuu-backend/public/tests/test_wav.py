@@ -0,0 +1,58 @@
+import io
+import struct
+import wave
+
+from echuu.live.wav import concat_wav, parse_wav, pcm_duration, wav_duration, wav_pcm
+
+
+def make_wav(pcm: bytes, sample_rate: int = 24000, channels: int = 1) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def test_pcm_duration():
+    assert pcm_duration(48000) == 1.0
+    assert pcm_duration(48000, sample_rate=48000, channels=2) == 0.25
+    assert pcm_duration(0) == 0.0
+
+
+def test_parse_wav():
+    data = make_wav(b"\x01\x00" * 100)
+    fmt, offset, size = parse_wav(data)
+    assert len(fmt) == 16
+    assert size == 200
+    assert data[offset : offset + size] == b"\x01\x00" * 100
+    assert parse_wav(b"not a wav file") is None
+
+
+def test_parse_wav_streaming_header():
+    # 流式写出的 WAV 把 data 块长度写成 0xFFFFFFFF，按实际字节数计算
+    data = bytearray(make_wav(b"\x00\x00" * 50))
+    _, offset, _ = parse_wav(bytes(data))
+    struct.pack_into("<I", data, offset - 4, 0xFFFFFFFF)
+    assert parse_wav(bytes(data))[2] == 100
+
+
+def test_wav_duration_and_pcm():
+    data = make_wav(b"\x00\x00" * 12000)
+    assert wav_duration(data) == 0.5
+    assert wav_pcm(data) == b"\x00\x00" * 12000
+    assert wav_duration(b"") is None
+
+
+def test_concat_wav():
+    joined = concat_wav([make_wav(b"\x01\x00" * 10), make_wav(b"\x02\x00" * 20)])
+    assert wav_pcm(joined) == b"\x01\x00" * 10 + b"\x02\x00" * 20
+    with wave.open(io.BytesIO(joined)) as f:
+        assert f.getnframes() == 30
+
+
+def test_concat_wav_rejects_mismatch():
+    assert concat_wav([make_wav(b"\x00\x00"), make_wav(b"\x00\x00", sample_rate=16000)]) is None
+    assert concat_wav([make_wav(b"\x00\x00"), b"raw pcm"]) is None
+    assert concat_wav([]) is None
@@ -0,0 +1,161 @@
+import base64
+import json
+
+import pytest
+from ws_protocol import (
+    AUDIO_FLAG_LAST,
+    AUDIO_FRAME_HEADER,
+    AUDIO_FRAME_MAGIC,
+    PROTOCOL_V1,
+    PROTOCOL_V2,
+    PROTOCOL_V3,
+    OutboundEvent,
+    encode_audio_frames,
+    encode_stream_frame,
+    parse_protocol,
+    split_chunks,
+)
+
+AUDIO = bytes(range(256)) * 3
+URL = "/api/audio/" + "a" * 64
+
+
+def decode_frame(frame: bytes):
+    """按前端的方式解析二进制帧。"""
+    magic, version, flags, seq, index, count = AUDIO_FRAME_HEADER.unpack_from(frame)
+    assert magic == AUDIO_FRAME_MAGIC
+    assert version == PROTOCOL_V2
+    return {
+        "last": bool(flags & AUDIO_FLAG_LAST),
+        "seq": seq,
+        "index": index,
+        "count": count,
+        "payload": frame[AUDIO_FRAME_HEADER.size :],
+    }
+
+
+def _step(**extra):
+    return OutboundEvent(
+        {"type": "step", "step": 1, "speech": "你好", **extra},
+        audio=AUDIO,
+        audio_seq=9,
+        audio_url=URL,
+    )
+
+
+def test_header_layout():
+    assert AUDIO_FRAME_HEADER.size == 12
+    frame = encode_audio_frames(0x01020304, [b"xy"])[0]
+    assert frame[:2] == b"EA"
+    assert frame[2] == PROTOCOL_V2
+    assert frame[3] == AUDIO_FLAG_LAST
+    assert frame[4:8] == b"\x01\x02\x03\x04"
+    assert frame[8:12] == b"\x00\x00\x00\x01"
+    assert frame[12:] == b"xy"
+
+
+def test_parse_protocol():
+    assert parse_protocol(2) == PROTOCOL_V2
+    assert parse_protocol(None) == PROTOCOL_V1
+    assert parse_protocol(99) == PROTOCOL_V1
+
+
+def test_split_chunks():
+    assert split_chunks(b"abcdefg", 3) == [b"abc", b"def", b"g"]
+    assert split_chunks(b"abc", 0) == [b"abc"]
+
+
+def test_v1_inlines_base64_audio():
+    (frame,) = _step().frames(PROTOCOL_V1)
+    data = json.loads(frame)
+    assert base64.b64decode(data["audio_b64"]) == AUDIO
+    assert data["audio_url"] == URL
+
+
+def test_v1_expands_danmaku_batch():
+    event = OutboundEvent(
+        {"type": "danmaku_batch", "items": [{"text": "666", "user": "a", "count": 3}]}
+    )
+    assert [json.loads(frame) for frame in event.frames(PROTOCOL_V1)] == [
+        {"type": "danmaku", "text": "666", "user": "a", "count": 3}
+    ]
+
+
+def test_v2_metadata_then_binary_chunks():
+    text, *binary = _step().frames(PROTOCOL_V2)
+    meta = json.loads(text)["audio"]
+    assert meta["seq"] == 9 and meta["bytes"] == len(AUDIO) and meta["url"] == URL
+    frames = [decode_frame(frame) for frame in binary]
+    assert len(frames) == meta["chunks"]
+    assert b"".join(frame["payload"] for frame in frames) == AUDIO
+    assert [frame["index"] for frame in frames] == list(range(len(frames)))
+    assert all(frame["count"] == len(frames) and frame["seq"] == 9 for frame in frames)
+    assert [frame["last"] for frame in frames] == [False] * (len(frames) - 1) + [True]
+
+
+def test_multi_chunk_frames():
+    chunks = split_chunks(AUDIO, 300)
+    frames = [decode_frame(frame) for frame in encode_audio_frames(5, chunks)]
+    assert [len(frame["payload"]) for frame in frames] == [300, 300, 168]
+    assert [frame["last"] for frame in frames] == [False, False, True]
+    assert {frame["count"] for frame in frames} == {3}
+
+
+def test_v2_stream_sequence():
+    start = OutboundEvent(
+        {"type": "step_start", "step": 1, "stream": 4, "audio": {"mime": "audio/pcm"}},
+        audio_seq=9,
+        protocols=[PROTOCOL_V2],
+    )
+    chunks = [
+        OutboundEvent(
+            {"type": "audio_chunk", "stream": 4, "index": i, "last": i == 2},
+            audio=payload,
+            audio_seq=9,
+            protocols=[PROTOCOL_V2],
+        )
+        for i, payload in enumerate([b"ab", b"cd", b""])
+    ]
+    end = _step(stream=4)
+
+    (start_frame,) = start.frames(PROTOCOL_V2)
+    assert json.loads(start_frame)["audio"] == {"mime": "audio/pcm", "seq": 9}
+    frames = [decode_frame(chunk.frames(PROTOCOL_V2)[0]) for chunk in chunks]
+    assert [frame["index"] for frame in frames] == [0, 1, 2]
+    # 总帧数未知，只有最后一帧写入 chunk_count
+    assert [frame["count"] for frame in frames] == [0, 0, 3]
+    assert [frame["last"] for frame in frames] == [False, False, True]
+    assert b"".join(frame["payload"] for frame in frames) == b"abcd"
+
+    # 结束时的 step 事件不再重复发送音频
+    (end_frame,) = end.frames(PROTOCOL_V2)
+    meta = json.loads(end_frame)["audio"]
+    assert meta["streamed"] is True and meta["chunks"] == 0 and meta["seq"] == 9
+
+
+@pytest.mark.parametrize("protocol", [PROTOCOL_V1, PROTOCOL_V3])
+def test_stream_events_only_for_v2(protocol):
+    chunk = OutboundEvent({"type": "audio_chunk"}, audio=b"ab", audio_seq=1)
+    assert chunk.frames(protocol) == []
+    assert OutboundEvent({"type": "step_start"}).frames(protocol) == []
+
+
+def test_v3_sends_url_only():
+    (frame,) = _step().frames(PROTOCOL_V3)
+    data = json.loads(frame)
+    assert data["audio"] == {"url": URL, "bytes": len(AUDIO), "mime": "audio/wav"}
+    assert "audio_b64" not in data
+    no_audio = OutboundEvent({"type": "step"}, audio=None).frames(PROTOCOL_V3)
+    assert json.loads(no_audio[0])["audio"] is None
+
+
+def test_frames_are_cached_per_protocol():
+    event = _step()
+    assert event.frames(PROTOCOL_V2) is event.frames(PROTOCOL_V2)
+    assert event.accepts(PROTOCOL_V1)
+    assert not OutboundEvent({}, protocols=[PROTOCOL_V2]).accepts(PROTOCOL_V3)
+
+
+def test_stream_frame_wraps_seq():
+    frame = decode_frame(encode_stream_frame(2**32 + 5, 1, b"x", last=True))
+    assert frame["seq"] == 5 and frame["count"] == 2